@@ -0,0 +1,583 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Measure the speed of the building blocks of a conversion.
+
+usage: benchmark-components.py [OPTIONS] [BENCHMARK...]
+
+Run micro-benchmarks of the components that dominate the running time
+of a conversion, using synthetic data:
+
+    sort -- sort.sort_file() on files of several sizes.
+
+    record-table -- sequential and random access to RecordTable and
+        MmapRecordTable.
+
+    indexed-database -- IndexedDatabase.get_many() compared to
+        individual lookups.
+
+    serializer -- PrimedPickleSerializer, MarshalSerializer, and
+        CompressingSerializer.
+
+    rcs-stream -- RCSStream.apply_diff() and invert_diff() on a large
+        file.
+
+    changeset-graph -- building a ChangesetGraph and consuming it,
+        breaking its cycles.
+
+    repository-walker -- walking a deep directory tree, with and
+        without scanning directories in advance.
+
+If no BENCHMARKs are specified, all of them are run.  Each benchmark
+is repeated --repeat times with the same data, and the best and mean
+times are reported.  The amount of data is proportional to --scale.
+The results are written in JSON format to --output, so that the
+effect of changes to a component can be evaluated in isolation."""
+
+import sys
+import os
+import time
+import random
+import shutil
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cvs2svn_lib.common import DB_OPEN_NEW
+from cvs2svn_lib.common import DB_OPEN_READ
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.telemetry import write_json
+from cvs2svn_lib.sort import sort_file
+from cvs2svn_lib.record_table import UnsignedIntegerPacker
+from cvs2svn_lib.record_table import RecordTable
+from cvs2svn_lib.record_table import MmapRecordTable
+from cvs2svn_lib.indexed_database import IndexedDatabase
+from cvs2svn_lib.serializer import MarshalSerializer
+from cvs2svn_lib.serializer import PrimedPickleSerializer
+from cvs2svn_lib.serializer import CompressingSerializer
+from cvs2svn_lib.rcs_stream import RCSStream
+from cvs2svn_lib.time_range import TimeRange
+from cvs2svn_lib.changeset import RevisionChangeset
+from cvs2svn_lib.changeset_graph_node import ChangesetGraphNode
+from cvs2svn_lib.changeset_graph import ChangesetGraph
+from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib.output_option import NullOutputOption
+from cvs2svn_lib.project import Project
+from cvs2svn_lib.repository_walker import _RepositoryWalker
+from cvs2svn_lib.repository_walker import walk_repository
+
+
+class Recorder:
+  """Collect the times measured by the benchmarks.
+
+  Each measurement is identified by the benchmark, the operation that
+  was timed, and the parameters of the operation (a map { name :
+  value }).  Repeated measurements are collected together."""
+
+  def __init__(self):
+    # A list of result maps, in the order that they were first
+    # recorded:
+    self.results = []
+
+    # A map { (benchmark, operation, params) : result }, where PARAMS
+    # is a sorted tuple of the items of the params map:
+    self._results = {}
+
+  def _get_result(self, benchmark, operation, params, count):
+    items = params.items()
+    items.sort()
+    key = (benchmark, operation, tuple(items),)
+    try:
+      return self._results[key]
+    except KeyError:
+      result = self._results[key] = {
+          'benchmark' : benchmark,
+          'operation' : operation,
+          'params' : params,
+          'count' : count,
+          'times' : [],
+          'values' : {},
+          }
+      self.results.append(result)
+      return result
+
+  def time(self, benchmark, operation, params, count, func, *args):
+    """Call FUNC(*ARGS), record the time it took, and return its value.
+
+    COUNT is the number of operations that the call performs."""
+
+    start = time.time()
+    retval = func(*args)
+    elapsed = time.time() - start
+    self._get_result(benchmark, operation, params, count)['times'].append(
+        elapsed
+        )
+    return retval
+
+  def set_value(self, benchmark, operation, params, name, value):
+    """Record another quantity NAME (e.g., a size) of a measurement.
+
+    Such quantities are not expected to vary between repetitions."""
+
+    result = self._get_result(benchmark, operation, params, None)
+    result['values'][name] = value
+
+  def get_results(self):
+    """Return the results, with summary statistics filled in."""
+
+    for result in self.results:
+      times = result['times']
+      result['best'] = min(times)
+      result['mean'] = sum(times) / len(times)
+      if result['best'] > 0.0:
+        result['rate'] = result['count'] / result['best']
+      else:
+        result['rate'] = None
+    return self.results
+
+
+def scaled(options, n):
+  return max(1, int(n * options.scale))
+
+
+def benchmark_sort(recorder, options, work_dir):
+  for size in [10000, 100000, 1000000]:
+    size = scaled(options, size)
+    params = {'lines' : size}
+    r = random.Random(options.seed)
+    input = os.path.join(work_dir, 'sort-input.txt')
+    output = os.path.join(work_dir, 'sort-output.txt')
+    f = open(input, 'wb')
+    for i in xrange(size):
+      f.write('%08x %d some typical payload\n' % (r.getrandbits(32), i,))
+    f.close()
+
+    recorder.time(
+        'sort', 'sort_file', params, size,
+        sort_file, input, output, None, 32000, [work_dir],
+        )
+    recorder.time(
+        'sort', 'sort_file with key', params, size,
+        sort_file, input, output, lambda line: line[9:],
+        32000, [work_dir],
+        )
+    os.remove(input)
+    os.remove(output)
+
+
+def _write_table(table, indexes):
+  for i in indexes:
+    table[i] = i + 1
+  table.close()
+
+
+def _read_table(table, indexes):
+  for i in indexes:
+    table[i]
+  table.close()
+
+
+def benchmark_record_table(recorder, options, work_dir):
+  size = scaled(options, 200000)
+  filename = os.path.join(work_dir, 'record-table.dat')
+  sequential = range(size)
+  shuffled = range(size)
+  random.Random(options.seed).shuffle(shuffled)
+
+  for klass in [RecordTable, MmapRecordTable]:
+    params = {'class' : klass.__name__, 'records' : size}
+    for (order, indexes) in [
+          ('sequential', sequential), ('random', shuffled),
+          ]:
+      recorder.time(
+          'record-table', '%s write' % (order,), params, size,
+          _write_table,
+          klass(filename, DB_OPEN_NEW, UnsignedIntegerPacker()), indexes,
+          )
+      recorder.time(
+          'record-table', '%s read' % (order,), params, size,
+          _read_table,
+          klass(filename, DB_OPEN_READ, UnsignedIntegerPacker()), indexes,
+          )
+    os.remove(filename)
+
+
+def make_record(r, i):
+  """Return a marshalable object resembling a stored CVSItem."""
+
+  return (
+      i, r.randrange(1000), r.randrange(1000000000),
+      '1.%d.2.%d' % (r.randrange(100), r.randrange(100),),
+      'author%d' % (r.randrange(20),),
+      [r.randrange(100000) for j in range(r.randrange(5))],
+      {'branch' : r.randrange(100), 'tag' : r.randrange(100)},
+      'Exp', r.random() < 0.5,
+      )
+
+
+def benchmark_indexed_database(recorder, options, work_dir):
+  size = scaled(options, 50000)
+  params = {'records' : size}
+  filename = os.path.join(work_dir, 'indexed-database.dat')
+  index_filename = os.path.join(work_dir, 'indexed-database.idx')
+  r = random.Random(options.seed)
+
+  db = IndexedDatabase(
+      filename, index_filename, DB_OPEN_NEW, MarshalSerializer()
+      )
+  for i in xrange(size):
+    db[i] = make_record(r, i)
+  db.close()
+
+  indexes = range(size)
+  r.shuffle(indexes)
+  # The lookups in a single get_many() call, as when a changeset's
+  # CVSItems are read:
+  batch_size = 100
+
+  def get_many():
+    db = IndexedDatabase(filename, index_filename, DB_OPEN_READ)
+    for i in xrange(0, size, batch_size):
+      for (index, item) in db.get_many(indexes[i:i + batch_size]):
+        pass
+    db.close()
+
+  def get_each():
+    db = IndexedDatabase(filename, index_filename, DB_OPEN_READ)
+    for index in indexes:
+      db[index]
+    db.close()
+
+  recorder.time(
+      'indexed-database', 'get_many(%d)' % (batch_size,), params, size,
+      get_many,
+      )
+  recorder.time(
+      'indexed-database', '__getitem__', params, size,
+      get_each,
+      )
+  os.remove(filename)
+  os.remove(index_filename)
+
+
+def benchmark_serializer(recorder, options, work_dir):
+  size = scaled(options, 20000)
+  r = random.Random(options.seed)
+  records = [make_record(r, i) for i in xrange(size)]
+  # Prime the pickler with the strings that occur most often:
+  primer = ['Exp', 'branch', 'tag'] + ['author%d' % (i,) for i in range(20)]
+
+  serializers = [
+      ('marshal', MarshalSerializer()),
+      ('primed-pickle', PrimedPickleSerializer(primer)),
+      ('compressed-marshal', CompressingSerializer(MarshalSerializer())),
+      ('compressed-primed-pickle',
+       CompressingSerializer(PrimedPickleSerializer(primer))),
+      ]
+
+  for (name, serializer) in serializers:
+    dumps = serializer.dumps
+    loads = serializer.loads
+    strings = recorder.time(
+        'serializer', 'dumps', {'serializer' : name, 'records' : size},
+        size, lambda: [dumps(record) for record in records],
+        )
+    recorder.time(
+        'serializer', 'loads', {'serializer' : name, 'records' : size},
+        size, lambda: [loads(s) for s in strings],
+        )
+    recorder.set_value(
+        'serializer', 'dumps', {'serializer' : name, 'records' : size},
+        'bytes', sum([len(s) for s in strings]),
+        )
+
+
+def make_diff(r, line_count, step):
+  """Return an RCS diff changing every STEPth line of a file."""
+
+  diff = []
+  for i in xrange(1 + r.randrange(step), line_count, step):
+    diff.append('d%d 1\n' % (i,))
+    diff.append('a%d 1\n' % (i,))
+    diff.append('changed line %d %x\n' % (i, r.getrandbits(32),))
+  return ''.join(diff)
+
+
+def benchmark_rcs_stream(recorder, options, work_dir):
+  line_count = scaled(options, 200000)
+  r = random.Random(options.seed)
+  text = ''.join([
+      'line %d of a large file %x\n' % (i, r.getrandbits(32),)
+      for i in xrange(line_count)
+      ])
+  for step in [10, 1000]:
+    diff = make_diff(r, line_count, step)
+    params = {'lines' : line_count, 'changed_lines' : line_count // step}
+    recorder.time(
+        'rcs-stream', 'apply_diff', params, line_count,
+        RCSStream(text).apply_diff, diff,
+        )
+    recorder.time(
+        'rcs-stream', 'invert_diff', params, line_count,
+        RCSStream(text).invert_diff, diff,
+        )
+
+
+class _SyntheticChangeset(RevisionChangeset):
+  """A changeset whose graph node is determined in advance."""
+
+  def __init__(self, id, timestamp, pred_ids, succ_ids):
+    RevisionChangeset.__init__(self, id, [])
+    self.timestamp = timestamp
+    self.pred_ids = pred_ids
+    self.succ_ids = succ_ids
+
+  def create_graph_node(self, cvs_item_to_changeset_id):
+    time_range = TimeRange()
+    time_range.add(self.timestamp)
+    return ChangesetGraphNode(
+        self, time_range, set(self.pred_ids), set(self.succ_ids)
+        )
+
+
+def make_changesets(r, size, cycle_fraction):
+  """Return a list of _SyntheticChangesets forming a dependency graph.
+
+  Each changeset depends on the previous one and on a few other
+  earlier ones.  A fraction CYCLE_FRACTION of the changesets also
+  depends on a later changeset, creating cycles."""
+
+  pred_ids = {}
+  succ_ids = {}
+  for id in xrange(1, size + 1):
+    pred_ids[id] = []
+    succ_ids[id] = []
+
+  for id in xrange(2, size + 1):
+    pred_ids[id].append(id - 1)
+    for i in range(r.randrange(3)):
+      pred_ids[id].append(max(1, id - r.randrange(2, 50)))
+    if r.random() < cycle_fraction:
+      # The later changeset is added to the graph after this one, so
+      # the dependency has to be recorded with that changeset:
+      later_id = min(size, id + r.randrange(1, 20))
+      if later_id != id:
+        succ_ids[later_id].append(id)
+
+  return [
+      _SyntheticChangeset(id, id, pred_ids[id], succ_ids[id])
+      for id in xrange(1, size + 1)
+      ]
+
+
+def benchmark_changeset_graph(recorder, options, work_dir):
+  size = scaled(options, 20000)
+  for cycle_fraction in [0.0, 0.05]:
+    params = {'changesets' : size, 'cycle_fraction' : cycle_fraction}
+    r = random.Random(options.seed)
+    changesets = make_changesets(r, size, cycle_fraction)
+    changeset_db = {}
+    for changeset in changesets:
+      changeset_db[changeset.id] = changeset
+
+    graph = ChangesetGraph(changeset_db, {})
+
+    def build():
+      for changeset in changesets:
+        graph.add_changeset(changeset)
+
+    cycles = []
+
+    def break_cycle(cycle):
+      # Remove the dependency of the first changeset on the last:
+      cycles.append(len(cycle))
+      graph[cycle[0].id].pred_ids.remove(cycle[-1].id)
+      graph[cycle[-1].id].succ_ids.remove(cycle[0].id)
+
+    def consume():
+      for (changeset, time_range) in graph.consume_graph(break_cycle):
+        pass
+
+    recorder.time('changeset-graph', 'add_changeset', params, size, build)
+    recorder.time('changeset-graph', 'consume_graph', params, size, consume)
+    recorder.set_value(
+        'changeset-graph', 'consume_graph', params, 'cycles', len(cycles)
+        )
+
+
+def make_tree(path, depth, width, files):
+  """Create a deep tree of empty RCS files under PATH.
+
+  The tree has a spine of DEPTH nested directories; each directory on
+  the spine has WIDTH leaf subdirectories with FILES files each, and
+  an Attic with one file."""
+
+  count = 0
+  for level in range(depth):
+    os.mkdir(path)
+    os.mkdir(os.path.join(path, 'Attic'))
+    open(os.path.join(path, 'Attic', 'dead%d.c,v' % (level,)), 'w').close()
+    count += 1
+    for i in range(width):
+      leaf = os.path.join(path, 'leaf%d' % (i,))
+      os.mkdir(leaf)
+      for j in range(files):
+        open(os.path.join(leaf, 'file%d.c,v' % (j,)), 'w').close()
+        count += 1
+    path = os.path.join(path, 'level%d' % (level + 1,))
+  return count
+
+
+def benchmark_repository_walker(recorder, options, work_dir):
+  depth = 50
+  width = scaled(options, 5)
+  repos = os.path.join(work_dir, 'repos')
+  os.mkdir(repos)
+  os.mkdir(os.path.join(repos, 'CVSROOT'))
+  file_count = make_tree(os.path.join(repos, 'module'), depth, width, 10)
+
+  Ctx().output_option = NullOutputOption()
+  project = Project(0, os.path.join(repos, 'module'))
+
+  def error_handler(msg):
+    raise RuntimeError(msg)
+
+  def walk():
+    count = 0
+    for cvs_path in walk_repository(project, KeyGenerator(), error_handler):
+      count += 1
+    return count
+
+  old_scan_threads = _RepositoryWalker.SCAN_THREADS
+  try:
+    for scan_threads in [0, old_scan_threads]:
+      _RepositoryWalker.SCAN_THREADS = scan_threads
+      params = {
+          'depth' : depth, 'files' : file_count,
+          'scan_threads' : scan_threads,
+          }
+      recorder.time(
+          'repository-walker', 'walk_repository', params, file_count, walk
+          )
+  finally:
+    _RepositoryWalker.SCAN_THREADS = old_scan_threads
+  shutil.rmtree(repos)
+
+
+BENCHMARKS = [
+    ('sort', benchmark_sort),
+    ('record-table', benchmark_record_table),
+    ('indexed-database', benchmark_indexed_database),
+    ('serializer', benchmark_serializer),
+    ('rcs-stream', benchmark_rcs_stream),
+    ('changeset-graph', benchmark_changeset_graph),
+    ('repository-walker', benchmark_repository_walker),
+    ]
+
+
+def print_results(results):
+  for result in results:
+    params = result['params'].items()
+    params.sort()
+    name = '%s %s (%s)' % (
+        result['benchmark'], result['operation'],
+        ', '.join(['%s=%s' % item for item in params]),
+        )
+    values = result['values'].items()
+    values.sort()
+    line = '%-72s %10.3f s %12.0f/s' % (
+        name, result['best'], result['rate'] or 0.0,
+        )
+    if values:
+      line += ' ' + ' '.join(['%s=%s' % item for item in values])
+    print line
+
+
+def main(args):
+  parser = OptionParser(usage=__doc__.split('\n\n')[1])
+  parser.add_option(
+      '--repeat', type='int', default=3,
+      help='the number of times to run each benchmark (default 3)',
+      )
+  parser.add_option(
+      '--scale', type='float', default=1.0,
+      help='the factor by which to scale the amount of data (default 1.0)',
+      )
+  parser.add_option(
+      '--seed', type='int', default=0,
+      help='the seed of the random number generator (default 0)',
+      )
+  parser.add_option(
+      '--work-dir', metavar='DIR',
+      help='the directory for temporary files '
+           '(default: a new temporary directory, removed afterwards)',
+      )
+  parser.add_option(
+      '--output', metavar='FILE',
+      help='write the results to FILE in JSON format',
+      )
+  (options, args) = parser.parse_args(args)
+
+  benchmarks = dict(BENCHMARKS)
+  for name in args:
+    if name not in benchmarks:
+      parser.error('unknown benchmark %r' % (name,))
+  if not args:
+    args = [name for (name, benchmark) in BENCHMARKS]
+
+  if options.work_dir is None:
+    work_dir = tempfile.mkdtemp(prefix='cvs2svn-benchmark-')
+  else:
+    work_dir = options.work_dir
+    if not os.path.isdir(work_dir):
+      os.makedirs(work_dir)
+
+  recorder = Recorder()
+  try:
+    for name in args:
+      sys.stderr.write('Running %s...\n' % (name,))
+      for i in range(options.repeat):
+        benchmarks[name](recorder, options, work_dir)
+  finally:
+    if options.work_dir is None:
+      shutil.rmtree(work_dir)
+
+  results = recorder.get_results()
+  print_results(results)
+
+  if options.output is not None:
+    f = open(options.output, 'w')
+    write_json(
+        {
+            'python' : sys.version.split()[0],
+            'repeat' : options.repeat,
+            'scale' : options.scale,
+            'seed' : options.seed,
+            'results' : results,
+            },
+        f,
+        )
+    f.write('\n')
+    f.close()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
+
+
@@ -0,0 +1,354 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Measure the time, memory, and disk space used by conversions.
+
+usage: benchmark-conversion.py [OPTIONS] CVS-REPOS-PATH...
+
+Convert each CVS repository with each of the tools selected by --tools
+(by default cvs2svn, cvs2git, and cvs2hg), and record the wall time,
+peak resident memory, and temporary disk space used by each pass, as
+reported by --telemetry-file.  The temporary disk space of a pass is
+the peak total size of all files in the temporary directory, sampled
+during the pass; it includes files that are not registered as
+artifacts, like the runs of external sorts.  The temporary disk space
+of the whole conversion is also sampled by this script while the tool
+runs.  Repositories for benchmarking can be generated using
+generate-cvs-repos.py.
+
+The results are written in JSON format to --output.  If --baseline is
+specified, the results are compared to those stored in that file (by
+an earlier run with --output), and any value that grew by more than
+--tolerance is reported as a regression; the exit status is then 1."""
+
+import sys
+import os
+import time
+import shutil
+import threading
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+try:
+  import json
+except ImportError:
+  json = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cvs2svn_lib.telemetry import write_json
+from cvs2svn_lib.telemetry import get_tree_size
+
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOOLS = ['cvs2svn', 'cvs2git', 'cvs2hg']
+
+# The quantities that are measured for each pass and compared to the
+# baseline:
+QUANTITIES = ['wall_time', 'peak_rss', 'temp_disk']
+
+# The number of seconds between samples of the size of the temporary
+# directory:
+SAMPLE_INTERVAL = 0.5
+
+# Values below these are too small to be compared meaningfully:
+MINIMA = {
+    'wall_time' : 1.0,
+    'peak_rss' : 16 * 1024 * 1024,
+    'temp_disk' : 1024 * 1024,
+    }
+
+
+def get_output_args(tool, output_dir):
+  """Return the output options for TOOL, writing into OUTPUT_DIR."""
+
+  if tool == 'cvs2svn':
+    return ['--dumpfile=%s' % (os.path.join(output_dir, 'svn.dump'),)]
+  elif tool == 'cvs2git':
+    return [
+        '--use-external-blob-generator',
+        '--blobfile=%s' % (os.path.join(output_dir, 'git-blob.dat'),),
+        '--dumpfile=%s' % (os.path.join(output_dir, 'git-dump.dat'),),
+        ]
+  elif tool == 'cvs2hg':
+    return ['--hgrepos=%s' % (os.path.join(output_dir, 'hg'),)]
+  else:
+    raise ValueError('unknown tool %r' % (tool,))
+
+
+class TreeSizeSampler(threading.Thread):
+  """Record the peak size of a directory tree while a tool runs."""
+
+  def __init__(self, directory):
+    threading.Thread.__init__(self)
+    self.setDaemon(True)
+    self.directory = directory
+    self.peak_size = 0
+    self._stop_event = threading.Event()
+
+  def _sample(self):
+    self.peak_size = max(self.peak_size, get_tree_size([self.directory]))
+
+  def run(self):
+    while not self._stop_event.isSet():
+      self._sample()
+      self._stop_event.wait(SAMPLE_INTERVAL)
+
+  def stop(self):
+    self._stop_event.set()
+    self.join()
+
+
+def summarize_telemetry(report):
+  """Return a list of per-pass maps from a --telemetry-file REPORT."""
+
+  passes = []
+  for telemetry in report['passes']:
+    passes.append({
+        'pass_num' : telemetry['pass_num'],
+        'pass_name' : telemetry['pass_name'],
+        'wall_time' : telemetry['wall_time'],
+        'peak_rss' : telemetry['peak_rss'],
+        'temp_disk' : telemetry.get('peak_temp_disk'),
+        })
+  return passes
+
+
+def run_conversion(python, tool, repos, work_dir, extra_args):
+  """Convert REPOS using TOOL; return a map describing the run."""
+
+  tmpdir = os.path.join(work_dir, 'cvs2svn-tmp')
+  output_dir = os.path.join(work_dir, 'output')
+  telemetry_file = os.path.join(work_dir, 'telemetry.json')
+  log_file = os.path.join(work_dir, 'log.txt')
+  for path in [tmpdir, output_dir]:
+    if os.path.exists(path):
+      shutil.rmtree(path)
+  os.makedirs(output_dir)
+
+  cmd = [
+      python, os.path.join(TOP_DIR, tool), '--quiet',
+      '--tmpdir=%s' % (tmpdir,),
+      '--telemetry-file=%s' % (telemetry_file,),
+      ] + get_output_args(tool, output_dir) + extra_args + [repos]
+
+  sampler = TreeSizeSampler(tmpdir)
+  log = open(log_file, 'w')
+  start = time.time()
+  sampler.start()
+  try:
+    status = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+  finally:
+    sampler.stop()
+  wall_time = time.time() - start
+  log.close()
+
+  result = {
+      'tool' : tool,
+      'repository' : os.path.basename(os.path.normpath(repos)),
+      'status' : status,
+      'wall_time' : wall_time,
+      'passes' : [],
+      }
+  if status != 0:
+    sys.stderr.write(
+        '%s failed on %s with status %d; see %s\n'
+        % (tool, repos, status, log_file,)
+        )
+    return result
+
+  f = open(telemetry_file)
+  report = json.load(f)
+  f.close()
+  result['passes'] = summarize_telemetry(report)
+  values = [
+      p['peak_rss'] for p in result['passes'] if p['peak_rss'] is not None
+      ]
+  if values:
+    result['peak_rss'] = max(values)
+  else:
+    result['peak_rss'] = None
+  values = [sampler.peak_size] + [
+      p['temp_disk'] for p in result['passes'] if p['temp_disk'] is not None
+      ]
+  result['temp_disk'] = max(values)
+  return result
+
+
+def format_value(quantity, value):
+  if value is None:
+    return '-'
+  elif quantity == 'wall_time':
+    return '%.2f s' % (value,)
+  else:
+    return '%.1f MiB' % (value / 1048576.0,)
+
+
+def print_results(results):
+  for result in results:
+    print '%s on %s:' % (result['tool'], result['repository'],)
+    if result['status'] != 0:
+      print '    FAILED (status %d)' % (result['status'],)
+      continue
+    for p in result['passes']:
+      print '    pass%-2d %-36s %10s %12s %12s' % (
+          p['pass_num'], p['pass_name'],
+          format_value('wall_time', p['wall_time']),
+          format_value('peak_rss', p['peak_rss']),
+          format_value('temp_disk', p['temp_disk']),
+          )
+    print '    %-43s %10s %12s %12s' % (
+        'total',
+        format_value('wall_time', result['wall_time']),
+        format_value('peak_rss', result.get('peak_rss')),
+        format_value('temp_disk', result.get('temp_disk')),
+        )
+
+
+def compare(results, baseline, tolerance):
+  """Compare RESULTS to BASELINE; print and return the regressions."""
+
+  def key(result):
+    return (result['tool'], result['repository'],)
+
+  baseline_runs = {}
+  for result in baseline['runs']:
+    baseline_runs[key(result)] = result
+
+  regressions = []
+  def check(name, quantity, old, new):
+    if old is None or new is None:
+      return
+    if max(old, new) < MINIMA[quantity]:
+      return
+    if new > old * (1.0 + tolerance):
+      regressions.append(name)
+      print '    REGRESSION %s %s: %s -> %s (%+.0f%%)' % (
+          name, quantity,
+          format_value(quantity, old), format_value(quantity, new),
+          100.0 * (new - old) / max(old, 1e-9),
+          )
+
+  for result in results:
+    old = baseline_runs.get(key(result))
+    if old is None or old['status'] != 0 or result['status'] != 0:
+      continue
+    print 'Comparing %s on %s with the baseline:' % key(result)
+    name = '%s/%s' % key(result)
+    for quantity in QUANTITIES:
+      check(name, quantity, old.get(quantity), result.get(quantity))
+    old_passes = {}
+    for p in old['passes']:
+      old_passes[p['pass_name']] = p
+    for p in result['passes']:
+      old_pass = old_passes.get(p['pass_name'])
+      if old_pass is None:
+        continue
+      for quantity in QUANTITIES:
+        check(
+            '%s/%s' % (name, p['pass_name'],), quantity,
+            old_pass[quantity], p[quantity],
+            )
+  return regressions
+
+
+def main(args):
+  parser = OptionParser(usage=__doc__.split('\n\n')[1])
+  parser.add_option(
+      '--tools', default=','.join(TOOLS),
+      help='a comma-separated list of the tools to run (default %s)'
+           % (','.join(TOOLS),),
+      )
+  parser.add_option(
+      '--python', default=sys.executable,
+      help='the Python interpreter used to run the tools',
+      )
+  parser.add_option(
+      '--work-dir', metavar='DIR',
+      help='the directory for temporary files and output '
+           '(default: a new temporary directory, removed afterwards)',
+      )
+  parser.add_option(
+      '--output', metavar='FILE',
+      help='write the results to FILE in JSON format',
+      )
+  parser.add_option(
+      '--baseline', metavar='FILE',
+      help='compare the results to those stored in FILE',
+      )
+  parser.add_option(
+      '--tolerance', type='float', default=0.2,
+      help='the relative growth that counts as a regression (default 0.2)',
+      )
+  parser.add_option(
+      '--tool-option', action='append', default=[], metavar='OPTION',
+      help='pass OPTION to each tool (may be repeated)',
+      )
+  (options, args) = parser.parse_args(args)
+  if not args:
+    parser.error('no CVS repositories specified')
+  if json is None:
+    parser.error('this script requires the json module (Python 2.6 or later)')
+  tools = options.tools.split(',')
+  for tool in tools:
+    if tool not in TOOLS:
+      parser.error('unknown tool %r' % (tool,))
+
+  if options.work_dir is None:
+    work_dir = tempfile.mkdtemp(prefix='cvs2svn-benchmark-')
+  else:
+    work_dir = options.work_dir
+
+  results = []
+  try:
+    for repos in args:
+      for tool in tools:
+        sys.stderr.write('Running %s on %s...\n' % (tool, repos,))
+        results.append(run_conversion(
+            options.python, tool, os.path.abspath(repos),
+            os.path.join(work_dir, tool), options.tool_option,
+            ))
+  finally:
+    if options.work_dir is None:
+      shutil.rmtree(work_dir)
+
+  print_results(results)
+
+  if options.output is not None:
+    f = open(options.output, 'w')
+    write_json({'runs' : results}, f)
+    f.write('\n')
+    f.close()
+
+  if options.baseline is not None:
+    f = open(options.baseline)
+    baseline = json.load(f)
+    f.close()
+    if compare(results, baseline, options.tolerance):
+      sys.exit(1)
+
+  if [result for result in results if result['status'] != 0]:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
+
+
@@ -0,0 +1,196 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Measure the cost per file of the standard file property setters.
+
+usage: benchmark-property-setters.py [OPTIONS]
+
+Apply the property setters that cvs2svn uses by default to a synthetic
+set of files and report the time spent in each setter, in microseconds
+per file.  Use --auto-props and --mime-types to benchmark real
+configuration files; otherwise an auto-props file with --patterns
+synthetic patterns is generated."""
+
+import sys
+import os
+import time
+import random
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cvs2svn_lib import config
+from cvs2svn_lib.property_setters import AutoPropsPropertySetter
+from cvs2svn_lib.property_setters import CVSBinaryFileDefaultMimeTypeSetter
+from cvs2svn_lib.property_setters import CVSBinaryFileEOLStyleSetter
+from cvs2svn_lib.property_setters import DefaultEOLStyleSetter
+from cvs2svn_lib.property_setters import DescriptionPropertySetter
+from cvs2svn_lib.property_setters import EOLStyleFromMimeTypeSetter
+from cvs2svn_lib.property_setters import ExecutablePropertySetter
+from cvs2svn_lib.property_setters import KeywordsPropertySetter
+from cvs2svn_lib.property_setters import MimeMapper
+from cvs2svn_lib.property_setters import SVNBinaryFileKeywordsPropertySetter
+
+
+EXTENSIONS = [
+    'c', 'h', 'cpp', 'hpp', 'java', 'py', 'txt', 'html', 'xml', 'png',
+    'gif', 'jar', 'zip', 'sh', 'pl', 'in', 'am', 'css', 'js', 'pdf',
+    ]
+
+
+class FakeCVSFile(object):
+  """Just enough of a CVSFile for the file property setters."""
+
+  __slots__ = [
+      'cvs_path', 'rcs_basename', 'mode', 'executable', 'description',
+      'properties',
+      ]
+
+  def __init__(self, cvs_path, rcs_basename, mode, executable):
+    self.cvs_path = cvs_path
+    self.rcs_basename = rcs_basename
+    self.mode = mode
+    self.executable = executable
+    self.description = None
+    self.properties = {}
+
+  def __str__(self):
+    return self.cvs_path
+
+
+def generate_auto_props(pattern_count):
+  """Write an auto-props file with PATTERN_COUNT patterns.
+
+  Return the name of the file, which the caller must remove."""
+
+  (fd, filename) = tempfile.mkstemp('.conf', 'auto-props-')
+  f = os.fdopen(fd, 'w')
+  f.write('[auto-props]\n')
+  for i in range(pattern_count):
+    if i < len(EXTENSIONS):
+      pattern = '*.%s' % (EXTENSIONS[i],)
+    elif i % 3 == 0:
+      pattern = 'file%d.*' % (i,)
+    elif i % 3 == 1:
+      pattern = '*.ext%d' % (i,)
+    else:
+      pattern = 'README%d' % (i,)
+    f.write('%s = prop%d=yes;svn:eol-style=native\n' % (pattern, i,))
+  f.close()
+  return filename
+
+
+def generate_files(file_count, basename_count):
+  """Return a list of FILE_COUNT FakeCVSFiles.
+
+  The files share BASENAME_COUNT different basenames."""
+
+  rng = random.Random(0)
+  basenames = []
+  for i in range(basename_count):
+    basenames.append('file%d.%s' % (i, rng.choice(EXTENSIONS),))
+
+  files = []
+  for i in range(file_count):
+    basename = rng.choice(basenames)
+    mode = rng.choice([None, None, 'kv', 'b'])
+    files.append(FakeCVSFile(
+        'dir%d/%s' % (i % 100, basename,), basename, mode, rng.random() < 0.1,
+        ))
+  return files
+
+
+def main(args):
+  parser = OptionParser(usage=__doc__.split('\n\n')[1])
+  parser.add_option(
+      '--files', type='int', default=100000,
+      help='the number of files to process (default 100000)',
+      )
+  parser.add_option(
+      '--basenames', type='int', default=5000,
+      help='the number of distinct basenames (default 5000)',
+      )
+  parser.add_option(
+      '--patterns', type='int', default=300,
+      help='the number of synthetic auto-props patterns (default 300)',
+      )
+  parser.add_option(
+      '--auto-props', metavar='FILE',
+      help='use the auto-props patterns in FILE',
+      )
+  parser.add_option(
+      '--mime-types', metavar='FILE',
+      help='use the MIME mappings in FILE',
+      )
+  (options, args) = parser.parse_args(args)
+  if args:
+    parser.error('unexpected arguments')
+
+  setters = []
+
+  generated_auto_props = None
+  if options.auto_props is None:
+    generated_auto_props = generate_auto_props(options.patterns)
+    auto_props = generated_auto_props
+  else:
+    auto_props = options.auto_props
+  try:
+    setters.append(AutoPropsPropertySetter(auto_props, True))
+  finally:
+    if generated_auto_props is not None:
+      os.remove(generated_auto_props)
+
+  if options.mime_types is not None:
+    setters.append(MimeMapper(options.mime_types))
+  else:
+    setters.append(MimeMapper(mime_mappings={
+        'txt' : 'text/plain', 'html' : 'text/html', 'png' : 'image/png',
+        }))
+
+  setters.extend([
+      CVSBinaryFileEOLStyleSetter(),
+      CVSBinaryFileDefaultMimeTypeSetter(),
+      EOLStyleFromMimeTypeSetter(),
+      DefaultEOLStyleSetter(None),
+      SVNBinaryFileKeywordsPropertySetter(),
+      KeywordsPropertySetter(config.SVN_KEYWORDS_VALUE),
+      ExecutablePropertySetter(),
+      DescriptionPropertySetter(),
+      ])
+
+  files = generate_files(options.files, options.basenames)
+
+  print '%d files, %d distinct basenames' % (len(files), options.basenames,)
+  total = 0.0
+  for setter in setters:
+    start = time.time()
+    for cvs_file in files:
+      setter.set_properties(cvs_file)
+    elapsed = time.time() - start
+    total += elapsed
+    print '%-40s %8.2f us/file' % (
+        setter.__class__.__name__, 1e6 * elapsed / len(files),
+        )
+  print '%-40s %8.2f us/file' % ('total', 1e6 * total / len(files),)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
+
+
@@ -0,0 +1,469 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Generate a synthetic CVS repository for benchmarking.
+
+usage: generate-cvs-repos.py [OPTIONS] DIRECTORY
+
+Write a CVS repository with the requested shape to DIRECTORY, which
+must not exist yet.  The repository consists of a CVSROOT directory
+and a module (--module) containing --files ,v files spread over a
+directory tree --depth levels deep with --fanout subdirectories per
+directory.
+
+The commits are laid out on a timeline of --commits commits,
+--commit-interval seconds apart; each file is modified by --revisions
+of them.  Commits share one of --log-messages log messages, so
+messages are duplicated if there are fewer messages than commits.
+Each timestamp is moved by a random amount of up to --skew seconds,
+which (if it is larger than the commit interval) provokes changeset
+dependency cycles.
+
+Each of the --branches branches and --tags tags is created at a random
+point on the timeline, on a random fraction (--symbol-fanout) of the
+files.  A fraction (--vendor-fraction) of the files are instead
+imported on a vendor branch, and a fraction (--binary-fraction) of the
+files are binary files of about --binary-size bytes that are replaced
+completely by each revision.
+
+The same --seed always generates the same repository."""
+
+import sys
+import os
+import time
+import random
+import binascii
+from optparse import OptionParser
+
+
+# The time of the first commit (2000-01-01 00:00:00 UTC):
+START_TIME = 946684800
+
+WORDS = [
+    'alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta',
+    'iota', 'kappa', 'lambda', 'mu', 'nu', 'xi', 'omicron', 'pi', 'rho',
+    'sigma', 'tau', 'upsilon', 'phi', 'chi', 'psi', 'omega', 'foo@bar',
+    ]
+
+
+def quote(s):
+  """Return S as an RCS string (including the surrounding '@')."""
+
+  return '@%s@' % (s.replace('@', '@@'),)
+
+
+def format_date(timestamp):
+  return time.strftime('%Y.%m.%d.%H.%M.%S', time.gmtime(timestamp))
+
+
+def make_line(rng):
+  return ' '.join([rng.choice(WORDS) for i in range(rng.randint(3, 10))]) \
+         + '\n'
+
+
+def make_binary_lines(rng, size):
+  """Return random binary contents of about SIZE bytes, as lines."""
+
+  size = max(size + rng.randint(-size // 4, size // 4), 1)
+  data = binascii.unhexlify('%0*x' % (2 * size, rng.getrandbits(8 * size),))
+  # Keep the line arithmetic simple by ending with a newline:
+  if not data.endswith('\n'):
+    data += '\n'
+  return [line + '\n' for line in data[:-1].split('\n')]
+
+
+def edit_text(rng, lines):
+  """Make a random change to LINES, a list of strings ending in '\\n'.
+
+  Return (new_lines, forward_diff, reverse_diff), where FORWARD_DIFF
+  is the RCS diff that turns LINES into NEW_LINES and REVERSE_DIFF the
+  one that turns NEW_LINES back into LINES.  The change replaces one
+  line and appends up to two lines."""
+
+  n = len(lines)
+  i = rng.randrange(n)
+  new_line = make_line(rng)
+  added = [make_line(rng) for j in range(rng.randint(0, 2))]
+  new_lines = lines[:i] + [new_line] + lines[i + 1:] + added
+
+  k = len(added)
+  if i + 1 == n:
+    forward = 'd%d 1\na%d %d\n%s' % (n, n, 1 + k, new_line + ''.join(added),)
+  else:
+    forward = 'd%d 1\na%d 1\n%s' % (i + 1, i + 1, new_line,)
+    if k:
+      forward += 'a%d %d\n%s' % (n, k, ''.join(added),)
+  reverse = 'd%d 1\na%d 1\n%s' % (i + 1, i + 1, lines[i],)
+  if k:
+    reverse += 'd%d %d\n' % (n + 1, k,)
+  return (new_lines, forward, reverse)
+
+
+def replace_text(rng, lines, size):
+  """Replace binary LINES completely; return as for edit_text()."""
+
+  new_lines = make_binary_lines(rng, size)
+  forward = 'd1 %d\na%d %d\n%s' % (
+      len(lines), len(lines), len(new_lines), ''.join(new_lines),
+      )
+  reverse = 'd1 %d\na%d %d\n%s' % (
+      len(new_lines), len(new_lines), len(lines), ''.join(lines),
+      )
+  return (new_lines, forward, reverse)
+
+
+class Revision:
+  def __init__(self, number, timestamp, author, log):
+    self.number = number
+    self.timestamp = timestamp
+    self.author = author
+    self.log = log
+    self.branches = []
+    self.next = None
+    # The full text (for the head revision) or the RCS diff:
+    self.text = None
+
+
+class Timeline:
+  """The commits, symbols, log messages, and authors of the repository."""
+
+  def __init__(self, options, rng):
+    self.options = options
+    self.rng = rng
+    self.messages = [
+        'Change %d: %s' % (i, make_line(rng),)
+        for i in range(options.log_messages)
+        ]
+    self.authors = ['user%d' % (i,) for i in range(options.authors)]
+    end_time = START_TIME + options.commits * options.commit_interval
+    # Lists of (name, timestamp) for the branches and tags:
+    self.branches = [
+        ('branch%d' % (i,), rng.randint(START_TIME, end_time),)
+        for i in range(options.branches)
+        ]
+    self.tags = [
+        ('tag%d' % (i,), rng.randint(START_TIME, end_time),)
+        for i in range(options.tags)
+        ]
+
+  def skew(self):
+    """Return a random offset within the configured clock skew."""
+
+    jitter = self.rng.randint(0, 59)
+    if self.options.skew:
+      jitter += self.rng.randint(-self.options.skew, self.options.skew)
+    return jitter
+
+  def get_commit(self, commit):
+    """Return (timestamp, author, log) for commit number COMMIT."""
+
+    return (
+        START_TIME + commit * self.options.commit_interval + self.skew(),
+        self.authors[commit % len(self.authors)],
+        self.messages[commit % len(self.messages)],
+        )
+
+
+class FileGenerator:
+  """Generate the revisions of one ,v file."""
+
+  def __init__(self, timeline, rng, binary):
+    self.timeline = timeline
+    self.options = timeline.options
+    self.rng = rng
+    self.binary = binary
+    # A map {revision_number : Revision}:
+    self.revisions = {}
+    # A list of (name, revision_number) for the symbols:
+    self.symbols = []
+    self.head = None
+    self.default_branch = None
+
+  def _initial_text(self):
+    if self.binary:
+      return make_binary_lines(self.rng, self.options.binary_size)
+    else:
+      return [make_line(self.rng) for i in range(self.options.lines)]
+
+  def _change(self, lines):
+    if self.binary:
+      return replace_text(self.rng, lines, self.options.binary_size)
+    else:
+      return edit_text(self.rng, lines)
+
+  def _add(self, number, timestamp, author, log):
+    revision = Revision(number, timestamp, author, log)
+    self.revisions[number] = revision
+    return revision
+
+  def generate_vendor(self):
+    """Generate a file that was imported on a vendor branch."""
+
+    (timestamp, author, log) = self.timeline.get_commit(0)
+    lines = self._initial_text()
+    rev = self._add('1.1', timestamp, 'vendor', 'Initial revision\n')
+    rev.text = ''.join(lines)
+    self.head = '1.1'
+    self.default_branch = '1.1.1'
+    self.symbols.append(('vendor', '1.1.1',))
+
+    prev = rev
+    for j in range(1, self.options.vendor_imports + 1):
+      number = '1.1.1.%d' % (j,)
+      if j == 1:
+        text = ''
+      else:
+        (timestamp, author, log) = self.timeline.get_commit(
+            j * self.options.commits // (self.options.vendor_imports + 1)
+            )
+        (lines, text, reverse) = self._change(lines)
+      rev = self._add(number, timestamp, 'vendor', 'Import %d\n' % (j,))
+      rev.text = text
+      if j == 1:
+        prev.branches.append(number)
+      else:
+        prev.next = number
+      self.symbols.append(('vendor-release-%d' % (j,), number,))
+      prev = rev
+
+  def generate(self):
+    """Generate a file with trunk, branch, and tag revisions."""
+
+    commits = self.rng.sample(
+        xrange(self.options.commits),
+        min(self.options.revisions, self.options.commits),
+        )
+    commits.sort()
+
+    # Generate the trunk texts forwards, then store them backwards:
+    texts = [self._initial_text()]
+    reverse_diffs = []
+    for commit in commits[1:]:
+      (lines, forward, reverse) = self._change(texts[-1])
+      texts.append(lines)
+      reverse_diffs.append(reverse)
+
+    trunk = []
+    for (k, commit) in enumerate(commits):
+      (timestamp, author, log) = self.timeline.get_commit(commit)
+      rev = self._add('1.%d' % (k + 1,), timestamp, author, log)
+      if k > 0:
+        rev.next = trunk[-1].number
+      trunk.append(rev)
+    for (k, rev) in enumerate(trunk[:-1]):
+      rev.text = reverse_diffs[k]
+    trunk[-1].text = ''.join(texts[-1])
+    self.head = trunk[-1].number
+
+    def sprout_point(timestamp):
+      """Return the index of the trunk revision current at TIMESTAMP."""
+
+      index = None
+      for (k, rev) in enumerate(trunk):
+        if rev.timestamp <= timestamp:
+          index = k
+      return index
+
+    for (name, timestamp) in self.timeline.branches:
+      if self.rng.random() >= self.options.symbol_fanout:
+        continue
+      k = sprout_point(timestamp)
+      if k is None:
+        continue
+      base = trunk[k]
+      even = 2 * (len(base.branches) + 1)
+      branch_number = '%s.%d' % (base.number, even,)
+      self.symbols.append((name, '%s.0.%d' % (base.number, even,),))
+      lines = texts[k]
+      prev = base
+      for j in range(self.options.branch_revisions):
+        number = '%s.%d' % (branch_number, j + 1,)
+        rev = self._add(
+            number,
+            timestamp + (j + 1) * self.options.commit_interval
+            + self.timeline.skew(),
+            self.timeline.authors[j % len(self.timeline.authors)],
+            'Change %d on %s\n' % (j + 1, name,),
+            )
+        (lines, rev.text, reverse) = self._change(lines)
+        if j == 0:
+          base.branches.append(number)
+        else:
+          prev.next = number
+        prev = rev
+
+    for (name, timestamp) in self.timeline.tags:
+      if self.rng.random() >= self.options.symbol_fanout:
+        continue
+      k = sprout_point(timestamp)
+      if k is not None:
+        self.symbols.append((name, trunk[k].number,))
+
+  def _iter_tree(self, number):
+    """Yield the revisions of the tree rooted at NUMBER in RCS order.
+
+    That is, each revision is followed by the rest of its line of
+    development and then by its branches.  The line of development is
+    followed iteratively, because it can be very long."""
+
+    line = []
+    while number is not None:
+      rev = self.revisions[number]
+      line.append(rev)
+      yield rev
+      number = rev.next
+    line.reverse()
+    for rev in line:
+      for branch in rev.branches:
+        for descendant in self._iter_tree(branch):
+          yield descendant
+
+  def write(self, filename):
+    f = open(filename, 'wb')
+    f.write('head\t%s;\n' % (self.head,))
+    if self.default_branch is not None:
+      f.write('branch\t%s;\n' % (self.default_branch,))
+    f.write('access;\nsymbols')
+    for (name, number) in self.symbols:
+      f.write('\n\t%s:%s' % (name, number,))
+    f.write(';\nlocks; strict;\ncomment\t@# @;\n')
+    if self.binary:
+      f.write('expand\t@b@;\n')
+    f.write('\n')
+
+    for rev in self._iter_tree(self.head):
+      f.write(
+          '\n%s\ndate\t%s;\tauthor %s;\tstate Exp;\nbranches'
+          % (rev.number, format_date(rev.timestamp), rev.author,)
+          )
+      for branch in rev.branches:
+        f.write('\n\t%s' % (branch,))
+      f.write(';\nnext\t%s;\n' % (rev.next or '',))
+
+    f.write('\n\ndesc\n@@\n')
+    for rev in self._iter_tree(self.head):
+      f.write(
+          '\n\n%s\nlog\n%s\ntext\n%s\n'
+          % (rev.number, quote(rev.log), quote(rev.text),)
+          )
+    f.close()
+
+
+def generate_directories(options):
+  """Return the list of directories (relative to the module)."""
+
+  directories = ['']
+  level = ['']
+  for depth in range(options.depth):
+    next_level = []
+    for parent in level:
+      for i in range(options.fanout):
+        next_level.append(os.path.join(parent, 'dir%d' % (i,)))
+    directories.extend(next_level)
+    level = next_level
+  return directories
+
+
+def main(args):
+  parser = OptionParser(usage=__doc__.split('\n\n')[1])
+  def add(name, default, help, type='int'):
+    parser.add_option(
+        '--' + name, type=type, default=default,
+        dest=name.replace('-', '_'),
+        help='%s (default %s)' % (help, default,),
+        )
+  add('files', 1000, 'the number of ,v files')
+  add('depth', 3, 'the depth of the directory tree')
+  add('fanout', 4, 'the number of subdirectories per directory')
+  add('revisions', 10, 'the number of trunk revisions per file')
+  add('lines', 50, 'the number of lines in the first revision of text files')
+  add('commits', 1000, 'the number of commits on the timeline')
+  add('commit-interval', 3600, 'the number of seconds between commits')
+  add('skew', 0, 'the maximum random clock skew in seconds')
+  add('log-messages', 500, 'the number of distinct log messages')
+  add('authors', 10, 'the number of distinct authors')
+  add('branches', 10, 'the number of branches')
+  add('branch-revisions', 2, 'the number of revisions per file on branches')
+  add('tags', 20, 'the number of tags')
+  add(
+      'symbol-fanout', 0.5,
+      'the fraction of the files on which each symbol is defined',
+      type='float',
+      )
+  add(
+      'vendor-fraction', 0.1,
+      'the fraction of the files imported on a vendor branch', type='float',
+      )
+  add('vendor-imports', 3, 'the number of vendor imports of those files')
+  add(
+      'binary-fraction', 0.05, 'the fraction of binary files', type='float',
+      )
+  add('binary-size', 10000, 'the average size of binary files in bytes')
+  parser.add_option(
+      '--module', default='proj',
+      help='the name of the module (default proj)',
+      )
+  add('seed', 0, 'the seed of the random number generator')
+  (options, args) = parser.parse_args(args)
+  if len(args) != 1:
+    parser.error('the directory must be specified')
+  [directory] = args
+  if os.path.exists(directory):
+    parser.error('%r already exists' % (directory,))
+  if options.revisions < 1 or options.commits < 1:
+    parser.error('--revisions and --commits must be at least 1')
+  if options.log_messages < 1 or options.authors < 1:
+    parser.error('--log-messages and --authors must be at least 1')
+
+  rng = random.Random(options.seed)
+  timeline = Timeline(options, rng)
+
+  os.makedirs(os.path.join(directory, 'CVSROOT'))
+  module_dir = os.path.join(directory, options.module)
+  directories = generate_directories(options)
+  for d in directories:
+    path = os.path.join(module_dir, d)
+    if not os.path.isdir(path):
+      os.makedirs(path)
+
+  start = time.time()
+  for i in range(options.files):
+    binary = rng.random() < options.binary_fraction
+    generator = FileGenerator(timeline, rng, binary)
+    if rng.random() < options.vendor_fraction:
+      generator.generate_vendor()
+    else:
+      generator.generate()
+    if binary:
+      basename = 'file%d.bin,v' % (i,)
+    else:
+      basename = 'file%d.c,v' % (i,)
+    generator.write(
+        os.path.join(module_dir, rng.choice(directories), basename)
+        )
+
+  sys.stderr.write(
+      'Generated %d files in %d directories in %.1f seconds.\n'
+      % (options.files, len(directories), time.time() - start,)
+      )
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
+
+
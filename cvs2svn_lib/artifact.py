@@ -36,6 +36,11 @@ class Artifact(object):
 
     pass
 
+  def get_size(self):
+    """Return the size of this artifact in bytes, or None if unknown."""
+
+    return None
+
 
 class TempFile(Artifact):
   """A temporary file that can be used across cvs2svn passes."""
@@ -49,6 +54,13 @@ class TempFile(Artifact):
 
   filename = property(_get_filename)
 
+  def get_size(self):
+    try:
+      return os.path.getsize(self.filename)
+    except OSError:
+      # The file does not exist (yet or any more):
+      return None
+
   def cleanup(self):
     logger.verbose("Deleting", self.filename)
     os.unlink(self.filename)
@@ -17,6 +17,7 @@
 """This module manages the artifacts produced by conversion passes."""
 
 
+from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.log import logger
 from cvs2svn_lib.artifact import TempFile
 
@@ -85,6 +86,10 @@ class ArtifactManager:
     # A set of passes that are currently being executed.
     self._active_passes = set()
 
+    # A map { artifact : pass } telling which pass creates each
+    # artifact.
+    self._creators = { }
+
   def set_artifact(self, name, artifact):
     """Add ARTIFACT to the list of artifacts that we manage.
 
@@ -113,6 +118,8 @@ class ArtifactManager:
 
     ARTIFACT must already have been registered."""
 
+    self._creators[artifact] = which_pass
+
     # An artifact is automatically "needed" in the pass in which it is
     # created:
     self.uses(which_pass, artifact)
@@ -165,6 +172,34 @@ class ArtifactManager:
 
     self.register_artifact_needed(basename, which_pass)
 
+  def get_prerequisites(self, which_pass):
+    """Return the artifacts that WHICH_PASS needs from other passes.
+
+    Return a map { artifact_name : creating_pass } for the artifacts
+    that are needed by WHICH_PASS but created by some other pass."""
+
+    needed = self._pass_needs.get(which_pass, set())
+    retval = {}
+    for (name, artifact) in self._artifacts.iteritems():
+      if artifact in needed:
+        creator = self._creators.get(artifact)
+        if creator is not None and creator is not which_pass:
+          retval[name] = creator
+    return retval
+
+  def get_artifact_sizes(self):
+    """Return a map { artifact_name : size } of the existing artifacts.
+
+    Artifacts whose size is unknown (e.g., because they have not been
+    created yet) are omitted."""
+
+    retval = {}
+    for (name, artifact) in self._artifacts.iteritems():
+      size = artifact.get_size()
+      if size is not None:
+        retval[name] = size
+    return retval
+
   def _unregister_artifacts(self, which_pass):
     """Unregister any artifacts that were needed for WHICH_PASS.
 
@@ -199,6 +234,26 @@ class ArtifactManager:
     """WHICH_PASS is starting."""
 
     self._active_passes.add(which_pass)
+    if Ctx().get_temp_dirs():
+      self._log_placement(which_pass)
+
+  def _log_placement(self, which_pass):
+    """Log the directories of the temporary files that WHICH_PASS creates.
+
+    This is only interesting if there are several temporary directories
+    (see Ctx.get_temp_dir())."""
+
+    names = [
+        name
+        for (name, artifact) in self._artifacts.iteritems()
+        if self._creators.get(artifact) is which_pass
+           and isinstance(artifact, TempFile)
+        ]
+    names.sort()
+    for name in names:
+      logger.verbose(
+          'Placing %s in %r' % (name, Ctx().get_temp_dir(name),)
+          )
 
   def pass_continued(self, which_pass):
     """WHICH_PASS will be continued during the next program run.
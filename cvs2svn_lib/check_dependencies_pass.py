@@ -14,8 +14,17 @@
 # history and logs, available at http://cvs2svn.tigris.org/.
 # ====================================================================
 
-"""This module defines some passes that can be used for debugging cv2svn."""
+"""This module checks the consistency of the dependencies of CVSItems.
 
+DependencyChecker can be fed the CVSItems as they are written or read
+by a pass (see --check-dependencies).  The passes defined here check a
+whole item store and can be used for debugging cv2svn."""
+
+
+import os
+import struct
+import tempfile
+import itertools
 
 from cvs2svn_lib import config
 from cvs2svn_lib.context import Ctx
@@ -29,13 +38,140 @@ from cvs2svn_lib.cvs_path_database import CVSPathDatabase
 from cvs2svn_lib.symbol_database import SymbolDatabase
 from cvs2svn_lib.cvs_item_database import OldCVSItemStore
 from cvs2svn_lib.cvs_item_database import IndexedCVSItemStore
+from cvs2svn_lib.sort import sort_file
+from cvs2svn_lib.sort import iter_records
+
+
+# The format of the records written by DependencyChecker: the ids of
+# the predecessor and the successor of a dependency, followed by
+# LISTED_BY_PRED or LISTED_BY_SUCC, telling which of the two CVSItems
+# listed it.  The natural string order of the records groups them by
+# dependency:
+EDGE_FORMAT = '>IIc'
+EDGE_LEN = struct.calcsize(EDGE_FORMAT)
+
+LISTED_BY_PRED = 'p'
+LISTED_BY_SUCC = 's'
+
+
+class DependencyChecker:
+  """Check that the pred_ids and succ_ids of CVSItems are consistent.
+
+  Each dependency between two CVSItems must be listed both in the
+  succ_ids of the predecessor and in the pred_ids of the successor.
+  Looking up the other CVSItem for each dependency is slow when the
+  CVSItems are not stored file by file.  Instead, add() writes one
+  record for each dependency that a CVSItem lists to a temporary file.
+  finish() sorts the records using sort_file(), so that the two
+  records of each dependency become adjacent, and reports the
+  dependencies that are only listed once.  Thus the CVSItems only have
+  to be seen once, in any order, and the time needed is dominated by
+  the external sort.
+
+  A DependencyChecker can be pickled as part of a checkpoint (see the
+  checkpoint module); the records written since then are discarded
+  when it is unpickled."""
+
+  def __init__(self, description):
+    """DESCRIPTION names the CVSItems being checked in messages."""
+
+    self.description = description
+    (fd, self.filename) = tempfile.mkstemp(
+        '.dat', 'dependencies-', Ctx().get_temp_dir(config.SORT_RUNS),
+        )
+    self.f = os.fdopen(fd, 'wb')
+
+  def add(self, cvs_item):
+    """Record the dependencies listed by CVS_ITEM."""
+
+    for pred_id in cvs_item.get_pred_ids():
+      self.f.write(
+          struct.pack(EDGE_FORMAT, pred_id, cvs_item.id, LISTED_BY_SUCC)
+          )
+    for succ_id in cvs_item.get_succ_ids():
+      self.f.write(
+          struct.pack(EDGE_FORMAT, cvs_item.id, succ_id, LISTED_BY_PRED)
+          )
+
+  def __getstate__(self):
+    self.f.flush()
+    return (self.description, self.filename, self.f.tell(),)
+
+  def __setstate__(self, state):
+    (self.description, self.filename, offset,) = state
+    self.f = open(self.filename, 'r+b')
+    self.f.seek(offset)
+    self.f.truncate()
+
+  def _iter_errors(self, sorted_filename):
+    """Generate a message for each inconsistent dependency."""
+
+    f = open(sorted_filename, 'rb')
+    try:
+      for (edge, records) in itertools.groupby(
+            iter_records(f, EDGE_LEN), lambda record: record[:-1]
+            ):
+        listers = set([record[-1] for record in records])
+        if len(listers) == 2:
+          continue
+        (pred_id, succ_id, lister) = struct.unpack(
+            EDGE_FORMAT, edge + listers.pop()
+            )
+        if lister == LISTED_BY_SUCC:
+          yield (
+              'Item <%x> lists pred=<%x>, but not vice versa.'
+              % (succ_id, pred_id,)
+              )
+        else:
+          yield (
+              'Item <%x> lists succ=<%x>, but not vice versa.'
+              % (pred_id, succ_id,)
+              )
+    finally:
+      f.close()
+
+  def finish(self):
+    """Check the dependencies recorded so far.
+
+    Raise a FatalException if any of them are inconsistent."""
+
+    logger.quiet(
+        'Checking dependency consistency of %s...' % (self.description,)
+        )
+    self.f.close()
+    self.f = None
+    (fd, sorted_filename) = tempfile.mkstemp(
+        '.dat', 'dependencies-s-', Ctx().get_temp_dir(config.SORT_RUNS),
+        )
+    os.close(fd)
+    try:
+      sort_file(
+          self.filename, sorted_filename,
+          tempdirs=[Ctx().get_temp_dir(config.SORT_RUNS)],
+          record_len=EDGE_LEN,
+          )
+      os.remove(self.filename)
+      fatal_errors = list(self._iter_errors(sorted_filename))
+    finally:
+      for filename in [self.filename, sorted_filename]:
+        if os.path.exists(filename):
+          os.remove(filename)
+
+    if fatal_errors:
+      raise FatalException(
+          'Dependencies inconsistent:\n'
+          '%s\n'
+          'Exited due to fatal error(s).'
+          % ('\n'.join(fatal_errors),)
+          )
 
 
 class CheckDependenciesPass(Pass):
   """Check that the dependencies are self-consistent."""
 
-  def __init__(self):
+  def __init__(self, cvs_items_store_file):
     Pass.__init__(self)
+    self.cvs_items_store_file = cvs_items_store_file
 
   def register_artifacts(self):
     self._register_temp_file_needed(config.PROJECTS)
@@ -45,9 +181,6 @@ class CheckDependenciesPass(Pass):
   def iter_cvs_items(self):
     raise NotImplementedError()
 
-  def get_cvs_item(self, item_id):
-    raise NotImplementedError()
-
   def run(self, run_options, stats_keeper):
     Ctx()._projects = read_projects(
         artifact_manager.get_temp_file(config.PROJECTS)
@@ -56,30 +189,10 @@ class CheckDependenciesPass(Pass):
     self.symbol_db = SymbolDatabase()
     Ctx()._symbol_db = self.symbol_db
 
-    logger.quiet("Checking dependency consistency...")
-
-    fatal_errors = []
+    checker = DependencyChecker(self.cvs_items_store_file)
     for cvs_item in self.iter_cvs_items():
-      # Check that the pred_ids and succ_ids are mutually consistent:
-      for pred_id in cvs_item.get_pred_ids():
-        pred = self.get_cvs_item(pred_id)
-        if not cvs_item.id in pred.get_succ_ids():
-          fatal_errors.append(
-              '%s lists pred=%s, but not vice versa.' % (cvs_item, pred,))
-
-      for succ_id in cvs_item.get_succ_ids():
-        succ = self.get_cvs_item(succ_id)
-        if not cvs_item.id in succ.get_pred_ids():
-          fatal_errors.append(
-              '%s lists succ=%s, but not vice versa.' % (cvs_item, succ,))
-
-    if fatal_errors:
-      raise FatalException(
-          'Dependencies inconsistent:\n'
-          '%s\n'
-          'Exited due to fatal error(s).'
-          % ('\n'.join(fatal_errors),)
-          )
+      checker.add(cvs_item)
+    checker.finish()
 
     self.symbol_db.close()
     self.symbol_db = None
@@ -89,8 +202,7 @@ class CheckDependenciesPass(Pass):
 
 class CheckItemStoreDependenciesPass(CheckDependenciesPass):
   def __init__(self, cvs_items_store_file):
-    CheckDependenciesPass.__init__(self)
-    self.cvs_items_store_file = cvs_items_store_file
+    CheckDependenciesPass.__init__(self, cvs_items_store_file)
 
   def register_artifacts(self):
     CheckDependenciesPass.register_artifacts(self)
@@ -101,22 +213,15 @@ class CheckItemStoreDependenciesPass(CheckDependenciesPass):
         artifact_manager.get_temp_file(self.cvs_items_store_file))
 
     for cvs_file_items in cvs_item_store.iter_cvs_file_items():
-      self.current_cvs_file_items = cvs_file_items
       for cvs_item in cvs_file_items.values():
         yield cvs_item
 
-    del self.current_cvs_file_items
-
     cvs_item_store.close()
 
-  def get_cvs_item(self, item_id):
-    return self.current_cvs_file_items[item_id]
-
 
 class CheckIndexedItemStoreDependenciesPass(CheckDependenciesPass):
   def __init__(self, cvs_items_store_file, cvs_items_store_index_file):
-    CheckDependenciesPass.__init__(self)
-    self.cvs_items_store_file = cvs_items_store_file
+    CheckDependenciesPass.__init__(self, cvs_items_store_file)
     self.cvs_items_store_index_file = cvs_items_store_index_file
 
   def register_artifacts(self):
@@ -127,9 +232,6 @@ class CheckIndexedItemStoreDependenciesPass(CheckDependenciesPass):
   def iter_cvs_items(self):
     return self.cvs_item_store.itervalues()
 
-  def get_cvs_item(self, item_id):
-    return self.cvs_item_store[item_id]
-
   def run(self, run_options, stats_keeper):
     self.cvs_item_store = IndexedCVSItemStore(
         artifact_manager.get_temp_file(self.cvs_items_store_file),
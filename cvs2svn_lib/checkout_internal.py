@@ -89,6 +89,8 @@ from cvs2svn_lib.log import logger
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_item import CVSRevisionModification
 from cvs2svn_lib.indexed_database import IndexedDatabase
+from cvs2svn_lib.metrics import get_counter
+from cvs2svn_lib.metrics import get_timer
 from cvs2svn_lib.rcs_stream import RCSStream
 from cvs2svn_lib.rcs_stream import MalformedDeltaException
 from cvs2svn_lib.keyword_expander import expand_keywords
@@ -104,6 +106,21 @@ from cvs2svn_lib.rcsparser import Sink
 from cvs2svn_lib.rcsparser import parse
 
 
+# Counters of how the texts requested from InternalRevisionReader were
+# obtained: read as fulltexts from the delta database, derived by
+# applying a delta, or read from the checkout database.  Also the
+# number of texts stored to the checkout database, and the number and
+# total size of the texts returned and the time spent getting them:
+_fulltext_reads = get_counter('InternalRevisionReader.fulltext_reads')
+_deltas_applied = get_counter('InternalRevisionReader.deltas_applied')
+_checkout_db_hits = get_counter('InternalRevisionReader.checkout_db_hits')
+_checkout_db_stores = get_counter(
+    'InternalRevisionReader.checkout_db_stores'
+    )
+_checkout_bytes = get_counter('InternalRevisionReader.bytes')
+_checkout_timer = get_timer('InternalRevisionReader.get_content')
+
+
 class TextRecord(object):
   """Bookkeeping data for the text of a single CVSRevision."""
 
@@ -173,6 +190,7 @@ class FullTextRecord(TextRecord):
 
   def checkout(self, text_record_db):
     text = text_record_db.delta_db[self.id]
+    _fulltext_reads.value += 1
     self.decrement_refcount(text_record_db)
     return text
 
@@ -215,6 +233,7 @@ class DeltaTextRecord(TextRecord):
     rcs_stream.apply_diff(delta_text)
     text = rcs_stream.get_text()
     del rcs_stream
+    _deltas_applied.value += 1
     self.refcount -= 1
     if self.refcount == 0:
       # This text will never be needed again; just delete ourselves
@@ -224,6 +243,7 @@ class DeltaTextRecord(TextRecord):
     else:
       # Store a new CheckedOutTextRecord in place of ourselves:
       text_record_db.checkout_db['%x' % self.id] = text
+      _checkout_db_stores.value += 1
       new_text_record = CheckedOutTextRecord(self.id)
       new_text_record.refcount = self.refcount
       text_record_db.replace(new_text_record)
@@ -256,6 +276,7 @@ class CheckedOutTextRecord(TextRecord):
 
   def checkout(self, text_record_db):
     text = text_record_db.checkout_db['%x' % self.id]
+    _checkout_db_hits.value += 1
     self.decrement_refcount(text_record_db)
     return text
 
@@ -681,6 +702,31 @@ class InternalRevisionReader(RevisionReader):
     # revisions:
     self._text_record_db = TextRecordDatabase(self._delta_db, self._co_db)
 
+  def __getstate__(self):
+    # This is only used for checkpoints (see the checkpoint module).
+    # The checkout database is not stored; instead, the fulltexts that
+    # are still checked out are saved along with the TextRecords.
+    checked_out = {}
+    for text_record in self._text_record_db.itervalues():
+      if isinstance(text_record, CheckedOutTextRecord):
+        key = '%x' % (text_record.id,)
+        checked_out[key] = self._co_db[key]
+    return (
+        self._compress, self._loaded_files, self._text_record_db,
+        checked_out,
+        )
+
+  def __setstate__(self, state):
+    (compress, loaded_files, text_record_db, checked_out,) = state
+    InternalRevisionReader.__init__(self, compress)
+    self.start()
+    self._loaded_files = loaded_files
+    text_record_db.delta_db = self._delta_db
+    text_record_db.checkout_db = self._co_db
+    self._text_record_db = text_record_db
+    for (key, text) in checked_out.iteritems():
+      self._co_db[key] = text
+
   def _get_text_record(self, cvs_rev):
     """Return the TextRecord instance for CVS_REV.
 
@@ -715,6 +761,7 @@ class InternalRevisionReader(RevisionReader):
     very large.  Revisions may be skipped.  Each revision may be
     requested only once."""
 
+    _checkout_timer.start()
     try:
       text = self._get_text_record(cvs_rev).checkout(self._text_record_db)
     except MalformedDeltaException, (msg):
@@ -722,6 +769,8 @@ class InternalRevisionReader(RevisionReader):
           'Malformed RCS delta in %s, revision %s: %s'
           % (cvs_rev.cvs_file.rcs_path, cvs_rev.rev, msg)
           )
+    _checkout_timer.stop()
+    _checkout_bytes.value += len(text)
 
     keyword_handling = cvs_rev.get_property('_keyword_handling')
 
@@ -749,6 +798,9 @@ class InternalRevisionReader(RevisionReader):
 
     return text
 
+  def skip_content(self, cvs_rev):
+    self._get_text_record(cvs_rev).decrement_refcount(self._text_record_db)
+
   def finish(self):
     self._text_record_db.log_leftovers()
 
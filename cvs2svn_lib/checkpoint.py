@@ -0,0 +1,253 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains support for mid-pass checkpoints.
+
+A long pass can periodically save its state to CHECKPOINT_FILE, so
+that an interrupted conversion can later be resumed from the last
+checkpoint (see --checkpoint-interval and --resume) rather than from
+the start of the pass.
+
+The state is saved by pickling the objects that the pass is working
+with.  The classes of the objects that write to files (NewCVSItemStore,
+IndexedDatabase, RecordTable, etc.) implement __getstate__() by
+flushing their output to disk and recording how far it extends, and
+__setstate__() by reopening the files and discarding anything that was
+written after the checkpoint.  This only works because all of these
+files are written sequentially or only ever have records appended to
+them.
+
+Projects, and the CVSPaths of a CVSPathDatabase that is opened for
+reading, are not pickled; only references to them are stored, and
+they are looked up in Ctx() when the checkpoint is loaded.  Therefore
+the pass has to set up Ctx() before it calls Checkpointer.load()."""
+
+
+import os
+import time
+import cPickle
+
+from cvs2svn_lib import config
+from cvs2svn_lib.common import DB_OPEN_READ
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.common import error_prefix
+from cvs2svn_lib.common import warning_prefix
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.project import Project
+from cvs2svn_lib.cvs_path import CVSPath
+
+
+def sync_file(f):
+  """Write the contents of file object F to disk; return its position."""
+
+  f.flush()
+  os.fsync(f.fileno())
+  return f.tell()
+
+
+def reopen_file(filename, length, mode='rb+'):
+  """Reopen FILENAME for writing after a checkpoint.
+
+  Discard anything after the first LENGTH bytes and return a file
+  object (opened using MODE) that is positioned at the end of the
+  file.  Raise FatalError if the file is shorter than LENGTH bytes."""
+
+  if os.path.getsize(filename) < length:
+    raise FatalError(
+        'File %r is shorter than recorded in the checkpoint' % (filename,)
+        )
+  f = open(filename, mode)
+  f.truncate(length)
+  f.seek(length)
+  return f
+
+
+def _persistent_id(obj):
+  """Return an id for OBJ if it should be looked up in Ctx() when loaded.
+
+  Raise TypeError if OBJ is an open file, because pickle protocol 2
+  would silently store it as a closed file.  Classes that write to
+  files have to implement __getstate__() (see above)."""
+
+  if isinstance(obj, file):
+    raise TypeError('cannot checkpoint file object %r' % (obj,))
+  elif isinstance(obj, Project):
+    return 'project %d' % (obj.id,)
+
+  cvs_path_db = getattr(Ctx(), '_cvs_path_db', None)
+  if cvs_path_db is not None and cvs_path_db.mode == DB_OPEN_READ:
+    if obj is cvs_path_db:
+      return 'cvs_path_db'
+    elif isinstance(obj, CVSPath):
+      return 'cvs_path %d' % (obj.id,)
+
+  return None
+
+
+def _persistent_load(pid):
+  words = pid.split()
+  if words[0] == 'project':
+    return Ctx()._projects[int(words[1])]
+  elif words[0] == 'cvs_path_db':
+    return Ctx()._cvs_path_db
+  elif words[0] == 'cvs_path':
+    return Ctx()._cvs_path_db.get_path(int(words[1]))
+  else:
+    raise cPickle.UnpicklingError('Unknown persistent id %r' % (pid,))
+
+
+def _get_checkpoint_filename():
+  return Ctx().get_temp_filename(config.CHECKPOINT_FILE)
+
+
+def read_checkpoint_pass_name():
+  """Return the name of the pass that wrote the checkpoint, or None.
+
+  Return None if there is no checkpoint in the temporary directory."""
+
+  filename = _get_checkpoint_filename()
+  if not os.path.exists(filename):
+    return None
+  f = open(filename, 'rb')
+  try:
+    (pass_name, timestamp) = cPickle.load(f)
+  finally:
+    f.close()
+  return pass_name
+
+
+class Checkpointer:
+  """Save the state of a pass at regular intervals.
+
+  A pass calls due() at points where its state is consistent (e.g.,
+  after each file or revision), and if it returns True, calls save()
+  with the objects that describe the progress of the pass.  When the
+  pass is resumed, load() returns those objects again.  When the pass
+  is done, it calls remove().
+
+  The checkpoint file consists of two pickles: the header (pass_name,
+  timestamp), which can be read without any setup, and the state
+  itself."""
+
+  def __init__(self, pass_name):
+    self.pass_name = pass_name
+
+    # The number of seconds between checkpoints, or None if no
+    # checkpoints should be written:
+    self.interval = Ctx().checkpoint_interval
+
+    self._filename = _get_checkpoint_filename()
+    self._last_time = time.time()
+
+    # For testing --resume: the number of checkpoints that this pass
+    # writes before simulating a crash, or None (see
+    # --crash-after-checkpoint):
+    self._crash_countdown = None
+    if Ctx().crash_after_checkpoint is not None:
+      (pass_name, count) = Ctx().crash_after_checkpoint.rsplit(':', 1)
+      if pass_name == self.pass_name:
+        self._crash_countdown = int(count)
+
+  def load(self):
+    """Return the state saved by this pass, or None if there is none."""
+
+    if read_checkpoint_pass_name() != self.pass_name:
+      return None
+
+    logger.quiet('Resuming %s from checkpoint...' % (self.pass_name,))
+    f = open(self._filename, 'rb')
+    try:
+      # Skip the header:
+      cPickle.load(f)
+      unpickler = cPickle.Unpickler(f)
+      unpickler.persistent_load = _persistent_load
+      state = unpickler.load()
+    finally:
+      f.close()
+    self._last_time = time.time()
+    return state
+
+  def due(self):
+    """Return True iff it is time to write another checkpoint."""
+
+    return (
+        self.interval is not None
+        and time.time() - self._last_time >= self.interval
+        )
+
+  def save(self, state):
+    """Write a checkpoint recording STATE.
+
+    STATE can be any object that can be pickled.  The checkpoint is
+    written to a temporary file which replaces the old checkpoint only
+    when it is complete, so a crash while saving leaves the previous
+    checkpoint intact.  If STATE cannot be pickled (for example, if the
+    output is written to a pipe), emit a warning and stop writing
+    checkpoints during this pass."""
+
+    logger.verbose('Writing checkpoint for %s' % (self.pass_name,))
+    tmp_filename = self._filename + '.tmp'
+    f = open(tmp_filename, 'wb')
+    try:
+      cPickle.dump((self.pass_name, time.time(),), f, -1)
+      pickler = cPickle.Pickler(f, -1)
+      pickler.persistent_id = _persistent_id
+      pickler.dump(state)
+    except (cPickle.PicklingError, TypeError), e:
+      f.close()
+      os.remove(tmp_filename)
+      logger.warn(
+          '%s: checkpoints are not supported for %s in this '
+          'configuration (%s); continuing without them'
+          % (warning_prefix, self.pass_name, e,)
+          )
+      self.interval = None
+      return
+    sync_file(f)
+    f.close()
+    try:
+      os.rename(tmp_filename, self._filename)
+    except OSError:
+      # On Windows, rename() fails if the target exists:
+      os.remove(self._filename)
+      os.rename(tmp_filename, self._filename)
+    self._last_time = time.time()
+
+    if self._crash_countdown is not None:
+      self._crash_countdown -= 1
+      if self._crash_countdown == 0:
+        self._simulate_crash()
+
+  def _simulate_crash(self):
+    """Exit immediately, as if the process had been killed.
+
+    No cleanup is done; in particular, the lock in the temporary
+    directory is left behind."""
+
+    logger.error(
+        '%s: simulated crash after checkpoint in %s'
+        % (error_prefix, self.pass_name,)
+        )
+    os._exit(1)
+
+  def remove(self):
+    """The pass is complete; remove its checkpoint, if any."""
+
+    if read_checkpoint_pass_name() == self.pass_name:
+      os.remove(self._filename)
+
+
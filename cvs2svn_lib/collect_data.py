@@ -73,6 +73,8 @@ from cvs2svn_lib.cvs_item_database import NewCVSItemStore
 from cvs2svn_lib.symbol_statistics import SymbolStatisticsCollector
 from cvs2svn_lib.metadata_database import MetadataDatabase
 from cvs2svn_lib.metadata_database import MetadataLogger
+from cvs2svn_lib.log_msg_database import LogMessageDatabase
+from cvs2svn_lib.parse_cache import ParseCache
 
 from cvs2svn_lib.rcsparser import Sink
 from cvs2svn_lib.rcsparser import parse
@@ -1045,12 +1047,16 @@ class _ProjectDataCollector:
   def process_file(self, cvs_file):
     logger.normal(cvs_file.rcs_path)
     fdc = _FileDataCollector(self, cvs_file)
+    parse_cache = self.collect_data.parse_cache
     try:
-      f = open(cvs_file.rcs_path, 'rb')
-      try:
-        parse(f, fdc)
-      finally:
-        f.close()
+      if parse_cache is not None:
+        parse_cache.parse(cvs_file, fdc)
+      else:
+        f = open(cvs_file.rcs_path, 'rb')
+        try:
+          parse(f, fdc)
+        finally:
+          f.close()
     except (RCSParseError, RuntimeError):
       self.collect_data.record_fatal_error(
           "%r is not a valid ,v file" % (cvs_file.rcs_path,)
@@ -1089,6 +1095,11 @@ class CollectData:
         artifact_manager.get_temp_file(config.METADATA_STORE),
         artifact_manager.get_temp_file(config.METADATA_INDEX_TABLE),
         DB_OPEN_NEW,
+        LogMessageDatabase(
+            artifact_manager.get_temp_file(config.LOG_MSG_STORE),
+            artifact_manager.get_temp_file(config.LOG_MSG_INDEX_TABLE),
+            DB_OPEN_NEW,
+            ),
         )
     self.metadata_logger = MetadataLogger(self.metadata_db)
     self.fatal_errors = []
@@ -1102,6 +1113,18 @@ class CollectData:
     # Key generator for Symbols:
     self.symbol_key_generator = KeyGenerator()
 
+    # The _ProjectDataCollector for the project that is currently
+    # being processed, and whether any RCS files have been found in
+    # it so far:
+    self._pdc = None
+    self._found_rcs_file = False
+
+    # The cache of parsed ,v files, if --parse-cache was specified:
+    if Ctx().parse_cache is None:
+      self.parse_cache = None
+    else:
+      self.parse_cache = ParseCache(Ctx().parse_cache)
+
   def record_fatal_error(self, err):
     """Record that fatal error ERR was found.
 
@@ -1157,30 +1180,46 @@ class CollectData:
     self.add_cvs_file_items(cvs_file_items)
     self.symbol_stats.register(cvs_file_items)
 
-  def process_project(self, project, cvs_paths):
-    pdc = _ProjectDataCollector(self, project)
+  def start_project(self, project):
+    """Start collecting the data for PROJECT.
 
-    found_rcs_file = False
-    for cvs_path in cvs_paths:
-      if isinstance(cvs_path, CVSDirectory):
-        self.add_cvs_directory(cvs_path)
-      else:
-        cvs_file_items = pdc.process_file(cvs_path)
-        self._process_cvs_file_items(cvs_file_items)
-        found_rcs_file = True
+    Then call process_cvs_path() for each CVSPath in the project, and
+    finally finish_project()."""
+
+    self._pdc = _ProjectDataCollector(self, project)
+    self._found_rcs_file = False
+
+  def process_cvs_path(self, cvs_path):
+    """Record CVS_PATH, a CVSPath in the current project."""
+
+    if isinstance(cvs_path, CVSDirectory):
+      self.add_cvs_directory(cvs_path)
+    else:
+      cvs_file_items = self._pdc.process_file(cvs_path)
+      self._process_cvs_file_items(cvs_file_items)
+      self._found_rcs_file = True
 
-    if not found_rcs_file:
+  def finish_project(self):
+    pdc = self._pdc
+    if not self._found_rcs_file:
       self.record_fatal_error(
           'No RCS files found under %r!\n'
           'Are you absolutely certain you are pointing cvs2svn\n'
           'at a CVS repository?\n'
-          % (project.project_cvs_repos_path,)
+          % (pdc.project.project_cvs_repos_path,)
           )
 
     pdc.summarize_symbol_transforms()
 
     self.num_files += pdc.num_files
     logger.verbose('Processed', self.num_files, 'files')
+    self._pdc = None
+
+  def process_project(self, project, cvs_paths):
+    self.start_project(project)
+    for cvs_path in cvs_paths:
+      self.process_cvs_path(cvs_path)
+    self.finish_project()
 
   def _register_empty_subdirectories(self):
     """Set the CVSDirectory.empty_subdirectory_id members."""
@@ -1209,12 +1248,16 @@ class CollectData:
     self.symbol_stats.purge_ghost_symbols()
     self.symbol_stats.close()
     self.symbol_stats = None
+    self.metadata_logger.close()
     self.metadata_logger = None
     self.metadata_db.close()
     self.metadata_db = None
     self._cvs_item_store.close()
     self._cvs_item_store = None
     self._register_empty_subdirectories()
+    if self.parse_cache is not None:
+      self.parse_cache.log_summary()
+      self.parse_cache = None
     retval = self.fatal_errors
     self.fatal_errors = None
     return retval
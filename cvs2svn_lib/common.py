@@ -422,3 +422,16 @@ class Timestamper:
     return self.timestamp
 
 
+class NullFile:
+  """A file-like object that discards everything written to it."""
+
+  def write(self, s):
+    pass
+
+  def flush(self):
+    pass
+
+  def close(self):
+    pass
+
+
@@ -98,21 +98,33 @@ CHANGESETS_SORTED_DATAFILE = 'changesets-s.txt'
 # filenames.
 STATISTICS_FILE = 'statistics-%02d.pck'
 
-# This text file contains records (1 per line) that describe openings
-# and closings for copies to tags and branches.  The format is as
-# follows:
+# The state of a pass that was saved by a mid-pass checkpoint (see
+# --checkpoint-interval and --resume).  It is removed when the pass
+# completes.
+CHECKPOINT_FILE = 'checkpoint.pck'
+
+# The profile of a pass (in the format of the pstats module) and a
+# summary of its hottest functions, written if the pass is selected
+# using --profile-passes.  These files are not removed automatically.
+PROFILE_STATS_FILE = 'profile-%02d.pstats'
+PROFILE_SUMMARY_FILE = 'profile-%02d.txt'
+
+# This binary file contains fixed-length records that describe
+# openings and closings for copies to tags and branches.  Each record
+# contains
 #
 #     SYMBOL_ID SVN_REVNUM TYPE CVS_SYMBOL_ID
 #
 # where type is either OPENING or CLOSING.  CVS_SYMBOL_ID is the id of
-# the CVSSymbol whose opening or closing is being described (in hex).
-SYMBOL_OPENINGS_CLOSINGS = 'symbolic-names.txt'
+# the CVSSymbol whose opening or closing is being described.  See
+# openings_closings.RECORD_FORMAT for the exact format.
+SYMBOL_OPENINGS_CLOSINGS = 'symbolic-names.dat'
 # A sorted version of the above file.  SYMBOL_ID and SVN_REVNUM are
 # the primary and secondary sorting criteria.  It is important that
 # SYMBOL_IDs be located together to make it quick to read them at
 # once.  The order of SVN_REVNUM is only important because it is
 # assumed by some internal consistency checks.
-SYMBOL_OPENINGS_CLOSINGS_SORTED = 'symbolic-names-s.txt'
+SYMBOL_OPENINGS_CLOSINGS_SORTED = 'symbolic-names-s.dat'
 
 # Skeleton version of the repository filesystem.  See class
 # RepositoryMirror for how these work.
@@ -120,12 +132,13 @@ MIRROR_NODES_INDEX_TABLE = 'mirror-nodes-index.dat'
 MIRROR_NODES_STORE = 'mirror-nodes.pck'
 
 # Offsets pointing to the beginning of each symbol's records in
-# SYMBOL_OPENINGS_CLOSINGS_SORTED.  This file contains a pickled map
-# from symbol_id to file offset.
-SYMBOL_OFFSETS_DB = 'symbol-offsets.pck'
+# SYMBOL_OPENINGS_CLOSINGS_SORTED.  This file is a RecordTable mapping
+# symbol_id to (first_record, record_count).
+SYMBOL_OFFSETS_DB = 'symbol-offsets.dat'
 
-# Pickled map of CVSPath.id to instance.
-CVS_PATHS_DB = 'cvs-paths.pck'
+# Columnar table of all CVSPaths, indexed by CVSPath.id (see
+# cvs_path_database.py).
+CVS_PATHS_DB = 'cvs-paths.dat'
 
 # A series of records.  The first is a pickled serializer.  Each
 # subsequent record is a serialized list of all CVSItems applying to a
@@ -181,6 +194,16 @@ METADATA_STORE = 'metadata.pck'
 METADATA_CLEAN_INDEX_TABLE = 'metadata-clean-index.dat'
 METADATA_CLEAN_STORE = 'metadata-clean.pck'
 
+# The log message texts referred to by the metadata databases.  Each
+# distinct text is stored only once:
+LOG_MSG_INDEX_TABLE = 'log-msgs-index.dat'
+LOG_MSG_STORE = 'log-msgs.pck'
+
+# The same, after they have been cleaned up for the chosen output
+# option:
+LOG_MSG_CLEAN_INDEX_TABLE = 'log-msgs-clean-index.dat'
+LOG_MSG_CLEAN_STORE = 'log-msgs-clean.pck'
+
 # The following four databases are used in conjunction with --use-internal-co.
 
 # Records the RCS deltas for all CVS revisions.  The deltas are to be
@@ -207,6 +230,38 @@ CVS_CHECKOUT_DB = 'cvs-checkout.db'
 # Hold the generated blob content for the git back end.
 GIT_BLOB_DATAFILE = "git-blobs.dat"
 
+# The name under which the temporary files of external sorts are
+# placed (see Context.get_temp_dir()).  The files themselves have
+# generated names.
+SORT_RUNS = 'sort-runs'
+
+# The name under which the tables of DigestIndexes that have outgrown
+# their memory are placed (see Context.get_temp_dir()).  The files
+# themselves have generated names.
+DIGEST_INDEX_TABLES = 'digest-index'
+
+# The temporary files that are large and mostly read and written
+# sequentially.  If a bulk temporary directory is configured (see
+# --bulk-tmpdir), they are kept there, whereas the smaller files that
+# are accessed randomly (such as the index tables and the
+# CVS_ITEM_TO_CHANGESET tables) stay in the main temporary directory.
+# The DigestIndex tables are accessed randomly, but they only come to
+# disk when they are too large to be kept in memory.
+BULK_TEMP_FILES = [
+    CVS_REVS_DATAFILE,
+    CVS_REVS_SORTED_DATAFILE,
+    CVS_SYMBOLS_DATAFILE,
+    CVS_SYMBOLS_SORTED_DATAFILE,
+    SYMBOL_OPENINGS_CLOSINGS,
+    SYMBOL_OPENINGS_CLOSINGS_SORTED,
+    CVS_ITEMS_STORE,
+    RCS_DELTAS_STORE,
+    RCS_TREES_STORE,
+    CVS_CHECKOUT_DB,
+    SORT_RUNS,
+    DIGEST_INDEX_TABLES,
+    ]
+
 # flush a commit if a 5 minute gap occurs.
 COMMIT_THRESHOLD = 5 * 60
 
@@ -19,6 +19,7 @@
 
 import os
 import textwrap
+import fnmatch
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import CVSTextDecoder
@@ -59,7 +60,22 @@ class Ctx:
     self.file_property_setters = []
     self.revision_property_setters = []
     self.tmpdir = None
+    self.bulk_tmpdir = None
+    self.artifact_tmpdirs = []
     self.skip_cleanup = False
+    self.in_memory_mirror = False
+    self.jobs = 1
+    self.memory_limit = None
+    self.check_dependencies = False
+    self.checkpoint_interval = None
+    self.crash_after_checkpoint = None
+    self.incremental_state = None
+    self.parse_cache = None
+    self.telemetry_file = None
+    self.progress_interval = 60
+    self.progress_file = None
+    self.estimate = False
+    self.estimate_sample = None
     self.keep_cvsignore = False
     self.cross_project_commits = True
     self.cross_branch_commits = True
@@ -86,10 +102,38 @@ class Ctx:
         )
 
 
-  def get_temp_filename(self, basename):
+  def get_temp_dir(self, basename):
+    """Return the directory in which to keep the temporary file BASENAME.
+
+    The first (pattern, directory) pair in self.artifact_tmpdirs whose
+    pattern matches BASENAME determines the directory.  Otherwise, the
+    files listed in config.BULK_TEMP_FILES are kept in self.bulk_tmpdir
+    (if it is set), and all others in self.tmpdir."""
+
+    for (pattern, directory) in self.artifact_tmpdirs:
+      if fnmatch.fnmatchcase(basename, pattern):
+        return directory
+    if self.bulk_tmpdir is not None and basename in config.BULK_TEMP_FILES:
+      return self.bulk_tmpdir
     if self.tmpdir is None:
       raise FatalError('Temporary directory has not been set!')
-    return os.path.join(self.tmpdir, basename)
+    return self.tmpdir
+
+  def get_temp_dirs(self):
+    """Return a list of the temporary directories other than self.tmpdir."""
+
+    retval = []
+    directories = [self.bulk_tmpdir] + [
+        directory for (pattern, directory) in self.artifact_tmpdirs
+        ]
+    for directory in directories:
+      if directory is not None and directory != self.tmpdir \
+             and directory not in retval:
+        retval.append(directory)
+    return retval
+
+  def get_temp_filename(self, basename):
+    return os.path.join(self.get_temp_dir(basename), basename)
 
   def clean(self):
     """Dispose of items in our dictionary that are not intended to
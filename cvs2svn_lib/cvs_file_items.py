@@ -612,7 +612,7 @@ class CVSFileItems(object):
     if cvs_item.ntdbr:
       return False
 
-    log_msg = metadata_db[cvs_item.metadata_id].log_msg
+    log_msg = metadata_db.get_log_msg(metadata_db[cvs_item.metadata_id])
     return bool(
         re.match(
             r'file .* was initially added on branch .*\.\n$',
@@ -675,7 +675,7 @@ class CVSFileItems(object):
     if cvs_revision.branch_ids:
       return False
 
-    log_msg = metadata_db[cvs_revision.metadata_id].log_msg
+    log_msg = metadata_db.get_log_msg(metadata_db[cvs_revision.metadata_id])
     return bool(re.match(
         r'file .* was added on branch .* on '
         r'\d{4}\-\d{2}\-\d{2} \d{2}\:\d{2}\:\d{2}( [\+\-]\d{4})?'
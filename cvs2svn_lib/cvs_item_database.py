@@ -32,6 +32,8 @@ from cvs2svn_lib.cvs_file_items import CVSFileItems
 from cvs2svn_lib.serializer import Serializer
 from cvs2svn_lib.serializer import PrimedPickleSerializer
 from cvs2svn_lib.indexed_database import IndexedStore
+from cvs2svn_lib.checkpoint import sync_file
+from cvs2svn_lib.checkpoint import reopen_file
 
 
 cvs_item_primer = (
@@ -53,10 +55,14 @@ class NewCVSItemStore:
   We don't use a single pickler for all items because the memo would
   grow too large."""
 
+  # The size in bytes of the buffer used for writing the file (see
+  # memory_budget):
+  BUFFER_SIZE = 64 * 1024
+
   def __init__(self, filename):
     """Initialize an instance, creating the file and writing the primer."""
 
-    self.f = open(filename, 'wb')
+    self.f = open(filename, 'wb', self.BUFFER_SIZE)
 
     self.serializer = PrimedPickleSerializer(
         cvs_item_primer + (CVSFileItems,)
@@ -68,6 +74,14 @@ class NewCVSItemStore:
 
     self.serializer.dumpf(self.f, cvs_file_items)
 
+  def __getstate__(self):
+    # See the checkpoint module:
+    return (self.f.name, sync_file(self.f), self.serializer,)
+
+  def __setstate__(self, state):
+    (filename, length, self.serializer,) = state
+    self.f = reopen_file(filename, length)
+
   def close(self):
     self.f.close()
     self.f = None
@@ -96,6 +110,16 @@ class OldCVSItemStore:
     except EOFError:
       return
 
+  def __getstate__(self):
+    # Record how far the file has been read; see the checkpoint
+    # module:
+    return (self.f.name, self.f.tell(),)
+
+  def __setstate__(self, state):
+    (filename, offset,) = state
+    OldCVSItemStore.__init__(self, filename)
+    self.f.seek(offset)
+
   def close(self):
     self.f.close()
     self.f = None
@@ -175,6 +199,14 @@ class NewSortableCVSRevisionDatabase(object):
             )
         )
 
+  def __getstate__(self):
+    # See the checkpoint module:
+    return (self.f.name, sync_file(self.f), self.serializer,)
+
+  def __setstate__(self, state):
+    (filename, length, self.serializer,) = state
+    self.f = reopen_file(filename, length, 'r+')
+
   def close(self):
     self.f.close()
     self.f = None
@@ -214,6 +246,14 @@ class NewSortableCVSSymbolDatabase(object):
         '%x %s' % (cvs_symbol.symbol.id, self.serializer.dumps(cvs_symbol))
         )
 
+  def __getstate__(self):
+    # See the checkpoint module:
+    return (self.f.name, sync_file(self.f), self.serializer,)
+
+  def __setstate__(self, state):
+    (filename, length, self.serializer,) = state
+    self.f = reopen_file(filename, length, 'r+')
+
   def close(self):
     self.f.close()
     self.f = None
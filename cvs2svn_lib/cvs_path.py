@@ -88,12 +88,12 @@ class CVSPath(object):
     self.rcs_path = os.path.normpath(self._calculate_rcs_path())
 
   def __getstate__(self):
-    """This method must only be called after ordinal has been set."""
-
+    # The ordinal is not set yet if the CVSPath is pickled for a
+    # checkpoint during CollectRevsPass:
     return (
         self.id, self.project.id,
         self.parent_directory, self.rcs_basename,
-        self.ordinal,
+        getattr(self, 'ordinal', None),
         )
 
   def __setstate__(self, state):
@@ -287,6 +287,10 @@ class CVSFile(CVSPath):
 
     file_size -- (long) size of the RCS file in bytes.
 
+    mtime -- (float or None) the modification time of the RCS file, as
+        returned by os.stat().  This is only known in CollectRevsPass;
+        it is not stored in the CVSPathDatabase.
+
     mode -- (string or None) 'kv', 'b', etc., as read from the CVS
         file.
 
@@ -314,6 +318,7 @@ class CVSFile(CVSPath):
       '_in_attic',
       'executable',
       'file_size',
+      'mtime',
       'mode',
       'description',
       'properties',
@@ -321,7 +326,7 @@ class CVSFile(CVSPath):
 
   def __init__(
         self, id, project, parent_directory, rcs_basename, in_attic,
-        executable, file_size, mode, description
+        executable, file_size, mode, description, mtime=None
         ):
     """Initialize a new CVSFile object."""
 
@@ -335,6 +340,7 @@ class CVSFile(CVSPath):
 
     self.executable = executable
     self.file_size = file_size
+    self.mtime = mtime
     self.mode = mode
     self.description = description
     self.properties = None
@@ -373,6 +379,7 @@ class CVSFile(CVSPath):
         self._in_attic, self.executable, self.file_size, self.mode,
         self.description, self.properties,
         ) = state
+    self.mtime = None
     CVSPath.__setstate__(self, cvs_path_state)
 
   def __str__(self):
@@ -14,9 +14,42 @@
 # history and logs, available at http://cvs2svn.tigris.org/.
 # ====================================================================
 
-"""This module contains database facilities used by cvs2svn."""
+"""This module contains database facilities used by cvs2svn.
 
+The CVSPathDatabase is stored in a columnar binary format, which can
+be memory-mapped and read lazily.  The file consists of:
 
+    HEADER -- see HEADER_FORMAT.  It records the number of records,
+        strings, and extras, and the file offsets of the sections
+        that follow the records.
+
+    RECORDS -- one fixed-length record (see RECORD_FORMAT) for each
+        possible CVSPath id, in id order, holding the flags, the
+        project id, the parent directory id, the string index of the
+        rcs_basename, the ordinal, the string index of the mode, the
+        file size, and the index of the extra data.  Ids that were not
+        used are filled with zeros (i.e., the PRESENT flag is unset).
+
+    STRING INDEX and STRING DATA -- the table of interned strings
+        (basenames and modes).  The index holds string_count + 1
+        offsets into the data; string i is data[index[i]:index[i+1]].
+        Each distinct string is stored only once.
+
+    EXTRA INDEX and EXTRA DATA -- a table of pickled values with the
+        same layout as the string table.  For CVSFiles the value is
+        (description, properties); for CVSDirectories it is the list
+        of empty_subdirectory_ids.  Identical values are stored only
+        once.
+
+When the database is read, CVSPath instances are only created when
+they are first requested (along with their parent directories), and
+are then remembered so that there is never more than one instance for
+a given id."""
+
+
+import os
+import struct
+import mmap
 import cPickle
 
 from cvs2svn_lib import config
@@ -24,6 +57,89 @@ from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_path import CVSPath
+from cvs2svn_lib.cvs_path import CVSDirectory
+from cvs2svn_lib.cvs_path import CVSFile
+
+
+MAGIC = 'CVSPATH1'
+
+# (magic, record_count, string_count, extra_count, string_index_offset,
+# string_data_offset, extra_index_offset, extra_data_offset):
+HEADER_FORMAT = '=8sIIIQQQQ'
+HEADER_LEN = struct.calcsize(HEADER_FORMAT)
+
+# (flags, project_id, parent_id, basename_index, ordinal, mode_index,
+# file_size, extra_index):
+RECORD_FORMAT = '=BIIIIIQI'
+RECORD_LEN = struct.calcsize(RECORD_FORMAT)
+
+# The format of the entries in the string and extra indexes:
+OFFSET_FORMAT = '=Q'
+OFFSET_LEN = struct.calcsize(OFFSET_FORMAT)
+
+# Bits in the flags field of a record:
+PRESENT = 0x01
+DIRECTORY = 0x02
+IN_ATTIC = 0x04
+EXECUTABLE = 0x08
+
+# The parent_id of a project's root directory:
+NO_PARENT = 0
+
+# The mode_index used to represent a mode of None:
+NO_STRING = 0xffffffff
+
+try:
+  _unpack_record_from = struct.Struct(RECORD_FORMAT).unpack_from
+  _unpack_offsets_from = struct.Struct('=QQ').unpack_from
+except AttributeError:
+  # Python 2.4 doesn't have struct.Struct:
+  def _unpack_record_from(buffer, offset):
+    return struct.unpack(RECORD_FORMAT, buffer[offset:offset + RECORD_LEN])
+
+  def _unpack_offsets_from(buffer, offset):
+    return struct.unpack('=QQ', buffer[offset:offset + 2 * OFFSET_LEN])
+
+
+class _InternTable:
+  """Collect distinct strings and assign them consecutive indexes."""
+
+  def __init__(self):
+    # A map {string : index}:
+    self._indexes = {}
+    self._strings = []
+
+  def intern(self, s):
+    """Return the index for string S, adding it if necessary."""
+
+    try:
+      return self._indexes[s]
+    except KeyError:
+      index = len(self._strings)
+      self._indexes[s] = index
+      self._strings.append(s)
+      return index
+
+  def __len__(self):
+    return len(self._strings)
+
+  def write(self, f):
+    """Write the index and data sections for the strings to F.
+
+    Return the file offsets of the index and the data."""
+
+    index_offset = f.tell()
+    offset = 0
+    for s in self._strings:
+      f.write(struct.pack(OFFSET_FORMAT, offset))
+      offset += len(s)
+    f.write(struct.pack(OFFSET_FORMAT, offset))
+
+    data_offset = f.tell()
+    for s in self._strings:
+      f.write(s)
+
+    return (index_offset, data_offset)
 
 
 class CVSPathDatabase:
@@ -40,19 +156,35 @@ class CVSPathDatabase:
 
     self.mode = mode
 
-    # A map { id : CVSPath }
+    # A map { id : CVSPath }.  In DB_OPEN_READ mode, this only holds
+    # the CVSPaths that have been materialized so far.
     self._cvs_paths = {}
 
     if self.mode == DB_OPEN_NEW:
       pass
     elif self.mode == DB_OPEN_READ:
-      f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'rb')
-      try:
-        cvs_paths = cPickle.load(f)
-      finally:
-        f.close()
-      for cvs_path in cvs_paths:
-        self._cvs_paths[cvs_path.id] = cvs_path
+      self._file = open(
+          artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'rb'
+          )
+      self._map = mmap.mmap(
+          self._file.fileno(), os.path.getsize(self._file.name),
+          access=mmap.ACCESS_READ
+          )
+      (
+          magic, self._record_count, string_count, extra_count,
+          self._string_index_offset, self._string_data_offset,
+          self._extra_index_offset, self._extra_data_offset,
+          ) = struct.unpack(HEADER_FORMAT, self._map[:HEADER_LEN])
+      if magic != MAGIC:
+        raise RuntimeError(
+            'File %s is not a CVSPathDatabase' % (self._file.name,)
+            )
+
+      # Maps {index : value} of the strings and extras that have been
+      # read so far, so that equal values are shared between
+      # CVSPaths:
+      self._strings = {}
+      self._extras = {}
     else:
       raise RuntimeError('Invalid mode %r' % self.mode)
 
@@ -69,20 +201,192 @@ class CVSPathDatabase:
 
     self._cvs_paths[cvs_path.id] = cvs_path
 
+  def relink_parent_directories(self):
+    """Make all parent_directory members refer to CVSPaths in this database.
+
+    When CollectRevsPass is resumed from a checkpoint, the CVSPaths
+    recorded before the checkpoint are unpickled, whereas the
+    repository walker creates new instances of the same directories
+    as parents of the CVSPaths that follow.  This method restores the
+    rule that there is only one instance for each id."""
+
+    for cvs_path in self._cvs_paths.itervalues():
+      parent_directory = cvs_path.parent_directory
+      if parent_directory is not None:
+        cvs_path.parent_directory = self._cvs_paths[parent_directory.id]
+
   def itervalues(self):
-    return self._cvs_paths.itervalues()
+    if self.mode == DB_OPEN_READ:
+      for id in xrange(self._record_count):
+        flags = ord(self._map[HEADER_LEN + id * RECORD_LEN])
+        if flags & PRESENT:
+          yield self.get_path(id)
+    else:
+      for cvs_path in self._cvs_paths.itervalues():
+        yield cvs_path
+
+  def _get_string(self, i):
+    try:
+      return self._strings[i]
+    except KeyError:
+      (start, end) = _unpack_offsets_from(
+          self._map, self._string_index_offset + i * OFFSET_LEN
+          )
+      s = self._map[
+          self._string_data_offset + start:self._string_data_offset + end
+          ]
+      self._strings[i] = s
+      return s
+
+  def _get_extra(self, i):
+    try:
+      return self._extras[i]
+    except KeyError:
+      (start, end) = _unpack_offsets_from(
+          self._map, self._extra_index_offset + i * OFFSET_LEN
+          )
+      value = cPickle.loads(
+          self._map[
+              self._extra_data_offset + start:self._extra_data_offset + end
+              ]
+          )
+      self._extras[i] = value
+      return value
+
+  def _read_path(self, id):
+    """Create the CVSPath instance for ID from its record."""
+
+    if not 0 <= id < self._record_count:
+      raise KeyError(id)
+
+    (
+        flags, project_id, parent_id, basename_index, ordinal, mode_index,
+        file_size, extra_index,
+        ) = _unpack_record_from(self._map, HEADER_LEN + id * RECORD_LEN)
+
+    if not flags & PRESENT:
+      raise KeyError(id)
+
+    if parent_id == NO_PARENT:
+      parent_directory = None
+    else:
+      parent_directory = self.get_path(parent_id)
+
+    cvs_path_state = (
+        id, project_id, parent_directory, self._get_string(basename_index),
+        ordinal,
+        )
+
+    if flags & DIRECTORY:
+      cvs_path = CVSDirectory.__new__(CVSDirectory)
+      # Each CVSDirectory needs its own list, since the list is
+      # mutable:
+      cvs_path.__setstate__(
+          (cvs_path_state, list(self._get_extra(extra_index)),)
+          )
+    else:
+      if mode_index == NO_STRING:
+        mode = None
+      else:
+        mode = self._get_string(mode_index)
+      (description, properties) = self._get_extra(extra_index)
+      if properties is not None:
+        properties = properties.copy()
+      cvs_path = CVSFile.__new__(CVSFile)
+      cvs_path.__setstate__((
+          cvs_path_state,
+          bool(flags & IN_ATTIC), bool(flags & EXECUTABLE), file_size, mode,
+          description, properties,
+          ))
+
+    return cvs_path
 
   def get_path(self, id):
     """Return the CVSPath with the specified ID."""
 
-    return self._cvs_paths[id]
+    try:
+      return self._cvs_paths[id]
+    except KeyError:
+      if self.mode != DB_OPEN_READ:
+        raise
+      cvs_path = self._read_path(id)
+      self._cvs_paths[id] = cvs_path
+      return cvs_path
+
+  def _write(self):
+    """Write all of the CVSPaths to CVS_PATHS_DB."""
+
+    strings = _InternTable()
+    extras = _InternTable()
+
+    if self._cvs_paths:
+      record_count = max(self._cvs_paths.keys()) + 1
+    else:
+      record_count = 0
+
+    f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'wb')
+    f.write('\0' * HEADER_LEN)
+
+    empty_record = '\0' * RECORD_LEN
+    for id in xrange(record_count):
+      cvs_path = self._cvs_paths.get(id)
+      if cvs_path is None:
+        f.write(empty_record)
+        continue
+
+      flags = PRESENT
+      if cvs_path.parent_directory is None:
+        parent_id = NO_PARENT
+      else:
+        parent_id = cvs_path.parent_directory.id
+
+      if isinstance(cvs_path, CVSDirectory):
+        flags |= DIRECTORY
+        mode_index = NO_STRING
+        file_size = 0
+        extra = cvs_path.empty_subdirectory_ids
+      else:
+        if cvs_path._in_attic:
+          flags |= IN_ATTIC
+        if cvs_path.executable:
+          flags |= EXECUTABLE
+        if cvs_path.mode is None:
+          mode_index = NO_STRING
+        else:
+          mode_index = strings.intern(cvs_path.mode)
+        file_size = cvs_path.file_size
+        extra = (cvs_path.description, cvs_path.properties,)
+
+      f.write(struct.pack(
+          RECORD_FORMAT,
+          flags, cvs_path.project.id, parent_id,
+          strings.intern(cvs_path.rcs_basename), cvs_path.ordinal,
+          mode_index, file_size, extras.intern(cPickle.dumps(extra, -1)),
+          ))
+
+    (string_index_offset, string_data_offset) = strings.write(f)
+    (extra_index_offset, extra_data_offset) = extras.write(f)
+
+    f.seek(0)
+    f.write(struct.pack(
+        HEADER_FORMAT,
+        MAGIC, record_count, len(strings), len(extras),
+        string_index_offset, string_data_offset,
+        extra_index_offset, extra_data_offset,
+        ))
+    f.close()
 
   def close(self):
     if self.mode == DB_OPEN_NEW:
       self.set_cvs_path_ordinals()
-      f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'wb')
-      cPickle.dump(self._cvs_paths.values(), f, -1)
-      f.close()
+      self._write()
+    elif self.mode == DB_OPEN_READ:
+      self._map.close()
+      self._map = None
+      self._file.close()
+      self._file = None
+      self._strings = None
+      self._extras = None
 
     self._cvs_paths = None
 
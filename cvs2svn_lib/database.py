@@ -25,6 +25,8 @@ from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.common import error_prefix
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.metrics import StorageMetrics
+from cvs2svn_lib.metrics import get_name
 
 
 # DBM module selection
@@ -100,6 +102,8 @@ class Database:
     # we know that for bsddb - but *not* anydbm in general - the database
     # consists of one file with the name we specify, rather than several
     # based on that name).
+    self._metrics = StorageMetrics(get_name(self.__class__, filename))
+
     if mode == DB_OPEN_NEW and anydbm._defaultmod.__name__ == 'dbhash':
       if os.path.isfile(filename):
         os.unlink(filename)
@@ -121,10 +125,23 @@ class Database:
       self.serializer = cPickle.loads(self.db[self.serializer_key])
 
   def __getitem__(self, key):
-    return self.serializer.loads(self.db[key])
+    metrics = self._metrics
+    s = self.db[key]
+    metrics.reads.value += 1
+    metrics.bytes_read.value += len(s)
+    metrics.deserialize.start()
+    value = self.serializer.loads(s)
+    metrics.deserialize.stop()
+    return value
 
   def __setitem__(self, key, value):
-    self.db[key] = self.serializer.dumps(value)
+    metrics = self._metrics
+    metrics.serialize.start()
+    s = self.serializer.dumps(value)
+    metrics.serialize.stop()
+    self.db[key] = s
+    metrics.writes.value += 1
+    metrics.bytes_written.value += len(s)
 
   def __delitem__(self, key):
     # gdbm defines a __delitem__ method, but it cannot be assigned.  So
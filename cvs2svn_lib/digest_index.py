@@ -0,0 +1,314 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a compact map from digests to integer ids.
+
+A DigestIndex is an open-addressing hash table with linear probing.
+Each slot is a fixed-length record (see SLOT_FORMAT) holding the first
+KEY_LEN bytes of a digest and a nonzero id; a slot whose id is zero is
+empty.  Since the digests are already uniformly distributed, the home
+slot of a digest is taken directly from its leading bytes.
+
+The slots are kept in an mmap.  As long as the table fits within the
+configured memory budget, the mmap is anonymous; when the table grows
+beyond the budget, it is moved into a temporary file so that the
+operating system can page it out as needed.  The file is removed when
+the table is closed."""
+
+
+import os
+import struct
+import mmap
+import tempfile
+
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.log import logger
+
+
+# The number of leading digest bytes that are stored in the table.
+# 128 bits are plenty to make accidental collisions between different
+# digests impossible in practice:
+KEY_LEN = 16
+
+# (key, id):
+SLOT_FORMAT = '=%dsI' % (KEY_LEN,)
+SLOT_LEN = struct.calcsize(SLOT_FORMAT)
+
+EMPTY_ID = '\0' * (SLOT_LEN - KEY_LEN)
+
+try:
+  _unpack_hash = struct.Struct('=Q').unpack
+  _unpack_id = struct.Struct('=I').unpack
+  _pack_slot = struct.Struct(SLOT_FORMAT).pack
+except AttributeError:
+  # Python 2.4 doesn't have struct.Struct:
+  def _unpack_hash(s):
+    return struct.unpack('=Q', s)
+
+  def _unpack_id(s):
+    return struct.unpack('=I', s)
+
+  def _pack_slot(key, id):
+    return struct.pack(SLOT_FORMAT, key, id)
+
+
+class DigestIndex:
+  """A map {digest : id} stored compactly in an mmap.
+
+  Digests must be at least KEY_LEN bytes long; only their first
+  KEY_LEN bytes are significant.  Ids must be positive integers less
+  than 2**32.  Entries cannot be removed.
+
+  A DigestIndex can be pickled for a checkpoint (see the checkpoint
+  module).  This moves the table to disk (if it isn't there already)
+  and only records the name of the file, so a checkpoint doesn't cost
+  more for a large table than for a small one.  When the checkpoint is
+  unpickled, the entries that were added after the checkpoint are
+  discarded.  For this to work, the ids must be added in increasing
+  order, as they are when they are generated by a KeyGenerator."""
+
+  # The default number of bytes that the table may use in RAM before
+  # it is moved to a temporary file:
+  MEMORY = 128 * 1024 * 1024
+
+  # The number of slots in a new table (must be a power of two):
+  INITIAL_CAPACITY = 1 << 16
+
+  # The number of bytes that are copied at a time when a table is
+  # moved to disk:
+  COPY_SIZE = 1024 * 1024
+
+  def __init__(self, tmpdir=None, memory=None):
+    """Create an empty index.
+
+    If the table grows beyond MEMORY bytes (default: self.MEMORY), it
+    is spilled to a temporary file in directory TMPDIR."""
+
+    self._tmpdir = tmpdir
+    if memory is None:
+      memory = self.MEMORY
+    self._memory = memory
+
+    # The number of entries in the table:
+    self._len = 0
+
+    # The largest id in the table:
+    self._max_id = 0
+
+    # The file backing the table and its name, or None if the mmap is
+    # anonymous.  The file is named (rather than unlinked as soon as
+    # it is created) so that the disk space that it uses can be seen
+    # in the temporary directory, and so that it can be referred to by
+    # a checkpoint:
+    self._file = None
+    self._filename = None
+
+    self._capacity = self.INITIAL_CAPACITY
+    (self._map, self._file, self._filename) = \
+        self._create_table(self._capacity)
+
+  def _create_table(self, capacity, on_disk=False):
+    """Return (map, file, filename) for an empty table with CAPACITY slots.
+
+    The table is kept in a temporary file if ON_DISK is set or if it
+    would take more than self._memory bytes; otherwise, FILE and
+    FILENAME are None."""
+
+    size = capacity * SLOT_LEN
+    if size <= self._memory and not on_disk:
+      return (mmap.mmap(-1, size), None, None)
+
+    if self._file is None and size > self._memory:
+      logger.verbose(
+          'Digest index exceeds %d bytes; moving it to a temporary file'
+          % (self._memory,)
+          )
+    (fd, filename) = tempfile.mkstemp(
+        prefix='digest-index-', suffix='.dat', dir=self._tmpdir,
+        )
+    os.close(fd)
+    f = open(filename, 'w+b')
+    f.seek(size - 1)
+    f.write('\0')
+    f.flush()
+    return (mmap.mmap(f.fileno(), size), f, filename)
+
+  def _find(self, key):
+    """Return the offset of the slot for KEY.
+
+    The slot is either the one holding KEY or the empty slot where KEY
+    would be inserted."""
+
+    m = self._map
+    mask = self._capacity - 1
+    i = _unpack_hash(key[:8])[0] & mask
+    while True:
+      offset = i * SLOT_LEN
+      slot = m[offset:offset + SLOT_LEN]
+      if slot[KEY_LEN:] == EMPTY_ID or slot[:KEY_LEN] == key:
+        return offset
+      i = (i + 1) & mask
+
+  def get(self, digest, default=None):
+    """Return the id stored for DIGEST, or DEFAULT if there is none."""
+
+    offset = self._find(digest[:KEY_LEN])
+    id = self._map[offset + KEY_LEN:offset + SLOT_LEN]
+    if id == EMPTY_ID:
+      return default
+    return _unpack_id(id)[0]
+
+  def __getitem__(self, digest):
+    id = self.get(digest)
+    if id is None:
+      raise KeyError(digest)
+    return id
+
+  def __contains__(self, digest):
+    return self.get(digest) is not None
+
+  def __setitem__(self, digest, id):
+    if id <= 0:
+      raise ValueError('Ids in a DigestIndex must be positive')
+    key = digest[:KEY_LEN]
+    offset = self._find(key)
+    if self._map[offset + KEY_LEN:offset + SLOT_LEN] == EMPTY_ID:
+      self._len += 1
+    self._map[offset:offset + SLOT_LEN] = _pack_slot(key, id)
+    if id > self._max_id:
+      self._max_id = id
+    # Keep the load factor below 2/3 so that probe sequences stay
+    # short:
+    if 3 * self._len > 2 * self._capacity:
+      self._grow()
+
+  def __len__(self):
+    return self._len
+
+  def _copy_slots(self, old_map, old_size, max_id=None):
+    """Insert the entries of table OLD_MAP (of OLD_SIZE bytes) into ours.
+
+    If MAX_ID is set, skip the entries whose ids are larger.  Return
+    the number of entries that were inserted."""
+
+    n = 0
+    for offset in xrange(0, old_size, SLOT_LEN):
+      slot = old_map[offset:offset + SLOT_LEN]
+      id = slot[KEY_LEN:]
+      if id != EMPTY_ID and (max_id is None or _unpack_id(id)[0] <= max_id):
+        new_offset = self._find(slot[:KEY_LEN])
+        self._map[new_offset:new_offset + SLOT_LEN] = slot
+        n += 1
+    return n
+
+  def _rename_table(self, filename):
+    """Rename the file of our table to FILENAME, replacing that file."""
+
+    try:
+      os.rename(self._filename, filename)
+    except OSError:
+      # On Windows, rename() fails if the target exists:
+      os.remove(filename)
+      os.rename(self._filename, filename)
+    self._filename = filename
+
+  def _grow(self):
+    """Double the capacity of the table and rehash all entries."""
+
+    old_map = self._map
+    old_file = self._file
+    old_filename = self._filename
+    old_size = self._capacity * SLOT_LEN
+
+    # Once a table is on disk (which might also be because of a
+    # checkpoint), it stays there:
+    self._capacity *= 2
+    (self._map, self._file, self._filename) = self._create_table(
+        self._capacity, on_disk=(old_file is not None),
+        )
+    self._copy_slots(old_map, old_size)
+
+    old_map.close()
+    if old_file is not None:
+      old_file.close()
+      # A checkpoint might refer to the old file, so keep the new table
+      # under the same name.  The new table contains all of the entries
+      # of the old one, so it is good enough for the checkpoint:
+      self._rename_table(old_filename)
+
+  def __getstate__(self):
+    """Write the table to disk and record the name of its file.
+
+    See the checkpoint module.  The table stays on disk afterwards, so
+    that later checkpoints only have to write the slots that changed."""
+
+    if self._file is None:
+      old_map = self._map
+      size = self._capacity * SLOT_LEN
+      (self._map, self._file, self._filename) = \
+          self._create_table(self._capacity, on_disk=True)
+      for offset in xrange(0, size, self.COPY_SIZE):
+        self._map[offset:offset + self.COPY_SIZE] = \
+            old_map[offset:offset + self.COPY_SIZE]
+      old_map.close()
+    self._map.flush()
+    return (
+        self._tmpdir, self._memory, self._filename, self._len,
+        self._capacity, self._max_id,
+        )
+
+  def __setstate__(self, state):
+    (
+        self._tmpdir, self._memory, filename, self._len, self._capacity,
+        self._max_id,
+        ) = state
+    try:
+      old_file = open(filename, 'rb')
+    except IOError:
+      raise FatalError(
+          'File %r, which is needed to resume from the checkpoint, '
+          'is missing' % (filename,)
+          )
+    old_size = os.path.getsize(filename)
+    old_map = mmap.mmap(old_file.fileno(), old_size, access=mmap.ACCESS_READ)
+
+    # Rebuild the table from the entries that were present when the
+    # checkpoint was written.  The file might have grown since then,
+    # and contain entries that were added later:
+    self._file = None
+    (self._map, self._file, self._filename) = \
+        self._create_table(self._capacity, on_disk=True)
+    n = self._copy_slots(old_map, old_size, self._max_id)
+    old_map.close()
+    old_file.close()
+    if n != self._len:
+      raise FatalError(
+          'File %r does not match the checkpoint' % (filename,)
+          )
+    # Take the place of the old file, so that resuming from the same
+    # checkpoint again still works:
+    self._rename_table(filename)
+
+  def close(self):
+    self._map.close()
+    self._map = None
+    if self._file is not None:
+      self._file.close()
+      os.remove(self._filename)
+      self._file = None
+      self._filename = None
+
+
@@ -19,6 +19,7 @@ Git, Mercurial, or Bazaar).
 """
 
 import os, sys
+import time
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import FatalError
@@ -33,7 +34,7 @@ from cvs2svn_lib.cvs_item import CVSRevisionAdd
 from cvs2svn_lib.cvs_item import CVSRevisionChange
 from cvs2svn_lib.cvs_item import CVSRevisionDelete
 from cvs2svn_lib.cvs_item import CVSRevisionNoop
-from cvs2svn_lib.svn_revision_range import RevisionScores
+from cvs2svn_lib.fill_source import SourceScoresCache
 from cvs2svn_lib.openings_closings import SymbolingsReader
 from cvs2svn_lib.repository_mirror import RepositoryMirror
 from cvs2svn_lib.output_option import OutputOption
@@ -198,9 +199,12 @@ class DVCSOutputOption(OutputOption):
 
   def setup(self, svn_rev_count):
     self._symbolings_reader = SymbolingsReader()
+    self._scores_cache = SourceScoresCache()
     self._mirror.open()
 
   def cleanup(self):
+    logger.normal(self._scores_cache.get_stats())
+    self._scores_cache = None
     self._mirror.close()
     self._symbolings_reader.close()
     del self._symbolings_reader
@@ -214,41 +218,63 @@ class DVCSOutputOption(OutputOption):
     development, and cvs_symbols is a list of CVSSymbolItems that can be
     copied from that source.  The list is in arbitrary order."""
 
+    start_time = time.time()
+
     # Get a map {CVSSymbol : SVNRevisionRange}:
     range_map = self._symbolings_reader.get_range_map(svn_commit)
 
-    # range_map, split up into one map per LOD; i.e., {LOD :
-    # {CVSSymbol : SVNRevisionRange}}:
+    # range_map, split up into one map per LOD, with the CVSSymbols
+    # that share a range grouped together; i.e., {LOD : {range_key :
+    # [CVSSymbol]}}, where range_key is as returned by
+    # SVNRevisionRange.get_key().  The scores only depend on the
+    # distinct ranges, which are usually far fewer than the CVSSymbols.
     lod_range_maps = {}
+    # The number of CVSSymbols for each LOD:
+    lod_counts = {}
 
     for (cvs_symbol, range) in range_map.iteritems():
       lod_range_map = lod_range_maps.get(range.source_lod)
       if lod_range_map is None:
         lod_range_map = {}
         lod_range_maps[range.source_lod] = lod_range_map
-      lod_range_map[cvs_symbol] = range
+        lod_counts[range.source_lod] = 0
+      lod_range_map.setdefault(range.get_key(), []).append(cvs_symbol)
+      lod_counts[range.source_lod] += 1
 
     # Sort the sources so that the branch that serves most often as
     # parent is processed first:
-    lod_ranges = lod_range_maps.items()
-    lod_ranges.sort(
-        lambda (lod1,lod_range_map1),(lod2,lod_range_map2):
-        -cmp(len(lod_range_map1), len(lod_range_map2)) or cmp(lod1, lod2)
+    lods = lod_range_maps.keys()
+    lods.sort(
+        lambda lod1, lod2:
+        -cmp(lod_counts[lod1], lod_counts[lod2]) or cmp(lod1, lod2)
         )
 
     source_groups = []
-    for (lod, lod_range_map) in lod_ranges:
+    for lod in lods:
+      lod_range_map = lod_range_maps[lod]
       while lod_range_map:
-        revision_scores = RevisionScores(lod_range_map.values())
-        (source_lod, revnum, score) = revision_scores.get_best_revnum()
+        range_counts = {}
+        for (range_key, cvs_symbols) in lod_range_map.iteritems():
+          range_counts[range_key] = len(cvs_symbols)
+        (revision_scores, source_lod, revnum, score) = \
+            self._scores_cache.get_scores(range_counts)
         assert source_lod == lod
         cvs_symbols = []
-        for (cvs_symbol, range) in lod_range_map.items():
-          if revnum in range:
-            cvs_symbols.append(cvs_symbol)
-            del lod_range_map[cvs_symbol]
+        for range_key in lod_range_map.keys():
+          (range_lod, opening_revnum, closing_revnum) = range_key
+          if opening_revnum <= revnum \
+                 and (closing_revnum is None or revnum < closing_revnum):
+            cvs_symbols.extend(lod_range_map.pop(range_key))
         source_groups.append((revnum, lod, cvs_symbols))
 
+    logger.verbose(
+        'Planned %d source groups for %s (%d files) in %.3f seconds'
+        % (
+            len(source_groups), svn_commit.symbol.name, len(range_map),
+            time.time() - start_time,
+            )
+        )
+
     return source_groups
 
   def _is_simple_copy(self, svn_commit, source_groups):
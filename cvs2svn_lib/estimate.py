@@ -0,0 +1,383 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains code to estimate the cost of a conversion.
+
+See --estimate.  The repository is walked as in CollectRevsPass, but
+only the admin and tree sections of each ,v file (plus the text of the
+head revision, which tells how big the file's fulltexts are) are
+parsed, optionally for only a random sample of the files.  From the
+numbers of revisions and symbols and the sizes of the files, the
+running time of each pass, the peak memory use, and the sizes of the
+largest temporary files are extrapolated using the models below."""
+
+
+import os
+import time
+import random
+import tempfile
+
+from cvs2svn_lib import config
+from cvs2svn_lib.common import warning_prefix
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib.cvs_path import CVSFile
+from cvs2svn_lib.rcsparser import Sink
+from cvs2svn_lib.rcsparser import parse
+from cvs2svn_lib.rcsparser import RCSParseError
+from cvs2svn_lib.rcsparser import RCSStopParser
+from cvs2svn_lib.repository_walker import walk_repository
+from cvs2svn_lib.checkout_internal import InternalRevisionCollector
+from cvs2svn_lib.progress import format_duration
+
+
+# The models were calibrated by converting repositories generated by
+# contrib/generate-cvs-repos.py to Subversion dumpfiles with the
+# default options (i.e., --use-internal-co), measuring each pass with
+# contrib/benchmark-conversion.py.  They are expressed in terms of the
+# following quantities:
+#
+#     files -- the number of ,v files.
+#
+#     rcs_bytes -- the total size of the ,v files.
+#
+#     revisions -- the number of CVS revisions.
+#
+#     symbols -- the number of branch and tag definitions, counting
+#         each file in which a symbol is defined separately.
+#
+#     text_bytes -- the total size of the fulltexts of all revisions
+#         (which is roughly what has to be checked out and output).
+#
+# Times depend on the speed of the computer, so they are only a rough
+# guide.
+
+# A map { pass_name : (quantity, seconds per unit) }:
+PASS_TIME_MODELS = {
+    'CollectRevsPass' : ('rcs_bytes', 1.0e-7),
+    'FilterSymbolsPass' : ('rcs_bytes', 1.55e-7),
+    'InitializeChangesetsPass' : ('revisions', 3.4e-5),
+    'BreakRevisionChangesetCyclesPass' : ('revisions', 2.8e-5),
+    'RevisionTopologicalSortPass' : ('revisions', 2.8e-5),
+    'BreakSymbolChangesetCyclesPass' : ('symbols', 2.0e-5),
+    'BreakAllChangesetCyclesPass' : ('revisions', 2.8e-5),
+    'TopologicalSortPass' : ('revisions', 2.8e-5),
+    'CreateRevsPass' : ('revisions', 4.0e-5),
+    'SortSymbolOpeningsClosingsPass' : ('symbols', 2.0e-6),
+    'OutputPass' : ('text_bytes', 3.5e-7),
+    }
+
+# The model for passes not listed above, which are all quick:
+DEFAULT_PASS_TIME_MODEL = ('revisions', 2.0e-6)
+
+# The peak memory use is about BASE_MEMORY plus MEMORY_PER_REVISION
+# bytes for each revision:
+BASE_MEMORY = 38 * 1024 * 1024
+MEMORY_PER_REVISION = 460
+
+# A list of (artifact, quantity, bytes per unit, internal_co_only)
+# describing the largest temporary files.  INTERNAL_CO_ONLY is True
+# for files that are only written when --use-internal-co is in
+# effect:
+TEMP_FILE_MODELS = [
+    (config.RCS_DELTAS_STORE, 'rcs_bytes', 0.70, True),
+    (config.CVS_CHECKOUT_DB, 'text_bytes', 0.35, True),
+    (config.RCS_TREES_STORE, 'revisions', 20, True),
+    (config.CVS_ITEMS_STORE, 'revisions', 90, False),
+    (config.CVS_ITEMS_SORTED_STORE, 'revisions', 100, False),
+    (config.CVS_REVS_DATAFILE, 'revisions', 98, False),
+    (config.CVS_REVS_SORTED_DATAFILE, 'revisions', 98, False),
+    # The temporary files of sort_file() are as big as its input:
+    (config.SORT_RUNS, 'revisions', 98, False),
+    (config.CVS_SYMBOLS_DATAFILE, 'symbols', 40, False),
+    (config.CVS_SYMBOLS_SORTED_DATAFILE, 'symbols', 40, False),
+    (config.SYMBOL_OPENINGS_CLOSINGS, 'symbols', 25, False),
+    (config.SYMBOL_OPENINGS_CLOSINGS_SORTED, 'symbols', 25, False),
+    (config.MIRROR_NODES_STORE, 'revisions', 35, False),
+    ('(other temporary files)', 'revisions', 110, False),
+    ]
+
+
+def _format_size(size):
+  return '%.1f MiB' % (size / 1048576.0,)
+
+
+class _EstimateSink(Sink):
+  """Count the revisions and symbols of a ,v file.
+
+  Parsing is stopped by raising RCSStopParser as soon as the text of
+  the head revision (the first deltatext) has been seen."""
+
+  def __init__(self):
+    self.revisions = 0
+    self.symbols = 0
+    self.head_size = 0
+
+  def define_tag(self, name, revision):
+    self.symbols += 1
+
+  def define_revision(self, revision, timestamp, author, state,
+                      branches, next):
+    self.revisions += 1
+
+  def set_revision_info(self, revision, log, text):
+    self.head_size = len(text)
+    raise RCSStopParser()
+
+
+class RepositoryScan:
+  """The quantities describing the repository, found by scanning it.
+
+  Members:
+
+    files, rcs_bytes -- the number and total size of the ,v files.
+
+    directories -- the number of directories.
+
+    scanned_files, scanned_bytes -- the number and total size of the
+        files that were parsed.
+
+    revisions, symbols, text_bytes -- the quantities (see above)
+        counted in the files that were parsed.
+
+    errors -- the number of problems found.
+
+  """
+
+  def __init__(self):
+    self.files = 0
+    self.rcs_bytes = 0
+    self.directories = 0
+    self.scanned_files = 0
+    self.scanned_bytes = 0
+    self.revisions = 0
+    self.symbols = 0
+    self.text_bytes = 0
+    self.errors = 0
+
+  def record_error(self, err):
+    logger.warn('%s: %s' % (warning_prefix, err,))
+    self.errors += 1
+
+  def scan_file(self, cvs_file):
+    """Parse CVS_FILE and add its revisions, symbols, and text size."""
+
+    sink = _EstimateSink()
+    f = open(cvs_file.rcs_path, 'rb')
+    try:
+      try:
+        parse(f, sink)
+      except RCSStopParser:
+        pass
+      except (RCSParseError, ValueError, RuntimeError):
+        self.record_error('%r is not a valid ,v file' % (cvs_file.rcs_path,))
+        return
+    finally:
+      f.close()
+
+    self.scanned_files += 1
+    self.scanned_bytes += cvs_file.file_size
+    self.revisions += sink.revisions
+    self.symbols += sink.symbols
+    # Each revision's fulltext is assumed to be about as big as that
+    # of the head revision:
+    self.text_bytes += sink.revisions * sink.head_size
+
+  def get_quantities(self):
+    """Return a map { quantity : value } extrapolated to all files.
+
+    The counts from the scanned files are scaled by the ratio of the
+    total size of all files to that of the scanned files, since
+    bigger files tend to have more revisions."""
+
+    if self.scanned_bytes:
+      factor = float(self.rcs_bytes) / self.scanned_bytes
+    elif self.scanned_files:
+      factor = float(self.files) / self.scanned_files
+    else:
+      factor = 0.0
+    return {
+        'files' : self.files,
+        'rcs_bytes' : self.rcs_bytes,
+        'revisions' : int(self.revisions * factor),
+        'symbols' : int(self.symbols * factor),
+        'text_bytes' : int(self.text_bytes * factor),
+        }
+
+
+def scan_repository(projects, sample_size=None):
+  """Walk PROJECTS and return a RepositoryScan describing them.
+
+  If SAMPLE_SIZE is specified, parse only that many randomly-chosen
+  files."""
+
+  scan = RepositoryScan()
+  cvs_files = []
+  file_key_generator = KeyGenerator()
+  for project in projects:
+    for cvs_path in walk_repository(
+          project, file_key_generator, scan.record_error
+          ):
+      if isinstance(cvs_path, CVSFile):
+        cvs_files.append(cvs_path)
+        scan.files += 1
+        scan.rcs_bytes += cvs_path.file_size
+      else:
+        scan.directories += 1
+
+  if sample_size is not None and sample_size < len(cvs_files):
+    cvs_files = random.sample(cvs_files, sample_size)
+
+  for cvs_file in cvs_files:
+    scan.scan_file(cvs_file)
+
+  return scan
+
+
+def estimate_temp_files(quantities):
+  """Return a list of (artifact, size) for the largest temporary files."""
+
+  internal_co = isinstance(
+      Ctx().revision_collector, InternalRevisionCollector
+      )
+  retval = []
+  for (artifact, quantity, factor, internal_co_only) in TEMP_FILE_MODELS:
+    if internal_co or not internal_co_only:
+      retval.append((artifact, int(quantities[quantity] * factor),))
+  return retval
+
+
+def _get_temp_dir(artifact):
+  """Return the directory in which ARTIFACT would be written.
+
+  If that directory does not exist yet, return the existing directory
+  in which it would be created."""
+
+  try:
+    directory = Ctx().get_temp_dir(artifact)
+  except FatalError:
+    # No --tmpdir was specified, so a subdirectory of the system's
+    # temporary directory would be used:
+    directory = tempfile.gettempdir()
+
+  directory = os.path.abspath(directory)
+  while not os.path.isdir(directory):
+    directory = os.path.dirname(directory)
+  return directory
+
+
+def _check_free_space(directory, size):
+  """Log the free space in DIRECTORY; warn if it is less than SIZE."""
+
+  if not hasattr(os, 'statvfs'):
+    return
+  st = os.statvfs(directory)
+  free = st.f_bavail * st.f_frsize
+  logger.quiet(
+      'Free space in the temporary directory %r: %s (%s needed)'
+      % (directory, _format_size(free), _format_size(size),)
+      )
+  if free < size:
+    logger.warn(
+        '%s: there might not be enough free space in %r.'
+        % (warning_prefix, directory,)
+        )
+
+
+def estimate_conversion(run_options, pass_manager):
+  """Scan the repository and log an estimate of the cost of converting it."""
+
+  ctx = Ctx()
+
+  logger.quiet('Scanning the CVS repository...')
+  start = time.time()
+  scan = scan_repository(run_options.projects, ctx.estimate_sample)
+  quantities = scan.get_quantities()
+  logger.quiet(
+      'Scanned %d of %d files (%s in %d directories) in %s.'
+      % (scan.scanned_files, scan.files, _format_size(scan.rcs_bytes),
+         scan.directories, format_duration(time.time() - start),)
+      )
+  if scan.scanned_files < scan.files:
+    logger.quiet('The following numbers are extrapolated from the sample.')
+  logger.quiet(
+      'Revisions: %d; branch and tag definitions: %d; '
+      'size of all fulltexts: %s'
+      % (quantities['revisions'], quantities['symbols'],
+         _format_size(quantities['text_bytes']),)
+      )
+
+  if not isinstance(ctx.revision_collector, InternalRevisionCollector):
+    logger.warn(
+        '%s: the estimates assume --use-internal-co; conversions '
+        'using\nRCS or CVS to check out revisions take longer.'
+        % (warning_prefix,)
+        )
+
+  logger.quiet('\nEstimated time of each pass:')
+  total_time = 0.0
+  for (i, the_pass) in enumerate(pass_manager.passes):
+    (quantity, factor) = PASS_TIME_MODELS.get(
+        the_pass.name, DEFAULT_PASS_TIME_MODEL
+        )
+    seconds = quantities[quantity] * factor
+    total_time += seconds
+    logger.quiet(
+        '    pass%-2d %-36s %s'
+        % (i + 1, the_pass.name, format_duration(seconds),)
+        )
+  logger.quiet('    %-43s %s' % ('total', format_duration(total_time),))
+
+  logger.quiet(
+      '\nEstimated peak memory use: %s'
+      % (_format_size(
+          BASE_MEMORY + MEMORY_PER_REVISION * quantities['revisions']
+          ),)
+      )
+
+  # This is an upper bound, because some of the files are deleted
+  # before others are created:
+  temp_files = estimate_temp_files(quantities)
+  total_size = 0
+  for (artifact, size) in temp_files:
+    total_size += size
+  logger.quiet(
+      '\nEstimated temporary disk space (at most): %s'
+      % (_format_size(total_size),)
+      )
+  for (artifact, size) in temp_files:
+    logger.quiet('    %-44s %12s' % (artifact, _format_size(size),))
+
+  # Group the temporary files by the directory in which they would be
+  # written (see Ctx.get_temp_dir()):
+  dir_sizes = {}
+  for (artifact, size) in temp_files:
+    directory = _get_temp_dir(artifact)
+    dir_sizes[directory] = dir_sizes.get(directory, 0) + size
+  directories = dir_sizes.keys()
+  directories.sort()
+  for directory in directories:
+    _check_free_space(directory, dir_sizes[directory])
+
+  if scan.errors:
+    logger.warn(
+        '%s: found %d problem(s) that would stop the conversion.'
+        % (warning_prefix, scan.errors,)
+        )
+
+
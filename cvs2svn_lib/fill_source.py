@@ -20,8 +20,68 @@
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import SVN_INVALID_REVNUM
+from cvs2svn_lib.lru_cache import LRUCache
 from cvs2svn_lib.svn_revision_range import SVNRevisionRange
-from cvs2svn_lib.svn_revision_range import RevisionScores
+from cvs2svn_lib.svn_revision_range import WeightedRevisionScores
+
+
+class SourceScoresCache:
+  """Memoize the scoring of fill sources.
+
+  The best source for a subtree only depends on the multiset of
+  SVNRevisionRanges of the files within it.  When a project is tagged
+  or branched many times, the same subtrees (with the same ranges)
+  have to be scored again and again; this class remembers the scores,
+  keyed by a frozenset of ((source_lod, opening_revnum,
+  closing_revnum), count) pairs.  The cache is bounded by the total
+  number of distinct ranges held in it."""
+
+  # The maximum total number of (range, count) pairs to keep:
+  MAX_SIZE = 200000
+
+  def __init__(self, max_size=None):
+    if max_size is None:
+      max_size = self.MAX_SIZE
+    self._cache = LRUCache(max_size)
+
+  def get_scores(self, range_counts, signature=None):
+    """Return (revision_scores, best_source_lod, best_revnum, best_score).
+
+    RANGE_COUNTS is a map {(source_lod, opening_revnum,
+    closing_revnum) : count}.  SIGNATURE, if specified, must be
+    frozenset(RANGE_COUNTS.iteritems())."""
+
+    if signature is None:
+      signature = frozenset(range_counts.iteritems())
+
+    try:
+      return self._cache[signature]
+    except KeyError:
+      revision_scores = WeightedRevisionScores(range_counts)
+      value = (revision_scores,) + revision_scores.get_best_revnum()
+      self._cache.set(signature, value, len(range_counts))
+      return value
+
+  def get_stats(self):
+    return 'Fill source scores cache: %s' % (self._cache.get_stats(),)
+
+
+class _SourceNode(dict):
+  """A directory node in a FillSource tree.
+
+  This is a map {CVSPath : node}, which additionally remembers a
+  summary of the SVNRevisionRanges underneath it once it has been
+  computed.  The tree is not modified after it has been built, so the
+  summary never becomes stale."""
+
+  __slots__ = ['summary']
+
+  def __init__(self):
+    dict.__init__(self)
+
+    # None, or a tuple (range_counts, signature, file_count,
+    # dir_count); see FillSource._get_summary():
+    self.summary = None
 
 
 class FillSource:
@@ -43,7 +103,7 @@ class FillSource:
 
   These objects are used by the symbol filler in SVNOutputOption."""
 
-  def __init__(self, cvs_path, symbol, node_tree):
+  def __init__(self, cvs_path, symbol, node_tree, scores_cache=None):
     """Create a fill source.
 
     The best LOD and SVN REVNUM to use as the copy source can be
@@ -55,17 +115,23 @@ class FillSource:
 
       _symbol -- (Symbol) the symbol to be filled.
 
-      _node_tree -- (dict) a tree stored as a map { CVSPath : node },
-          where subnodes have the same form.  Leaves are
+      _node_tree -- (_SourceNode) a tree stored as a map { CVSPath :
+          node }, where subnodes have the same form.  Leaves are
           SVNRevisionRange instances telling the source_lod and range
           of SVN revision numbers from which the CVSPath can be
           copied.
 
+      _scores_cache -- (SourceScoresCache) the cache used to memoize
+          the scoring of subtrees.  It is shared with subsources.
+
     """
 
     self.cvs_path = cvs_path
     self._symbol = symbol
     self._node_tree = node_tree
+    if scores_cache is None:
+      scores_cache = SourceScoresCache()
+    self._scores_cache = scores_cache
 
   def _set_node(self, cvs_file, svn_revision_range):
     parent_node = self._get_node(cvs_file.parent_directory, create=True)
@@ -84,7 +150,7 @@ class FillSource:
         return parent_node[cvs_path]
       except KeyError:
         if create:
-          node = {}
+          node = _SourceNode()
           parent_node[cvs_path] = node
           return node
         else:
@@ -100,14 +166,11 @@ class FillSource:
     sort order).  The return value's source_lod is the best LOD to
     copy from, and its opening_revnum is the best SVN revision."""
 
-    # Aggregate openings and closings from our rev tree
-    svn_revision_ranges = self._get_revision_ranges(self._node_tree)
+    (range_counts, signature, file_count, dir_count) = \
+        self._get_summary(self._node_tree)
 
-    # Score the lists
-    revision_scores = RevisionScores(svn_revision_ranges)
-
-    best_source_lod, best_revnum, best_score = \
-        revision_scores.get_best_revnum()
+    (revision_scores, best_source_lod, best_revnum, best_score) = \
+        self._scores_cache.get_scores(range_counts, signature)
 
     if (
         preferred_source is not None
@@ -124,28 +187,82 @@ class FillSource:
 
     return SVNRevisionRange(best_source_lod, best_revnum)
 
-  def _get_revision_ranges(self, node):
-    """Return a list of all the SVNRevisionRanges at and under NODE.
+  def get_file_count(self):
+    """Return the number of CVSFiles at and under self.cvs_path."""
+
+    return self._get_summary(self._node_tree)[2]
+
+  def get_dir_count(self):
+    """Return the number of CVSDirectories strictly under self.cvs_path."""
+
+    return self._get_summary(self._node_tree)[3]
+
+  def is_complete_source(self, source):
+    """Return True iff every file in this subtree can be copied from SOURCE.
+
+    SOURCE is an SVNRevisionRange whose opening_revnum is the revision
+    that would be copied.  If this method returns True, then copying
+    the whole subtree from SOURCE yields the correct version of all of
+    the files in this FillSource (though it might also yield
+    additional paths)."""
 
-    Include duplicates.  This is a helper method used by
-    compute_best_source()."""
+    (range_counts, signature, file_count, dir_count) = \
+        self._get_summary(self._node_tree)
+    revision_scores = self._scores_cache.get_scores(
+        range_counts, signature
+        )[0]
+    return revision_scores.get_score(source) == file_count
+
+  def _get_summary(self, node):
+    """Return a summary of the SVNRevisionRanges at and under NODE.
+
+    Return a tuple (range_counts, signature, file_count, dir_count),
+    where RANGE_COUNTS is a map {(source_lod, opening_revnum,
+    closing_revnum) : count}, SIGNATURE is a frozenset of the items of
+    RANGE_COUNTS, FILE_COUNT is the number of leaves at and under
+    NODE, and DIR_COUNT is the number of directory nodes strictly
+    under NODE.
+
+    The summaries of directory nodes are remembered, so that each
+    node's summary is computed only once, from the summaries of its
+    children."""
 
     if isinstance(node, SVNRevisionRange):
       # It is a leaf node.
-      return [ node ]
-    else:
-      # It is an intermediate node.
-      revision_ranges = []
-      for key, subnode in node.items():
-        revision_ranges.extend(self._get_revision_ranges(subnode))
-      return revision_ranges
+      range_counts = {node.get_key() : 1}
+      return (range_counts, None, 1, 0)
+
+    if node.summary is None:
+      range_counts = {}
+      file_count = 0
+      dir_count = 0
+      for subnode in node.itervalues():
+        if isinstance(subnode, SVNRevisionRange):
+          key = subnode.get_key()
+          range_counts[key] = range_counts.get(key, 0) + 1
+          file_count += 1
+        else:
+          (sub_range_counts, sub_signature, sub_file_count, sub_dir_count) \
+              = self._get_summary(subnode)
+          for (key, count) in sub_range_counts.iteritems():
+            range_counts[key] = range_counts.get(key, 0) + count
+          file_count += sub_file_count
+          dir_count += sub_dir_count + 1
+      node.summary = (
+          range_counts, frozenset(range_counts.iteritems()),
+          file_count, dir_count,
+          )
+
+    return node.summary
 
   def get_subsources(self):
     """Generate (CVSPath, FillSource) for all direct subsources."""
 
     if not isinstance(self._node_tree, SVNRevisionRange):
       for cvs_path, node in self._node_tree.items():
-        fill_source = FillSource(cvs_path, self._symbol, node)
+        fill_source = FillSource(
+            cvs_path, self._symbol, node, self._scores_cache
+            )
         yield (cvs_path, fill_source)
 
   def get_subsource_map(self):
@@ -171,18 +288,22 @@ class FillSource:
     return '%s%r' % (self, self._node_tree,)
 
 
-def get_source_set(symbol, range_map):
+def get_source_set(symbol, range_map, scores_cache=None):
   """Return a FillSource describing the fill sources for RANGE_MAP.
 
   SYMBOL is either a Branch or a Tag.  RANGE_MAP is a map { CVSSymbol
   : SVNRevisionRange } as returned by
-  SymbolingsReader.get_range_map().
+  SymbolingsReader.get_range_map().  SCORES_CACHE, if specified, is a
+  SourceScoresCache that should be used (and can be shared between
+  symbols).
 
   Use the SVNRevisionRanges from RANGE_MAP to create a FillSource
   instance describing the sources for filling SYMBOL."""
 
   root_cvs_directory = symbol.project.get_root_cvs_directory()
-  fill_source = FillSource(root_cvs_directory, symbol, {})
+  fill_source = FillSource(
+      root_cvs_directory, symbol, _SourceNode(), scores_cache
+      )
 
   for cvs_symbol, svn_revision_range in range_map.items():
     fill_source._set_node(cvs_symbol.cvs_file, svn_revision_range)
@@ -29,6 +29,7 @@ import shutil
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import InternalError
+from cvs2svn_lib.common import NullFile
 from cvs2svn_lib.log import logger
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.symbol import Trunk
@@ -47,6 +48,11 @@ class GitRevisionWriter(MirrorUpdater):
     MirrorUpdater.start(self, mirror)
     self.f = f
 
+  def set_output(self, f):
+    """Write any further output to F (see set_replaying())."""
+
+    self.f = f
+
   def _modify_file(self, cvs_item, post_commit):
     raise NotImplementedError()
 
@@ -117,6 +123,17 @@ class GitRevisionInlineWriter(GitRevisionWriter):
     self.revision_reader.start()
 
   def _modify_file(self, cvs_item, post_commit):
+    if isinstance(cvs_item, CVSSymbol):
+      cvs_rev = cvs_item.get_cvs_revision_source(Ctx()._cvs_items_db)
+    else:
+      cvs_rev = cvs_item
+
+    if isinstance(self.f, NullFile):
+      # The commit is only being replayed, so don't bother reading the
+      # file contents, but let the revision reader release them:
+      self.revision_reader.skip_content(cvs_rev)
+      return
+
     if cvs_item.cvs_file.executable:
       mode = '100755'
     else:
@@ -127,11 +144,6 @@ class GitRevisionInlineWriter(GitRevisionWriter):
         % (mode, cvs_item.cvs_file.cvs_path,)
         )
 
-    if isinstance(cvs_item, CVSSymbol):
-      cvs_rev = cvs_item.get_cvs_revision_source(Ctx()._cvs_items_db)
-    else:
-      cvs_rev = cvs_item
-
     # FIXME: We have to decide what to do about keyword substitution
     # and eol_style here:
     fulltext = self.revision_reader.get_content(cvs_rev)
@@ -231,8 +243,32 @@ class GitOutputOption(DVCSOutputOption):
     # at the end of the revnum.
     self._marks = {}
 
+    # A map {git_branch : mark} giving the mark of the last commit
+    # that was written to each branch (e.g., 'refs/heads/master'):
+    self._branch_marks = {}
+
+    # The set of branches that have been written to the output since
+    # the end of the replayed commits.  git-fast-import only knows
+    # about these branches; a commit to any other branch must say
+    # explicitly which commit it follows:
+    self._branches_in_stream = set()
+
     self.revision_writer.start(self._mirror, self.f)
 
+    # While commits are being replayed, the real output file is kept
+    # here and self.f is a NullFile:
+    self._replayed_f = None
+
+  def set_replaying(self, replaying):
+    if replaying:
+      self._replayed_f = self.f
+      self.f = NullFile()
+    else:
+      self.f = self._replayed_f
+      self._replayed_f = None
+      self._branches_in_stream = set()
+    self.revision_writer.set_output(self.f)
+
   def _create_commit_mark(self, lod, revnum):
     mark = self._mark_generator.gen_id()
     self._set_lod_mark(lod, revnum, mark)
@@ -260,6 +296,30 @@ class GitOutputOption(DVCSOutputOption):
         modifications.append(entry)
     self._youngest = revnum
 
+  def _set_branch_mark(self, git_branch, mark):
+    """Record that GIT_BRANCH now points at MARK.
+
+    If MARK is None, GIT_BRANCH has been reset to nothing."""
+
+    if mark is None:
+      self._branch_marks.pop(git_branch, None)
+    else:
+      self._branch_marks[git_branch] = mark
+    self._branches_in_stream.add(git_branch)
+
+  def _write_commit_parent(self, git_branch):
+    """Write a 'from' line if a commit to GIT_BRANCH needs one.
+
+    This is the case if GIT_BRANCH was last written by a replayed
+    commit, because then git-fast-import doesn't know that the new
+    commit follows it.  This method must be called after the commit
+    message and before any 'merge' lines."""
+
+    if git_branch not in self._branches_in_stream:
+      mark = self._branch_marks.get(git_branch)
+      if mark is not None:
+        self.f.write('from :%d\n' % (mark,))
+
   def _get_author(self, svn_commit):
     """Return the author to be used for SVN_COMMIT.
 
@@ -294,9 +354,10 @@ class GitOutputOption(DVCSOutputOption):
     self._mirror.start_commit(svn_commit.revnum)
     if isinstance(lod, Trunk):
       # FIXME: is this correct?:
-      self.f.write('commit refs/heads/master\n')
+      git_branch = 'refs/heads/master'
     else:
-      self.f.write('commit refs/heads/%s\n' % (lod.name,))
+      git_branch = 'refs/heads/%s' % (lod.name,)
+    self.f.write('commit %s\n' % (git_branch,))
     mark = self._create_commit_mark(lod, svn_commit.revnum)
     logger.normal(
         'Writing commit r%d on %s (mark :%d)'
@@ -308,6 +369,8 @@ class GitOutputOption(DVCSOutputOption):
         )
     self.f.write('data %d\n' % (len(log_msg),))
     self.f.write('%s\n' % (log_msg,))
+    self._write_commit_parent(git_branch)
+    self._set_branch_mark(git_branch, mark)
     for cvs_rev in svn_commit.get_cvs_items():
       self.revision_writer.process_revision(cvs_rev, post_commit=False)
 
@@ -339,6 +402,8 @@ class GitOutputOption(DVCSOutputOption):
         )
     self.f.write('data %d\n' % (len(log_msg),))
     self.f.write('%s\n' % (log_msg,))
+    self._write_commit_parent('refs/heads/master')
+    self._set_branch_mark('refs/heads/master', mark)
     self.f.write(
         'merge :%d\n'
         % (self._get_source_mark(source_lod, svn_commit.revnum),)
@@ -452,14 +517,22 @@ class GitOutputOption(DVCSOutputOption):
           'from :%d\n'
           % (self._get_source_mark(p_source_lod, p_source_revnum),)
           )
+    else:
+      self._write_commit_parent(git_branch)
+    self._set_branch_mark(git_branch, mark)
 
     for (source_revnum, source_lod, cvs_symbols,) in source_groups:
       for cvs_symbol in cvs_symbols:
         self.revision_writer.branch_file(cvs_symbol)
 
     if is_initial_lod_creation:
-      for cvs_file in cvs_files_to_delete:
-        self.f.write('D %s\n' % (cvs_file.cvs_path,))
+      # Sort the paths so that the output doesn't depend on the order
+      # of the set (which varies, e.g., after resuming from a
+      # checkpoint):
+      for cvs_path in sorted(
+            cvs_file.cvs_path for cvs_file in cvs_files_to_delete
+            ):
+        self.f.write('D %s\n' % (cvs_path,))
 
     self.f.write('\n')
     return mark
@@ -496,8 +569,10 @@ class GitOutputOption(DVCSOutputOption):
       category = 'tags'
     else:
       raise InternalError()
-    self.f.write('reset refs/%s/%s\n' % (category, symbol.name,))
+    git_branch = 'refs/%s/%s' % (category, symbol.name,)
+    self.f.write('reset %s\n' % (git_branch,))
     self.f.write('from :%d\n' % (mark,))
+    self._set_branch_mark(git_branch, mark)
 
   def get_tag_fixup_branch_name(self, svn_commit):
     # The branch name to use for the "tag fixup branches".  The
@@ -542,6 +617,7 @@ class GitOutputOption(DVCSOutputOption):
       self._set_symbol(svn_commit.symbol, mark)
       self.f.write('reset %s\n' % (fixup_branch_name,))
       self.f.write('\n')
+      self._set_branch_mark(fixup_branch_name, None)
 
       if self.tie_tag_fixup_branches:
         source_lod = source_groups[0][1]
@@ -557,6 +633,8 @@ class GitOutputOption(DVCSOutputOption):
         self.f.write('committer %s %d +0000\n' % (author, svn_commit.date,))
         self.f.write('data %d\n' % (len(log_msg),))
         self.f.write('%s\n' % (log_msg,))
+        self._write_commit_parent(source_lod_git_branch)
+        self._set_branch_mark(source_lod_git_branch, mark2)
 
         self.f.write(
             'merge :%d\n'
@@ -21,6 +21,8 @@ from cvs2svn_lib.cvs_item import CVSRevisionDelete
 from cvs2svn_lib.revision_manager import RevisionCollector
 from cvs2svn_lib.key_generator import KeyGenerator
 from cvs2svn_lib.artifact_manager import artifact_manager
+from cvs2svn_lib.checkpoint import sync_file
+from cvs2svn_lib.checkpoint import reopen_file
 
 
 class GitRevisionCollector(RevisionCollector):
@@ -47,6 +49,20 @@ class GitRevisionCollector(RevisionCollector):
       self.dump_file = open(self.blob_filename, 'wb')
     self._mark_generator = KeyGenerator()
 
+  def __getstate__(self):
+    # This is only used for checkpoints (see the checkpoint module):
+    return (
+        self.revision_reader, self.blob_filename, self.dump_file.name,
+        sync_file(self.dump_file), self._mark_generator,
+        )
+
+  def __setstate__(self, state):
+    (
+        self.revision_reader, self.blob_filename, filename, length,
+        self._mark_generator,
+        ) = state
+    self.dump_file = reopen_file(filename, length)
+
   def _process_revision(self, cvs_rev):
     """Write the revision fulltext to a blob if it is not dead."""
 
@@ -0,0 +1,153 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains support for incremental conversions.
+
+An incremental conversion (see --incremental-state) converts the CVS
+repository as usual, but only outputs the commits that were not
+already output by the previous conversion.  Between conversions, the
+state file records a digest of each commit that was output.  All files
+are parsed and converted again (possibly with the help of the parse
+cache), because the order of the commits depends on all of them.
+
+When the new conversion reaches OutputPass, the commits that were
+output last time are checked against the recorded digests and
+replayed without writing anything, so that the output option ends up
+in the same state as at the end of the previous conversion.  The
+remaining commits are output normally.  If the history of the
+previously-output commits has changed (for example, because a file
+was added with an old timestamp), the conversion is aborted, because
+in that case a full conversion is needed."""
+
+
+import os
+import cPickle
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.cvs_item import CVSRevision
+from cvs2svn_lib.svn_commit import SVNPostCommit
+
+
+class IncrementalState:
+  """The information that is kept from one conversion to the next.
+
+  Members:
+
+    commit_digests -- (list) the digests (as computed by
+        get_commit_digest()) of the commits that were output, in
+        order; i.e., commit_digests[i] is the digest of revision i+1.
+
+  """
+
+  def __init__(self, commit_digests):
+    self.commit_digests = commit_digests
+
+  def write(self, filename):
+    """Write this state to FILENAME, replacing the old state atomically."""
+
+    tmp_filename = filename + '.tmp'
+    f = open(tmp_filename, 'wb')
+    cPickle.dump(self, f, -1)
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    try:
+      os.rename(tmp_filename, filename)
+    except OSError:
+      # On Windows, rename() fails if the target exists:
+      os.remove(filename)
+      os.rename(tmp_filename, filename)
+
+
+def read_incremental_state(filename):
+  """Return the IncrementalState stored in FILENAME, or None.
+
+  Return None if FILENAME does not exist (i.e., if this is the first
+  conversion)."""
+
+  if not os.path.exists(filename):
+    return None
+  f = open(filename, 'rb')
+  try:
+    return cPickle.load(f)
+  finally:
+    f.close()
+
+
+def _describe_cvs_item(cvs_item):
+  """Return a description of CVS_ITEM that does not involve item ids."""
+
+  if isinstance(cvs_item, CVSRevision):
+    lod_name = getattr(cvs_item.lod, 'name', None)
+    rev = cvs_item.rev
+  else:
+    lod_name = cvs_item.symbol.name
+    rev = cvs_item.get_cvs_revision_source(Ctx()._cvs_items_db).rev
+  return (
+      type(cvs_item).__name__,
+      cvs_item.cvs_file.project.id, cvs_item.cvs_file.cvs_path,
+      lod_name, rev,
+      )
+
+
+def get_commit_digest(svn_commit):
+  """Return a digest of the parts of SVN_COMMIT that determine the output.
+
+  The digest covers the type, date, author and log message of the
+  commit and the files, revisions, and lines of development of its
+  CVSItems.  It does not depend on the ids of CVSItems, which change
+  from one conversion to the next when ,v files are added or
+  changed."""
+
+  items = [
+      _describe_cvs_item(cvs_item)
+      for cvs_item in svn_commit.get_cvs_items()
+      ]
+  items.sort()
+  if isinstance(svn_commit, SVNPostCommit):
+    motivating_revnum = svn_commit.motivating_revnum
+  else:
+    motivating_revnum = None
+  return sha1(repr((
+      type(svn_commit).__name__, svn_commit.date, motivating_revnum,
+      svn_commit.get_author(), svn_commit.get_log_msg(), items,
+      ))).digest()
+
+
+def check_commit_digest(previous_state, svn_commit, digest):
+  """Verify that the previous conversion output SVN_COMMIT with DIGEST.
+
+  SVN_COMMIT must be one of the commits that were output by the
+  conversion that wrote PREVIOUS_STATE.  Raise a FatalError if its
+  digest differs from the one that was recorded."""
+
+  if previous_state.commit_digests[svn_commit.revnum - 1] != digest:
+    raise FatalError(
+        'Revision %d differs from the revision that was output by the '
+        'previous\n'
+        'conversion, so the new commits cannot be appended to it.  '
+        'Please run a\n'
+        'full conversion (without the state file %r).'
+        % (svn_commit.revnum, Ctx().incremental_state,)
+        )
+
+
@@ -24,6 +24,10 @@ from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.record_table import FileOffsetPacker
 from cvs2svn_lib.record_table import RecordTable
+from cvs2svn_lib.metrics import StorageMetrics
+from cvs2svn_lib.metrics import get_name
+from cvs2svn_lib.checkpoint import sync_file
+from cvs2svn_lib.checkpoint import reopen_file
 
 
 class IndexedDatabase:
@@ -58,6 +62,7 @@ class IndexedDatabase:
     self.filename = filename
     self.index_filename = index_filename
     self.mode = mode
+    self._metrics = StorageMetrics(get_name(self.__class__, self.filename))
     if self.mode == DB_OPEN_NEW:
       self.f = open(self.filename, 'wb+')
     elif self.mode == DB_OPEN_WRITE:
@@ -87,24 +92,65 @@ class IndexedDatabase:
   def __setitem__(self, index, item):
     """Write ITEM into the database indexed by INDEX."""
 
+    metrics = self._metrics
     # Make sure we're at the end of the file:
     if self.fp != self.eofp:
       self.f.seek(self.eofp)
+      metrics.seeks.value += 1
     self.index_table[index] = self.eofp
+    metrics.serialize.start()
     s = self.serializer.dumps(item)
+    metrics.serialize.stop()
     self.f.write(s)
+    metrics.writes.value += 1
+    metrics.bytes_written.value += len(s)
     self.eofp += len(s)
     self.fp = self.eofp
 
+  def set_many(self, items):
+    """Write the (index, item) pairs in ITEMS into the database.
+
+    This is equivalent to calling __setitem__() for each pair, but the
+    serialized items are written to the file in a single call."""
+
+    metrics = self._metrics
+    # Make sure we're at the end of the file:
+    if self.fp != self.eofp:
+      self.f.seek(self.eofp)
+      metrics.seeks.value += 1
+    dumps = self.serializer.dumps
+    index_table = self.index_table
+    pieces = []
+    offset = self.eofp
+    metrics.serialize.start()
+    for (index, item) in items:
+      s = dumps(item)
+      index_table[index] = offset
+      pieces.append(s)
+      offset += len(s)
+    metrics.serialize.stop()
+    self.f.write(''.join(pieces))
+    metrics.writes.value += len(pieces)
+    metrics.bytes_written.value += offset - self.eofp
+    self.eofp = offset
+    self.fp = self.eofp
+
   def _fetch(self, offset):
+    metrics = self._metrics
     if self.fp != offset:
       self.f.seek(offset)
+      metrics.seeks.value += 1
 
     # There is no easy way to tell how much data will be read, so just
     # indicate that we don't know the current file pointer:
     self.fp = None
 
-    return self.serializer.loadf(self.f)
+    metrics.deserialize.start()
+    item = self.serializer.loadf(self.f)
+    metrics.deserialize.stop()
+    metrics.reads.value += 1
+    metrics.bytes_read.value += self.f.tell() - offset
+    return item
 
   def iterkeys(self):
     return self.index_table.iterkeys()
@@ -144,6 +190,36 @@ class IndexedDatabase:
     # We don't actually free the data in self.f.
     del self.index_table[index]
 
+  def __getstate__(self):
+    """Write everything to disk and record how far the file extends.
+
+    See the checkpoint module.  When the instance is unpickled, items
+    that were added after this point are discarded; existing items
+    must not have been overwritten or deleted in the meantime."""
+
+    if self.mode != DB_OPEN_READ:
+      sync_file(self.f)
+    return (
+        self.filename, self.index_filename, self.mode, self.index_table,
+        self.eofp,
+        )
+
+  def __setstate__(self, state):
+    (
+        self.filename, self.index_filename, self.mode, self.index_table,
+        self.eofp,
+        ) = state
+    self._metrics = StorageMetrics(get_name(self.__class__, self.filename))
+    if self.mode == DB_OPEN_READ:
+      self.f = open(self.filename, 'rb')
+    else:
+      self.f = reopen_file(self.filename, self.eofp)
+      self.mode = DB_OPEN_WRITE
+    self.f.seek(0)
+    self.serializer = cPickle.load(self.f)
+    self.f.seek(self.eofp)
+    self.fp = self.eofp
+
   def close(self):
     self.index_table.close()
     self.index_table = None
@@ -0,0 +1,120 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a database of deduplicated log message texts."""
+
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
+from cvs2svn_lib import config
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.common import DB_OPEN_NEW
+from cvs2svn_lib.indexed_database import IndexedDatabase
+from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib.serializer import StringSerializer
+from cvs2svn_lib.digest_index import DigestIndex
+from cvs2svn_lib.lru_cache import LRUCache
+
+
+class LogMessageDatabase:
+  """A database of log message texts, indexed by small integer ids.
+
+  Many Metadata records typically share a log message (for example,
+  when the same commit touches several branches or projects and
+  cross-branch or cross-project commits are disabled).  Therefore the
+  texts are stored separately, and Metadata instances only refer to
+  them by id.
+
+  In DB_OPEN_NEW mode, add() stores each distinct text only once,
+  using a DigestIndex {sha1 digest : id} to recognize texts that have
+  been seen before.  Long texts are compressed.  Texts that are read
+  are kept in a small LRU cache, because consecutive commits often
+  refer to the same text."""
+
+  # The minimum length of texts that are compressed:
+  MIN_COMPRESS_SIZE = 256
+
+  # The maximum total length of the texts held in the read cache:
+  CACHE_MEMORY = 1024 * 1024
+
+  def __init__(self, store_filename, index_table_filename, mode):
+    self.mode = mode
+    self._db = IndexedDatabase(
+        store_filename, index_table_filename, mode,
+        StringSerializer(self.MIN_COMPRESS_SIZE),
+        )
+
+    if self.mode == DB_OPEN_NEW:
+      # A map { digest : id } of the texts stored so far:
+      self._digest_to_id = DigestIndex(
+          tmpdir=Ctx().get_temp_dir(config.DIGEST_INDEX_TABLES),
+          )
+      self._key_generator = KeyGenerator()
+    else:
+      self._digest_to_id = None
+      self._key_generator = None
+
+    # A cache { id : log_msg } of recently-used texts:
+    self._cache = LRUCache(self.CACHE_MEMORY)
+
+  def add(self, log_msg):
+    """Store LOG_MSG if it is not already present, and return its id."""
+
+    digest = sha1(log_msg).digest()
+    id = self._digest_to_id.get(digest)
+    if id is None:
+      id = self._key_generator.gen_id()
+      self._digest_to_id[digest] = id
+      self._db[id] = log_msg
+    return id
+
+  def set_many(self, items):
+    """Store the (id, log_msg) pairs in ITEMS, without deduplication."""
+
+    self._db.set_many(items)
+
+  def iterkeys(self):
+    return self._db.iterkeys()
+
+  def __getitem__(self, id):
+    try:
+      return self._cache[id]
+    except KeyError:
+      log_msg = self._db[id]
+      self._cache.set(id, log_msg, len(log_msg))
+      return log_msg
+
+  def __getstate__(self):
+    # Don't store the cache (see the checkpoint module):
+    return (self.mode, self._db, self._digest_to_id, self._key_generator,)
+
+  def __setstate__(self, state):
+    (self.mode, self._db, self._digest_to_id, self._key_generator,) = state
+    self._cache = LRUCache(self.CACHE_MEMORY)
+
+  def close(self):
+    if self._digest_to_id is not None:
+      self._digest_to_id.close()
+      self._digest_to_id = None
+    self._key_generator = None
+    self._cache = None
+    self._db.close()
+    self._db = None
+
+
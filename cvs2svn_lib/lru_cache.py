@@ -0,0 +1,168 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a size-bounded least-recently-used cache."""
+
+
+# Indexes into the list objects used as links in LRUCache:
+_PREV = 0
+_NEXT = 1
+_KEY = 2
+_VALUE = 3
+_SIZE = 4
+
+
+class LRUCache(object):
+  """A map {key : value} that evicts the least recently used entries.
+
+  Each entry is charged a size (in arbitrary units, typically bytes)
+  when it is stored.  Whenever the total size of the entries exceeds
+  MAX_SIZE, the least recently used entries are discarded until the
+  total fits again.  Looking up an entry (via __getitem__() or get())
+  makes it the most recently used one.
+
+  The recency order is kept in a circular doubly-linked list of small
+  lists [prev, next, key, value, size], with self._root as a sentinel.
+  This keeps all operations O(1).
+
+  The cache also counts hits, misses and evictions, for reporting."""
+
+  def __init__(self, max_size):
+    self.max_size = max_size
+
+    # The total size of the entries currently in the cache:
+    self.size = 0
+
+    # A map {key : link}:
+    self._map = {}
+
+    self._root = [None, None, None, None, 0]
+    self._root[_PREV] = self._root
+    self._root[_NEXT] = self._root
+
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def __len__(self):
+    return len(self._map)
+
+  def __contains__(self, key):
+    return key in self._map
+
+  def _unlink(self, link):
+    link[_PREV][_NEXT] = link[_NEXT]
+    link[_NEXT][_PREV] = link[_PREV]
+
+  def _link_at_front(self, link):
+    root = self._root
+    first = root[_NEXT]
+    link[_PREV] = root
+    link[_NEXT] = first
+    first[_PREV] = link
+    root[_NEXT] = link
+
+  def __getitem__(self, key):
+    """Return the value for KEY, marking it most recently used.
+
+    Raise KeyError if KEY is not in the cache."""
+
+    try:
+      link = self._map[key]
+    except KeyError:
+      self.misses += 1
+      raise
+
+    self.hits += 1
+    if link is not self._root[_NEXT]:
+      self._unlink(link)
+      self._link_at_front(link)
+    return link[_VALUE]
+
+  def get(self, key, default=None):
+    try:
+      return self[key]
+    except KeyError:
+      return default
+
+  def set(self, key, value, size=1):
+    """Store VALUE under KEY, charging SIZE against the cache budget.
+
+    The new entry becomes the most recently used one.  Older entries
+    are evicted as needed to keep the total size within max_size (but
+    the new entry itself is never evicted by this call)."""
+
+    link = self._map.get(key)
+    if link is not None:
+      self._unlink(link)
+      self.size -= link[_SIZE]
+      link[_VALUE] = value
+      link[_SIZE] = size
+    else:
+      link = [None, None, key, value, size]
+      self._map[key] = link
+    self._link_at_front(link)
+    self.size += size
+    self._shrink(link)
+
+  __setitem__ = set
+
+  def _shrink(self, keep=None):
+    """Evict least recently used entries until the cache fits.
+
+    Never evict the link KEEP."""
+
+    root = self._root
+    while self.size > self.max_size:
+      link = root[_PREV]
+      if link is root or link is keep:
+        break
+      self._unlink(link)
+      del self._map[link[_KEY]]
+      self.size -= link[_SIZE]
+      self.evictions += 1
+
+  def resize(self, max_size):
+    """Change the size budget to MAX_SIZE, evicting entries if needed."""
+
+    self.max_size = max_size
+    self._shrink()
+
+  def __delitem__(self, key):
+    link = self._map.pop(key)
+    self._unlink(link)
+    self.size -= link[_SIZE]
+
+  def clear(self):
+    self._map.clear()
+    self._root[_PREV] = self._root
+    self._root[_NEXT] = self._root
+    self.size = 0
+
+  def get_stats(self):
+    """Return a string summarizing the cache's hits and misses."""
+
+    lookups = self.hits + self.misses
+    if lookups:
+      hit_rate = 100.0 * self.hits / lookups
+    else:
+      hit_rate = 0.0
+    return (
+        '%d lookups, %d hits (%.1f%%), %d misses, %d evictions'
+        % (lookups, self.hits, hit_rate, self.misses, self.evictions,)
+        )
+
+
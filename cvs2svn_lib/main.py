@@ -34,12 +34,18 @@ from cvs2svn_lib.bzr_run_options import BzrRunOptions
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.pass_manager import PassManager
 from cvs2svn_lib.passes import passes
+from cvs2svn_lib.estimate import estimate_conversion
 
 
 def main(progname, run_options, pass_manager):
   # Convenience var, so we don't have to keep instantiating this Borg.
   ctx = Ctx()
 
+  if ctx.estimate:
+    # Only scan the repository; no temporary files are needed:
+    estimate_conversion(run_options, pass_manager)
+    return
+
   # Make sure the tmp directory exists.  Note that we don't check if
   # it's empty -- we want to be able to use, for example, "." to hold
   # tempfiles.
@@ -80,7 +86,21 @@ def main(progname, run_options, pass_manager):
           % (ctx.tmpdir, ctx.tmpdir, ctx.tmpdir, ctx.tmpdir,))
     raise
 
+  # The other temporary directories (see --bulk-tmpdir and
+  # --artifact-tmpdir) that were created by this run:
+  created_dirs = []
+
   try:
+    for path in ctx.get_temp_dirs():
+      if not os.path.exists(path):
+        os.mkdir(path)
+        created_dirs.append(path)
+      elif not os.path.isdir(path):
+        raise FatalError(
+            "cvs2svn tried to use '%s' for temporary files, but that path\n"
+            "  exists and is not a directory."
+            % (path,))
+
     if run_options.profiling:
       try:
         import cProfile
@@ -105,6 +125,12 @@ def main(progname, run_options, pass_manager):
     except:
       pass
 
+    for path in created_dirs:
+      try:
+        os.rmdir(path)
+      except:
+        pass
+
     if erase_tmpdir:
       try:
         os.rmdir(ctx.tmpdir)
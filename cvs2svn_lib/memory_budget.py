@@ -0,0 +1,230 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module sizes the caches of each pass from a memory budget.
+
+Several classes keep a cache (or buffer) whose size is set by a class
+or module attribute: RecordTable.CACHE_MEMORY, _NodeDatabase's node
+cache, LogMessageDatabase's read cache, DigestIndex.MEMORY, the write
+buffer of NewCVSItemStore, and the number of lines that sort_file()
+sorts in memory.
+
+If Ctx().memory_limit is set, allocate_memory() is called at the start
+of each pass.  It divides CACHE_FRACTION of the limit among the caches
+that the pass declares in its 'caches' attribute, in proportion to
+their weights, and sets the corresponding attributes before the pass
+creates its objects.  The caches can be made larger or smaller than
+their defaults, but not smaller than their minimum sizes.  The caches
+that the pass does not use are reset to their defaults.  The rest of
+the limit is left for the fixed overhead: the interpreter and the data
+structures of the pass itself, which are not bounded by caches.  If
+the limit is too small even for the fixed overhead and the minimum
+cache sizes, a warning is emitted.
+
+The checkout database of the internal revision reader is not sized
+here: it is a dbm database on disk, whose in-memory cache belongs to
+the dbm library and cannot be set through the anydbm interface."""
+
+
+from cvs2svn_lib.common import warning_prefix
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.telemetry import get_rss
+from cvs2svn_lib import sort
+from cvs2svn_lib.record_table import RecordTable
+from cvs2svn_lib.digest_index import DigestIndex
+from cvs2svn_lib.log_msg_database import LogMessageDatabase
+from cvs2svn_lib.cvs_item_database import NewCVSItemStore
+from cvs2svn_lib.repository_mirror import _NodeDatabase
+
+
+# The fraction of the memory limit that is divided among the caches:
+CACHE_FRACTION = 0.5
+
+# The memory used by the interpreter and cvs2svn's modules, which is
+# assumed as the fixed overhead of a pass if the memory that the
+# process already uses cannot be measured:
+BASE_MEMORY = 32 * 1024 * 1024
+
+
+class CacheConsumer(object):
+  """A cache whose size is set by an attribute of OWNER.
+
+  Members:
+
+    name -- the name by which passes refer to this cache.
+
+    owner -- the class or module having the attribute.
+
+    attribute -- the name of the attribute that holds the size.
+
+    weight -- the relative share of the budget that this cache gets,
+        compared to the other caches used by the same pass.
+
+    instances -- the number of instances that typically exist at the
+        same time; each one gets an equal part of the share.
+
+    unit -- the plural noun describing a unit of the attribute.
+
+    unit_size -- the number of bytes per unit of the attribute (e.g.,
+        per line for the sort buffer).
+
+    default -- the value of the attribute when the module was loaded.
+
+    minimum -- the smallest value that is allocated, below which the
+        cache would be too small to be useful.
+
+    maximum -- the largest value that is allocated, beyond which more
+        memory would not help, or None if there is no such value."""
+
+  def __init__(
+        self, name, owner, attribute, weight, minimum, maximum=None,
+        instances=1, unit='bytes', unit_size=1,
+        ):
+    self.name = name
+    self.owner = owner
+    self.attribute = attribute
+    self.weight = weight
+    self.minimum = minimum
+    self.maximum = maximum
+    self.instances = instances
+    self.unit = unit
+    self.unit_size = unit_size
+    self.default = getattr(owner, attribute)
+
+  def set(self, value):
+    setattr(self.owner, self.attribute, value)
+
+  def reset(self):
+    self.set(self.default)
+
+  def allocate(self, memory):
+    """Set the attribute so that all instances use about MEMORY bytes.
+
+    The value is kept between self.minimum and self.maximum.  Return
+    the new value of the attribute."""
+
+    value = max(
+        int(memory // (self.instances * self.unit_size)), self.minimum
+        )
+    if self.maximum is not None:
+      value = min(value, self.maximum)
+    self.set(value)
+    return value
+
+  def get_minimum_memory(self):
+    """Return the memory used by all instances at the minimum size."""
+
+    return self.minimum * self.instances * self.unit_size
+
+  def describe(self, value):
+    if self.unit_size == 1:
+      amount = '%.1f MiB' % (value / 1048576.0,)
+    else:
+      amount = '%d %s (about %.1f MiB)' % (
+          value, self.unit, value * self.unit_size / 1048576.0,
+          )
+    if self.instances > 1:
+      amount += ' each (x%d)' % (self.instances,)
+    return '%s.%s = %s' % (self.name, self.attribute, amount,)
+
+
+# The caches that can be sized, keyed by name:
+CONSUMERS = {}
+
+for consumer in [
+    # Many IndexedDatabases (each of which has a RecordTable for its
+    # index) are open at the same time in most passes:
+    CacheConsumer(
+        'RecordTable', RecordTable, 'CACHE_MEMORY', 1, 256 * 1024,
+        instances=8,
+        ),
+    # A DigestIndex that exceeds its memory is moved to a temporary
+    # file, which only works well if the memory holds a fair part of
+    # the table:
+    CacheConsumer(
+        'DigestIndex', DigestIndex, 'MEMORY', 2, 4 * 1024 * 1024,
+        instances=2,
+        ),
+    CacheConsumer(
+        'LogMessageDatabase', LogMessageDatabase, 'CACHE_MEMORY', 1,
+        64 * 1024,
+        ),
+    CacheConsumer(
+        'NodeDatabase', _NodeDatabase, 'CACHE_MEMORY', 4, 1024 * 1024,
+        ),
+    # A write buffer larger than a few MiB doesn't make writing faster:
+    CacheConsumer(
+        'NewCVSItemStore', NewCVSItemStore, 'BUFFER_SIZE', 1, 8 * 1024,
+        maximum=4 * 1024 * 1024,
+        ),
+    # A line being sorted takes about this many bytes, including the
+    # overhead of the string object and of the list holding it:
+    CacheConsumer(
+        'sort', sort, 'BUFFER_SIZE', 1, 1000, unit='lines', unit_size=200,
+        ),
+    ]:
+  CONSUMERS[consumer.name] = consumer
+
+del consumer
+
+
+def allocate_memory(the_pass, pass_num, memory_limit):
+  """Size the caches used by THE_PASS to fit within MEMORY_LIMIT bytes.
+
+  PASS_NUM is the number of the pass, which is only used for logging.
+  If MEMORY_LIMIT is None, leave the caches at their current sizes."""
+
+  if memory_limit is None:
+    return
+
+  active = [CONSUMERS[name] for name in the_pass.caches]
+  for consumer in CONSUMERS.itervalues():
+    if consumer not in active:
+      consumer.reset()
+
+  if not active:
+    return
+
+  # The memory that the process already uses is a lower bound for the
+  # fixed overhead of the pass:
+  overhead = get_rss()
+  if overhead is None or overhead < BASE_MEMORY:
+    overhead = BASE_MEMORY
+  minimum_caches = sum([consumer.get_minimum_memory() for consumer in active])
+  if memory_limit < overhead + minimum_caches:
+    budget = 0
+    logger.warn(
+        '%s: the memory limit of %.1f MiB is below the fixed overhead of '
+        'pass %d (%s), about %.1f MiB plus %.1f MiB for the smallest '
+        'caches; the caches are set to their minimum sizes.'
+        % (warning_prefix, memory_limit / 1048576.0, pass_num,
+           the_pass.name, overhead / 1048576.0, minimum_caches / 1048576.0,)
+        )
+  else:
+    budget = min(memory_limit * CACHE_FRACTION, memory_limit - overhead)
+
+  total_weight = sum([consumer.weight for consumer in active])
+  lines = []
+  for consumer in active:
+    value = consumer.allocate(budget * consumer.weight / total_weight)
+    lines.append('    %s' % (consumer.describe(value),))
+  logger.verbose(
+      'Memory budget for pass %d (%s), %.1f MiB of %.1f MiB for caches:\n%s'
+      % (pass_num, the_pass.name, budget / 1048576.0,
+         memory_limit / 1048576.0, '\n'.join(lines),)
+      )
+
+
@@ -18,9 +18,14 @@
 
 
 class Metadata(object):
-  def __init__(self, id, author, log_msg):
+  """The author and log message shared by some CVSRevisions.
+
+  The log message itself is stored in a LogMessageDatabase; LOG_MSG_ID
+  is its id there."""
+
+  def __init__(self, id, author, log_msg_id):
     self.id = id
     self.author = author
-    self.log_msg = log_msg
+    self.log_msg_id = log_msg_id
 
 
@@ -22,26 +22,59 @@ try:
 except ImportError:
   from sha import new as sha1
 
+from cvs2svn_lib import config
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.indexed_database import IndexedDatabase
+from cvs2svn_lib.digest_index import DigestIndex
 from cvs2svn_lib.key_generator import KeyGenerator
 from cvs2svn_lib.serializer import PrimedPickleSerializer
 from cvs2svn_lib.metadata import Metadata
 
 
-def MetadataDatabase(store_filename, index_table_filename, mode):
+class MetadataDatabase:
   """A database to store Metadata instances that describe CVSRevisions.
 
   This database manages a map
 
       id -> Metadata instance
 
-  where id is a unique identifier for the metadata."""
+  where id is a unique identifier for the metadata.  The log messages
+  themselves are kept in a separate LogMessageDatabase, LOG_MSG_DB,
+  and are only read when get_log_msg() is called.  LOG_MSG_DB is
+  closed along with this database.  It may be None if the log messages
+  are not needed."""
 
-  return IndexedDatabase(
-      store_filename, index_table_filename,
-      mode, PrimedPickleSerializer((Metadata,)),
-      )
+  def __init__(self, store_filename, index_table_filename, mode,
+               log_msg_db=None):
+    self._db = IndexedDatabase(
+        store_filename, index_table_filename,
+        mode, PrimedPickleSerializer((Metadata,)),
+        )
+    self.log_msg_db = log_msg_db
+
+  def __getitem__(self, id):
+    return self._db[id]
+
+  def __setitem__(self, id, metadata):
+    self._db[id] = metadata
+
+  def set_many(self, items):
+    self._db.set_many(items)
+
+  def iterkeys(self):
+    return self._db.iterkeys()
+
+  def get_log_msg(self, metadata):
+    """Return the log message of METADATA, a Metadata instance."""
+
+    return self.log_msg_db[metadata.log_msg_id]
+
+  def close(self):
+    self._db.close()
+    self._db = None
+    if self.log_msg_db is not None:
+      self.log_msg_db.close()
+      self.log_msg_db = None
 
 
 class MetadataLogger:
@@ -60,6 +93,10 @@ class MetadataLogger:
   metadata database under that ID, record the mapping {digest : id},
   and return the new id.
 
+  The map {digest : id} is a DigestIndex, which stores a truncated
+  digest and the id in a compact table that is moved to a temporary
+  file if it outgrows its memory budget.
+
   What metadata is included in the digest?  The author, log_msg,
   project_id (if Ctx().cross_project_commits is not set), and
   branch_name (if Ctx().cross_branch_commits is not set)."""
@@ -68,7 +105,9 @@ class MetadataLogger:
     self._metadata_db = metadata_db
 
     # A map { digest : id }:
-    self._digest_to_id = {}
+    self._digest_to_id = DigestIndex(
+        tmpdir=Ctx().get_temp_dir(config.DIGEST_INDEX_TABLES),
+        )
 
     # A key_generator to generate keys for metadata that haven't been
     # seen yet:
@@ -90,13 +129,18 @@ class MetadataLogger:
       key.append(branch_name or '')
 
     digest = sha1('\0'.join(key)).digest()
-    try:
-      # See if it is already known:
-      return self._digest_to_id[digest]
-    except KeyError:
+    # See if it is already known:
+    id = self._digest_to_id.get(digest)
+    if id is None:
       id = self.key_generator.gen_id()
       self._digest_to_id[digest] = id
-      self._metadata_db[id] = Metadata(id, author, log_msg)
-      return id
+      self._metadata_db[id] = Metadata(
+          id, author, self._metadata_db.log_msg_db.add(log_msg)
+          )
+    return id
+
+  def close(self):
+    self._digest_to_id.close()
+    self._digest_to_id = None
 
 
@@ -0,0 +1,247 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a registry of named counters and timers.
+
+The storage classes (RecordTable, IndexedDatabase, etc.) use these to
+count their reads, writes, seeks, bytes, and cache hits and misses,
+and to measure the time spent serializing and deserializing.  The
+values are reset at the start of each pass and recorded with the
+pass's telemetry (see the telemetry module), so that it is possible to
+see which files are responsible for the I/O of a pass.
+
+Counters and timers are looked up by name once (usually when the
+object that uses them is created) and then updated directly, which
+is cheap enough for inner loops:
+
+    self._reads = get_counter('RecordTable(%s).reads' % (basename,))
+    ...
+    self._reads.value += 1
+
+Names have the form 'CLASS(ARTIFACT).QUANTITY'.  Objects of the same
+class that use the same file share their counters."""
+
+
+import sys
+import os
+import time
+
+
+def _get_monotonic_clock():
+  """Return a function returning seconds from a monotonic clock, or None.
+
+  time.monotonic() is only available in Python 3.3 and later.  On
+  older versions, use clock_gettime(CLOCK_MONOTONIC) from the C
+  library via ctypes, which is only attempted on Linux because the
+  value of CLOCK_MONOTONIC differs between platforms."""
+
+  if hasattr(time, 'monotonic'):
+    return time.monotonic
+
+  if not sys.platform.startswith('linux'):
+    return None
+
+  try:
+    import ctypes
+    import ctypes.util
+
+    class timespec(ctypes.Structure):
+      _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c'))
+    clock_gettime = libc.clock_gettime
+  except (ImportError, OSError, AttributeError):
+    return None
+
+  # Linux's value of CLOCK_MONOTONIC:
+  CLOCK_MONOTONIC = 1
+
+  ts = timespec()
+  ts_ref = ctypes.byref(ts)
+  if clock_gettime(CLOCK_MONOTONIC, ts_ref) != 0:
+    return None
+
+  # The argument types are not declared because converting them would
+  # make each call several times slower:
+  def monotonic():
+    clock_gettime(CLOCK_MONOTONIC, ts_ref)
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+  return monotonic
+
+
+# The clock used by Timers.  If no monotonic clock is available, fall
+# back to time.time(); then a timer that is running while the system
+# clock is set (e.g., by NTP) records a wrong, possibly negative,
+# duration.
+_clock = _get_monotonic_clock() or time.time
+
+
+class Counter(object):
+  """A named number that can be incremented."""
+
+  __slots__ = ['name', 'value']
+
+  def __init__(self, name):
+    self.name = name
+    self.value = 0
+
+
+class Timer(object):
+  """A named accumulator of elapsed time.
+
+  Call start() and stop() around each timed operation, or add time
+  measured some other way using add().  Durations are measured with a
+  monotonic clock where one is available (see _clock)."""
+
+  __slots__ = ['name', 'count', 'total', '_start']
+
+  def __init__(self, name):
+    self.name = name
+    # The number of operations timed, and their total duration in
+    # seconds:
+    self.count = 0
+    self.total = 0.0
+    self._start = None
+
+  def start(self):
+    self._start = _clock()
+
+  def stop(self):
+    self.total += _clock() - self._start
+    self.count += 1
+
+  def add(self, duration):
+    self.total += duration
+    self.count += 1
+
+
+# Maps { name : Counter } and { name : Timer } of all counters and
+# timers that have been used:
+_counters = {}
+_timers = {}
+
+
+def get_counter(name):
+  """Return the Counter called NAME, creating it if necessary."""
+
+  try:
+    return _counters[name]
+  except KeyError:
+    counter = _counters[name] = Counter(name)
+    return counter
+
+
+def get_timer(name):
+  """Return the Timer called NAME, creating it if necessary."""
+
+  try:
+    return _timers[name]
+  except KeyError:
+    timer = _timers[name] = Timer(name)
+    return timer
+
+
+def get_name(klass, filename):
+  """Return the prefix for the names of the metrics of a storage object.
+
+  KLASS is the class of the object and FILENAME the name of the file
+  that it uses.  The directory part of the filename is omitted."""
+
+  return '%s(%s)' % (klass.__name__, os.path.basename(filename),)
+
+
+class StorageMetrics(object):
+  """The counters and timers of a storage object, named after PREFIX.
+
+  Members:
+
+    reads, writes -- Counters of the records read and written.
+
+    bytes_read, bytes_written -- Counters of the bytes read and
+        written.
+
+    seeks -- Counter of the seeks in the underlying file.
+
+    cache_hits, cache_misses -- Counters of the lookups that were and
+        were not satisfied by an in-memory cache.
+
+    serialize, deserialize -- Timers of the time spent converting
+        records to and from their stored form.
+
+  """
+
+  __slots__ = [
+      'reads', 'writes', 'bytes_read', 'bytes_written', 'seeks',
+      'cache_hits', 'cache_misses', 'serialize', 'deserialize',
+      ]
+
+  def __init__(self, prefix):
+    for name in [
+          'reads', 'writes', 'bytes_read', 'bytes_written', 'seeks',
+          'cache_hits', 'cache_misses',
+          ]:
+      setattr(self, name, get_counter('%s.%s' % (prefix, name,)))
+    for name in ['serialize', 'deserialize']:
+      setattr(self, name, get_timer('%s.%s' % (prefix, name,)))
+
+
+def reset():
+  """Set all counters and timers back to zero."""
+
+  for counter in _counters.itervalues():
+    counter.value = 0
+  for timer in _timers.itervalues():
+    timer.count = 0
+    timer.total = 0.0
+
+
+def snapshot():
+  """Return the current values of the counters and timers that were used.
+
+  Return a tuple (counters, timers), where COUNTERS is a map {name :
+  value} and TIMERS is a map {name : (count, total)}.  Counters and
+  timers that are zero are omitted."""
+
+  counters = {}
+  for (name, counter) in _counters.iteritems():
+    if counter.value:
+      counters[name] = counter.value
+  timers = {}
+  for (name, timer) in _timers.iteritems():
+    if timer.count:
+      timers[name] = (timer.count, timer.total,)
+  return (counters, timers,)
+
+
+def format_snapshot(counters, timers):
+  """Return a description of COUNTERS and TIMERS (see snapshot())."""
+
+  lines = []
+  names = counters.keys()
+  names.sort()
+  for name in names:
+    lines.append('    %-60s %14d' % (name, counters[name],))
+  names = timers.keys()
+  names.sort()
+  for name in names:
+    (count, total) = timers[name]
+    lines.append(
+        '    %-60s %14.3f s (%d)' % (name, total, count,)
+        )
+  return '\n'.join(lines)
+
+
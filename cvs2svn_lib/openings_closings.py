@@ -17,11 +17,15 @@
 """This module contains classes to keep track of symbol openings/closings."""
 
 
-import cPickle
+import struct
 
 from cvs2svn_lib import config
+from cvs2svn_lib.common import DB_OPEN_NEW
+from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.artifact_manager import artifact_manager
+from cvs2svn_lib.record_table import Packer
+from cvs2svn_lib.record_table import RecordTable
 from cvs2svn_lib.svn_revision_range import SVNRevisionRange
 
 
@@ -29,6 +33,49 @@ from cvs2svn_lib.svn_revision_range import SVNRevisionRange
 OPENING = 'O'
 CLOSING = 'C'
 
+# The format of the fixed-length records in SYMBOL_OPENINGS_CLOSINGS:
+# (symbol_id, svn_revnum, type, cvs_symbol_id).  The fields are
+# big-endian so that sorting the records as strings sorts them by
+# symbol_id, then svn_revnum, then type, then cvs_symbol_id.
+RECORD_FORMAT = '>IIcI'
+RECORD_LEN = struct.calcsize(RECORD_FORMAT)
+
+try:
+  _unpack_record_from = struct.Struct(RECORD_FORMAT).unpack_from
+except AttributeError:
+  # Python 2.4 doesn't have struct.Struct:
+  def _unpack_record_from(buffer, offset):
+    return struct.unpack(RECORD_FORMAT, buffer[offset:offset + RECORD_LEN])
+
+
+def get_record_symbol_id(record):
+  """Return the symbol_id from RECORD, a SYMBOL_OPENINGS_CLOSINGS record.
+
+  RECORD need only contain the first four bytes of the record."""
+
+  return struct.unpack('>I', record[:4])[0]
+
+
+class SymbolingsOffsetPacker(Packer):
+  """Pack (first_record, record_count) pairs for SYMBOL_OFFSETS_DB.
+
+  FIRST_RECORD is the index (not the byte offset) of the first record
+  for a symbol in SYMBOL_OPENINGS_CLOSINGS_SORTED, and RECORD_COUNT is
+  the number of records for that symbol.  Since every symbol that is
+  recorded has at least one record, an all-zero record can be used to
+  mark symbols that have none."""
+
+  FORMAT = '=II'
+
+  def __init__(self):
+    Packer.__init__(self, struct.calcsize(self.FORMAT))
+
+  def pack(self, v):
+    return struct.pack(self.FORMAT, *v)
+
+  def unpack(self, s):
+    return struct.unpack(self.FORMAT, s)
+
 
 class SymbolingsLogger:
   """Manage the file that contains lines for symbol openings and closings.
@@ -71,7 +118,7 @@ class SymbolingsLogger:
 
   def __init__(self):
     self.symbolings = open(
-        artifact_manager.get_temp_file(config.SYMBOL_OPENINGS_CLOSINGS), 'w')
+        artifact_manager.get_temp_file(config.SYMBOL_OPENINGS_CLOSINGS), 'wb')
 
   def log_revision(self, cvs_rev, svn_revnum):
     """Log any openings and closings found in CVS_REV."""
@@ -91,14 +138,14 @@ class SymbolingsLogger:
   def _log(self, symbol_id, cvs_symbol_id, svn_revnum, type):
     """Log an opening or closing to self.symbolings.
 
-    Write out a single line to the symbol_openings_closings file
+    Write out a single record to the symbol_openings_closings file
     representing that SVN_REVNUM is either the opening or closing
     (TYPE) of CVS_SYMBOL_ID for SYMBOL_ID.
 
     TYPE should be one of the following constants: OPENING or CLOSING."""
 
     self.symbolings.write(
-        '%x %d %s %x\n' % (symbol_id, svn_revnum, type, cvs_symbol_id)
+        struct.pack(RECORD_FORMAT, symbol_id, svn_revnum, type, cvs_symbol_id)
         )
 
   def _log_opening(self, symbol_id, cvs_symbol_id, svn_revnum):
@@ -120,6 +167,58 @@ class SymbolingsLogger:
     self.symbolings = None
 
 
+class SymbolingsIndexer:
+  """Write SYMBOL_OFFSETS_DB for SYMBOL_OPENINGS_CLOSINGS_SORTED.
+
+  SYMBOL_OFFSETS_DB is a RecordTable mapping each symbol_id to the
+  range of records in SYMBOL_OPENINGS_CLOSINGS_SORTED that describe
+  that symbol, as a (first_record, record_count) pair."""
+
+  def __init__(self):
+    self.offsets = RecordTable(
+        artifact_manager.get_temp_file(config.SYMBOL_OFFSETS_DB),
+        DB_OPEN_NEW, SymbolingsOffsetPacker(),
+        )
+
+  def index(self, symbol_visitor=None):
+    """Read SYMBOL_OPENINGS_CLOSINGS_SORTED and record the symbol ranges.
+
+    If SYMBOL_VISITOR is specified, call it with the symbol_id of each
+    symbol as it is encountered."""
+
+    f = open(
+        artifact_manager.get_temp_file(
+            config.SYMBOL_OPENINGS_CLOSINGS_SORTED),
+        'rb')
+    try:
+      # Read only the symbol_id of each record:
+      old_id = None
+      first = 0
+      i = 0
+      while True:
+        block = f.read(RECORD_LEN * 4096)
+        if not block:
+          break
+        for offset in xrange(0, len(block), RECORD_LEN):
+          id = get_record_symbol_id(block[offset:offset + 4])
+          if id != old_id:
+            if old_id is not None:
+              self.offsets[old_id] = (first, i - first)
+            if symbol_visitor is not None:
+              symbol_visitor(id)
+            old_id = id
+            first = i
+          i += 1
+      if old_id is not None:
+        self.offsets[old_id] = (first, i - first)
+    finally:
+      f.close()
+
+  def close(self):
+    self.offsets.close()
+    self.offsets = None
+
+
 class SymbolingsReader:
   """Provides an interface to retrieve symbol openings and closings.
 
@@ -129,51 +228,45 @@ class SymbolingsReader:
   given symbolic name and SVN revision number range."""
 
   def __init__(self):
-    """Opens the SYMBOL_OPENINGS_CLOSINGS_SORTED for reading, and
-    reads the offsets database into memory."""
+    """Open SYMBOL_OPENINGS_CLOSINGS_SORTED and SYMBOL_OFFSETS_DB."""
 
     self.symbolings = open(
         artifact_manager.get_temp_file(
             config.SYMBOL_OPENINGS_CLOSINGS_SORTED),
-        'r')
-    # The offsets_db is really small, and we need to read and write
-    # from it a fair bit, so suck it into memory
-    offsets_db = file(
-        artifact_manager.get_temp_file(config.SYMBOL_OFFSETS_DB), 'rb')
-    # A map from symbol_id to offset.  The values of this map are
-    # incremented as the openings and closings for a symbol are
-    # consumed.
-    self.offsets = cPickle.load(offsets_db)
-    offsets_db.close()
+        'rb')
+    self.offsets = RecordTable(
+        artifact_manager.get_temp_file(config.SYMBOL_OFFSETS_DB),
+        DB_OPEN_READ, SymbolingsOffsetPacker(),
+        )
 
   def close(self):
     self.symbolings.close()
     del self.symbolings
+    self.offsets.close()
     del self.offsets
 
   def _generate_lines(self, symbol):
-    """Generate the lines for SYMBOL.
+    """Generate the records for SYMBOL.
 
     SYMBOL is a TypedSymbol instance.  Yield the tuple (revnum, type,
-    cvs_symbol_id) for all openings and closings for SYMBOL."""
-
-    if symbol.id in self.offsets:
-      # Set our read offset for self.symbolings to the offset for this
-      # symbol:
-      self.symbolings.seek(self.offsets[symbol.id])
-
-      while True:
-        line = self.symbolings.readline().rstrip()
-        if not line:
-          break
-        (id, revnum, type, cvs_symbol_id) = line.split()
-        id = int(id, 16)
-        revnum = int(revnum)
-        if id != symbol.id:
-          break
-        cvs_symbol_id = int(cvs_symbol_id, 16)
-
-        yield (revnum, type, cvs_symbol_id)
+    cvs_symbol_id) for all openings and closings for SYMBOL.  All of
+    the symbol's records are read with a single read() call."""
+
+    try:
+      (first, count) = self.offsets[symbol.id]
+    except KeyError:
+      return
+
+    self.symbolings.seek(first * RECORD_LEN)
+    data = self.symbolings.read(count * RECORD_LEN)
+    if len(data) != count * RECORD_LEN:
+      raise InternalError(
+          'Truncated openings/closings data for %s' % (symbol,)
+          )
+
+    for offset in xrange(0, len(data), RECORD_LEN):
+      (id, revnum, type, cvs_symbol_id) = _unpack_record_from(data, offset)
+      yield (revnum, type, cvs_symbol_id)
 
   def get_range_map(self, svn_symbol_commit):
     """Return the ranges of all CVSSymbols in SVN_SYMBOL_COMMIT.
@@ -82,6 +82,16 @@ class OutputOption:
 
     raise NotImplementedError()
 
+  def set_replaying(self, replaying):
+    """Set whether the following commits should only be replayed.
+
+    While REPLAYING is True, commits are processed as usual to keep
+    the internal state of the output option up to date, but nothing is
+    output.  This is used for the commits that were already output by
+    the previous conversion (see --incremental-state)."""
+
+    raise NotImplementedError()
+
   def process_initial_project_commit(self, svn_commit):
     """Process SVN_COMMIT, which is an SVNInitialProjectCommit."""
 
@@ -127,6 +137,9 @@ class NullOutputOption(OutputOption):
   def setup(self, svn_rev_count):
     pass
 
+  def set_replaying(self, replaying):
+    pass
+
   def process_initial_project_commit(self, svn_commit):
     pass
 
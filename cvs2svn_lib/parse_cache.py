@@ -0,0 +1,278 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a persistent cache of parsed ,v files.
+
+When a conversion is run repeatedly on the same CVS repository (for
+example, while tuning the symbol handling options), most of the time
+spent in CollectRevsPass goes into parsing ,v files that have not
+changed since the last run.  The ParseCache (see --parse-cache)
+records the sequence of Sink callbacks that the RCS parser made for
+each file and replays them into the _FileDataCollector the next time,
+instead of parsing the file again.  Since the symbol transforms, the
+symbol hints, and the allocation of ids are all done by the
+_FileDataCollector, they are applied to the replayed callbacks in
+exactly the same way as to a fresh parse.
+
+A cache entry is used only if the path, size, and modification time
+of the ,v file are the same as when it was recorded, and if the
+digest of the file's admin and revision tree sections (everything
+before the 'desc' keyword) matches.  The texts of the deltas are not
+recorded; only whether each is empty."""
+
+
+import os
+import re
+import cPickle
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.rcsparser import Sink
+from cvs2svn_lib.rcsparser import parse
+
+
+# The version of the format of cache entries.  Entries written with a
+# different version are ignored:
+CACHE_FORMAT_VERSION = 1
+
+
+# A regular expression matching either the start of an RCS string or
+# the 'desc' keyword that follows the revision tree.
+_admin_end_re = re.compile(r'@|(?<![^\s;])desc(?=[\s@])')
+
+
+def get_admin_digest(filename, block_size=64 * 1024):
+  """Return the digest of the admin and tree sections of ,v file FILENAME.
+
+  These are the sections of the file that come before the 'desc'
+  keyword.  Only that part of the file is read.  RCS strings (which
+  might contain the word 'desc') are skipped.  If there is no 'desc'
+  keyword, return the digest of the whole file."""
+
+  f = open(filename, 'rb')
+  try:
+    data = ''
+    pos = 0
+    in_string = False
+    end = None
+    while end is None:
+      block = f.read(block_size)
+      data += block
+      eof = not block
+      while True:
+        if in_string:
+          i = data.find('@', pos)
+          if i == -1:
+            pos = len(data)
+            break
+          elif i + 1 == len(data) and not eof:
+            # We can't tell yet whether this is a doubled '@':
+            pos = i
+            break
+          elif data[i + 1:i + 2] == '@':
+            pos = i + 2
+          else:
+            in_string = False
+            pos = i + 1
+        else:
+          m = _admin_end_re.search(data, pos)
+          if m is None:
+            # Leave room for a 'desc' that is split across blocks:
+            pos = max(pos, len(data) - 4)
+            break
+          elif m.group() == '@':
+            in_string = True
+            pos = m.end()
+          else:
+            end = m.start()
+            break
+      if eof and end is None:
+        end = len(data)
+  finally:
+    f.close()
+
+  return sha1(data[:end]).digest()
+
+
+class _RecordingSink(Sink):
+  """A Sink that forwards its callbacks to another Sink and records them.
+
+  The callbacks are recorded in self.events as a list of tuples
+  (method_name, args).  The text passed to set_revision_info() is not
+  recorded, only whether it is empty (which is all that
+  _FileDataCollector needs to know)."""
+
+  def __init__(self, sink):
+    self.sink = sink
+    self.events = []
+
+  def _record(self, method_name, *args):
+    self.events.append((method_name, args,))
+    getattr(self.sink, method_name)(*args)
+
+  def set_head_revision(self, revision):
+    self._record('set_head_revision', revision)
+
+  def set_principal_branch(self, branch_name):
+    self._record('set_principal_branch', branch_name)
+
+  def set_access(self, accessors):
+    self._record('set_access', accessors)
+
+  def define_tag(self, name, revision):
+    self._record('define_tag', name, revision)
+
+  def set_locker(self, revision, locker):
+    self._record('set_locker', revision, locker)
+
+  def set_locking(self, mode):
+    self._record('set_locking', mode)
+
+  def set_comment(self, comment):
+    self._record('set_comment', comment)
+
+  def set_expansion(self, mode):
+    self._record('set_expansion', mode)
+
+  def admin_completed(self):
+    self._record('admin_completed')
+
+  def define_revision(self, revision, timestamp, author, state,
+                      branches, next):
+    self._record(
+        'define_revision', revision, timestamp, author, state,
+        branches, next,
+        )
+
+  def tree_completed(self):
+    self._record('tree_completed')
+
+  def set_description(self, description):
+    self._record('set_description', description)
+
+  def set_revision_info(self, revision, log, text):
+    if text:
+      self.events.append(('set_revision_info', (revision, log, '1',),))
+    else:
+      self.events.append(('set_revision_info', (revision, log, '',),))
+    self.sink.set_revision_info(revision, log, text)
+
+  def parse_completed(self):
+    self._record('parse_completed')
+
+
+class ParseCache:
+  """A directory holding the recorded parses of ,v files.
+
+  There is one cache entry per ,v file, stored in a file whose name is
+  derived from the path of the ,v file.  When a ,v file changes, its
+  entry is simply replaced.  Each entry is a pickled tuple
+
+      (CACHE_FORMAT_VERSION, rcs_path, size, mtime, admin_digest, events)
+
+  where EVENTS is the list recorded by _RecordingSink."""
+
+  def __init__(self, directory):
+    self.directory = directory
+    if not os.path.isdir(self.directory):
+      os.makedirs(self.directory)
+
+    # The number of files that were replayed from the cache and the
+    # number of files that had to be parsed:
+    self.hits = 0
+    self.misses = 0
+
+  def _get_entry_filename(self, rcs_path):
+    name = sha1(rcs_path).hexdigest()
+    return os.path.join(self.directory, name[:2], name[2:] + '.pck')
+
+  def _read_entry(self, filename):
+    """Return the entry stored in FILENAME, or None if it can't be read."""
+
+    try:
+      f = open(filename, 'rb')
+    except IOError:
+      return None
+    try:
+      try:
+        return cPickle.load(f)
+      except Exception:
+        # A corrupt entry (e.g., from an interrupted run) is treated
+        # like a missing one.
+        return None
+    finally:
+      f.close()
+
+  def _write_entry(self, filename, entry):
+    """Write ENTRY to FILENAME, replacing any previous entry atomically."""
+
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+      os.makedirs(dirname)
+    tmp_filename = '%s.%d.tmp' % (filename, os.getpid(),)
+    f = open(tmp_filename, 'wb')
+    cPickle.dump(entry, f, -1)
+    f.close()
+    try:
+      os.rename(tmp_filename, filename)
+    except OSError:
+      # On Windows, rename() fails if the target exists:
+      os.remove(filename)
+      os.rename(tmp_filename, filename)
+
+  def parse(self, cvs_file, sink):
+    """Feed the contents of the ,v file of CVS_FILE to SINK.
+
+    If there is a valid cache entry for the file, replay it into SINK;
+    otherwise, parse the file and record a new entry.  Exceptions
+    raised by the parser or by SINK are propagated, and in that case
+    no entry is written."""
+
+    rcs_path = cvs_file.rcs_path
+    filename = self._get_entry_filename(rcs_path)
+    admin_digest = get_admin_digest(rcs_path)
+    key = (
+        CACHE_FORMAT_VERSION, rcs_path, cvs_file.file_size, cvs_file.mtime,
+        admin_digest,
+        )
+
+    entry = self._read_entry(filename)
+    if entry is not None and entry[:-1] == key:
+      self.hits += 1
+      for (method_name, args) in entry[-1]:
+        getattr(sink, method_name)(*args)
+      return
+
+    self.misses += 1
+    recorder = _RecordingSink(sink)
+    f = open(rcs_path, 'rb')
+    try:
+      parse(f, recorder)
+    finally:
+      f.close()
+    self._write_entry(filename, key + (recorder.events,))
+
+  def log_summary(self):
+    logger.normal(
+        'Parse cache: %d files replayed, %d files parsed.'
+        % (self.hits, self.misses,)
+        )
+
+
@@ -16,18 +16,26 @@
 
 """This module contains tools to manage the passes of a conversion."""
 
+import os
 import sys
 import time
 import platform
 import gc
+import cPickle
+import traceback
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.common import FatalException
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.log import logger
 from cvs2svn_lib.stats_keeper import StatsKeeper
 from cvs2svn_lib.stats_keeper import read_stats_keeper
 from cvs2svn_lib.artifact_manager import artifact_manager
+from cvs2svn_lib.telemetry import PassTelemetry
+from cvs2svn_lib.telemetry import write_telemetry_report
+from cvs2svn_lib.profiler import profile_pass
+from cvs2svn_lib.memory_budget import allocate_memory
 
 
 class InvalidPassError(FatalError):
@@ -130,6 +138,15 @@ def choose_garbage_collection_policy():
 class Pass(object):
   """Base class for one step of the conversion."""
 
+  # An estimate of the peak memory (in bytes) used by this pass, or
+  # None if it is unknown.  It is used to decide which passes may be
+  # run concurrently if Ctx().memory_limit is set:
+  memory_estimate = None
+
+  # The names of the caches used by this pass (see memory_budget).  If
+  # Ctx().memory_limit is set, it is divided among them:
+  caches = ['RecordTable']
+
   def __init__(self):
     # By default, use the pass object's class name as the pass name:
     self.name = self.__class__.__name__
@@ -204,7 +221,11 @@ class PassManager:
       raise InvalidPassError('Unknown pass name (%r).' % (pass_name,))
 
   def run(self, run_options):
-    """Run the specified passes, one after another.
+    """Run the specified passes.
+
+    The passes are run one after another, unless Ctx().jobs is greater
+    than one, in which case independent passes may be run
+    concurrently (see _run_concurrently()).
 
     RUN_OPTIONS will be passed to the Passes' run() methods.
     RUN_OPTIONS.start_pass is the number of the first pass that should
@@ -237,6 +258,47 @@ class PassManager:
     for the_pass in self.passes[0:index_start]:
       artifact_manager.pass_skipped(the_pass)
 
+    if self._can_run_concurrently(index_start, index_end):
+      stats_keeper = self._run_concurrently(
+          run_options, index_start, index_end
+          )
+    else:
+      stats_keeper = self._run_serially(run_options, index_start, index_end)
+
+    # Tell the artifact manager about passes that are being deferred:
+    for the_pass in self.passes[index_end:]:
+      artifact_manager.pass_deferred(the_pass)
+
+    logger.quiet(stats_keeper)
+    logger.normal(stats_keeper.timings())
+
+    if Ctx().telemetry_file is not None:
+      write_telemetry_report(stats_keeper, Ctx().telemetry_file)
+
+    # Consistency check:
+    artifact_manager.check_clean()
+
+  def _run_pass(self, run_options, i, stats_keeper, memory_limit):
+    """Run pass index I, profiling it if RUN_OPTIONS asks for that.
+
+    Before the pass is started, its caches are sized to fit within
+    MEMORY_LIMIT bytes (if it is not None)."""
+
+    the_pass = self.passes[i]
+    allocate_memory(the_pass, i + 1, memory_limit)
+    if i + 1 in run_options.profile_passes:
+      profile_pass(
+          the_pass, i + 1, run_options.profile_mode,
+          run_options, stats_keeper,
+          )
+    else:
+      the_pass.run(run_options, stats_keeper)
+
+  def _run_serially(self, run_options, index_start, index_end):
+    """Run the passes with indexes INDEX_START <= i < INDEX_END in order.
+
+    Return the StatsKeeper after the last pass."""
+
     start_time = time.time()
     for i in range(index_start, index_end):
       the_pass = self.passes[i]
@@ -252,12 +314,19 @@ class PassManager:
                 )
             )
 
-      the_pass.run(run_options, stats_keeper)
+      telemetry = PassTelemetry()
+      telemetry.start()
+      self._run_pass(run_options, i, stats_keeper, Ctx().memory_limit)
+      stats_keeper.log_telemetry_for_pass(
+          telemetry.stop(), i + 1, the_pass.name
+          )
       end_time = time.time()
       stats_keeper.log_duration_for_pass(
           end_time - start_time, i + 1, the_pass.name
           )
       logger.normal(stats_keeper.single_pass_timing(i + 1))
+      logger.verbose(stats_keeper.single_pass_telemetry(i + 1))
+      logger.verbose(stats_keeper.single_pass_metrics(i + 1))
       stats_keeper.archive(
           artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
           )
@@ -269,15 +338,198 @@ class PassManager:
 
       self.garbage_collection_policy.check_for_garbage()
 
-    # Tell the artifact manager about passes that are being deferred:
-    for the_pass in self.passes[index_end:]:
-      artifact_manager.pass_deferred(the_pass)
+    return stats_keeper
 
-    logger.quiet(stats_keeper)
-    logger.normal(stats_keeper.timings())
+  def _can_run_concurrently(self, index_start, index_end):
+    """Return True iff passes should be run by _run_concurrently()."""
 
-    # Consistency check:
-    artifact_manager.check_clean()
+    return (
+        Ctx().jobs > 1
+        and index_end - index_start > 1
+        and hasattr(os, 'fork')
+        )
+
+  def _get_dependencies(self, index_start, index_end):
+    """Return the dependencies among the passes to be run.
+
+    Return a map { i : set(j) } telling, for each index i in
+    INDEX_START <= i < INDEX_END, the indexes j of the passes in the
+    same range that create artifacts needed by pass i.  The statistics
+    files, which chain every pass to its predecessor, are ignored;
+    _run_concurrently() handles the statistics itself."""
+
+    statistics_files = set([
+        config.STATISTICS_FILE % (i + 1,) for i in range(self.num_passes)
+        ])
+    indexes = {}
+    for i in range(index_start, index_end):
+      indexes[self.passes[i]] = i
+
+    dependencies = {}
+    for i in range(index_start, index_end):
+      dependencies[i] = set()
+      prerequisites = artifact_manager.get_prerequisites(self.passes[i])
+      for (name, creator) in prerequisites.iteritems():
+        if name not in statistics_files and creator in indexes:
+          dependencies[i].add(indexes[creator])
+    return dependencies
+
+  def _start_pass(self, run_options, i, stats_keeper):
+    """Start pass index I in a child process and return its pid.
+
+    The child runs the pass with STATS_KEEPER, records the duration and
+    telemetry of the pass in it, and archives it to the pass's
+    statistics file."""
+
+    the_pass = self.passes[i]
+    logger.quiet('----- pass %d (%s) started -----' % (i + 1, the_pass.name,))
+    artifact_manager.pass_started(the_pass)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+      return pid
+
+    # This is the child process.  It must never return from this
+    # method, so exit via os._exit() no matter what happens:
+    status = 1
+    try:
+      try:
+        start_time = time.time()
+        # Other passes may be running at the same time, so stay within
+        # the memory that the scheduler assumed for this one:
+        memory_limit = Ctx().memory_limit
+        if memory_limit is not None and the_pass.memory_estimate is not None:
+          memory_limit = min(memory_limit, the_pass.memory_estimate)
+        telemetry = PassTelemetry()
+        telemetry.start()
+        self._run_pass(run_options, i, stats_keeper, memory_limit)
+        stats_keeper.log_telemetry_for_pass(
+            telemetry.stop(), i + 1, the_pass.name
+            )
+        stats_keeper.log_duration_for_pass(
+            time.time() - start_time, i + 1, the_pass.name
+            )
+        stats_keeper.archive(
+            artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
+            )
+        status = 0
+      except FatalException, e:
+        sys.stderr.write(str(e) + '\n')
+      except:
+        traceback.print_exc()
+    finally:
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os._exit(status)
+
+  def _run_concurrently(self, run_options, index_start, index_end):
+    """Run the passes with indexes INDEX_START <= i < INDEX_END.
+
+    Each pass is run in a child process as soon as the passes that
+    create the artifacts that it needs are done.  At most Ctx().jobs
+    passes run at a time, and if Ctx().memory_limit is set, the sum of
+    the memory_estimates of the running passes is kept within it (a
+    pass whose memory_estimate is unknown only runs by itself).
+
+    Since concurrent passes cannot share a StatsKeeper, each pass is
+    given the statistics as of when it started; when it is done, the
+    changes that it made are merged into the current statistics, which
+    are then written to its statistics file.
+
+    Return the StatsKeeper after the last pass."""
+
+    ctx = Ctx()
+    dependencies = self._get_dependencies(index_start, index_end)
+
+    if index_start == 0:
+      stats_keeper = StatsKeeper()
+    else:
+      # No pass is active yet, so the artifact manager cannot be asked
+      # for the filename:
+      stats_keeper = read_stats_keeper(
+          ctx.get_temp_filename(
+              config.STATISTICS_FILE % (index_start + 1 - 1,)
+              )
+          )
+
+    # Indexes of the passes that have not been started, in order:
+    waiting = range(index_start, index_end)
+
+    # Indexes of the passes that have finished:
+    done = set(range(0, index_start))
+
+    # A map { pid : (i, base_stats) } for the running passes, where
+    # BASE_STATS is a pickle of the StatsKeeper that the pass started
+    # with:
+    running = {}
+
+    # The memory_estimates of the running passes (None if unknown):
+    running_memory = []
+
+    failed = []
+
+    while waiting or running:
+      if not failed:
+        for i in waiting[:]:
+          if len(running) >= ctx.jobs:
+            break
+          if not dependencies[i] <= done:
+            continue
+          memory = self.passes[i].memory_estimate
+          if ctx.memory_limit is not None and running:
+            if memory is None or None in running_memory \
+                   or sum(running_memory) + memory > ctx.memory_limit:
+              continue
+          waiting.remove(i)
+          pid = self._start_pass(run_options, i, stats_keeper)
+          running[pid] = (i, cPickle.dumps(stats_keeper, -1))
+          running_memory.append(memory)
+
+      if not running:
+        break
+
+      (pid, status) = os.wait()
+      if pid not in running:
+        continue
+      (i, base_stats) = running.pop(pid)
+      the_pass = self.passes[i]
+      running_memory.remove(the_pass.memory_estimate)
+
+      if status != 0:
+        logger.error('Pass %d (%s) failed' % (i + 1, the_pass.name,))
+        artifact_manager.pass_continued(the_pass)
+        failed.append(the_pass)
+        continue
+
+      pass_stats = read_stats_keeper(
+          artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
+          )
+      stats_keeper.merge(cPickle.loads(base_stats), pass_stats)
+      logger.quiet('----- pass %d (%s) done -----' % (i + 1, the_pass.name,))
+      logger.normal(stats_keeper.single_pass_timing(i + 1))
+      logger.verbose(stats_keeper.single_pass_telemetry(i + 1))
+      logger.verbose(stats_keeper.single_pass_metrics(i + 1))
+      done.add(i)
+
+      # Write the merged statistics to the statistics files of all of
+      # the passes that are done (not just this one), so that a later
+      # run that starts after any of them sees the complete statistics:
+      for j in done:
+        filename = ctx.get_temp_filename(config.STATISTICS_FILE % (j + 1,))
+        if j == i or os.path.exists(filename):
+          stats_keeper.archive(filename)
+
+      artifact_manager.pass_done(the_pass, ctx.skip_cleanup)
+
+    if failed:
+      raise FatalError(
+          'Pass(es) %s failed (see messages above).'
+          % (', '.join([the_pass.name for the_pass in failed]),)
+          )
+
+    return stats_keeper
 
   def help_passes(self):
     """Output (to sys.stdout) the indices and names of available passes."""
@@ -17,9 +17,18 @@
 """This module defines the passes that make up a conversion."""
 
 
+import os
 import sys
+import copy
 import shutil
 import cPickle
+import itertools
+
+try:
+  import multiprocessing
+except ImportError:
+  # multiprocessing is only available in Python 2.6 or later:
+  multiprocessing = None
 
 from cvs2svn_lib import config
 from cvs2svn_lib.context import Ctx
@@ -34,10 +43,18 @@ from cvs2svn_lib.common import Timestamper
 from cvs2svn_lib.sort import sort_file
 from cvs2svn_lib.log import logger
 from cvs2svn_lib.pass_manager import Pass
+from cvs2svn_lib.stats_keeper import StatsKeeper
+from cvs2svn_lib.checkpoint import Checkpointer
+from cvs2svn_lib.progress import ProgressReporter
+from cvs2svn_lib.incremental import IncrementalState
+from cvs2svn_lib.incremental import read_incremental_state
+from cvs2svn_lib.incremental import get_commit_digest
+from cvs2svn_lib.incremental import check_commit_digest
 from cvs2svn_lib.serializer import PrimedPickleSerializer
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_path_database import CVSPathDatabase
 from cvs2svn_lib.metadata_database import MetadataDatabase
+from cvs2svn_lib.log_msg_database import LogMessageDatabase
 from cvs2svn_lib.project import read_projects
 from cvs2svn_lib.project import write_projects
 from cvs2svn_lib.symbol import LineOfDevelopment
@@ -71,11 +88,14 @@ from cvs2svn_lib.changeset_graph_link import ChangesetGraphLink
 from cvs2svn_lib.changeset_database import ChangesetDatabase
 from cvs2svn_lib.changeset_database import CVSItemToChangesetTable
 from cvs2svn_lib.svn_commit import SVNRevisionCommit
+from cvs2svn_lib import openings_closings
 from cvs2svn_lib.openings_closings import SymbolingsLogger
+from cvs2svn_lib.openings_closings import SymbolingsIndexer
 from cvs2svn_lib.svn_commit_creator import SVNCommitCreator
 from cvs2svn_lib.persistence_manager import PersistenceManager
 from cvs2svn_lib.repository_walker import walk_repository
 from cvs2svn_lib.collect_data import CollectData
+from cvs2svn_lib.check_dependencies_pass import DependencyChecker
 from cvs2svn_lib.check_dependencies_pass \
     import CheckItemStoreDependenciesPass
 from cvs2svn_lib.check_dependencies_pass \
@@ -85,30 +105,103 @@ from cvs2svn_lib.check_dependencies_pass \
 class CollectRevsPass(Pass):
   """This pass was formerly known as pass1."""
 
+  caches = [
+      'RecordTable', 'DigestIndex', 'LogMessageDatabase', 'NewCVSItemStore',
+      ]
+
   def register_artifacts(self):
     self._register_temp_file(config.PROJECTS)
     self._register_temp_file(config.SYMBOL_STATISTICS)
     self._register_temp_file(config.METADATA_INDEX_TABLE)
     self._register_temp_file(config.METADATA_STORE)
+    self._register_temp_file(config.LOG_MSG_INDEX_TABLE)
+    self._register_temp_file(config.LOG_MSG_STORE)
     self._register_temp_file(config.CVS_PATHS_DB)
     self._register_temp_file(config.CVS_ITEMS_STORE)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Examining all CVS ',v' files...")
+    projects = run_options.projects
     Ctx()._projects = {}
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_NEW)
-    cd = CollectData(stats_keeper)
+    for project in projects:
+      Ctx()._projects[project.id] = project
 
-    # Key generator for CVSFiles:
-    file_key_generator = KeyGenerator()
+    checkpointer = Checkpointer(self.name)
+    state = None
+    if run_options.resume:
+      state = checkpointer.load()
 
-    for project in run_options.projects:
-      Ctx()._projects[project.id] = project
-      cd.process_project(
-          project,
-          walk_repository(project, file_key_generator, cd.record_fatal_error),
-          )
+    if state is None:
+      Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_NEW)
+      cd = CollectData(stats_keeper)
+
+      # Key generator for CVSFiles:
+      file_key_generator = KeyGenerator()
+
+      first_index = 0
+      skip_count = 0
+    else:
+      # FILE_KEY_GENERATOR is restored to its state at the start of the
+      # project that was being processed, because the project is walked
+      # again from the beginning; the first SKIP_COUNT CVSPaths, which
+      # had already been processed, are skipped.
+      (
+          first_index, skip_count, file_key_generator, project_ids,
+          Ctx()._cvs_path_db, cd,
+          ) = state
+      for (project, (trunk_id, root_cvs_directory_id)) \
+              in zip(projects, project_ids):
+        project.trunk_id = trunk_id
+        project.root_cvs_directory_id = root_cvs_directory_id
+      stats_keeper.merge(StatsKeeper(), cd.stats_keeper)
+      cd.stats_keeper = stats_keeper
+
+    # Errors that the walker finds while the already-processed
+    # CVSPaths are being skipped were recorded before the checkpoint:
+    skipping = [False]
+    def record_fatal_error(err):
+      if not skipping[0]:
+        cd.record_fatal_error(err)
+
+    # The total number of files is not known until the walk is done:
+    progress = ProgressReporter(self.name, 'paths')
+
+    for index in range(first_index, len(projects)):
+      project = projects[index]
+      project_key_generator = copy.copy(file_key_generator)
+      if state is None or index > first_index:
+        cd.start_project(project)
+        skip_count = 0
+
+      skipping[0] = skip_count > 0
+      count = 0
+      for cvs_path in walk_repository(
+            project, file_key_generator, record_fatal_error
+            ):
+        count += 1
+        if count <= skip_count:
+          skipping[0] = count < skip_count
+          continue
+
+        cd.process_cvs_path(cvs_path)
+        progress.update()
+
+        if checkpointer.due():
+          checkpointer.save((
+              index, count, project_key_generator,
+              [(p.trunk_id, p.root_cvs_directory_id) for p in projects],
+              Ctx()._cvs_path_db, cd,
+              ))
+
+      cd.finish_project()
     run_options.projects = None
+    progress.finish()
+
+    # All files have been processed, so the checkpoint is obsolete:
+    checkpointer.remove()
+
+    if state is not None:
+      Ctx()._cvs_path_db.relink_parent_directories()
 
     fatal_errors = cd.close()
 
@@ -124,14 +217,56 @@ class CollectRevsPass(Pass):
     logger.quiet("Done")
 
 
+def _clean_log_msg(log_msg):
+  """Convert LOG_MSG to UTF8 using Ctx().cvs_log_decoder.
+
+  Return the tuple (clean_log_msg, None) on success, or (None, error)
+  where ERROR is a description of the problem.  This is a module-level
+  function so that it can be run in worker processes."""
+
+  try:
+    clean_log_msg = Ctx().cvs_log_decoder(log_msg)
+  except UnicodeError:
+    return (
+        None,
+        'Problem decoding log message:\n'
+        '%s\n'
+        '%s\n'
+        '%s'
+        % ('-' * 75, log_msg, '-' * 75,),
+        )
+
+  try:
+    return (clean_log_msg.encode('utf8'), None)
+  except UnicodeError:
+    return (
+        None,
+        'Problem encoding log message:\n'
+        '%s\n'
+        '%s\n'
+        '%s'
+        % ('-' * 75, log_msg, '-' * 75,),
+        )
+
+
 class CleanMetadataPass(Pass):
   """Clean up CVS revision metadata and write it to a new database."""
 
+  caches = ['RecordTable', 'DigestIndex', 'LogMessageDatabase']
+
+  # The number of records that are read, cleaned, and written as a
+  # group:
+  CHUNK_SIZE = 10000
+
   def register_artifacts(self):
     self._register_temp_file(config.METADATA_CLEAN_INDEX_TABLE)
     self._register_temp_file(config.METADATA_CLEAN_STORE)
+    self._register_temp_file(config.LOG_MSG_CLEAN_INDEX_TABLE)
+    self._register_temp_file(config.LOG_MSG_CLEAN_STORE)
     self._register_temp_file_needed(config.METADATA_INDEX_TABLE)
     self._register_temp_file_needed(config.METADATA_STORE)
+    self._register_temp_file_needed(config.LOG_MSG_INDEX_TABLE)
+    self._register_temp_file_needed(config.LOG_MSG_STORE)
 
   def _get_clean_author(self, author):
     """Return AUTHOR, converted appropriately to UTF8.
@@ -159,34 +294,6 @@ class CleanMetadataPass(Pass):
     self._authors[author] = clean_author
     return clean_author
 
-  def _get_clean_log_msg(self, log_msg):
-    """Return LOG_MSG, converted appropriately to UTF8.
-
-    Raise a UnicodeException if it cannot be converted using the
-    configured cvs_log_decoder."""
-
-    try:
-      clean_log_msg = Ctx().cvs_log_decoder(log_msg)
-    except UnicodeError:
-      raise UnicodeError(
-          'Problem decoding log message:\n'
-          '%s\n'
-          '%s\n'
-          '%s'
-          % ('-' * 75, log_msg, '-' * 75,)
-          )
-
-    try:
-      return clean_log_msg.encode('utf8')
-    except UnicodeError:
-      raise UnicodeError(
-          'Problem encoding log message:\n'
-          '%s\n'
-          '%s\n'
-          '%s'
-          % ('-' * 75, log_msg, '-' * 75,)
-          )
-
   def _clean_metadata(self, metadata):
     """Clean up METADATA by overwriting its members as necessary."""
 
@@ -196,11 +303,83 @@ class CleanMetadataPass(Pass):
       logger.warn('%s: %s' % (warning_prefix, e,))
       self.warnings = True
 
-    try:
-      metadata.log_msg = self._get_clean_log_msg(metadata.log_msg)
-    except UnicodeError, e:
-      logger.warn('%s: %s' % (warning_prefix, e,))
-      self.warnings = True
+  def _get_pool(self):
+    """Return a multiprocessing.Pool for decoding, or None.
+
+    The workers get their configuration (in particular the log
+    decoder) by inheriting the Ctx when they are forked, so a pool is
+    only used on platforms that support fork()."""
+
+    jobs = Ctx().jobs
+    if jobs <= 1 or multiprocessing is None or not hasattr(os, 'fork'):
+      return None
+    logger.verbose('Decoding log messages using %d processes' % (jobs,))
+    return multiprocessing.Pool(jobs)
+
+  def _decode_log_msgs(self, log_msgs, pool):
+    """Return the results of _clean_log_msg() for each of LOG_MSGS.
+
+    The log messages are decoded by POOL if it is not None."""
+
+    if pool is None or len(log_msgs) < 2:
+      return map(_clean_log_msg, log_msgs)
+    return pool.map(
+        _clean_log_msg, log_msgs,
+        max(1, len(log_msgs) // (4 * Ctx().jobs)),
+        )
+
+  def _iter_chunks(self, ids):
+    """Yield the ids from iterable IDS in lists of CHUNK_SIZE."""
+
+    ids = iter(ids)
+    while True:
+      chunk = list(itertools.islice(ids, self.CHUNK_SIZE))
+      if not chunk:
+        return
+      yield chunk
+
+  def _clean_all_metadata(self, metadata_db, metadata_clean_db):
+    # A map {author : clean_author} for those known (to avoid
+    # repeating warnings):
+    self._authors = {}
+
+    for chunk in self._iter_chunks(metadata_db.iterkeys()):
+      items = []
+      for id in chunk:
+        metadata = metadata_db[id]
+
+        # Record the original author name because it might be needed
+        # for expanding CVS keywords:
+        metadata.original_author = metadata.author
+
+        self._clean_metadata(metadata)
+
+        items.append((id, metadata))
+
+      metadata_clean_db.set_many(items)
+
+  def _clean_all_log_msgs(self, log_msg_db, log_msg_clean_db, pool):
+    """Clean the log messages, which are all distinct, keeping their ids.
+
+    Since the LogMessageDatabase stores each distinct log message only
+    once, each one is also decoded only once.  The log messages are
+    decoded in chunks, using POOL if it is not None."""
+
+    for chunk in self._iter_chunks(log_msg_db.iterkeys()):
+      log_msgs = [log_msg_db[id] for id in chunk]
+      results = self._decode_log_msgs(log_msgs, pool)
+
+      items = []
+      for (id, log_msg, (clean_log_msg, error)) in zip(
+            chunk, log_msgs, results
+            ):
+        if error is not None:
+          logger.warn('%s: %s' % (warning_prefix, error,))
+          self.warnings = True
+          clean_log_msg = log_msg
+        items.append((id, clean_log_msg))
+
+      log_msg_clean_db.set_many(items)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Converting metadata to UTF8...")
@@ -208,29 +387,38 @@ class CleanMetadataPass(Pass):
         artifact_manager.get_temp_file(config.METADATA_STORE),
         artifact_manager.get_temp_file(config.METADATA_INDEX_TABLE),
         DB_OPEN_READ,
+        LogMessageDatabase(
+            artifact_manager.get_temp_file(config.LOG_MSG_STORE),
+            artifact_manager.get_temp_file(config.LOG_MSG_INDEX_TABLE),
+            DB_OPEN_READ,
+            ),
         )
     metadata_clean_db = MetadataDatabase(
         artifact_manager.get_temp_file(config.METADATA_CLEAN_STORE),
         artifact_manager.get_temp_file(config.METADATA_CLEAN_INDEX_TABLE),
         DB_OPEN_NEW,
+        LogMessageDatabase(
+            artifact_manager.get_temp_file(config.LOG_MSG_CLEAN_STORE),
+            artifact_manager.get_temp_file(
+                config.LOG_MSG_CLEAN_INDEX_TABLE
+                ),
+            DB_OPEN_NEW,
+            ),
         )
 
     self.warnings = False
 
-    # A map {author : clean_author} for those known (to avoid
-    # repeating warnings):
-    self._authors = {}
-
-    for id in metadata_db.iterkeys():
-      metadata = metadata_db[id]
-
-      # Record the original author name because it might be needed for
-      # expanding CVS keywords:
-      metadata.original_author = metadata.author
+    self._clean_all_metadata(metadata_db, metadata_clean_db)
 
-      self._clean_metadata(metadata)
-
-      metadata_clean_db[id] = metadata
+    pool = self._get_pool()
+    try:
+      self._clean_all_log_msgs(
+          metadata_db.log_msg_db, metadata_clean_db.log_msg_db, pool
+          )
+    finally:
+      if pool is not None:
+        pool.close()
+        pool.join()
 
     if self.warnings:
       raise FatalError(
@@ -461,34 +649,66 @@ class FilterSymbolsPass(Pass):
         DB_OPEN_READ,
         )
     Ctx()._symbol_db = SymbolDatabase()
-    cvs_item_store = OldCVSItemStore(
-        artifact_manager.get_temp_file(config.CVS_ITEMS_STORE))
 
-    cvs_item_serializer = PrimedPickleSerializer(cvs_item_primer)
-    f = open(artifact_manager.get_temp_file(config.ITEM_SERIALIZER), 'wb')
-    cPickle.dump(cvs_item_serializer, f, -1)
-    f.close()
+    # The number of files recorded by CollectRevsPass:
+    file_count = stats_keeper.repos_file_count()
 
-    rev_db = NewSortableCVSRevisionDatabase(
-        artifact_manager.get_temp_file(config.CVS_REVS_DATAFILE),
-        cvs_item_serializer,
-        )
+    checkpointer = Checkpointer(self.name)
+    state = None
+    if run_options.resume:
+      state = checkpointer.load()
 
-    symbol_db = NewSortableCVSSymbolDatabase(
-        artifact_manager.get_temp_file(config.CVS_SYMBOLS_DATAFILE),
-        cvs_item_serializer,
-        )
+    if state is None:
+      cvs_item_store = OldCVSItemStore(
+          artifact_manager.get_temp_file(config.CVS_ITEMS_STORE))
+
+      cvs_item_serializer = PrimedPickleSerializer(cvs_item_primer)
+      f = open(artifact_manager.get_temp_file(config.ITEM_SERIALIZER), 'wb')
+      cPickle.dump(cvs_item_serializer, f, -1)
+      f.close()
+
+      rev_db = NewSortableCVSRevisionDatabase(
+          artifact_manager.get_temp_file(config.CVS_REVS_DATAFILE),
+          cvs_item_serializer,
+          )
+
+      symbol_db = NewSortableCVSSymbolDatabase(
+          artifact_manager.get_temp_file(config.CVS_SYMBOLS_DATAFILE),
+          cvs_item_serializer,
+          )
+
+      revision_collector = Ctx().revision_collector
 
-    revision_collector = Ctx().revision_collector
+      if Ctx().check_dependencies:
+        dependency_checker = DependencyChecker(config.CVS_ITEMS_STORE)
+      else:
+        dependency_checker = None
 
-    logger.quiet("Filtering out excluded symbols and summarizing items...")
+      logger.quiet("Filtering out excluded symbols and summarizing items...")
 
-    stats_keeper.reset_cvs_rev_info()
-    revision_collector.start()
+      stats_keeper.reset_cvs_rev_info()
+      revision_collector.start()
+      progress = ProgressReporter(self.name, 'files', file_count)
+    else:
+      (
+          cvs_item_store, rev_db, symbol_db, revision_collector,
+          saved_stats_keeper, dependency_checker,
+          ) = state
+      stats_keeper.reset_cvs_rev_info()
+      stats_keeper.merge(StatsKeeper(), saved_stats_keeper)
+      progress = ProgressReporter(
+          self.name, 'files', file_count, stats_keeper.repos_file_count()
+          )
 
     # Process the cvs items store one file at a time:
     for cvs_file_items in cvs_item_store.iter_cvs_file_items():
       logger.verbose(cvs_file_items.cvs_file.rcs_path)
+
+      # Check the items as they were written by CollectRevsPass:
+      if dependency_checker is not None:
+        for cvs_item in cvs_file_items.values():
+          dependency_checker.add(cvs_item)
+
       cvs_file_items.filter_excluded_symbols()
       cvs_file_items.mutate_symbols()
       cvs_file_items.adjust_parents()
@@ -514,6 +734,19 @@ class FilterSymbolsPass(Pass):
         elif isinstance(cvs_item, CVSSymbol):
           symbol_db.add(cvs_item)
 
+      progress.update()
+
+      if checkpointer.due():
+        checkpointer.save((
+            cvs_item_store, rev_db, symbol_db, revision_collector,
+            stats_keeper, dependency_checker,
+            ))
+
+    checkpointer.remove()
+    progress.finish()
+
+    if dependency_checker is not None:
+      dependency_checker.finish()
     stats_keeper.set_stats_reflect_exclude(True)
 
     rev_db.close()
@@ -529,6 +762,10 @@ class FilterSymbolsPass(Pass):
 class SortRevisionsPass(Pass):
   """Sort the revisions file."""
 
+  # sort_file() only holds a bounded number of lines in memory:
+  memory_estimate = 64 * 1024 * 1024
+  caches = ['sort']
+
   def register_artifacts(self):
     self._register_temp_file(config.CVS_REVS_SORTED_DATAFILE)
     self._register_temp_file_needed(config.CVS_REVS_DATAFILE)
@@ -540,7 +777,7 @@ class SortRevisionsPass(Pass):
         artifact_manager.get_temp_file(
             config.CVS_REVS_SORTED_DATAFILE
             ),
-        tempdirs=[Ctx().tmpdir],
+        tempdirs=[Ctx().get_temp_dir(config.SORT_RUNS)],
         )
     logger.quiet("Done")
 
@@ -548,6 +785,10 @@ class SortRevisionsPass(Pass):
 class SortSymbolsPass(Pass):
   """Sort the symbols file."""
 
+  # sort_file() only holds a bounded number of lines in memory:
+  memory_estimate = 64 * 1024 * 1024
+  caches = ['sort']
+
   def register_artifacts(self):
     self._register_temp_file(config.CVS_SYMBOLS_SORTED_DATAFILE)
     self._register_temp_file_needed(config.CVS_SYMBOLS_DATAFILE)
@@ -559,7 +800,7 @@ class SortSymbolsPass(Pass):
         artifact_manager.get_temp_file(
             config.CVS_SYMBOLS_SORTED_DATAFILE
             ),
-        tempdirs=[Ctx().tmpdir],
+        tempdirs=[Ctx().get_temp_dir(config.SORT_RUNS)],
         )
     logger.quiet("Done")
 
@@ -799,6 +1040,15 @@ class InitializeChangesetsPass(Pass):
 
     self.changeset_key_generator = KeyGenerator()
 
+    if Ctx().check_dependencies:
+      dependency_checker = DependencyChecker(config.CVS_ITEMS_SORTED_STORE)
+    else:
+      dependency_checker = None
+
+    progress = ProgressReporter(
+        self.name, 'items', stats_keeper.cvs_item_count()
+        )
+
     for (changeset, changeset_items) in self.get_changesets():
       if logger.is_on(logger.DEBUG):
         logger.debug(repr(changeset))
@@ -806,6 +1056,14 @@ class InitializeChangesetsPass(Pass):
       for cvs_item in changeset_items:
         self.sorted_cvs_items_db.add(cvs_item)
         cvs_item_to_changeset_id[cvs_item.id] = changeset.id
+        if dependency_checker is not None:
+          dependency_checker.add(cvs_item)
+      progress.update(len(changeset_items))
+
+    progress.finish()
+
+    if dependency_checker is not None:
+      dependency_checker.finish()
 
     self.sorted_cvs_items_db.close()
     cvs_item_to_changeset_id.close()
@@ -946,12 +1204,19 @@ class BreakRevisionChangesetCyclesPass(Pass):
 
     self.processed_changeset_logger = ProcessedChangesetLogger()
 
+    # The total grows whenever a changeset is split:
+    progress = ProgressReporter(
+        self.name, 'changesets', len(self.changeset_graph.nodes)
+        )
+
     # Consume the graph, breaking cycles using self.break_cycle():
     for (changeset, time_range) in self.changeset_graph.consume_graph(
           cycle_breaker=self.break_cycle
           ):
       self.processed_changeset_logger.log(changeset.id)
+      progress.update(remaining=len(self.changeset_graph.nodes))
 
+    progress.finish()
     self.processed_changeset_logger.flush()
     del self.processed_changeset_logger
 
@@ -1168,12 +1433,19 @@ class BreakSymbolChangesetCyclesPass(Pass):
 
     self.processed_changeset_logger = ProcessedChangesetLogger()
 
+    # The total grows whenever a changeset is split:
+    progress = ProgressReporter(
+        self.name, 'changesets', len(self.changeset_graph.nodes)
+        )
+
     # Consume the graph, breaking cycles using self.break_cycle():
     for (changeset, time_range) in self.changeset_graph.consume_graph(
           cycle_breaker=self.break_cycle
           ):
       self.processed_changeset_logger.log(changeset.id)
+      progress.update(remaining=len(self.changeset_graph.nodes))
 
+    progress.finish()
     self.processed_changeset_logger.flush()
     del self.processed_changeset_logger
 
@@ -1417,11 +1689,17 @@ class BreakAllChangesetCyclesPass(Pass):
 
     self.processed_changeset_logger = ProcessedChangesetLogger()
 
+    # The total grows whenever a changeset is split:
+    progress = ProgressReporter(
+        self.name, 'changesets', len(self.changeset_graph.nodes)
+        )
+
     while self.changeset_graph:
       # Consume any nodes that don't have predecessors:
       for (changeset, time_range) \
               in self.changeset_graph.consume_nopred_nodes():
         self.processed_changeset_logger.log(changeset.id)
+        progress.update(remaining=len(self.changeset_graph.nodes))
         if changeset.id in ordered_changeset_ids:
           next_ordered_changeset += 1
           ordered_changeset_ids.remove(changeset.id)
@@ -1454,6 +1732,7 @@ class BreakAllChangesetCyclesPass(Pass):
               )
         self.break_cycle(self.changeset_graph.find_cycle(id))
 
+    progress.finish()
     del self.processed_changeset_logger
     self.changeset_graph.close()
     self.changeset_graph = None
@@ -1642,6 +1921,10 @@ class CreateRevsPass(Pass):
 class SortSymbolOpeningsClosingsPass(Pass):
   """This pass was formerly known as pass6."""
 
+  # sort_file() only holds a bounded number of lines in memory:
+  memory_estimate = 64 * 1024 * 1024
+  caches = ['sort']
+
   def register_artifacts(self):
     self._register_temp_file(config.SYMBOL_OPENINGS_CLOSINGS_SORTED)
     self._register_temp_file_needed(config.SYMBOL_OPENINGS_CLOSINGS)
@@ -1649,17 +1932,15 @@ class SortSymbolOpeningsClosingsPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting symbolic name source revisions...")
 
-    def sort_key(line):
-      line = line.split(' ', 2)
-      return (int(line[0], 16), int(line[1]), line[2],)
-
+    # The records are designed so that their natural string order is
+    # the order that we want:
     sort_file(
         artifact_manager.get_temp_file(config.SYMBOL_OPENINGS_CLOSINGS),
         artifact_manager.get_temp_file(
             config.SYMBOL_OPENINGS_CLOSINGS_SORTED
             ),
-        key=sort_key,
-        tempdirs=[Ctx().tmpdir],
+        tempdirs=[Ctx().get_temp_dir(config.SORT_RUNS)],
+        record_len=openings_closings.RECORD_LEN,
         )
     logger.quiet("Done")
 
@@ -1674,38 +1955,19 @@ class IndexSymbolsPass(Pass):
     self._register_temp_file_needed(config.SYMBOL_OPENINGS_CLOSINGS_SORTED)
 
   def generate_offsets_for_symbolings(self):
-    """This function iterates through all the lines in
-    SYMBOL_OPENINGS_CLOSINGS_SORTED, writing out a file mapping
-    SYMBOLIC_NAME to the file offset in SYMBOL_OPENINGS_CLOSINGS_SORTED
-    where SYMBOLIC_NAME is first encountered.  This will allow us to
-    seek to the various offsets in the file and sequentially read only
-    the openings and closings that we need."""
-
-    offsets = {}
-
-    f = open(
-        artifact_manager.get_temp_file(
-            config.SYMBOL_OPENINGS_CLOSINGS_SORTED),
-        'r')
-    old_id = None
-    while True:
-      fpos = f.tell()
-      line = f.readline()
-      if not line:
-        break
-      id, svn_revnum, ignored = line.split(" ", 2)
-      id = int(id, 16)
-      if id != old_id:
-        logger.verbose(' ', Ctx()._symbol_db.get_symbol(id).name)
-        old_id = id
-        offsets[id] = fpos
+    """This function iterates through all the records in
+    SYMBOL_OPENINGS_CLOSINGS_SORTED, writing out a table mapping each
+    symbol_id to the range of records in
+    SYMBOL_OPENINGS_CLOSINGS_SORTED describing that symbol.  This will
+    allow us to read all of the openings and closings that we need for
+    a symbol at once."""
 
-    f.close()
+    def log_symbol(id):
+      logger.verbose(' ', Ctx()._symbol_db.get_symbol(id).name)
 
-    offsets_db = file(
-        artifact_manager.get_temp_file(config.SYMBOL_OFFSETS_DB), 'wb')
-    cPickle.dump(offsets, offsets_db, -1)
-    offsets_db.close()
+    indexer = SymbolingsIndexer()
+    indexer.index(log_symbol)
+    indexer.close()
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Determining offsets for all symbolic names...")
@@ -1721,6 +1983,8 @@ class IndexSymbolsPass(Pass):
 class OutputPass(Pass):
   """This pass was formerly known as pass8."""
 
+  caches = ['RecordTable', 'LogMessageDatabase', 'NodeDatabase']
+
   def register_artifacts(self):
     self._register_temp_file_needed(config.PROJECTS)
     self._register_temp_file_needed(config.CVS_PATHS_DB)
@@ -1729,6 +1993,8 @@ class OutputPass(Pass):
     self._register_temp_file_needed(config.SYMBOL_DB)
     self._register_temp_file_needed(config.METADATA_CLEAN_INDEX_TABLE)
     self._register_temp_file_needed(config.METADATA_CLEAN_STORE)
+    self._register_temp_file_needed(config.LOG_MSG_CLEAN_INDEX_TABLE)
+    self._register_temp_file_needed(config.LOG_MSG_CLEAN_STORE)
     self._register_temp_file_needed(config.SVN_COMMITS_INDEX_TABLE)
     self._register_temp_file_needed(config.SVN_COMMITS_STORE)
     self._register_temp_file_needed(config.CVS_REVS_TO_SVN_REVNUMS)
@@ -1743,6 +2009,13 @@ class OutputPass(Pass):
         artifact_manager.get_temp_file(config.METADATA_CLEAN_STORE),
         artifact_manager.get_temp_file(config.METADATA_CLEAN_INDEX_TABLE),
         DB_OPEN_READ,
+        LogMessageDatabase(
+            artifact_manager.get_temp_file(config.LOG_MSG_CLEAN_STORE),
+            artifact_manager.get_temp_file(
+                config.LOG_MSG_CLEAN_INDEX_TABLE
+                ),
+            DB_OPEN_READ,
+            ),
         )
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
@@ -1751,18 +2024,89 @@ class OutputPass(Pass):
     Ctx()._symbol_db = SymbolDatabase()
     Ctx()._persistence_manager = PersistenceManager(DB_OPEN_READ)
 
-    Ctx().output_option.setup(stats_keeper.svn_rev_count())
+    checkpointer = Checkpointer(self.name)
+    state = None
+    if run_options.resume:
+      state = checkpointer.load()
+
+    # For --incremental-state, the state written by the previous
+    # conversion (or None), and the digests of the commits so far:
+    previous_state = None
+    commit_digests = None
+    if Ctx().incremental_state is not None:
+      previous_state = read_incremental_state(Ctx().incremental_state)
+      commit_digests = []
+
+    if state is None:
+      Ctx().output_option.setup(stats_keeper.svn_rev_count())
+      svn_revnum = 1
+    else:
+      # The output option usually refers to the revision reader, so
+      # both are saved together:
+      (
+          svn_revnum, Ctx().output_option, Ctx().revision_reader,
+          commit_digests,
+          ) = state
+
+    # The number of commits that were already output by the previous
+    # conversion.  They are only replayed, to bring the output option
+    # up to date:
+    if previous_state is None:
+      replay_count = 0
+    else:
+      replay_count = len(previous_state.commit_digests)
+      if svn_revnum <= replay_count:
+        logger.quiet(
+            'Skipping the %d revisions that were output by the previous '
+            'conversion...' % (replay_count,)
+            )
+        Ctx().output_option.set_replaying(True)
+
+    progress = ProgressReporter(
+        self.name, 'revisions', stats_keeper.svn_rev_count(), svn_revnum - 1
+        )
 
-    svn_revnum = 1
     svn_commit = Ctx()._persistence_manager.get_svn_commit(svn_revnum)
     while svn_commit:
+      if commit_digests is not None:
+        digest = get_commit_digest(svn_commit)
+        if svn_revnum <= replay_count:
+          check_commit_digest(previous_state, svn_commit, digest)
+        commit_digests.append(digest)
       svn_commit.output(Ctx().output_option)
+      if svn_revnum == replay_count:
+        Ctx().output_option.set_replaying(False)
       svn_revnum += 1
+      progress.update()
+      if svn_revnum > replay_count and checkpointer.due():
+        checkpointer.save((
+            svn_revnum, Ctx().output_option, Ctx().revision_reader,
+            commit_digests,
+            ))
       svn_commit = Ctx()._persistence_manager.get_svn_commit(svn_revnum)
 
+    if svn_revnum <= replay_count:
+      raise FatalError(
+          'The conversion has fewer revisions than the previous '
+          'conversion.\n'
+          'Please run a full conversion (without the state file %r).'
+          % (Ctx().incremental_state,)
+          )
+
+    checkpointer.remove()
+    progress.finish()
     Ctx().output_option.cleanup()
     Ctx()._persistence_manager.close()
 
+    if commit_digests is not None and not Ctx().dry_run:
+      IncrementalState(commit_digests).write(
+          Ctx().incremental_state
+          )
+      logger.quiet(
+          'Output %d new revisions; wrote incremental state to %r.'
+          % (len(commit_digests) - replay_count, Ctx().incremental_state,)
+          )
+
     Ctx()._symbol_db.close()
     Ctx()._cvs_items_db.close()
     Ctx()._metadata_db.close()
@@ -0,0 +1,218 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains an immutable map based on a hash array mapped trie.
+
+A PersistentMap maps non-negative integer keys to arbitrary values.
+It is never modified in place; set() and delete() return a new
+PersistentMap that shares all unchanged subtrees with the old one.
+Therefore "copying" a map is free, and a modified version costs only
+O(log32(n)) new trie nodes.
+
+The trie consumes BITS bits of the key at each level, starting with
+the least significant bits.  Each trie node holds a bitmap telling
+which of the 2**BITS possible children are present, plus a tuple
+containing only the children that are present.  A child is either
+another _TrieNode or a (key, value) tuple for a leaf.  Since distinct
+integers always differ in some bit, no collision handling is needed."""
+
+
+BITS = 5
+MASK = (1 << BITS) - 1
+
+
+def _popcount(x):
+  """Return the number of bits set in X, a 32-bit non-negative int."""
+
+  x = x - ((x >> 1) & 0x55555555)
+  x = (x & 0x33333333) + ((x >> 2) & 0x33333333)
+  x = (x + (x >> 4)) & 0x0f0f0f0f
+  return ((x * 0x01010101) & 0xffffffff) >> 24
+
+
+class _TrieNode(object):
+  __slots__ = ['bitmap', 'children']
+
+  def __init__(self, bitmap, children):
+    self.bitmap = bitmap
+    self.children = children
+
+  def get(self, key, shift, default):
+    node = self
+    while True:
+      bit = 1 << ((key >> shift) & MASK)
+      if not node.bitmap & bit:
+        return default
+      child = node.children[_popcount(node.bitmap & (bit - 1))]
+      if isinstance(child, _TrieNode):
+        node = child
+        shift += BITS
+      elif child[0] == key:
+        return child[1]
+      else:
+        return default
+
+  def assoc(self, key, value, shift):
+    """Return (new_node, added) with KEY mapped to VALUE.
+
+    ADDED is True iff KEY was not present before."""
+
+    bit = 1 << ((key >> shift) & MASK)
+    i = _popcount(self.bitmap & (bit - 1))
+    if not self.bitmap & bit:
+      children = self.children[:i] + ((key, value),) + self.children[i:]
+      return (_TrieNode(self.bitmap | bit, children), True)
+
+    child = self.children[i]
+    if isinstance(child, _TrieNode):
+      (new_child, added) = child.assoc(key, value, shift + BITS)
+    elif child[0] == key:
+      if child[1] is value:
+        return (self, False)
+      new_child = (key, value)
+      added = False
+    else:
+      new_child = _make_pair(child, (key, value), shift + BITS)
+      added = True
+
+    children = self.children[:i] + (new_child,) + self.children[i + 1:]
+    return (_TrieNode(self.bitmap, children), added)
+
+  def without(self, key, shift):
+    """Return a node like this one but without KEY.
+
+    Return None if the resulting node would be empty, or a (key, value)
+    leaf if only a single leaf would remain.  Raise KeyError if KEY is
+    not present."""
+
+    bit = 1 << ((key >> shift) & MASK)
+    if not self.bitmap & bit:
+      raise KeyError(key)
+    i = _popcount(self.bitmap & (bit - 1))
+    child = self.children[i]
+    if isinstance(child, _TrieNode):
+      new_child = child.without(key, shift + BITS)
+    elif child[0] == key:
+      new_child = None
+    else:
+      raise KeyError(key)
+
+    if new_child is None:
+      bitmap = self.bitmap & ~bit
+      if not bitmap:
+        return None
+      children = self.children[:i] + self.children[i + 1:]
+      if len(children) == 1 and not isinstance(children[0], _TrieNode):
+        # Let the parent absorb the remaining leaf:
+        return children[0]
+      return _TrieNode(bitmap, children)
+    else:
+      children = self.children[:i] + (new_child,) + self.children[i + 1:]
+      return _TrieNode(self.bitmap, children)
+
+  def iteritems(self):
+    for child in self.children:
+      if isinstance(child, _TrieNode):
+        for item in child.iteritems():
+          yield item
+      else:
+        yield child
+
+
+def _make_pair(leaf1, leaf2, shift):
+  """Return a _TrieNode containing the two leaves LEAF1 and LEAF2."""
+
+  i1 = (leaf1[0] >> shift) & MASK
+  i2 = (leaf2[0] >> shift) & MASK
+  if i1 == i2:
+    return _TrieNode(1 << i1, (_make_pair(leaf1, leaf2, shift + BITS),))
+  elif i1 < i2:
+    return _TrieNode((1 << i1) | (1 << i2), (leaf1, leaf2,))
+  else:
+    return _TrieNode((1 << i1) | (1 << i2), (leaf2, leaf1,))
+
+
+class PersistentMap(object):
+  """An immutable map {int : value} with cheap modified copies."""
+
+  __slots__ = ['_root', '_len']
+
+  def __init__(self, root=None, length=0):
+    # The root _TrieNode, or None if the map is empty:
+    self._root = root
+    self._len = length
+
+  def __len__(self):
+    return self._len
+
+  def get(self, key, default=None):
+    if self._root is None:
+      return default
+    return self._root.get(key, 0, default)
+
+  def __getitem__(self, key):
+    value = self.get(key, _missing)
+    if value is _missing:
+      raise KeyError(key)
+    return value
+
+  def __contains__(self, key):
+    return self.get(key, _missing) is not _missing
+
+  def set(self, key, value):
+    """Return a new PersistentMap with KEY mapped to VALUE."""
+
+    if self._root is None:
+      root = _TrieNode(0, ())
+    else:
+      root = self._root
+    (new_root, added) = root.assoc(key, value, 0)
+    if new_root is self._root:
+      return self
+    return PersistentMap(new_root, self._len + int(added))
+
+  def delete(self, key):
+    """Return a new PersistentMap without KEY.
+
+    Raise KeyError if KEY is not present."""
+
+    if self._root is None:
+      raise KeyError(key)
+    new_root = self._root.without(key, 0)
+    if new_root is not None and not isinstance(new_root, _TrieNode):
+      # A lone leaf cannot be the root:
+      new_root = _TrieNode(1 << (new_root[0] & MASK), (new_root,))
+    return PersistentMap(new_root, self._len - 1)
+
+  def iteritems(self):
+    if self._root is not None:
+      for item in self._root.iteritems():
+        yield item
+
+  def iterkeys(self):
+    for (key, value) in self.iteritems():
+      yield key
+
+  __iter__ = iterkeys
+
+
+# A unique value used to detect missing keys:
+_missing = object()
+
+# The empty map (since instances are immutable, it can be shared):
+EMPTY = PersistentMap()
+
+
@@ -0,0 +1,244 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains support for profiling individual passes.
+
+See --profile-passes.  Two kinds of profilers are available:
+
+    DeterministicProfiler -- uses cProfile (or the profile module if
+        cProfile is not available) to record every function call.
+        This gives exact call counts, but slows the pass down
+        considerably.
+
+    SamplingProfiler -- records the call stack every INTERVAL seconds
+        of CPU time, using a SIGPROF timer.  This has little overhead
+        and is therefore suitable for long passes, but the results are
+        statistical.
+
+Both write their results in the format of the pstats module, so they
+can be examined using the usual tools."""
+
+
+import signal
+import marshal
+
+try:
+  from cProfile import Profile
+except ImportError:
+  from profile import Profile
+
+from cvs2svn_lib import config
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.log import logger
+
+
+def check_sampling_supported():
+  """Raise FatalError if SamplingProfiler cannot be used here."""
+
+  if not hasattr(signal, 'setitimer'):
+    raise FatalError(
+        'Sampling profiling requires signal.setitimer() '
+        '(Python 2.6 or later on Unix).'
+        )
+
+
+class DeterministicProfiler:
+  """Profile a function call using cProfile."""
+
+  def runcall(self, func, *args):
+    """Call FUNC(*ARGS) while profiling; return its return value."""
+
+    self._profile = Profile()
+    return self._profile.runcall(func, *args)
+
+  def get_stats(self):
+    """Return the results in the format used by the pstats module."""
+
+    self._profile.create_stats()
+    return self._profile.stats
+
+
+class SamplingProfiler:
+  """Profile a function call by sampling the call stack.
+
+  The call stack is recorded whenever the process has used another
+  INTERVAL seconds of CPU time.  The results are converted into the
+  format used by the pstats module, in which the times are estimated
+  from the number of samples, and the call counts are the numbers of
+  samples in which each function was active."""
+
+  # The number of seconds of CPU time between samples:
+  INTERVAL = 0.005
+
+  def __init__(self):
+    check_sampling_supported()
+
+    # A map { stack : count }, where STACK is a tuple of the functions
+    # that were active when a sample was taken, innermost first:
+    self._samples = {}
+
+  def _handle_signal(self, signum, frame):
+    stack = []
+    while frame is not None:
+      code = frame.f_code
+      stack.append((code.co_filename, code.co_firstlineno, code.co_name,))
+      frame = frame.f_back
+    stack = tuple(stack)
+    self._samples[stack] = self._samples.get(stack, 0) + 1
+
+  def runcall(self, func, *args):
+    """Call FUNC(*ARGS) while profiling; return its return value."""
+
+    old_handler = signal.signal(signal.SIGPROF, self._handle_signal)
+    # Restart system calls that are interrupted by the signal, rather
+    # than raising EINTR:
+    signal.siginterrupt(signal.SIGPROF, False)
+    signal.setitimer(signal.ITIMER_PROF, self.INTERVAL, self.INTERVAL)
+    try:
+      return func(*args)
+    finally:
+      signal.setitimer(signal.ITIMER_PROF, 0, 0)
+      signal.signal(signal.SIGPROF, old_handler)
+
+  def get_stats(self):
+    """Return the results in the format used by the pstats module.
+
+    That format is a map { function : (cc, nc, tt, ct, callers) },
+    where FUNCTION is a tuple (filename, line, name), CC and NC are
+    the primitive and total call counts, TT and CT are the time spent
+    in the function itself and including its callees, and CALLERS is a
+    map { caller : (nc, cc, tt, ct) } breaking down those values by
+    calling function."""
+
+    # Mutable versions of the values described above:
+    stats = {}
+
+    def get_entry(function):
+      try:
+        return stats[function]
+      except KeyError:
+        entry = stats[function] = [0, 0, 0.0, 0.0, {}]
+        return entry
+
+    for (stack, count) in self._samples.iteritems():
+      t = count * self.INTERVAL
+      get_entry(stack[0])[2] += t
+      seen = set()
+      for (i, function) in enumerate(stack):
+        entry = get_entry(function)
+        if function in seen:
+          # A recursive call; it is already accounted for:
+          continue
+        seen.add(function)
+        entry[0] += count
+        entry[1] += count
+        entry[3] += t
+        if i + 1 < len(stack):
+          callers = entry[4]
+          caller = callers.setdefault(stack[i + 1], [0, 0, 0.0, 0.0])
+          caller[0] += count
+          caller[1] += count
+          if i == 0:
+            caller[2] += t
+          caller[3] += t
+
+    retval = {}
+    for (function, (cc, nc, tt, ct, callers)) in stats.iteritems():
+      for caller in callers:
+        callers[caller] = tuple(callers[caller])
+      retval[function] = (cc, nc, tt, ct, callers,)
+    return retval
+
+
+def _format_function(function):
+  (filename, line, name) = function
+  if filename == '~':
+    # A built-in function (as recorded by cProfile):
+    return name
+  return '%s:%d(%s)' % (filename, line, name,)
+
+
+def write_summary(stats, f, title, count):
+  """Write the COUNT functions with the most own time in STATS to F.
+
+  STATS is in the format used by the pstats module."""
+
+  total = 0.0
+  for (cc, nc, tt, ct, callers) in stats.itervalues():
+    total += tt
+
+  items = [
+      (tt, ct, nc, function)
+      for (function, (cc, nc, tt, ct, callers)) in stats.iteritems()
+      ]
+  items.sort()
+  items.reverse()
+
+  f.write('%s\n' % (title,))
+  f.write('Total time: %.3f seconds\n\n' % (total,))
+  f.write('   tottime    cumtime      calls  function\n')
+  for (tt, ct, nc, function) in items[:count]:
+    f.write(
+        '%10.3f %10.3f %10d  %s\n' % (tt, ct, nc, _format_function(function),)
+        )
+
+
+# The number of functions listed in the summary of a profile:
+SUMMARY_LENGTH = 40
+
+
+def profile_pass(the_pass, pass_num, mode, *args):
+  """Run THE_PASS.run(*ARGS), profiling it using MODE.
+
+  MODE is 'deterministic' or 'sampling'.  Write the profile for pass
+  number PASS_NUM to the temporary directory in the format of the
+  pstats module, and a summary of the hottest functions next to it."""
+
+  if mode == 'sampling':
+    profiler = SamplingProfiler()
+  else:
+    profiler = DeterministicProfiler()
+
+  try:
+    profiler.runcall(the_pass.run, *args)
+  finally:
+    stats = profiler.get_stats()
+
+    stats_filename = Ctx().get_temp_filename(
+        config.PROFILE_STATS_FILE % (pass_num,)
+        )
+    f = open(stats_filename, 'wb')
+    marshal.dump(stats, f)
+    f.close()
+
+    summary_filename = Ctx().get_temp_filename(
+        config.PROFILE_SUMMARY_FILE % (pass_num,)
+        )
+    f = open(summary_filename, 'w')
+    write_summary(
+        stats, f,
+        'Profile of pass%d (%s), %s mode' % (pass_num, the_pass.name, mode,),
+        SUMMARY_LENGTH,
+        )
+    f.close()
+
+    logger.normal(
+        'Wrote profile of pass%d (%s) to %r (summary in %r).'
+        % (pass_num, the_pass.name, stats_filename, summary_filename,)
+        )
+
+
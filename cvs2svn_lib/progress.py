@@ -0,0 +1,179 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a class to report the progress of long passes.
+
+A pass creates a ProgressReporter, telling it the unit of work (e.g.,
+'files' or 'changesets') and, if known, the total amount of work, and
+calls update() whenever a unit is done.  Every --progress-interval
+seconds, the reporter logs the amount done, the throughput, and an
+estimate of the time remaining.  If --progress-file was specified, the
+same information is written to that file in JSON format, so that it
+can be polled by external monitoring."""
+
+
+import os
+import time
+
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.telemetry import write_json
+
+
+def format_duration(seconds):
+  """Return SECONDS formatted as 'H:MM:SS'."""
+
+  seconds = int(seconds + 0.5)
+  return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60,)
+
+
+class ProgressReporter:
+  """Log the progress of a pass at regular intervals.
+
+  Members:
+
+    pass_name -- the name of the pass whose progress is reported.
+
+    unit -- the plural noun describing a unit of work.
+
+    total -- the total number of units that the pass has to process,
+        or None if it is not known.  The pass may change it at any
+        time (see also update()).
+
+    done -- the number of units processed so far.
+
+  """
+
+  def __init__(self, pass_name, unit, total=None, done=0):
+    self.pass_name = pass_name
+    self.unit = unit
+    self.total = total
+    self.done = done
+
+    # The number of seconds between reports, or None if no reports
+    # should be made:
+    self.interval = Ctx().progress_interval or None
+    self.filename = Ctx().progress_file
+
+    # The time and the amount done when the reporter was created (or
+    # the pass was resumed), from which the throughput is computed:
+    self._start_time = time.time()
+    self._start_done = done
+
+    if self.interval is None:
+      self._next_time = None
+    else:
+      self._next_time = self._start_time + self.interval
+      if self.filename is not None:
+        self._write_status(self._start_time, False)
+
+  def update(self, count=1, remaining=None):
+    """Record that COUNT more units have been processed.
+
+    If REMAINING is specified, it is the number of units still to be
+    processed; this is convenient for passes whose total grows as they
+    go along.  Make a report if one is due."""
+
+    self.done += count
+    if remaining is not None:
+      self.total = self.done + remaining
+    if self._next_time is not None:
+      now = time.time()
+      if now >= self._next_time:
+        self._next_time = now + self.interval
+        self._report(now)
+
+  def _get_status(self, now, finished):
+    """Return a map describing the progress at time NOW."""
+
+    elapsed = now - self._start_time
+    if elapsed > 0.0:
+      rate = (self.done - self._start_done) / elapsed
+    else:
+      rate = 0.0
+
+    status = {
+        'pass_name' : self.pass_name,
+        'unit' : self.unit,
+        'done' : self.done,
+        'total' : self.total,
+        'elapsed' : elapsed,
+        'rate' : rate,
+        'percent' : None,
+        'eta' : None,
+        'updated' : now,
+        'finished' : finished,
+        }
+    if self.total:
+      status['percent'] = 100.0 * min(self.done, self.total) / self.total
+      if finished:
+        status['eta'] = 0.0
+      elif rate > 0.0:
+        status['eta'] = max(self.total - self.done, 0) / rate
+    return status
+
+  def _write_status(self, now, finished):
+    """Write the status to self.filename, replacing it atomically."""
+
+    tmp_filename = '%s.%d.tmp' % (self.filename, os.getpid(),)
+    f = open(tmp_filename, 'w')
+    write_json(self._get_status(now, finished), f)
+    f.write('\n')
+    f.close()
+    try:
+      os.rename(tmp_filename, self.filename)
+    except OSError:
+      # On Windows, rename() fails if the target exists:
+      os.remove(self.filename)
+      os.rename(tmp_filename, self.filename)
+
+  def _report(self, now):
+    status = self._get_status(now, False)
+    words = []
+    if status['percent'] is None:
+      words.append('%d %s' % (self.done, self.unit,))
+    else:
+      words.append(
+          '%d of %d %s (%.1f%%)'
+          % (self.done, self.total, self.unit, status['percent'],)
+          )
+    words.append('%.1f %s/s' % (status['rate'], self.unit,))
+    if status['eta'] is not None:
+      words.append(
+          'about %s remaining' % (format_duration(status['eta']),)
+          )
+    logger.normal('%s: %s' % (self.pass_name, ', '.join(words),))
+
+    if self.filename is not None:
+      self._write_status(now, False)
+
+  def finish(self):
+    """Record that the pass is done, and log a summary."""
+
+    # Whatever the estimate was, the work is now complete:
+    self.total = self.done
+    now = time.time()
+    status = self._get_status(now, True)
+    logger.verbose(
+        '%s: processed %d %s in %s (%.1f %s/s)'
+        % (self.pass_name, self.done, self.unit,
+           format_duration(status['elapsed']), status['rate'], self.unit,)
+        )
+    if self._next_time is not None and self.filename is not None:
+      self._write_status(now, True)
+    self._next_time = None
+
+
@@ -39,6 +39,13 @@ def cvs_file_is_binary(cvs_file):
   return cvs_file.mode == 'b'
 
 
+# The maximum number of basenames whose results are memoized by the
+# basename-based property setters.  When a memo grows beyond this
+# size, it is simply cleared; this is cheaper than LRU bookkeeping on
+# every lookup:
+BASENAME_CACHE_SIZE = 100000
+
+
 class FilePropertySetter(object):
   """Abstract class for objects that set properties on a CVSFile."""
 
@@ -121,6 +128,11 @@ class MimeMapper(FilePropertySetter):
     else:
       self.transform_case = _preserve_case
 
+    # Files with the same rcs_basename always get the same MIME type,
+    # so remember the result for each basename; {rcs_basename :
+    # mime_type}:
+    self._mime_types = {}
+
     if mime_types_file is None and mime_mappings is None:
       logger.error('Should specify MIME types file or dict.\n')
 
@@ -154,11 +166,20 @@ class MimeMapper(FilePropertySetter):
               )
         self.mappings[ext] = type
 
-  def set_properties(self, cvs_file):
-    if self.propname in cvs_file.properties:
-      return
+  def get_mime_type(self, rcs_basename):
+    """Return the MIME type for a file named RCS_BASENAME, or None."""
 
-    basename, extension = os.path.splitext(cvs_file.rcs_basename)
+    try:
+      return self._mime_types[rcs_basename]
+    except KeyError:
+      mime_type = self._compute_mime_type(rcs_basename)
+      if len(self._mime_types) >= BASENAME_CACHE_SIZE:
+        self._mime_types.clear()
+      self._mime_types[rcs_basename] = mime_type
+      return mime_type
+
+  def _compute_mime_type(self, rcs_basename):
+    basename, extension = os.path.splitext(rcs_basename)
 
     # Extension includes the dot, so strip it (will leave extension
     # empty if filename ends with a dot, which is ok):
@@ -172,7 +193,13 @@ class MimeMapper(FilePropertySetter):
 
     extension = self.transform_case(extension)
 
-    mime_type = self.mappings.get(extension, None)
+    return self.mappings.get(extension, None)
+
+  def set_properties(self, cvs_file):
+    if self.propname in cvs_file.properties:
+      return
+
+    mime_type = self.get_mime_type(cvs_file.rcs_basename)
     if mime_type is not None:
       cvs_file.properties[self.propname] = mime_type
 
@@ -197,7 +224,15 @@ class AutoPropsPropertySetter(FilePropertySetter):
   buggy and inconsistent.  Usually spaces are preserved, but if there
   is at least one semicolon in the value, and the *first* semicolon is
   preceded by a space, then that is treated as the start of a comment
-  and the rest of the line is silently discarded."""
+  and the rest of the line is silently discarded.
+
+  Since there can be many patterns and very many files, the patterns
+  are not tried one by one.  Instead, they are compiled into a table
+  of literal basenames, a table of literal suffixes (for patterns like
+  '*.c'), and a single combined regular expression that is used to
+  find out quickly whether any of the remaining patterns can match.
+  Moreover, the properties resulting from each (case-transformed)
+  basename are memoized."""
 
   property_name_pattern = r'(?P<name>[^\!\=\s]+)'
   property_unset_re = re.compile(
@@ -215,6 +250,9 @@ class AutoPropsPropertySetter(FilePropertySetter):
       )
   comment_re = re.compile(r'\s;')
 
+  # Characters that have a special meaning in fnmatch patterns:
+  glob_chars_re = re.compile(r'[\*\?\[]')
+
   class Pattern:
     """Describes the properties to be set for files matching a pattern."""
 
@@ -264,6 +302,8 @@ class AutoPropsPropertySetter(FilePropertySetter):
           if value:
             self._add_pattern(pattern, value)
 
+    self._compile_patterns()
+
   def _add_pattern(self, pattern, props):
     propdict = {}
     if self.quoted_re.match(pattern):
@@ -317,25 +357,122 @@ class AutoPropsPropertySetter(FilePropertySetter):
 
     self.patterns.append(self.Pattern(self.transform_case(pattern), propdict))
 
-  def get_propdict(self, cvs_file):
-    basename = self.transform_case(cvs_file.rcs_basename)
+  def _compile_patterns(self):
+    """Prepare the tables used by _get_matching_patterns().
+
+    Like fnmatch.fnmatch(), normalize the case of the patterns
+    according to the conventions of the operating system."""
+
+    # A map {basename : [index]} for patterns without wildcards:
+    self._literals = {}
+
+    # A map {suffix : [index]} for patterns of the form '*SUFFIX',
+    # where SUFFIX has no wildcards:
+    self._suffixes = {}
+
+    # A list [(index, regexp)] for all other patterns:
+    self._regexps = []
+
+    for (i, pattern) in enumerate(self.patterns):
+      p = os.path.normcase(pattern.pattern)
+      if not self.glob_chars_re.search(p):
+        self._literals.setdefault(p, []).append(i)
+      elif p.startswith('*') and not self.glob_chars_re.search(p[1:]):
+        self._suffixes.setdefault(p[1:], []).append(i)
+      else:
+        self._regexps.append((i, re.compile(fnmatch.translate(p))))
+
+    # The distinct lengths of the suffixes in self._suffixes:
+    self._suffix_lengths = {}
+    for suffix in self._suffixes:
+      self._suffix_lengths[len(suffix)] = None
+    self._suffix_lengths = self._suffix_lengths.keys()
+    self._suffix_lengths.sort()
+
+    # A regexp that matches iff at least one of the patterns in
+    # self._regexps matches:
+    if self._regexps:
+      self._combined_re = re.compile('|'.join([
+          '(?:%s)' % (regexp.pattern,)
+          for (i, regexp) in self._regexps
+          ]))
+    else:
+      self._combined_re = None
+
+    # A map {basename : (propdict, conflicts)}; see _get_basename_props():
+    self._basename_props = {}
+
+  def _get_matching_patterns(self, basename):
+    """Return the Patterns that match BASENAME, in their original order.
+
+    BASENAME should already have been transformed by
+    self.transform_case()."""
+
+    basename = os.path.normcase(basename)
+
+    indexes = list(self._literals.get(basename, []))
+
+    n = len(basename)
+    for length in self._suffix_lengths:
+      if length > n:
+        break
+      indexes.extend(self._suffixes.get(basename[n - length:], []))
+
+    if self._combined_re is not None and self._combined_re.match(basename):
+      for (i, regexp) in self._regexps:
+        if regexp.match(basename):
+          indexes.append(i)
+
+    indexes.sort()
+    return [self.patterns[i] for i in indexes]
+
+  def _get_basename_props(self, basename):
+    """Return (propdict, conflicts) for the files named BASENAME.
+
+    PROPDICT is the map of properties resulting from the patterns that
+    match BASENAME.  CONFLICTS is a list of the property names for
+    which a later pattern tried to set a different value than an
+    earlier one (with one entry per such attempt).  The result must
+    not be modified by the caller."""
+
+    try:
+      return self._basename_props[basename]
+    except KeyError:
+      pass
+
     propdict = {}
-    for pattern in self.patterns:
-      if pattern.match(basename):
-        for (key,value) in pattern.propdict.items():
-          if key in propdict:
-            if propdict[key] != value:
-              logger.warn(
-                  "Contradictory values set for property '%s' for file %s."
-                  % (key, cvs_file,))
-          else:
-            propdict[key] = value
+    conflicts = []
+    for pattern in self._get_matching_patterns(basename):
+      for (key,value) in pattern.propdict.items():
+        if key in propdict:
+          if propdict[key] != value:
+            conflicts.append(key)
+        else:
+          propdict[key] = value
+
+    if len(self._basename_props) >= BASENAME_CACHE_SIZE:
+      self._basename_props.clear()
+    self._basename_props[basename] = (propdict, conflicts)
+    return (propdict, conflicts)
+
+  def _get_shared_propdict(self, cvs_file):
+    """Return the propdict for CVS_FILE, which must not be modified."""
+
+    basename = self.transform_case(cvs_file.rcs_basename)
+    (propdict, conflicts) = self._get_basename_props(basename)
+    for key in conflicts:
+      logger.warn(
+          "Contradictory values set for property '%s' for file %s."
+          % (key, cvs_file,))
 
     return propdict
 
+  def get_propdict(self, cvs_file):
+    return self._get_shared_propdict(cvs_file).copy()
+
   def set_properties(self, cvs_file):
-    propdict = self.get_propdict(cvs_file)
-    for (k,v) in propdict.items():
+    propdict = self._get_shared_propdict(cvs_file)
+    for (k,v) in propdict.iteritems():
       if k in cvs_file.properties:
         if cvs_file.properties[k] != v:
           logger.warn(
@@ -20,6 +20,18 @@
 from cStringIO import StringIO
 import re
 
+from cvs2svn_lib.metrics import get_counter
+from cvs2svn_lib.metrics import get_timer
+
+
+# The number of diffs applied (with and without inverting them), the
+# total size of those diffs, and the time spent applying them:
+_diffs_applied = get_counter('RCSStream.diffs_applied')
+_diffs_inverted = get_counter('RCSStream.diffs_inverted')
+_delta_bytes = get_counter('RCSStream.delta_bytes')
+_apply_timer = get_timer('RCSStream.apply_diff')
+_invert_timer = get_timer('RCSStream.invert_diff')
+
 
 def msplit(s):
   """Split S into an array of lines.
@@ -263,6 +275,7 @@ class RCSStream:
   def apply_diff(self, diff):
     """Apply the RCS diff DIFF to the current file content."""
 
+    _apply_timer.start()
     lines = []
 
     blocks = self.generate_blocks(generate_edits(diff))
@@ -270,6 +283,9 @@ class RCSStream:
       lines += new_lines
 
     self._lines = lines
+    _apply_timer.stop()
+    _diffs_applied.value += 1
+    _delta_bytes.value += len(diff)
 
   def apply_and_invert_edits(self, edits):
     """Apply EDITS and generate their inverse.
@@ -300,10 +316,14 @@ class RCSStream:
     Simultaneously generate an RCS diff suitable for reverting the
     change, and return it as a string."""
 
+    _invert_timer.start()
     inverse_diff = StringIO()
     write_edits(
         inverse_diff, self.apply_and_invert_edits(generate_edits(diff))
         )
+    _invert_timer.stop()
+    _diffs_inverted.value += 1
+    _delta_bytes.value += len(diff)
     return inverse_diff.getvalue()
 
 
@@ -19,6 +19,7 @@
 # These identifiers are imported to be exported:
 from cvs2svn_rcsparse.common import Sink
 from cvs2svn_rcsparse.common import RCSParseError
+from cvs2svn_rcsparse.common import RCSStopParser
 
 
 selected_parser = None
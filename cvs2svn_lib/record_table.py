@@ -42,6 +42,10 @@ from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.metrics import StorageMetrics
+from cvs2svn_lib.metrics import get_name
+from cvs2svn_lib.checkpoint import sync_file
+from cvs2svn_lib.checkpoint import reopen_file
 
 
 # A unique value that can be used to stand for "unset" without
@@ -134,6 +138,7 @@ class AbstractRecordTable:
     self.packer = packer
     # Simplify and speed access to this oft-needed quantity:
     self._record_len = self.packer.record_len
+    self._metrics = StorageMetrics(get_name(self.__class__, self.filename))
 
   def __str__(self):
     return '%s(%r)' % (self.__class__.__name__, self.filename,)
@@ -227,8 +232,10 @@ class RecordTable(AbstractRecordTable):
   # about 96 bytes on a 32-bit computer.
   CACHE_OVERHEAD_PER_ENTRY = 96
 
-  def __init__(self, filename, mode, packer, cache_memory=CACHE_MEMORY):
+  def __init__(self, filename, mode, packer, cache_memory=None):
     AbstractRecordTable.__init__(self, filename, mode, packer)
+    if cache_memory is None:
+      cache_memory = self.CACHE_MEMORY
     if self.mode == DB_OPEN_NEW:
       self.f = open(self.filename, 'wb+')
     elif self.mode == DB_OPEN_WRITE:
@@ -266,6 +273,7 @@ class RecordTable(AbstractRecordTable):
       pairs.sort()
       old_i = None
       f = self.f
+      metrics = self._metrics
       for (i, s) in pairs:
         if i == old_i:
           # No seeking needed
@@ -273,17 +281,22 @@ class RecordTable(AbstractRecordTable):
         elif i <= self._limit_written:
           # Just jump there:
           f.seek(i * self._record_len)
+          metrics.seeks.value += 1
         else:
           # Jump to the end of the file then write _empty_values until
           # we reach the correct location:
           f.seek(self._limit_written * self._record_len)
+          metrics.seeks.value += 1
           while self._limit_written < i:
             f.write(self.packer.empty_value)
             self._limit_written += 1
+            metrics.bytes_written.value += self._record_len
         f.write(s)
         old_i = i + 1
         self._limit_written = max(self._limit_written, old_i)
 
+      metrics.writes.value += len(pairs)
+      metrics.bytes_written.value += len(pairs) * self._record_len
       self.f.flush()
 
     self._cache.clear()
@@ -300,17 +313,47 @@ class RecordTable(AbstractRecordTable):
 
   def _get_packed_record(self, i):
     try:
-      return self._cache[i][1]
+      s = self._cache[i][1]
     except KeyError:
+      metrics = self._metrics
+      metrics.cache_misses.value += 1
       if not 0 <= i < self._limit_written:
         raise KeyError(i)
       self.f.seek(i * self._record_len)
       s = self.f.read(self._record_len)
+      metrics.seeks.value += 1
+      metrics.reads.value += 1
+      metrics.bytes_read.value += self._record_len
       self._cache[i] = (False, s)
       if len(self._cache) >= self._max_memory_cache:
         self.flush()
 
       return s
+    else:
+      self._metrics.cache_hits.value += 1
+      return s
+
+  def __getstate__(self):
+    """Write all records to disk and record how many there are.
+
+    See the checkpoint module.  When the instance is unpickled, records
+    that were added after this point are discarded; records must not
+    have been modified in the meantime."""
+
+    self.flush()
+    if self.mode != DB_OPEN_READ:
+      sync_file(self.f)
+    return (
+        self.filename, self.mode, self.packer, self.cache_memory,
+        self._limit,
+        )
+
+  def __setstate__(self, state):
+    (filename, mode, packer, cache_memory, limit) = state
+    if mode != DB_OPEN_READ:
+      reopen_file(filename, limit * packer.record_len).close()
+      mode = DB_OPEN_WRITE
+    RecordTable.__init__(self, filename, mode, packer, cache_memory)
 
   def close(self):
     self.flush()
@@ -385,10 +428,14 @@ class MmapRecordTable(AbstractRecordTable):
       self._limit = i + 1
 
     self.f[i * self._record_len:(i + 1) * self._record_len] = s
+    self._metrics.writes.value += 1
+    self._metrics.bytes_written.value += self._record_len
 
   def _get_packed_record(self, i):
     if not 0 <= i < self._limit:
       raise KeyError(i)
+    self._metrics.reads.value += 1
+    self._metrics.bytes_read.value += self._record_len
     return self.f[i * self._record_len:(i + 1) * self._record_len]
 
   def close(self):
@@ -133,6 +133,7 @@ Probably the semantics should be changed.
 
 
 import bisect
+import array
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import DB_OPEN_NEW
@@ -145,6 +146,18 @@ from cvs2svn_lib.key_generator import KeyGenerator
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.serializer import MarshalSerializer
 from cvs2svn_lib.indexed_database import IndexedDatabase
+from cvs2svn_lib.lru_cache import LRUCache
+from cvs2svn_lib.metrics import get_counter
+from cvs2svn_lib import persistent_map
+
+
+# Counters of the lookups of nodes in the node cache of _NodeDatabase
+# and of subtree sizes in RepositoryMirror, and of the nodes written:
+_node_cache_hits = get_counter('RepositoryMirror.node_cache_hits')
+_node_cache_misses = get_counter('RepositoryMirror.node_cache_misses')
+_nodes_written = get_counter('RepositoryMirror.nodes_written')
+_subtree_size_hits = get_counter('RepositoryMirror.subtree_size_hits')
+_subtree_size_misses = get_counter('RepositoryMirror.subtree_size_misses')
 
 
 class RepositoryMirrorError(Exception):
@@ -330,7 +343,7 @@ class CurrentMirrorDirectory(MirrorDirectory):
 
     new_node = _CurrentMirrorWritableSubdirectory(
         self.repo, self.repo._key_generator.gen_id(), self.lod, cvs_directory,
-        self, {}
+        self, self.repo._node_db.new_entries()
         )
     self._set_entry(cvs_directory, new_node)
     self.repo._new_nodes[new_node.id] = new_node
@@ -585,34 +598,107 @@ class LODHistory(object):
       self.ids.append(id)
 
 
+class _NodeEntries(object):
+  """A compact, immutable map {CVSPath : node_id} for a stored node.
+
+  The entries are stored as two parallel arrays, sorted by CVSPath id:
+  _path_ids holds the ids of the CVSPaths within the directory and
+  _node_ids holds the corresponding node ids, with 0 standing for None
+  (i.e., a CVSFile; real node ids are always positive).  This takes a
+  small fraction of the memory of an equivalent dict, and a lookup is
+  a binary search in _path_ids.
+
+  Instances are shared between all MirrorDirectory instances that
+  refer to the same node, so they must never be mutated.  A writable
+  node gets a real dict via copy()."""
+
+  __slots__ = ['_cvs_path_db', '_path_ids', '_node_ids']
+
+  # The approximate fixed cost of an instance (the object, its arrays
+  # and the cache bookkeeping), in bytes:
+  ENTRY_OVERHEAD = 250
+
+  def __init__(self, cvs_path_db, path_ids, node_ids):
+    self._cvs_path_db = cvs_path_db
+    self._path_ids = path_ids
+    self._node_ids = node_ids
+
+  def get_memory_size(self):
+    """Return the approximate number of bytes used by this instance."""
+
+    return (
+        self.ENTRY_OVERHEAD
+        + self._path_ids.itemsize * len(self._path_ids)
+        + self._node_ids.itemsize * len(self._node_ids)
+        )
+
+  def _find(self, cvs_path):
+    """Return the index of CVS_PATH in self._path_ids, or -1."""
+
+    path_id = cvs_path.id
+    i = bisect.bisect_left(self._path_ids, path_id)
+    if i < len(self._path_ids) and self._path_ids[i] == path_id:
+      return i
+    else:
+      return -1
+
+  def __getitem__(self, cvs_path):
+    i = self._find(cvs_path)
+    if i == -1:
+      raise KeyError(cvs_path)
+    return self._node_ids[i] or None
+
+  def __contains__(self, cvs_path):
+    return self._find(cvs_path) != -1
+
+  def __len__(self):
+    return len(self._path_ids)
+
+  def __iter__(self):
+    get_path = self._cvs_path_db.get_path
+    for path_id in self._path_ids:
+      yield get_path(path_id)
+
+  def iteritems(self):
+    get_path = self._cvs_path_db.get_path
+    for i in xrange(len(self._path_ids)):
+      yield (get_path(self._path_ids[i]), self._node_ids[i] or None)
+
+  def items(self):
+    return list(self.iteritems())
+
+  def copy(self):
+    """Return the entries as a new (mutable) dict {CVSPath : node_id}."""
+
+    return dict(self.iteritems())
+
+
 class _NodeDatabase(object):
   """A database storing all of the directory nodes.
 
   The nodes are written in groups every time write_new_nodes() is
   called.  To the database is written a dictionary {node_id :
-  [(cvs_path.id, node_id),...]}, where the keys are the node_ids of
-  the new nodes.  When a node is read, its whole group is read and
-  cached under the assumption that the other nodes in the group are
-  likely to be needed soon.  The cache is retained across revisions
-  and cleared when _cache_max_size is exceeded.
-
-  The dictionaries for nodes that have been read from the database
-  during the current revision are cached by node_id in the _cache
-  member variable.  The corresponding dictionaries are *not* copied
-  when read.  To avoid cross-talk between distinct MirrorDirectory
-  instances that have the same node_id, users of these dictionaries
-  have to copy them before modification."""
-
-  # How many entries should be allowed in the cache for each
-  # CVSDirectory in the repository.  (This number is very roughly the
-  # number of complete lines of development that can be stored in the
-  # cache at one time.)
-  CACHE_SIZE_MULTIPLIER = 5
-
-  # But the cache will never be limited to less than this number:
-  MIN_CACHE_LIMIT = 5000
-
-  def __init__(self):
+  (path_ids, node_ids)}, where the keys are the node_ids of the new
+  nodes and the values are the strings of the arrays held by the
+  corresponding _NodeEntries.  When a node is read, its whole group is
+  read and cached under the assumption that the other nodes in the
+  group are likely to be needed soon.
+
+  The cache holds _NodeEntries instances in an LRUCache whose budget
+  is CACHE_MEMORY bytes, so the least recently used nodes are evicted
+  one at a time rather than the whole cache being discarded at once.
+  The _NodeEntries are immutable and shared by every MirrorDirectory
+  instance that refers to the same node_id; users have to copy them
+  before modification."""
+
+  # The approximate amount of memory (in bytes) to be used for the
+  # node cache:
+  CACHE_MEMORY = 64 * 1024 * 1024
+
+  # The array typecode used to store CVSPath ids and node ids:
+  TYPECODE = 'l'
+
+  def __init__(self, cache_memory=None):
     self.cvs_path_db = Ctx()._cvs_path_db
     self.db = IndexedDatabase(
         artifact_manager.get_temp_file(config.MIRROR_NODES_STORE),
@@ -624,32 +710,34 @@ class _NodeDatabase(object):
     # write_new_nodes():
     self._max_node_ids = [0]
 
-    # A map {node_id : {cvs_path : node_id}}:
-    self._cache = {}
+    if cache_memory is None:
+      cache_memory = self.CACHE_MEMORY
 
-    # The number of directories in the repository:
-    num_dirs = len([
-        cvs_path
-        for cvs_path in self.cvs_path_db.itervalues()
-        if isinstance(cvs_path, CVSDirectory)
-        ])
+    # A map {node_id : _NodeEntries}:
+    self._cache = LRUCache(cache_memory)
 
-    self._cache_max_size = max(
-        int(self.CACHE_SIZE_MULTIPLIER * num_dirs),
-        self.MIN_CACHE_LIMIT,
-        )
+  def _load(self, value):
+    (path_ids_string, node_ids_string) = value
+    path_ids = array.array(self.TYPECODE)
+    path_ids.fromstring(path_ids_string)
+    node_ids = array.array(self.TYPECODE)
+    node_ids.fromstring(node_ids_string)
+    return _NodeEntries(self.cvs_path_db, path_ids, node_ids)
 
-  def _load(self, items):
-    retval = {}
-    for (id, value) in items:
-      retval[self.cvs_path_db.get_path(id)] = value
-    return retval
+  def _encode(self, node):
+    """Return a _NodeEntries equivalent to NODE, a dict {CVSPath : id}."""
 
-  def _dump(self, node):
-    return [
-        (cvs_path.id, value)
+    items = [
+        (cvs_path.id, value or 0)
         for (cvs_path, value) in node.iteritems()
         ]
+    items.sort()
+    path_ids = array.array(self.TYPECODE, [item[0] for item in items])
+    node_ids = array.array(self.TYPECODE, [item[1] for item in items])
+    return _NodeEntries(self.cvs_path_db, path_ids, node_ids)
+
+  def _dump(self, entries):
+    return (entries._path_ids.tostring(), entries._node_ids.tostring(),)
 
   def _determine_index(self, id):
     """Return the index of the record holding the node with ID."""
@@ -658,35 +746,47 @@ class _NodeDatabase(object):
 
   def __getitem__(self, id):
     try:
-      items = self._cache[id]
+      entries = self._cache[id]
     except KeyError:
-      index = self._determine_index(id)
-      for (node_id, items) in self.db[index].items():
-        self._cache[node_id] = self._load(items)
-      items = self._cache[id]
+      _node_cache_misses.value += 1
+    else:
+      _node_cache_hits.value += 1
+      return entries
+
+    index = self._determine_index(id)
+    entries = None
+    for (node_id, value) in self.db[index].items():
+      if node_id == id:
+        entries = self._load(value)
+      elif node_id not in self._cache:
+        node_entries = self._load(value)
+        self._cache.set(
+            node_id, node_entries, node_entries.get_memory_size()
+            )
+
+    if entries is None:
+      raise KeyError(id)
 
-    return items
+    # Store the requested node last, so that it is the most recently
+    # used one and is not evicted by its siblings:
+    self._cache.set(id, entries, entries.get_memory_size())
+    return entries
 
   def write_new_nodes(self, nodes):
     """Write NODES to the database.
 
     NODES is an iterable of writable CurrentMirrorDirectory instances."""
 
-    if len(self._cache) > self._cache_max_size:
-      # The size of the cache has exceeded the threshold.  Discard the
-      # old cache values (but still store the new nodes into the
-      # cache):
-      logger.debug('Clearing node cache')
-      self._cache.clear()
-
     data = {}
     max_node_id = 0
     for node in nodes:
       max_node_id = max(max_node_id, node.id)
-      data[node.id] = self._dump(node._entries)
-      self._cache[node.id] = node._entries
+      entries = self._encode(node._entries)
+      data[node.id] = self._dump(entries)
+      self._cache.set(node.id, entries, entries.get_memory_size())
 
     self.db[len(self._max_node_ids)] = data
+    _nodes_written.value += len(data)
 
     if max_node_id == 0:
       # Rewrite last value:
@@ -694,12 +794,126 @@ class _NodeDatabase(object):
     else:
       self._max_node_ids.append(max_node_id)
 
+  def new_entries(self):
+    """Return an empty, mutable map {CVSPath : node_id} for a new node."""
+
+    return {}
+
+  def get_cache_stats(self):
+    """Return a string describing how well the node cache performed."""
+
+    return 'Node cache: %s; %d nodes (%d KiB) cached at end' % (
+        self._cache.get_stats(), len(self._cache), self._cache.size // 1024,
+        )
+
+  def __getstate__(self):
+    # The cache is not stored in checkpoints (see the checkpoint
+    # module):
+    return (
+        self.cvs_path_db, self.db, self._max_node_ids, self._cache.max_size,
+        )
+
+  def __setstate__(self, state):
+    (self.cvs_path_db, self.db, self._max_node_ids, cache_memory,) = state
+    self._cache = LRUCache(cache_memory)
+
   def close(self):
     self._cache.clear()
     self.db.close()
     self.db = None
 
 
+class _PersistentNodeEntries(object):
+  """A map {CVSPath : node_id} backed by a PersistentMap.
+
+  The PersistentMap is keyed by CVSPath id and stores node ids (or
+  None for CVSFiles).  Since the PersistentMap itself is immutable,
+  copy() is O(1) and the copies share their structure; mutating an
+  instance just replaces its PersistentMap with a modified version."""
+
+  __slots__ = ['_cvs_path_db', '_map']
+
+  def __init__(self, cvs_path_db, map):
+    self._cvs_path_db = cvs_path_db
+    self._map = map
+
+  def __getitem__(self, cvs_path):
+    return self._map[cvs_path.id]
+
+  def __setitem__(self, cvs_path, node_id):
+    self._map = self._map.set(cvs_path.id, node_id)
+
+  def __delitem__(self, cvs_path):
+    self._map = self._map.delete(cvs_path.id)
+
+  def __contains__(self, cvs_path):
+    return cvs_path.id in self._map
+
+  def __len__(self):
+    return len(self._map)
+
+  def __iter__(self):
+    get_path = self._cvs_path_db.get_path
+    for path_id in self._map.iterkeys():
+      yield get_path(path_id)
+
+  def iteritems(self):
+    get_path = self._cvs_path_db.get_path
+    for (path_id, node_id) in self._map.iteritems():
+      yield (get_path(path_id), node_id)
+
+  def items(self):
+    return list(self.iteritems())
+
+  def copy(self):
+    return _PersistentNodeEntries(self._cvs_path_db, self._map)
+
+
+class _InMemoryNodeDatabase(object):
+  """A node database that keeps all nodes in memory.
+
+  This is an alternative to _NodeDatabase for repositories whose
+  history fits in RAM.  Each node's entries are held in a
+  _PersistentNodeEntries, so making a node writable (which requires
+  copying its entries) costs O(1), and a modified node shares all but
+  O(log(n)) of its structure with the node it was copied from.  Nodes
+  are never written to disk, so old revisions can be read without any
+  disk access."""
+
+  def __init__(self):
+    self.cvs_path_db = Ctx()._cvs_path_db
+
+    # A map {node_id : _PersistentNodeEntries}:
+    self._nodes = {}
+
+  def __getitem__(self, id):
+    return self._nodes[id]
+
+  def new_entries(self):
+    """Return an empty, mutable map {CVSPath : node_id} for a new node."""
+
+    return _PersistentNodeEntries(self.cvs_path_db, persistent_map.EMPTY)
+
+  def write_new_nodes(self, nodes):
+    """Record NODES, which are now immutable.
+
+    NODES is an iterable of writable CurrentMirrorDirectory instances."""
+
+    for node in nodes:
+      # Store a copy so that the stored node remains immutable even if
+      # somebody holds on to the writable instance:
+      self._nodes[node.id] = node._entries.copy()
+      _nodes_written.value += 1
+
+  def get_cache_stats(self):
+    """Return a string describing the nodes held in memory."""
+
+    return 'In-memory mirror: %d nodes' % (len(self._nodes),)
+
+  def close(self):
+    self._nodes = None
+
+
 class RepositoryMirror:
   """Mirror a repository and its history.
 
@@ -715,8 +929,9 @@ class RepositoryMirror:
 
   The LOD trees themselves are stored in the _node_db database, which
   maps node ids to nodes.  A node is a map from CVSPath to ids of the
-  corresponding subnodes.  The _node_db is stored on disk and each
-  access is expensive.
+  corresponding subnodes.  By default, the _node_db is stored on disk
+  and each access is expensive.  If ctx.in_memory_mirror is set, an
+  _InMemoryNodeDatabase is used instead, which keeps all nodes in RAM.
 
   The _node_db database only holds the nodes for old revisions.  The
   revision that is being constructed is kept in memory in the
@@ -725,9 +940,15 @@ class RepositoryMirror:
   You must invoke start_commit() before each commit and end_commit()
   afterwards."""
 
+  # The maximum number of subtree sizes to remember:
+  SUBTREE_SIZE_CACHE_LIMIT = 100000
+
   def register_artifacts(self, which_pass):
     """Register the artifacts that will be needed for this object."""
 
+    if Ctx().in_memory_mirror:
+      return
+
     artifact_manager.register_temp_file(
         config.MIRROR_NODES_INDEX_TABLE, which_pass
         )
@@ -747,11 +968,34 @@ class RepositoryMirror:
     # This corresponds to the 'nodes' table in a Subversion fs.  (We
     # don't need a 'representations' or 'strings' table because we
     # only track file existence, not file contents.)
-    self._node_db = _NodeDatabase()
+    if Ctx().in_memory_mirror:
+      self._node_db = _InMemoryNodeDatabase()
+    else:
+      self._node_db = _NodeDatabase()
+
+    # An LRUCache {node_id : (file_count, dir_count)} for nodes from
+    # earlier revisions; see get_subtree_size():
+    self._subtree_sizes = LRUCache(self.SUBTREE_SIZE_CACHE_LIMIT)
 
     # Start at revision 0 without a root node.
     self._youngest = 0
 
+  def __getstate__(self):
+    # This is only used for checkpoints, which are written between
+    # commits (see the checkpoint module).  The subtree size cache is
+    # not stored.
+    return (
+        self._key_generator, self._lod_histories, self._node_db,
+        self._youngest,
+        )
+
+  def __setstate__(self, state):
+    (
+        self._key_generator, self._lod_histories, self._node_db,
+        self._youngest,
+        ) = state
+    self._subtree_sizes = LRUCache(self.SUBTREE_SIZE_CACHE_LIMIT)
+
   def start_commit(self, revnum):
     """Start a new commit."""
 
@@ -858,7 +1102,7 @@ class RepositoryMirror:
           % (lod,)
           )
     new_node = _CurrentMirrorWritableLODDirectory(
-        self, self._key_generator.gen_id(), lod, {}
+        self, self._key_generator.gen_id(), lod, self._node_db.new_entries()
         )
     lod_history.update(self._youngest, new_node.id)
     self._new_nodes[new_node.id] = new_node
@@ -887,10 +1131,53 @@ class RepositoryMirror:
     # Return src_node, except packaged up as a CurrentMirrorDirectory:
     return self.get_current_lod_directory(dest_lod)
 
+  def get_subtree_size(self, node):
+    """Return (file_count, dir_count) for the paths strictly under NODE.
+
+    NODE is a MirrorDirectory.  Nodes from earlier revisions never
+    change, so their sizes are remembered by node id; this makes
+    repeated queries about the same (typically copied) subtrees
+    cheap."""
+
+    return self._get_subtree_size(node.id)
+
+  def _get_subtree_size(self, id):
+    try:
+      new_node = self._new_nodes[id]
+    except KeyError:
+      pass
+    else:
+      # The node might still change, so don't remember its size:
+      return self._count_subtree(new_node._entries)
+
+    try:
+      size = self._subtree_sizes[id]
+    except KeyError:
+      _subtree_size_misses.value += 1
+      size = self._count_subtree(self._node_db[id])
+      self._subtree_sizes[id] = size
+    else:
+      _subtree_size_hits.value += 1
+    return size
+
+  def _count_subtree(self, entries):
+    file_count = 0
+    dir_count = 0
+    for (cvs_path, id) in entries.iteritems():
+      if id is None:
+        file_count += 1
+      else:
+        (sub_file_count, sub_dir_count) = self._get_subtree_size(id)
+        file_count += sub_file_count
+        dir_count += sub_dir_count + 1
+    return (file_count, dir_count)
+
   def close(self):
     """Free resources and close databases."""
 
     self._lod_histories = None
+    self._subtree_sizes = None
+    logger.normal(self._node_db.get_cache_stats())
     self._node_db.close()
     self._node_db = None
 
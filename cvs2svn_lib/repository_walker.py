@@ -18,7 +18,18 @@
 
 
 import os
+import sys
 import stat
+import threading
+import Queue
+
+try:
+  # The scandir module (a backport of os.scandir()) returns the types
+  # of directory entries along with their names, which saves a stat()
+  # per entry:
+  from scandir import scandir
+except ImportError:
+  scandir = None
 
 from cvs2svn_lib.common import path_join
 from cvs2svn_lib.common import FatalError
@@ -31,21 +42,161 @@ from cvs2svn_lib.cvs_path import CVSDirectory
 from cvs2svn_lib.cvs_path import CVSFile
 
 
+def _scan_directory(path):
+  """Return a sorted list describing the entries of directory PATH.
+
+  Each entry is a tuple (fname, is_dir, file_stat), where IS_DIR tells
+  whether the entry is a directory (following symlinks) and FILE_STAT
+  is the os.stat() result for entries that are ',v' files (or None if
+  it was not needed or could not be determined)."""
+
+  entries = []
+  if scandir is not None:
+    for entry in scandir(path):
+      fname = entry.name
+      try:
+        is_dir = entry.is_dir()
+      except OSError:
+        is_dir = False
+      file_stat = None
+      if not is_dir and fname.endswith(',v'):
+        try:
+          file_stat = entry.stat()
+        except OSError:
+          pass
+      entries.append((fname, is_dir, file_stat,))
+  else:
+    for fname in os.listdir(path):
+      try:
+        file_stat = os.stat(os.path.join(path, fname))
+      except OSError:
+        entries.append((fname, False, None,))
+      else:
+        if stat.S_ISDIR(file_stat.st_mode):
+          entries.append((fname, True, None,))
+        else:
+          entries.append((fname, False, file_stat,))
+
+  entries.sort()
+  return entries
+
+
+class _DirectoryScanner(object):
+  """Scan directories, possibly in advance, using worker threads.
+
+  Directories that are passed to prefetch() are scanned by a pool of
+  THREAD_COUNT worker threads; get() returns the result, waiting for
+  it if necessary.  Directories that were not prefetched (or all
+  directories, if THREAD_COUNT is zero) are scanned synchronously.
+  This hides the latency of directory listings and stat() calls, which
+  can be considerable when the repository is on a network
+  filesystem."""
+
+  def __init__(self, thread_count):
+    self._thread_count = thread_count
+
+    # A map {path : None} of directories that have been prefetched but
+    # not yet retrieved via get():
+    self._requested = {}
+
+    # A map {path : (entries, exc_info)} of the results of directories
+    # that have been scanned but not yet retrieved.  Exactly one of
+    # ENTRIES and EXC_INFO is None:
+    self._results = {}
+
+    self._condition = threading.Condition()
+    self._queue = Queue.Queue()
+    self._threads = []
+    for i in range(self._thread_count):
+      thread = threading.Thread(target=self._work)
+      thread.setDaemon(True)
+      thread.start()
+      self._threads.append(thread)
+
+  def _work(self):
+    while True:
+      path = self._queue.get()
+      if path is None:
+        return
+
+      try:
+        result = (_scan_directory(path), None,)
+      except:
+        result = (None, sys.exc_info(),)
+
+      self._condition.acquire()
+      try:
+        self._results[path] = result
+        self._condition.notifyAll()
+      finally:
+        self._condition.release()
+
+  def prefetch(self, path):
+    """Start scanning directory PATH in the background."""
+
+    if self._threads and path not in self._requested:
+      self._requested[path] = None
+      self._queue.put(path)
+
+  def get(self, path):
+    """Return the result of _scan_directory(PATH)."""
+
+    if path not in self._requested:
+      return _scan_directory(path)
+
+    del self._requested[path]
+    self._condition.acquire()
+    try:
+      while path not in self._results:
+        self._condition.wait()
+      (entries, exc_info) = self._results.pop(path)
+    finally:
+      self._condition.release()
+
+    if exc_info is not None:
+      raise exc_info[0], exc_info[1], exc_info[2]
+    return entries
+
+  def close(self):
+    """Stop the worker threads.
+
+    Directories that were prefetched but not yet picked up by a worker
+    are discarded, so that closing early doesn't wait for them."""
+
+    while True:
+      try:
+        self._queue.get_nowait()
+      except Queue.Empty:
+        break
+    for thread in self._threads:
+      self._queue.put(None)
+    self._threads = []
+
+
 class _RepositoryWalker(object):
+  # The number of threads used to scan directories in advance (0 to
+  # scan each directory only when it is reached):
+  SCAN_THREADS = 8
+
   def __init__(self, file_key_generator, error_handler):
     self.file_key_generator = file_key_generator
     self.error_handler = error_handler
+    self._scanner = _DirectoryScanner(self.SCAN_THREADS)
+
+  def close(self):
+    self._scanner.close()
 
   def _get_cvs_file(
-        self, parent_directory, basename,
-        file_in_attic=False, leave_in_attic=False,
+        self, parent_directory, basename, file_stat=None,
+        file_in_attic=False, leave_in_attic=False, non_attic_fnames=None,
         ):
     """Return a CVSFile describing the file with name BASENAME.
 
     PARENT_DIRECTORY is the CVSDirectory instance describing the
     directory that physically holds this file in the filesystem.
     BASENAME must be the base name of a *,v file within
-    PARENT_DIRECTORY.
+    PARENT_DIRECTORY.  FILE_STAT, if not None, is the result of
+    os.stat() for the file.
 
     FILE_IN_ATTIC is a boolean telling whether the specified file is
     in an Attic subdirectory.  If FILE_IN_ATTIC is True, then:
@@ -54,7 +205,9 @@ class _RepositoryWalker(object):
       the filename.
 
     - Otherwise, raise FileInAndOutOfAtticException if a file with the
-      same filename appears outside of Attic.
+      same filename appears outside of Attic.  NON_ATTIC_FNAMES, if
+      not None, is the set of names in the directory containing the
+      Attic; otherwise the filesystem is checked.
 
     The CVSFile is assigned a new unique id.  All of the CVSFile
     information is filled in except mode (which can only be determined
@@ -81,13 +234,18 @@ class _RepositoryWalker(object):
       non_attic_filename = os.path.join(
           logical_parent_directory.rcs_path, basename,
           )
-      if os.path.exists(non_attic_filename):
+      if non_attic_fnames is None:
+        exists = os.path.exists(non_attic_filename)
+      else:
+        exists = basename in non_attic_fnames
+      if exists:
         raise FileInAndOutOfAtticException(non_attic_filename, filename)
     else:
       in_attic = False
       logical_parent_directory = parent_directory
 
-    file_stat = os.stat(filename)
+    if file_stat is None:
+      file_stat = os.stat(filename)
 
     # The size of the file in bytes:
     file_size = file_stat.st_size
@@ -99,16 +257,20 @@ class _RepositoryWalker(object):
     return CVSFile(
         self.file_key_generator.gen_id(),
         parent_directory.project, logical_parent_directory, basename[:-2],
-        in_attic, file_executable, file_size, None, None
+        in_attic, file_executable, file_size, None, None,
+        file_stat.st_mtime,
         )
 
-  def _get_attic_file(self, parent_directory, basename):
+  def _get_attic_file(
+        self, parent_directory, basename, file_stat, non_attic_fnames
+        ):
     """Return a CVSFile object for the Attic file at BASENAME.
 
     PARENT_DIRECTORY is the CVSDirectory that physically contains the
     file on the filesystem (i.e., the Attic directory).  It is not
     necessarily the parent_directory of the CVSFile that will be
-    returned.
+    returned.  FILE_STAT and NON_ATTIC_FNAMES are as for
+    _get_cvs_file().
 
     Return CVSFile, whose parent directory is usually
     PARENT_DIRECTORY.parent_directory, but might be PARENT_DIRECTORY
@@ -116,7 +278,8 @@ class _RepositoryWalker(object):
 
     try:
       return self._get_cvs_file(
-          parent_directory, basename, file_in_attic=True,
+          parent_directory, basename, file_stat, file_in_attic=True,
+          non_attic_fnames=non_attic_fnames,
           )
     except FileInAndOutOfAtticException, e:
       if Ctx().retain_conflicting_attic_files:
@@ -131,14 +294,18 @@ class _RepositoryWalker(object):
       # Either way, return a CVSFile object so that the rest of the
       # file processing can proceed:
       return self._get_cvs_file(
-          parent_directory, basename, file_in_attic=True, leave_in_attic=True,
+          parent_directory, basename, file_stat,
+          file_in_attic=True, leave_in_attic=True,
           )
 
-  def _generate_attic_cvs_files(self, cvs_directory, exclude_paths):
+  def _generate_attic_cvs_files(
+        self, cvs_directory, exclude_paths, non_attic_fnames
+        ):
     """Generate CVSFiles for the files in Attic directory CVS_DIRECTORY.
 
     Also yield CVS_DIRECTORY if any files are being retained in the
-    Attic.
+    Attic.  NON_ATTIC_FNAMES is the set of names in the parent of
+    CVS_DIRECTORY.
 
     Silently ignore subdirectories named '.svn' or 'CVS', but emit a
     warning if any other directories are found within the Attic
@@ -146,16 +313,16 @@ class _RepositoryWalker(object):
 
     retained_attic_files = []
 
-    fnames = os.listdir(cvs_directory.rcs_path)
-    fnames.sort()
-    for fname in fnames:
+    for (fname, is_dir, file_stat) in self._scanner.get(
+          cvs_directory.rcs_path
+          ):
       pathname = os.path.join(cvs_directory.rcs_path, fname)
       path_in_repository = path_join(cvs_directory.get_cvs_path(), fname)
       if path_in_repository in exclude_paths:
         logger.normal(
             "Excluding file from conversion: %s" % (path_in_repository,)
             )
-      elif os.path.isdir(pathname):
+      elif is_dir:
         if fname == '.svn' or fname == 'CVS':
           logger.debug(
               "Directory %s found within Attic; ignoring" % (pathname,)
@@ -165,7 +332,9 @@ class _RepositoryWalker(object):
               "Directory %s found within Attic; ignoring" % (pathname,)
               )
       elif fname.endswith(',v'):
-        cvs_file = self._get_attic_file(cvs_directory, fname)
+        cvs_file = self._get_attic_file(
+            cvs_directory, fname, file_stat, non_attic_fnames
+            )
         if cvs_file.parent_directory == cvs_directory:
           # This file will be retained in the Attic directory.
           retained_attic_files.append(cvs_file)
@@ -207,9 +376,17 @@ class _RepositoryWalker(object):
     # Non-Attic subdirectories of cvs_directory (to be recursed into):
     dirs = []
 
-    fnames = os.listdir(cvs_directory.rcs_path)
-    fnames.sort()
-    for fname in fnames:
+    entries = self._scanner.get(cvs_directory.rcs_path)
+
+    # The names of all entries in cvs_directory (used to detect files
+    # that are both in and out of the Attic):
+    fnames = set()
+
+    # Files in cvs_directory, as a list of (fname, file_stat):
+    files = []
+
+    for (fname, is_dir, file_stat) in entries:
+      fnames.add(fname)
       pathname = os.path.join(cvs_directory.rcs_path, fname)
       path_in_repository = path_join(cvs_directory.get_cvs_path(), fname)
       if path_in_repository in exclude_paths:
@@ -217,7 +394,7 @@ class _RepositoryWalker(object):
             "Excluding file from conversion: %s" % (path_in_repository,)
             )
         pass
-      elif os.path.isdir(pathname):
+      elif is_dir:
         if fname == 'Attic':
           attic_dir = fname
         elif fname == '.svn' or fname == 'CVS':
@@ -225,13 +402,23 @@ class _RepositoryWalker(object):
         else:
           dirs.append(fname)
       elif fname.endswith(',v'):
-        cvs_file = self._get_cvs_file(cvs_directory, fname)
-        rcsfiles[cvs_file.rcs_basename] = cvs_file.rcs_path
-        yield cvs_file
+        files.append((fname, file_stat,))
       else:
         # Silently ignore other files:
         pass
 
+    # Start scanning the subdirectories while the files in this
+    # directory are being processed:
+    if attic_dir is not None:
+      self._scanner.prefetch(os.path.join(cvs_directory.rcs_path, attic_dir))
+    for fname in dirs:
+      self._scanner.prefetch(os.path.join(cvs_directory.rcs_path, fname))
+
+    for (fname, file_stat) in files:
+      cvs_file = self._get_cvs_file(cvs_directory, fname, file_stat)
+      rcsfiles[cvs_file.rcs_basename] = cvs_file.rcs_path
+      yield cvs_file
+
     # Map {cvs_file.rcs_basename : cvs_file.rcs_path} for files in an
     # Attic directory within cvs_directory:
     attic_rcsfiles = {}
@@ -242,7 +429,9 @@ class _RepositoryWalker(object):
           cvs_directory.project, cvs_directory, 'Attic',
           )
 
-      for cvs_path in self._generate_attic_cvs_files(attic_directory, exclude_paths):
+      for cvs_path in self._generate_attic_cvs_files(
+            attic_directory, exclude_paths, fnames
+            ):
         if isinstance(cvs_path, CVSFile) \
                and cvs_path.parent_directory == cvs_directory:
           attic_rcsfiles[cvs_path.rcs_basename] = cvs_path.rcs_path
@@ -325,9 +514,12 @@ def walk_repository(project, file_key_generator, error_handler):
       )
   project.root_cvs_directory_id = root_cvs_directory.id
   repository_walker = _RepositoryWalker(file_key_generator, error_handler)
-  for cvs_path in repository_walker.generate_cvs_paths(
-        root_cvs_directory, project.exclude_paths
-        ):
-    yield cvs_path
+  try:
+    for cvs_path in repository_walker.generate_cvs_paths(
+          root_cvs_directory, project.exclude_paths
+          ):
+      yield cvs_path
+  finally:
+    repository_walker.close()
 
 
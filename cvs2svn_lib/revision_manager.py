@@ -133,6 +133,16 @@ class RevisionReader(object):
 
     raise NotImplementedError()
 
+  def skip_content(self, cvs_rev):
+    """Inform the reader that the contents of CVS_REV won't be needed.
+
+    This is called instead of get_content() for revisions whose
+    contents are not output (e.g., when commits are only replayed for
+    --incremental-state), so that readers that keep track of which
+    texts will still be needed can release them."""
+
+    pass
+
   def finish(self):
     """Inform the reader that all calls to get_content() are done.
 
@@ -34,6 +34,8 @@ from cvs2svn_lib.log import logger
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.man_writer import ManOption
 from cvs2svn_lib.pass_manager import InvalidPassError
+from cvs2svn_lib.checkpoint import read_checkpoint_pass_name
+from cvs2svn_lib.profiler import check_sampling_supported
 from cvs2svn_lib.revision_manager import NullRevisionCollector
 from cvs2svn_lib.rcs_revision_manager import RCSRevisionReader
 from cvs2svn_lib.cvs_revision_manager import CVSRevisionReader
@@ -214,7 +216,11 @@ class RunOptions(object):
     self.pass_manager = pass_manager
     self.start_pass = 1
     self.end_pass = self.pass_manager.num_passes
+    self.resume = False
     self.profiling = False
+    # The numbers of the passes to profile, and how:
+    self.profile_passes = set()
+    self.profile_mode = 'deterministic'
 
     self.projects = []
 
@@ -291,7 +297,10 @@ class RunOptions(object):
             '\\fB--help-passes\\fR, \\fB--version\\fR, '
             '\\fB-v\\fR/\\fB--verbose\\fR, \\fB-q\\fR/\\fB--quiet\\fR, '
             '\\fB-p\\fR/\\fB--pass\\fR/\\fB--passes\\fR, \\fB--dry-run\\fR, '
-            '\\fB--profile\\fR, \\fB--trunk-only\\fR, \\fB--encoding\\fR, '
+            '\\fB--profile\\fR, \\fB--profile-passes\\fR, '
+            '\\fB--profile-mode\\fR, \\fB--trunk-only\\fR, '
+            '\\fB--estimate\\fR, \\fB--estimate-sample\\fR, '
+            '\\fB--encoding\\fR, '
             'and \\fB--fallback-encoding\\fR. '
             'Options are processed in the order specified on the command '
             'line.'
@@ -713,6 +722,45 @@ class RunOptions(object):
             ) % (tempfile.gettempdir(),),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--bulk-tmpdir', type='string',
+        action='store',
+        help=(
+            'directory for the large, sequentially accessed temporary '
+            'files (default: the --tmpdir directory)'
+            ),
+        man_help=(
+            'Keep the large temporary files that are mostly read and '
+            'written sequentially (such as the RCS deltas, the fulltexts '
+            'of the checked-out revisions, the files of the external '
+            'sorts, and the digest tables that are too large to be kept '
+            'in memory) in \\fIpath\\fR, and only the smaller, randomly '
+            'accessed files (such as the index tables) in the directory '
+            'given by \\fB--tmpdir\\fR.  This allows, for example, '
+            '\\fB--tmpdir\\fR to be on a fast device and '
+            '\\fB--bulk-tmpdir\\fR on a large one.  The directory where '
+            'each file is placed is logged in verbose mode.'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(IncompatibleOption(
+        '--artifact-tmpdir', type='string',
+        action='callback', callback=self.callback_artifact_tmpdir,
+        help=(
+            'keep the temporary files whose names match PATTERN in PATH '
+            '(may be repeated)'
+            ),
+        man_help=(
+            'Keep the temporary files whose names match the shell-style '
+            '\\fIpattern\\fR (e.g., \\fBrcs-deltas.*\\fR) in '
+            '\\fIpath\\fR, overriding \\fB--tmpdir\\fR and '
+            '\\fB--bulk-tmpdir\\fR.  This option can be specified '
+            'multiple times; the first matching pattern is used.  The same '
+            'temporary directory options must be used for all runs of a '
+            'conversion (see \\fB--passes\\fR and \\fB--resume\\fR).'
+            ),
+        metavar='PATTERN=PATH',
+        ))
     self.parser.set_default('co_executable', config.CO_EXECUTABLE)
     group.add_option(IncompatibleOption(
         '--co', type='string',
@@ -735,6 +783,94 @@ class RunOptions(object):
             ),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--in-memory-mirror',
+        action='store_true',
+        help=(
+            'keep the repository mirror used during OutputPass in RAM '
+            '(faster, but needs memory proportional to the history)'
+            ),
+        man_help=(
+            'Keep the skeleton of the converted repository, which is '
+            'needed during \\fBOutputPass\\fR, entirely in memory rather '
+            'than in temporary files.  This is faster but needs memory '
+            'roughly proportional to the number of directory changes in '
+            'the history of the repository.'
+            ),
+        ))
+    group.add_option(ContextOption(
+        '--jobs', type='int',
+        action='store',
+        help=(
+            'use up to N processes for work that can be parallelized '
+            '(default 1)'
+            ),
+        man_help=(
+            'Use up to \\fIn\\fR processes for the parts of the '
+            'conversion that can be done in parallel: passes that do '
+            'not depend on each other\'s output are run concurrently, '
+            'and \\fBCleanMetadataPass\\fR decodes log messages in '
+            'several processes.  The default is 1.  This option has no '
+            'effect on platforms that do not support \\fIfork\\fR().'
+            ),
+        metavar='N',
+        ))
+    group.add_option(IncompatibleOption(
+        '--memory-limit', type='string',
+        action='callback', callback=self.callback_memory_limit,
+        help=(
+            'size the caches of each pass to use up to SIZE MiB (or '
+            'use a suffix K, M, or G)'
+            ),
+        man_help=(
+            'Use up to \\fIsize\\fR MiB of memory (or a suffix '
+            '\\fBK\\fR, \\fBM\\fR, or \\fBG\\fR can be given).  At the '
+            'start of each pass, half of this budget is divided among the '
+            'caches and sort buffers that the pass uses.  On a machine '
+            'with a lot of memory this makes the caches larger than their '
+            'defaults; with a small limit they are made smaller, down to '
+            'a minimum size, and a warning is emitted if the limit is '
+            'below what the pass needs anyway.  The allocation is '
+            'logged in verbose mode.  If \\fB--jobs\\fR is greater than '
+            'one, passes are only run concurrently if the sum of their '
+            'estimated memory use stays within this limit.'
+            ),
+        metavar='SIZE',
+        ))
+    group.add_option(ContextOption(
+        '--checkpoint-interval', type='int',
+        action='store',
+        help=(
+            'save the progress of long passes every SECONDS seconds, so '
+            'that an interrupted conversion can be continued with '
+            '--resume (in OutputPass, each checkpoint costs more the '
+            'larger the converted tree gets)'
+            ),
+        man_help=(
+            'Save the progress of \\fBCollectRevsPass\\fR, '
+            '\\fBFilterSymbolsPass\\fR, and \\fBOutputPass\\fR to a '
+            'checkpoint in the temporary directory every \\fIseconds\\fR '
+            'seconds, so that if the conversion is interrupted it can be '
+            'continued from the last checkpoint using \\fB--resume\\fR. '
+            'Checkpoints are not possible for some output options, such '
+            'as when the output is loaded directly into a Subversion '
+            'repository; a warning is emitted in that case.  The cost of '
+            'a checkpoint of \\fBOutputPass\\fR grows as the '
+            'conversion progresses, because the state of the repository '
+            'mirror (the history of all lines of development converted so '
+            'far) is saved with it, so don\'t choose a very short '
+            'interval for large repositories.'
+            ),
+        metavar='SECONDS',
+        ))
+    # For testing --resume: exit abruptly after the COUNTth checkpoint
+    # of pass PASS_NAME.  The argument has the form PASS_NAME:COUNT.
+    group.add_option(ContextOption(
+        '--crash-after-checkpoint', type='string',
+        action='store',
+        help=optparse.SUPPRESS_HELP,
+        man_help=optparse.SUPPRESS_HELP,
+        ))
 
     return group
 
@@ -770,6 +906,81 @@ class RunOptions(object):
             ),
         metavar='[START]:[END]',
         ))
+    group.add_option(ManOption(
+        '--resume',
+        action='callback', callback=self.callback_resume,
+        help=(
+            'continue an interrupted conversion from the last checkpoint '
+            '(see --checkpoint-interval); remove a stale cvs2svn.lock '
+            'left in the temporary directory by a crash first'
+            ),
+        man_help=(
+            'Continue an interrupted conversion from the last checkpoint '
+            'that was saved in the temporary directory (see '
+            '\\fB--checkpoint-interval\\fR and \\fB--tmpdir\\fR).  The '
+            'conversion starts with the pass that was interrupted; the '
+            'work that was done in that pass before the checkpoint is not '
+            'repeated.  The other options must be the same as for the '
+            'interrupted run.  If the interrupted process was killed '
+            'or crashed, it may have left behind the lock directory '
+            '\\fIcvs2svn.lock\\fR in the temporary directory; after '
+            'making sure that no other cvs2svn process is using the '
+            'temporary directory, remove it before resuming.'
+            ),
+        ))
+    group.add_option(ContextOption(
+        '--incremental-state', type='string',
+        action='store',
+        help=(
+            'output only the commits that were not output by the previous '
+            'conversion that used the same state file PATH (each run '
+            'still takes as long as a full conversion; see also '
+            '--parse-cache)'
+            ),
+        man_help=(
+            'Convert the whole repository, but output only the commits '
+            'that were not already output by the previous conversion '
+            'that used the same state file \\fIpath\\fR, then update '
+            'the state file.  If the file does not exist, all commits '
+            'are output.  For Subversion, the output can be loaded into '
+            'the repository that was created by the previous '
+            'conversion (use \\fB--existing-svnrepos\\fR or '
+            '\\fBsvnadmin load\\fR).  For git, load it (together with '
+            'the blob file) using \\fBgit fast-import --import-marks\\fR '
+            'with the marks file that was exported when the previous '
+            'output was loaded.  '
+            'If the commits that were already output have changed (for '
+            'example, because of changed options or because a file was '
+            'added with an old timestamp), the conversion fails and a '
+            'full conversion is needed.  Only the output is '
+            'incremental: every run reads and converts the whole '
+            'repository again, so it takes as long as a full '
+            'conversion.  To at least avoid parsing the unchanged ,v '
+            'files again, also use \\fB--parse-cache\\fR.'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(ContextOption(
+        '--parse-cache', type='string',
+        action='store',
+        help=(
+            'keep the parsed contents of ,v files in directory PATH, so '
+            'that later conversions only need to parse files that changed'
+            ),
+        man_help=(
+            'Keep a record of what was parsed from each \\fI,v\\fR file '
+            'in the directory \\fIpath\\fR (which is created if '
+            'necessary), and use it in later conversions instead of '
+            'parsing the files again if they have not changed.  A file is '
+            'considered unchanged if its path, size, modification time, '
+            'and the contents of its header and revision tree are the '
+            'same.  Symbol transforms and the symbol handling options are '
+            'applied after the cache lookup, so this option speeds up '
+            'repeated conversions that only differ in those options.  The '
+            'directory can be kept from one conversion to the next.'
+            ),
+        metavar='PATH',
+        ))
 
     return group
 
@@ -833,12 +1044,124 @@ class RunOptions(object):
             ),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--telemetry-file', type='string',
+        action='store',
+        help=(
+            'write the memory, CPU, I/O, and disk space used by each pass '
+            'to PATH in JSON format'
+            ),
+        man_help=(
+            'Write a report of the resources used by each pass to '
+            '\\fIpath\\fR in JSON format: the peak and average resident '
+            'memory, the user and system CPU time (of cvs2svn and of its '
+            'child processes), the bytes read and written, the sizes of '
+            'the temporary files at the start and end of the pass, and '
+            'the peak total size of the temporary directories during the '
+            'pass.  '
+            'Memory use and I/O can only be measured on Linux.  The same '
+            'information is always recorded in the statistics files in '
+            'the temporary directory, so the report covers passes that '
+            'were run by earlier invocations (see \\fB--passes\\fR).'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(ContextOption(
+        '--progress-interval', type='int',
+        action='store',
+        help=(
+            'report the progress of long passes every SECONDS seconds '
+            '(default: 60; 0 to disable)'
+            ),
+        man_help=(
+            'Every \\fIseconds\\fR seconds, report how far the long '
+            'passes (such as \\fBCollectRevsPass\\fR, the cycle-breaking '
+            'passes, and \\fBOutputPass\\fR) have got: the number of '
+            'files, items, changesets, or revisions processed, the '
+            'throughput, and, where the total is known, the percentage '
+            'done and an estimate of the time remaining.  The default is '
+            '60 seconds; 0 disables the reports.'
+            ),
+        metavar='SECONDS',
+        ))
+    group.add_option(ContextOption(
+        '--progress-file', type='string',
+        action='store',
+        help=(
+            'also write the progress reports to PATH in JSON format'
+            ),
+        man_help=(
+            'Whenever the progress of a pass is reported (see '
+            '\\fB--progress-interval\\fR), also write it to '
+            '\\fIpath\\fR in JSON format, replacing the previous '
+            'contents, so that the conversion can be monitored by other '
+            'programs.  The file records the pass name, the unit of work, '
+            'the amount done and the total (if known), the throughput, '
+            'the estimated number of seconds remaining, and whether the '
+            'pass has finished.'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(ContextOption(
+        '--estimate',
+        action='store_true',
+        compatible_with_option=True,
+        help=(
+            'only scan the repository and estimate the time, memory, '
+            'and temporary disk space that the conversion would need'
+            ),
+        man_help=(
+            'Do not convert the repository; instead, scan it quickly and '
+            'print an estimate of the time that each pass would take, '
+            'the peak memory use, and the sizes of the largest temporary '
+            'files.  The scan reads only the headers and revision trees '
+            'of the \\fI,v\\fR files (and the text of their head '
+            'revisions), skipping the rest of the deltas.  The estimates '
+            'are extrapolated using models calibrated on synthetic '
+            'repositories, so they are only a rough guide, especially '
+            'the times, which depend on the speed of the computer.  Use '
+            'the same options as for the conversion, plus this one.'
+            ),
+        ))
+    group.add_option(ContextOption(
+        '--estimate-sample', type='int',
+        action='store',
+        compatible_with_option=True,
+        help=(
+            'with --estimate, parse only COUNT randomly-chosen files '
+            '(default: all)'
+            ),
+        man_help=(
+            'With \\fB--estimate\\fR, parse only \\fIcount\\fR '
+            'randomly-chosen \\fI,v\\fR files, and extrapolate the '
+            'numbers of revisions and symbols to the whole repository '
+            'according to the sizes of the files.  This makes the scan '
+            'of a very large repository much faster.'
+            ),
+        metavar='COUNT',
+        ))
     group.add_option(ContextOption(
         '--skip-cleanup',
         action='store_true',
         help='prevent the deletion of intermediate files',
         man_help='Prevent the deletion of temporary files.',
         ))
+    group.add_option(ContextOption(
+        '--check-dependencies',
+        action='store_true',
+        help=(
+            'check that the dependencies between CVS items are '
+            'consistent'
+            ),
+        man_help=(
+            'Check that the dependencies between the CVS items are '
+            'consistent, once as written by \\fBCollectRevsPass\\fR and '
+            'once as written by \\fBInitializeChangesetsPass\\fR.  The '
+            'items are checked as they are processed anyway, and the '
+            'dependencies are matched up using an external sort, so the '
+            'check takes roughly linear time.'
+            ),
+        ))
     prof = 'cProfile'
     try:
         import cProfile
@@ -852,6 +1175,46 @@ class RunOptions(object):
             'Profile with \'' + prof + '\' (into file \\fIcvs2svn.' + prof + '\\fR).'
             ),
         ))
+    group.add_option(ManOption(
+        '--profile-passes', type='string',
+        action='callback', callback=self.callback_profile_passes,
+        help=(
+            'profile the specified passes (a comma-separated list of '
+            'pass names or numbers); see --profile-mode'
+            ),
+        man_help=(
+            'Profile each of the passes in \\fIpasses\\fR, a '
+            'comma-separated list of pass names or numbers (see '
+            '\\fB--help-passes\\fR).  For each pass, the profile is '
+            'written to the temporary directory as '
+            '\\fIprofile-NN.pstats\\fR (which can be read using '
+            'Python\'s \\fIpstats\\fR module), together with a summary '
+            'of the functions that took the most time, '
+            '\\fIprofile-NN.txt\\fR.'
+            ),
+        metavar='PASSES',
+        ))
+    group.add_option(ManOption(
+        '--profile-mode', type='choice',
+        choices=['deterministic', 'sampling'],
+        action='callback', callback=self.callback_profile_mode,
+        help=(
+            'how to profile the passes selected by --profile-passes: '
+            '"deterministic" (the default) or "sampling"'
+            ),
+        man_help=(
+            'Choose how to profile the passes selected by '
+            '\\fB--profile-passes\\fR.  \\fBdeterministic\\fR (the '
+            'default) uses \\fIcProfile\\fR, which records every '
+            'function call but slows the pass down considerably.  '
+            '\\fBsampling\\fR records the call stack many times per '
+            'second of CPU time; it adds little overhead, so it is '
+            'suitable for long passes, but its results are statistical '
+            'and its call counts are sample counts.  Sampling requires '
+            'Python 2.6 or later on Unix.'
+            ),
+        metavar='MODE',
+        ))
 
     return group
 
@@ -923,9 +1286,23 @@ class RunOptions(object):
           self.start_pass = \
           self.pass_manager.get_pass_number(value)
 
+  def callback_resume(self, option, opt_str, value, parser):
+    self.resume = True
+
   def callback_profile(self, option, opt_str, value, parser):
     self.profiling = True
 
+  def callback_profile_passes(self, option, opt_str, value, parser):
+    for pass_name in value.split(','):
+      self.profile_passes.add(
+          self.pass_manager.get_pass_number(pass_name.strip())
+          )
+
+  def callback_profile_mode(self, option, opt_str, value, parser):
+    if value == 'sampling':
+      check_sampling_supported()
+    self.profile_mode = value
+
   def callback_symbol_hints(self, option, opt_str, value, parser):
     parser.values.symbol_strategy_rules.append(SymbolHintsFileRule(value))
 
@@ -944,6 +1321,31 @@ class RunOptions(object):
         ExcludeRegexpStrategyRule(value)
         )
 
+  def callback_artifact_tmpdir(self, option, opt_str, value, parser):
+    try:
+      [pattern, path] = value.split('=', 1)
+    except ValueError:
+      raise FatalError(
+          '%s: %r is not of the form PATTERN=PATH' % (opt_str, value,)
+          )
+    Ctx().artifact_tmpdirs.append((pattern, path,))
+
+  def callback_memory_limit(self, option, opt_str, value, parser):
+    multipliers = {'K' : 1024, 'M' : 1024 * 1024, 'G' : 1024 * 1024 * 1024}
+    number = value.strip()
+    multiplier = multipliers.get(number[-1:].upper())
+    if multiplier is None:
+      multiplier = multipliers['M']
+    else:
+      number = number[:-1]
+    try:
+      size = int(float(number) * multiplier)
+    except ValueError:
+      raise FatalError('%s: invalid size %r' % (opt_str, value,))
+    if size <= 0:
+      raise FatalError('%s: the size must be positive' % (opt_str,))
+    Ctx().memory_limit = size
+
   def callback_cvs_revnums(self, option, opt_str, value, parser):
     Ctx().revision_property_setters.append(CVSRevisionNumberSetter())
 
@@ -1074,10 +1476,27 @@ class RunOptions(object):
     # Convenience var, so we don't have to keep instantiating this Borg.
     ctx = Ctx()
 
+    if self.resume:
+      if ctx.tmpdir is None:
+        raise FatalError('--resume requires --tmpdir to be specified.')
+      pass_name = read_checkpoint_pass_name()
+      if pass_name is None:
+        raise FatalError(
+            'No checkpoint found in temporary directory %r.' % (ctx.tmpdir,)
+            )
+      self.start_pass = self.pass_manager.get_pass_number(pass_name)
+
     if not self.start_pass <= self.end_pass:
       raise InvalidPassError(
           'Ending pass must not come before starting pass.')
 
+    if self.profiling and self.profile_passes \
+           and self.profile_mode == 'deterministic':
+      raise FatalError(
+          '--profile cannot be combined with --profile-passes unless '
+          '--profile-mode=sampling is used.'
+          )
+
     if not ctx.dry_run and ctx.output_option is None:
       raise FatalError('No output option specified.')
 
@@ -86,6 +86,8 @@ class PrimedPickleSerializer(Serializer):
     which can be an arbitrary object (e.g., a list of objects that are
     expected to occur frequently in the objects to be serialized)."""
 
+    self.primer = primer
+
     f = cStringIO.StringIO()
     pickler = cPickle.Pickler(f, -1)
     pickler.dump(primer)
@@ -95,6 +97,15 @@ class PrimedPickleSerializer(Serializer):
     unpickler.load()
     self.unpickler_memo = unpickler.memo
 
+  def __getstate__(self):
+    # The pickler memo is keyed by object ids, which are meaningless
+    # in another process, so store only the primer and prime again
+    # when unpickling:
+    return self.primer
+
+  def __setstate__(self, primer):
+    self.__init__(primer)
+
   def dumpf(self, f, object):
     """Serialize OBJECT to file-like object F."""
 
@@ -144,3 +155,41 @@ class CompressingSerializer(Serializer):
     return self.wrapee.loads(zlib.decompress(marshal.loads(s)))
 
 
+class StringSerializer(Serializer):
+  """This class serializes strings, optionally compressing them.
+
+  Strings of at least MIN_COMPRESS_SIZE bytes are compressed using
+  zlib; shorter ones (for which compression rarely pays) are stored
+  as-is.  If MIN_COMPRESS_SIZE is None, nothing is compressed.  Each
+  string is prefixed with a flag character telling how it was stored,
+  and the result is written using marshal."""
+
+  def __init__(self, min_compress_size=None):
+    self.min_compress_size = min_compress_size
+
+  def _encode(self, s):
+    if self.min_compress_size is not None \
+           and len(s) >= self.min_compress_size:
+      return 'z' + zlib.compress(s)
+    else:
+      return '-' + s
+
+  def _decode(self, s):
+    if s[0] == 'z':
+      return zlib.decompress(s[1:])
+    else:
+      return s[1:]
+
+  def dumpf(self, f, object):
+    marshal.dump(self._encode(object), f)
+
+  def dumps(self, object):
+    return marshal.dumps(self._encode(object))
+
+  def loadf(self, f):
+    return self._decode(marshal.load(f))
+
+  def loads(self, s):
+    return self._decode(marshal.loads(s))
+
+
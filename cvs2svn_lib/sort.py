@@ -25,6 +25,10 @@ It was apparently submitted by Nicolas Lehuen on Tue, 17 Jan 2006.
 According to the terms of service of that website, the code is usable
 under the MIT license.
 
+By default the files are treated as sequences of lines.  The functions
+also accept a RECORD_LEN argument, in which case the files are treated
+as sequences of binary records of RECORD_LEN bytes each.
+
 """
 
 
@@ -38,6 +42,10 @@ import tempfile
 # The buffer size to use for open files:
 BUFSIZE = 64 * 1024
 
+# The default number of lines (or records) that sort_file() sorts in
+# memory at a time:
+BUFFER_SIZE = 32000
+
 
 def get_default_max_merge():
   """Return the default maximum number of files to merge at once."""
@@ -95,7 +103,31 @@ def merge(iterables, key=None):
       heapq.heappush(values, (key(value), index, value, iterator))
 
 
-def merge_files_onepass(input_filenames, output_filename, key=None):
+def iter_records(f, record_len):
+  """Generate the RECORD_LEN-byte records from file-like object F."""
+
+  # Read many records at a time:
+  block_size = max(1, BUFSIZE // record_len) * record_len
+  while True:
+    block = f.read(block_size)
+    if not block:
+      break
+    for i in xrange(0, len(block), record_len):
+      yield block[i:i + record_len]
+
+
+def _iter_file(f, record_len):
+  """Return an iterator over the lines or records of file F."""
+
+  if record_len is None:
+    return iter(f)
+  else:
+    return iter_records(f, record_len)
+
+
+def merge_files_onepass(
+    input_filenames, output_filename, key=None, record_len=None,
+    ):
   """Merge a number of input files into one output file.
 
   This is a merge in the sense of mergesort; namely, it is assumed
@@ -112,7 +144,12 @@ def merge_files_onepass(input_filenames, output_filename, key=None):
       try:
         for input_filename in input_filenames:
           chunks.append(open(input_filename, 'rb', BUFSIZE))
-        output_file.writelines(merge(chunks, key))
+        output_file.writelines(
+            merge(
+                [_iter_file(chunk, record_len) for chunk in chunks],
+                key,
+                )
+            )
       finally:
         for chunk in chunks:
           try:
@@ -155,7 +192,7 @@ def tempfile_generator(tempdirs=[]):
 
 def _merge_file_generation(
     input_filenames, delete_inputs, key=None,
-    max_merge=DEFAULT_MAX_MERGE, tempfiles=None,
+    max_merge=DEFAULT_MAX_MERGE, tempfiles=None, record_len=None,
     ):
   """Merge multiple input files into fewer output files.
 
@@ -187,7 +224,7 @@ def _merge_file_generation(
     group = filenames[:max_merge]
     del filenames[:max_merge]
     group_output = tempfiles.next()
-    merge_files_onepass(group, group_output, key=key)
+    merge_files_onepass(group, group_output, key=key, record_len=record_len)
     if delete_inputs:
       _try_delete_files(group)
     yield group_output
@@ -195,7 +232,7 @@ def _merge_file_generation(
 
 def merge_files(
     input_filenames, output_filename, key=None, delete_inputs=False,
-    max_merge=DEFAULT_MAX_MERGE, tempfiles=None,
+    max_merge=DEFAULT_MAX_MERGE, tempfiles=None, record_len=None,
     ):
   """Merge a number of input files into one output file.
 
@@ -223,7 +260,8 @@ def merge_files(
       filenames = list(
           _merge_file_generation(
               filenames, delete_inputs, key=key,
-              max_merge=max_merge, tempfiles=tempfiles
+              max_merge=max_merge, tempfiles=tempfiles,
+              record_len=record_len,
               )
           )
       # After the first iteration, we are only working with temporary
@@ -233,15 +271,27 @@ def merge_files(
 
     # The last merge writes the results directly into the output
     # file:
-    merge_files_onepass(filenames, output_filename, key=key)
+    merge_files_onepass(
+        filenames, output_filename, key=key, record_len=record_len,
+        )
     if delete_inputs:
       _try_delete_files(filenames)
 
 
 def sort_file(
       input, output, key=None,
-      buffer_size=32000, tempdirs=[], max_merge=DEFAULT_MAX_MERGE,
+      buffer_size=None, tempdirs=[], max_merge=DEFAULT_MAX_MERGE,
+      record_len=None,
       ):
+  """Sort the lines (or RECORD_LEN-byte records) of file INPUT into OUTPUT.
+
+  At most BUFFER_SIZE (default: the module's BUFFER_SIZE) lines or
+  records are sorted in memory at a time; the sorted runs are stored to
+  temporary files in TEMPDIRS and then merged."""
+
+  if buffer_size is None:
+    buffer_size = BUFFER_SIZE
+
   tempfiles = tempfile_generator(tempdirs)
 
   filenames = []
@@ -249,7 +299,7 @@ def sort_file(
   input_file = file(input, 'rb', BUFSIZE)
   try:
     try:
-      input_iterator = iter(input_file)
+      input_iterator = _iter_file(input_file, record_len)
       while True:
         current_chunk = list(itertools.islice(input_iterator, buffer_size))
         if not current_chunk:
@@ -268,6 +318,7 @@ def sort_file(
     merge_files(
         filenames, output, key=key,
         delete_inputs=True, max_merge=max_merge, tempfiles=tempfiles,
+        record_len=record_len,
         )
   finally:
     _try_delete_files(filenames)
@@ -27,6 +27,7 @@ from cStringIO import StringIO
 from cvs2svn_lib.cvs_item import CVSRevision
 from cvs2svn_lib.cvs_item import CVSBranch
 from cvs2svn_lib.cvs_item import CVSTag
+from cvs2svn_lib.metrics import format_snapshot
 
 
 class StatsKeeper:
@@ -35,12 +36,36 @@ class StatsKeeper:
     self._first_rev_date = 1L<<32
     self._last_rev_date = 0
     self._pass_timings = { }
+    # A map { pass_num : (pass_name, telemetry) } where TELEMETRY is a
+    # map as returned by PassTelemetry.stop():
+    self._pass_telemetry = { }
     self._stats_reflect_exclude = False
     self.reset_cvs_rev_info()
 
   def log_duration_for_pass(self, duration, pass_num, pass_name):
     self._pass_timings[pass_num] = (pass_name, duration,)
 
+  def log_telemetry_for_pass(self, telemetry, pass_num, pass_name):
+    self._pass_telemetry[pass_num] = (pass_name, telemetry,)
+
+  def get_pass_telemetry(self):
+    """Return a list of maps describing the resources used by each pass.
+
+    Each map contains the keys 'pass_num' and 'pass_name' in addition
+    to those of the map returned by PassTelemetry.stop().  The list is
+    in pass order."""
+
+    passes = self._pass_telemetry.keys()
+    passes.sort()
+    retval = []
+    for pass_num in passes:
+      (pass_name, telemetry,) = self._pass_telemetry[pass_num]
+      d = telemetry.copy()
+      d['pass_num'] = pass_num
+      d['pass_name'] = pass_name
+      retval.append(d)
+    return retval
+
   def set_stats_reflect_exclude(self, value):
     self._stats_reflect_exclude = value
 
@@ -88,12 +113,36 @@ class StatsKeeper:
     else:
       raise RuntimeError('Unknown CVSItem type')
 
+  def repos_file_count(self):
+    return self._repos_file_count
+
+  def cvs_item_count(self):
+    return (
+        self._cvs_revs_count + self._cvs_branches_count
+        + self._cvs_tags_count
+        )
+
   def set_svn_rev_count(self, count):
     self._svn_rev_count = count
 
   def svn_rev_count(self):
     return self._svn_rev_count
 
+  def merge(self, base, other):
+    """Merge into self the changes that OTHER made relative to BASE.
+
+    BASE and OTHER are StatsKeepers; OTHER is derived from BASE (for
+    example, by a pass that was run concurrently with other passes).
+    Take all pass timings and telemetry from OTHER, and each other
+    statistic from OTHER if it differs from the value in BASE."""
+
+    self._pass_timings.update(other._pass_timings)
+    self._pass_telemetry.update(other._pass_telemetry)
+    for (name, value) in other.__dict__.iteritems():
+      if name not in ['_pass_timings', '_pass_telemetry'] \
+             and value != base.__dict__.get(name):
+        self.__dict__[name] = value
+
   def __getstate__(self):
     state = self.__dict__.copy()
     # This can get kinda large, so we don't store it:
@@ -153,6 +202,45 @@ class StatsKeeper:
         % (pass_num, pass_name, time_string,)
         )
 
+  def single_pass_telemetry(self, pass_num):
+    (pass_name, telemetry,) = self._pass_telemetry[pass_num]
+    words = []
+    if telemetry['peak_rss'] is not None:
+      words.append(
+          'peak memory %.1f MiB' % (telemetry['peak_rss'] / 1048576.0,)
+          )
+    words.append(
+        'CPU %.3f s user, %.3f s system'
+        % (telemetry['cpu_user'], telemetry['cpu_system'],)
+        )
+    if telemetry['read_bytes'] is not None:
+      words.append(
+          'I/O %.1f MiB read, %.1f MiB written'
+          % (telemetry['read_bytes'] / 1048576.0,
+             telemetry['write_bytes'] / 1048576.0,)
+          )
+    if telemetry.get('peak_temp_disk') is not None:
+      words.append(
+          'peak temporary files %.1f MiB'
+          % (telemetry['peak_temp_disk'] / 1048576.0,)
+          )
+    return (
+        'Resources for pass%d (%s): %s.'
+        % (pass_num, pass_name, '; '.join(words),)
+        )
+
+  def single_pass_metrics(self, pass_num):
+    (pass_name, telemetry,) = self._pass_telemetry[pass_num]
+    counters = telemetry.get('counters', {})
+    timers = telemetry.get('timers', {})
+    if not counters and not timers:
+      return 'No storage metrics were recorded for pass%d (%s).' % (
+          pass_num, pass_name,
+          )
+    return 'Storage metrics for pass%d (%s):\n%s' % (
+        pass_num, pass_name, format_snapshot(counters, timers),
+        )
+
   def timings(self):
     passes = self._pass_timings.keys()
     passes.sort()
@@ -229,7 +229,7 @@ class SVNPrimaryCommit(SVNRevisionCommit):
   def get_log_msg(self):
     """Return the actual log message for this commit."""
 
-    return self._get_metadata().log_msg
+    return Ctx()._metadata_db.get_log_msg(self._get_metadata())
 
   def get_description(self):
     return 'commit'
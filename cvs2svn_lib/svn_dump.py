@@ -17,6 +17,8 @@
 """This module contains code to output to Subversion dumpfile format."""
 
 
+import os
+import stat
 import subprocess
 
 try:
@@ -27,11 +29,14 @@ except ImportError:
 from cvs2svn_lib.common import CommandError
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import InternalError
+from cvs2svn_lib.common import NullFile
 from cvs2svn_lib.common import path_split
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.cvs_path import CVSDirectory
 from cvs2svn_lib.cvs_path import CVSFile
 from cvs2svn_lib.svn_repository_delegate import SVNRepositoryDelegate
+from cvs2svn_lib.checkpoint import sync_file
+from cvs2svn_lib.checkpoint import reopen_file
 
 
 # Things that can happen to a file.
@@ -93,6 +98,38 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
     # directories etc.
     self._basic_directories = set([''])
 
+    # While commits are being replayed, the real dumpfile is kept
+    # here and self._dumpfile is a NullFile:
+    self._replayed_dumpfile = None
+
+  def set_replaying(self, replaying):
+    if replaying:
+      self._replayed_dumpfile = self._dumpfile
+      self._dumpfile = NullFile()
+    else:
+      self._dumpfile = self._replayed_dumpfile
+      self._replayed_dumpfile = None
+
+  def __getstate__(self):
+    # This is only used for checkpoints (see the checkpoint module).
+    # Only output to a regular file can be resumed:
+    if not (
+        isinstance(self._dumpfile, file)
+        and stat.S_ISREG(os.fstat(self._dumpfile.fileno()).st_mode)
+        ):
+      raise TypeError('cannot checkpoint output to %r' % (self._dumpfile,))
+    return (
+        self._revision_reader, self._dumpfile.name,
+        sync_file(self._dumpfile), self._basic_directories,
+        )
+
+  def __setstate__(self, state):
+    (
+        self._revision_reader, filename, length, self._basic_directories,
+        ) = state
+    self._dumpfile = reopen_file(filename, length)
+    self._replayed_dumpfile = None
+
   def _write_dumpfile_header(self):
     """Initialize the dumpfile with the standard headers.
 
@@ -225,6 +262,12 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
 
     assert op in [OP_ADD, OP_CHANGE]
 
+    if self._replayed_dumpfile is not None:
+      # Nothing is output, so don't bother reading the file contents,
+      # but let the revision reader release them:
+      self._revision_reader.skip_content(cvs_rev)
+      return
+
     # The property handling here takes advantage of an undocumented
     # but IMHO consistent feature of the Subversion dumpfile-loading
     # code.  When a node's properties aren't mentioned (that is, the
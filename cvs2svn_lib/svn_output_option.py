@@ -19,6 +19,7 @@
 
 import os
 import re
+import time
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import InternalError
@@ -45,6 +46,7 @@ from cvs2svn_lib.cvs_item import CVSRevisionNoop
 from cvs2svn_lib.repository_mirror import RepositoryMirror
 from cvs2svn_lib.repository_mirror import PathExistsError
 from cvs2svn_lib.openings_closings import SymbolingsReader
+from cvs2svn_lib.fill_source import SourceScoresCache
 from cvs2svn_lib.fill_source import get_source_set
 from cvs2svn_lib.svn_dump import DumpstreamDelegate
 from cvs2svn_lib.svn_dump import LoaderPipe
@@ -142,10 +144,32 @@ class SVNOutputOption(OutputOption):
   def setup(self, svn_rev_count):
     self._symbolings_reader = SymbolingsReader()
     self._mirror.open()
+    self._scores_cache = SourceScoresCache()
+    # The number of symbol fills and the total time spent on them:
+    self._fill_count = 0
+    self._fill_time = 0.0
     self._delegates = []
     Ctx().revision_reader.start()
     self.svn_rev_count = svn_rev_count
 
+  def __getstate__(self):
+    # This is only used for checkpoints, which are written between
+    # commits (see the checkpoint module).  The SymbolingsReader is
+    # reopened and the scores cache is started afresh when the state
+    # is restored.
+    state = self.__dict__.copy()
+    del state['_symbolings_reader']
+    del state['_scores_cache']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._symbolings_reader = SymbolingsReader()
+    self._scores_cache = SourceScoresCache()
+
+  def set_replaying(self, replaying):
+    self._invoke_delegates('set_replaying', replaying)
+
   def _get_author(self, svn_commit):
     author = svn_commit.get_author()
     name = self.author_transforms.get(author, author)
@@ -444,6 +468,12 @@ class SVNOutputOption(OutputOption):
     else:
       copy_source = parent_source
 
+    if copy_source is not None \
+           and self._is_exact_copy(dest_node, fill_source, copy_source):
+      # Everything under this directory is already correct, so there
+      # is no need to recurse:
+      return dest_node
+
     # The map {CVSPath : FillSource} of entries within this directory
     # that need filling:
     src_entries = fill_source.get_subsource_map()
@@ -457,6 +487,28 @@ class SVNOutputOption(OutputOption):
         symbol, dest_node, src_entries, copy_source
         )
 
+  def _is_exact_copy(self, dest_node, fill_source, copy_source):
+    """Return True iff DEST_NODE needs no further filling.
+
+    DEST_NODE is a directory that was copied from COPY_SOURCE in this
+    commit.  It is exactly right if COPY_SOURCE is a correct source
+    for every file in FILL_SOURCE and DEST_NODE contains no other
+    paths.  Since every file that can be copied from COPY_SOURCE
+    exists in DEST_NODE, the latter can be checked by comparing the
+    numbers of files and directories in the two trees.
+
+    This check is cheap (the counts are memoized in both trees), and
+    it allows whole unchanged subtrees to be skipped, so that the cost
+    of a fill depends mostly on the subtrees that differ from their
+    copy source."""
+
+    if not fill_source.is_complete_source(copy_source):
+      return False
+
+    return self._mirror.get_subtree_size(dest_node) == (
+        fill_source.get_file_count(), fill_source.get_dir_count(),
+        )
+
   def _cleanup_filled_directory(
         self, symbol, dest_node, src_entries, copy_source
         ):
@@ -645,38 +697,48 @@ class SVNOutputOption(OutputOption):
 
     self.end_commit()
 
-  def process_branch_commit(self, svn_commit):
-    self.start_commit(svn_commit.revnum, self._get_revprops(svn_commit))
-    logger.verbose('Filling branch:', svn_commit.symbol.name)
+  def _process_symbol_commit(self, svn_commit):
+    start_time = time.time()
 
     # Get the set of sources for the symbolic name:
     source_set = get_source_set(
         svn_commit.symbol,
         self._symbolings_reader.get_range_map(svn_commit),
+        self._scores_cache,
         )
 
     self.fill_symbol(svn_commit, source_set)
 
+    fill_time = time.time() - start_time
+    self._fill_count += 1
+    self._fill_time += fill_time
+    logger.verbose(
+        'Filled %s (%d files) in %.3f seconds'
+        % (svn_commit.symbol.name, source_set.get_file_count(), fill_time,)
+        )
+
+  def process_branch_commit(self, svn_commit):
+    self.start_commit(svn_commit.revnum, self._get_revprops(svn_commit))
+    logger.verbose('Filling branch:', svn_commit.symbol.name)
+    self._process_symbol_commit(svn_commit)
     self.end_commit()
 
   def process_tag_commit(self, svn_commit):
     self.start_commit(svn_commit.revnum, self._get_revprops(svn_commit))
     logger.verbose('Filling tag:', svn_commit.symbol.name)
-
-    # Get the set of sources for the symbolic name:
-    source_set = get_source_set(
-        svn_commit.symbol,
-        self._symbolings_reader.get_range_map(svn_commit),
-        )
-
-    self.fill_symbol(svn_commit, source_set)
-
+    self._process_symbol_commit(svn_commit)
     self.end_commit()
 
   def cleanup(self):
     self._invoke_delegates('finish')
     logger.verbose("Finished creating Subversion repository.")
     logger.quiet("Done.")
+    logger.normal(
+        'Symbol fills: %d fills in %.3f seconds'
+        % (self._fill_count, self._fill_time,)
+        )
+    logger.normal(self._scores_cache.get_stats())
+    self._scores_cache = None
     self._mirror.close()
     self._mirror = None
     Ctx().revision_reader.finish()
@@ -108,6 +108,15 @@ class SVNRepositoryDelegate:
 
     raise NotImplementedError()
 
+  def set_replaying(self, replaying):
+    """Set whether the following commits should only be replayed.
+
+    While REPLAYING is True, nothing should be output, but any state
+    needed for later commits must still be kept up to date.  See
+    OutputOption.set_replaying()."""
+
+    raise NotImplementedError()
+
   def finish(self):
     """All SVN revisions have been committed.
 
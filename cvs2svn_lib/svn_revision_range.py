@@ -14,7 +14,7 @@
 # history and logs, available at http://cvs2svn.tigris.org/.
 # ====================================================================
 
-"""This module contains the SVNRevisionRange class."""
+"""This module contains the SVNRevisionRange and RevisionScores classes."""
 
 
 import bisect
@@ -40,6 +40,14 @@ class SVNRevisionRange:
     if self.closing_revnum is None:
       self.closing_revnum = closing_revnum
 
+  def get_key(self):
+    """Return a tuple (source_lod, opening_revnum, closing_revnum).
+
+    The tuple is hashable and compares equal for equal ranges, so it
+    can be used to aggregate ranges that are shared by many paths."""
+
+    return (self.source_lod, self.opening_revnum, self.closing_revnum,)
+
   def __contains__(self, revnum):
     """Return True iff REVNUM is contained in the range."""
 
@@ -81,15 +89,18 @@ class RevisionScores:
     deltas_map = {}
 
     for range in svn_revision_ranges:
-      source_lod = range.source_lod
-      try:
-        deltas = deltas_map[source_lod]
-      except:
-        deltas = []
-        deltas_map[source_lod] = deltas
-      deltas.append((range.opening_revnum, +1))
-      if range.closing_revnum is not None:
-        deltas.append((range.closing_revnum, -1))
+      _add_deltas(
+          deltas_map,
+          range.source_lod, range.opening_revnum, range.closing_revnum, 1
+          )
+
+    self._compute_scores(deltas_map)
+
+  def _compute_scores(self, deltas_map):
+    """Compute self._scores_map from DELTAS_MAP.
+
+    DELTAS_MAP is a map {SOURCE_LOD : [(REVNUM, CHANGE), ...]} listing
+    the changes in score that take place at each revision."""
 
     # A map:
     #
@@ -169,3 +180,48 @@ class RevisionScores:
     return best_source_lod, best_revnum, best_score
 
 
+class WeightedRevisionScores(RevisionScores):
+  """RevisionScores computed from counts of identical ranges.
+
+  Typically many paths share the same SVNRevisionRange (for example,
+  all of the files that were unchanged since a tag's source revision).
+  Aggregating them first means that the cost of scoring depends on
+  the number of distinct ranges rather than the number of paths."""
+
+  def __init__(self, range_counts):
+    """Initialize based on RANGE_COUNTS.
+
+    RANGE_COUNTS is a map {(source_lod, opening_revnum,
+    closing_revnum) : count}, where the keys are as returned by
+    SVNRevisionRange.get_key().  The scores are the same as for a
+    RevisionScores instance constructed from a list containing each
+    range COUNT times."""
+
+    deltas_map = {}
+
+    for ((source_lod, opening_revnum, closing_revnum), count) \
+            in range_counts.iteritems():
+      _add_deltas(
+          deltas_map, source_lod, opening_revnum, closing_revnum, count
+          )
+
+    self._compute_scores(deltas_map)
+
+
+def _add_deltas(
+      deltas_map, source_lod, opening_revnum, closing_revnum, count
+      ):
+  """Record COUNT ranges from OPENING_REVNUM to CLOSING_REVNUM in DELTAS_MAP.
+
+  DELTAS_MAP is a map {SOURCE_LOD : [(REVNUM, CHANGE), ...]}."""
+
+  try:
+    deltas = deltas_map[source_lod]
+  except KeyError:
+    deltas = []
+    deltas_map[source_lod] = deltas
+  deltas.append((opening_revnum, +count))
+  if closing_revnum is not None:
+    deltas.append((closing_revnum, -count))
+
+
@@ -49,6 +49,32 @@ class SymbolTransform:
 
     raise NotImplementedError()
 
+  def is_path_independent(self):
+    """Return True iff transform() depends only on SYMBOL_NAME and REVISION.
+
+    More precisely, return True iff the return value of transform()
+    is determined by SYMBOL_NAME and by whether REVISION is a branch
+    revision number, so that it can be memoized by
+    CompoundSymbolTransform.  The default implementation returns
+    False, which is always safe."""
+
+    return False
+
+
+def is_path_independent(symbol_transform):
+  """Return SYMBOL_TRANSFORM.is_path_independent(), if it is defined.
+
+  Symbol transforms are not required to be derived from
+  SymbolTransform; return False for those that don't define the
+  method."""
+
+  try:
+    method = symbol_transform.is_path_independent
+  except AttributeError:
+    return False
+  else:
+    return method()
+
 
 class ReplaceSubstringsSymbolTransform(SymbolTransform):
   """Replace specific substrings in symbol names.
@@ -62,6 +88,9 @@ class ReplaceSubstringsSymbolTransform(SymbolTransform):
   def transform(self, cvs_file, symbol_name, revision):
     return symbol_name.replace(self.old, self.new)
 
+  def is_path_independent(self):
+    return True
+
 
 class NormalizePathsSymbolTransform(SymbolTransform):
   def transform(self, cvs_file, symbol_name, revision):
@@ -70,13 +99,21 @@ class NormalizePathsSymbolTransform(SymbolTransform):
     except IllegalSVNPathError, e:
       raise FatalError('Problem with %s: %s' % (symbol_name, e,))
 
+  def is_path_independent(self):
+    return True
+
 
 class CompoundSymbolTransform(SymbolTransform):
   """A SymbolTransform that applies other SymbolTransforms in series.
 
   Each of the contained SymbolTransforms is applied, one after the
   other.  If any of them returns None, then None is returned (the
-  following SymbolTransforms are ignored)."""
+  following SymbolTransforms are ignored).
+
+  Runs of consecutive path-independent SymbolTransforms (see
+  SymbolTransform.is_path_independent()) are combined into stages
+  whose results are memoized by (symbol_name, is_branch), because the
+  same symbol names typically appear in very many files."""
 
   def __init__(self, symbol_transforms):
     """Ininitialize a CompoundSymbolTransform.
@@ -85,17 +122,63 @@ class CompoundSymbolTransform(SymbolTransform):
 
     self.symbol_transforms = list(symbol_transforms)
 
-  def transform(self, cvs_file, symbol_name, revision):
+    # A list of stages.  Each stage is either a single path-dependent
+    # SymbolTransform, or a _MemoizedSymbolTransforms instance
+    # wrapping a run of path-independent SymbolTransforms:
+    self._stages = []
     for symbol_transform in self.symbol_transforms:
-      symbol_name = symbol_transform.transform(
-          cvs_file, symbol_name, revision
-          )
+      if not is_path_independent(symbol_transform):
+        self._stages.append(symbol_transform)
+      elif self._stages \
+               and isinstance(self._stages[-1], _MemoizedSymbolTransforms):
+        self._stages[-1].symbol_transforms.append(symbol_transform)
+      else:
+        self._stages.append(_MemoizedSymbolTransforms([symbol_transform]))
+
+  def transform(self, cvs_file, symbol_name, revision):
+    for stage in self._stages:
+      symbol_name = stage.transform(cvs_file, symbol_name, revision)
       if symbol_name is None:
         # Don't continue with other symbol transforms:
         break
 
     return symbol_name
 
+  def is_path_independent(self):
+    for symbol_transform in self.symbol_transforms:
+      if not is_path_independent(symbol_transform):
+        return False
+
+    return True
+
+
+class _MemoizedSymbolTransforms(SymbolTransform):
+  """Apply path-independent SymbolTransforms in series, with memoization.
+
+  The results are memoized in a map {(symbol_name, is_branch) :
+  new_name}.  The number of entries is bounded by the number of
+  distinct symbol names in the repository."""
+
+  def __init__(self, symbol_transforms):
+    self.symbol_transforms = symbol_transforms
+    self._memo = {}
+
+  def transform(self, cvs_file, symbol_name, revision):
+    key = (symbol_name, is_branch_revision_number(revision),)
+    try:
+      return self._memo[key]
+    except KeyError:
+      new_name = symbol_name
+      for symbol_transform in self.symbol_transforms:
+        new_name = symbol_transform.transform(cvs_file, new_name, revision)
+        if new_name is None:
+          break
+      self._memo[key] = new_name
+      return new_name
+
+  def is_path_independent(self):
+    return True
+
 
 class RegexpSymbolTransform(SymbolTransform):
   """Transform symbols by using a regexp textual substitution."""
@@ -115,6 +198,9 @@ class RegexpSymbolTransform(SymbolTransform):
   def transform(self, cvs_file, symbol_name, revision):
     return self.pattern.sub(self.replacement, symbol_name)
 
+  def is_path_independent(self):
+    return True
+
 
 class SymbolMapper(SymbolTransform):
   """A SymbolTransform that transforms specific symbol definitions.
@@ -178,6 +264,14 @@ class SubtreeSymbolMapper(SymbolTransform):
     # A map {symbol_name : {cvs_path : new_name}}:
     self._map = {}
 
+    # The id of the CVSFile most recently passed to transform(), and
+    # the list of its normalized rcs_path followed by the paths of
+    # its ancestor directories.  All of the symbols of a file are
+    # transformed one after the other, so this avoids recomputing the
+    # list for each symbol:
+    self._last_cvs_file_id = None
+    self._last_ancestors = None
+
     for (cvs_path, symbol_name, new_name) in items:
       self[cvs_path, symbol_name] = new_name
 
@@ -206,19 +300,38 @@ class SubtreeSymbolMapper(SymbolTransform):
       # No rules for that symbol name
       return symbol_name
 
-    # cvs_file.rcs_path is guaranteed to already be normalised the way
-    # os.path.normpath() normalises paths.  No need to call it again.
-    cvs_path = os.path.normcase(cvs_file.rcs_path)
-    while True:
+    for cvs_path in self._get_ancestors(cvs_file):
       try:
         return symbol_map[cvs_path]
       except KeyError:
+        pass
+
+    # No rules found for that path; return symbol name unaltered.
+    return symbol_name
+
+  def _get_ancestors(self, cvs_file):
+    """Return the normalized rcs_path of CVS_FILE and of its ancestors.
+
+    The paths are listed from the most specific to the least
+    specific."""
+
+    if cvs_file.id != self._last_cvs_file_id:
+      # cvs_file.rcs_path is guaranteed to already be normalised the
+      # way os.path.normpath() normalises paths.  No need to call it
+      # again.
+      cvs_path = os.path.normcase(cvs_file.rcs_path)
+      ancestors = [cvs_path]
+      while True:
         new_cvs_path = os.path.dirname(cvs_path)
         if new_cvs_path == cvs_path:
-          # No rules found for that path; return symbol name unaltered.
-          return symbol_name
-        else:
-          cvs_path = new_cvs_path
+          break
+        cvs_path = new_cvs_path
+        ancestors.append(cvs_path)
+
+      self._last_cvs_file_id = cvs_file.id
+      self._last_ancestors = ancestors
+
+    return self._last_ancestors
 
 
 class IgnoreSymbolTransform(SymbolTransform):
@@ -238,6 +351,9 @@ class IgnoreSymbolTransform(SymbolTransform):
     else:
       return symbol_name
 
+  def is_path_independent(self):
+    return True
+
 
 class SubtreeSymbolTransform(SymbolTransform):
   """A wrapper around another SymbolTransform, that limits it to a
@@ -252,8 +368,21 @@ class SubtreeSymbolTransform(SymbolTransform):
     assert isinstance(cvs_path, str)
     self.__subtree = os.path.normcase(os.path.normpath(cvs_path))
     self.__subtree_len = len(self.__subtree)
+    if is_path_independent(inner_symbol_transform):
+      # The inner transform gives the same results in every file of
+      # the subtree, so it can be memoized:
+      inner_symbol_transform = _MemoizedSymbolTransforms(
+          [inner_symbol_transform]
+          )
     self.__inner = inner_symbol_transform
 
+    # The id of the CVSFile that was most recently checked by
+    # __does_rule_apply_to(), and the result of the check.  All of
+    # the symbols of a file are transformed one after the other, so
+    # usually the check only has to be done once per file:
+    self.__last_cvs_file_id = None
+    self.__last_result = None
+
   def __does_rule_apply_to(self, cvs_file):
     #
     # NOTE: This turns out to be a hot path through the code.
@@ -298,7 +427,11 @@ class SubtreeSymbolTransform(SymbolTransform):
     return cvs_path[self.__subtree_len] == os.path.sep
 
   def transform(self, cvs_file, symbol_name, revision):
-    if self.__does_rule_apply_to(cvs_file):
+    if cvs_file.id != self.__last_cvs_file_id:
+      self.__last_result = self.__does_rule_apply_to(cvs_file)
+      self.__last_cvs_file_id = cvs_file.id
+
+    if self.__last_result:
       return self.__inner.transform(cvs_file, symbol_name, revision)
     else:
       # Rule does not apply to that path; return symbol name unaltered.
@@ -323,6 +456,9 @@ class TagOnlyTransform(SymbolTransform):
       # It's a tag
       return self.__inner.transform(cvs_file, symbol_name, revision)
 
+  def is_path_independent(self):
+    return is_path_independent(self.__inner)
+
 
 class BranchOnlyTransform(SymbolTransform):
   """A wrapper around another SymbolTransform, that limits it to
@@ -342,4 +478,7 @@ class BranchOnlyTransform(SymbolTransform):
       # It's a tag
       return symbol_name
 
+  def is_path_independent(self):
+    return is_path_independent(self.__inner)
+
 
@@ -0,0 +1,336 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains tools to measure the resources used by passes.
+
+For each pass, PassManager uses a PassTelemetry to record the memory
+(resident set size), CPU time, and I/O used by the pass, the sizes
+of the artifacts at the start and end of the pass, the peak size of
+the temporary directories during the pass, and the values of the
+counters and timers of the metrics module.  The results are
+stored in the StatsKeeper (and therefore archived in the
+STATISTICS_FILE of the pass) and can be written as a JSON report
+using --telemetry-file.
+
+Memory and I/O are determined by reading from the /proc filesystem.
+Where that is not available (i.e., on systems other than Linux), the
+corresponding values are None."""
+
+
+import os
+import re
+import time
+import threading
+
+from cvs2svn_lib import metrics
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.artifact_manager import artifact_manager
+
+
+_status_re = re.compile(r'^(?P<name>VmRSS|VmHWM)\:\s+(?P<kb>\d+)\s+kB$')
+
+
+def _read_proc_status():
+  """Return a map {'VmRSS' : bytes, 'VmHWM' : bytes} for this process.
+
+  Return an empty map if /proc/self/status cannot be read."""
+
+  retval = {}
+  try:
+    f = open('/proc/self/status')
+  except IOError:
+    return retval
+  try:
+    for line in f:
+      m = _status_re.match(line.strip())
+      if m:
+        retval[m.group('name')] = int(m.group('kb')) * 1024
+  finally:
+    f.close()
+  return retval
+
+
+def get_rss():
+  """Return the current resident set size in bytes, or None."""
+
+  return _read_proc_status().get('VmRSS')
+
+
+def _reset_peak_rss():
+  """Reset the peak resident set size (VmHWM) of this process.
+
+  Return True on success.  This only works on Linux 4.0 and later."""
+
+  try:
+    f = open('/proc/self/clear_refs', 'w')
+    try:
+      f.write('5')
+    finally:
+      f.close()
+  except (IOError, OSError):
+    return False
+  return True
+
+
+def get_io_counters():
+  """Return a map of the I/O counters from /proc/self/io.
+
+  The map contains the keys 'rchar' and 'wchar' (the bytes passed to
+  read and write system calls) and 'read_bytes' and 'write_bytes' (the
+  bytes actually read from and written to storage).  Return an empty
+  map if /proc/self/io cannot be read."""
+
+  retval = {}
+  try:
+    f = open('/proc/self/io')
+  except IOError:
+    return retval
+  try:
+    for line in f:
+      (name, value) = line.split(':', 1)
+      if name in ('rchar', 'wchar', 'read_bytes', 'write_bytes'):
+        retval[name] = int(value)
+  finally:
+    f.close()
+  return retval
+
+
+def get_tree_size(directories):
+  """Return the total size in bytes of the files under DIRECTORIES.
+
+  Files that disappear while the directories are being scanned are
+  ignored."""
+
+  size = 0
+  for directory in directories:
+    for (dirpath, dirnames, filenames) in os.walk(directory):
+      for filename in filenames:
+        try:
+          size += os.path.getsize(os.path.join(dirpath, filename))
+        except OSError:
+          pass
+  return size
+
+
+class _Sampler(threading.Thread):
+  """A thread that samples resource use at regular intervals.
+
+  It records the resident set size and the total size of the files in
+  TEMP_DIRS.  The latter includes the files that are not registered as
+  artifacts, like the runs of external sorts and the tables of
+  DigestIndexes that have been moved to disk."""
+
+  def __init__(self, interval, temp_dirs):
+    threading.Thread.__init__(self)
+    self.setDaemon(True)
+    self.interval = interval
+    self.temp_dirs = temp_dirs
+    self._stop_event = threading.Event()
+    self.samples = []
+    self.peak_temp_disk = None
+
+  def _sample(self):
+    rss = get_rss()
+    if rss is not None:
+      self.samples.append(rss)
+    if self.temp_dirs:
+      temp_disk = get_tree_size(self.temp_dirs)
+      if self.peak_temp_disk is None or temp_disk > self.peak_temp_disk:
+        self.peak_temp_disk = temp_disk
+
+  def run(self):
+    self._sample()
+    while not self._stop_event.isSet():
+      self._stop_event.wait(self.interval)
+      self._sample()
+
+  def stop(self):
+    self._stop_event.set()
+    self.join()
+
+
+class PassTelemetry:
+  """Measure the resources used between calls to start() and stop()."""
+
+  # The number of seconds between samples of the resident set size and
+  # of the size of the temporary directories:
+  SAMPLE_INTERVAL = 1.0
+
+  def start(self):
+    """Take the initial measurements and start sampling memory use."""
+
+    self._peak_rss_reset = _reset_peak_rss()
+    self._start_time = time.time()
+    self._start_times = os.times()
+    self._start_io = get_io_counters()
+    self._start_artifact_sizes = artifact_manager.get_artifact_sizes()
+    metrics.reset()
+    ctx = Ctx()
+    temp_dirs = [ctx.tmpdir] + ctx.get_temp_dirs()
+    temp_dirs = [
+        directory for directory in temp_dirs
+        if directory is not None and os.path.isdir(directory)
+        ]
+    self._sampler = _Sampler(self.SAMPLE_INTERVAL, temp_dirs)
+    self._sampler.start()
+
+  def stop(self):
+    """Stop measuring and return the results as a map.
+
+    The map has the following keys:
+
+        'wall_time', 'cpu_user', 'cpu_system', 'children_cpu_user',
+        'children_cpu_system' -- seconds elapsed and used by this
+            process and by its child processes (e.g., co or cvs).
+
+        'peak_rss', 'average_rss' -- the peak and average resident set
+            size in bytes, or None if they are not known.
+
+        'rchar', 'wchar', 'read_bytes', 'write_bytes' -- the I/O done
+            by this process in bytes (see get_io_counters()), or None
+            if they are not known.
+
+        'artifacts_start', 'artifacts_end' -- maps {name : size} of
+            the artifacts that existed at the start and end of the
+            pass.
+
+        'peak_temp_disk' -- the largest total size in bytes of all
+            files in the temporary directories that was sampled during
+            the pass, or None if there are no temporary directories.
+            When passes run concurrently, this includes the files of
+            the other passes.
+
+        'counters', 'timers' -- the values of the counters and timers
+            used during the pass, as returned by metrics.snapshot().
+
+    """
+
+    self._sampler.stop()
+    (counters, timers,) = metrics.snapshot()
+    end_times = os.times()
+    end_io = get_io_counters()
+    status = _read_proc_status()
+
+    samples = self._sampler.samples
+    if samples:
+      peak_rss = max(samples)
+      average_rss = sum(samples) / len(samples)
+    else:
+      peak_rss = average_rss = None
+    if self._peak_rss_reset and 'VmHWM' in status:
+      # The kernel's high-water mark also catches peaks between
+      # samples:
+      if peak_rss is None or status['VmHWM'] > peak_rss:
+        peak_rss = status['VmHWM']
+
+    retval = {
+        'wall_time' : time.time() - self._start_time,
+        'cpu_user' : end_times[0] - self._start_times[0],
+        'cpu_system' : end_times[1] - self._start_times[1],
+        'children_cpu_user' : end_times[2] - self._start_times[2],
+        'children_cpu_system' : end_times[3] - self._start_times[3],
+        'peak_rss' : peak_rss,
+        'average_rss' : average_rss,
+        'artifacts_start' : self._start_artifact_sizes,
+        'artifacts_end' : artifact_manager.get_artifact_sizes(),
+        'peak_temp_disk' : self._sampler.peak_temp_disk,
+        'counters' : counters,
+        'timers' : timers,
+        }
+    for name in ['rchar', 'wchar', 'read_bytes', 'write_bytes']:
+      if name in self._start_io and name in end_io:
+        retval[name] = end_io[name] - self._start_io[name]
+      else:
+        retval[name] = None
+
+    self._sampler = None
+    return retval
+
+
+def write_json(value, f, indent=''):
+  """Write VALUE to file object F in JSON format.
+
+  VALUE can consist of dicts (with string keys), lists, tuples,
+  strings, numbers, booleans, and None.  (The json module is not
+  available in all of the Python versions that we support.)"""
+
+  if value is None:
+    f.write('null')
+  elif value is True:
+    f.write('true')
+  elif value is False:
+    f.write('false')
+  elif isinstance(value, (int, long)):
+    f.write('%d' % (value,))
+  elif isinstance(value, float):
+    f.write(repr(value))
+  elif isinstance(value, basestring):
+    if isinstance(value, unicode):
+      value = value.encode('utf-8')
+    f.write('"')
+    for c in value:
+      if c in '"\\':
+        f.write('\\' + c)
+      elif c < ' ':
+        f.write('\\u%04x' % (ord(c),))
+      else:
+        f.write(c)
+    f.write('"')
+  elif isinstance(value, dict):
+    if not value:
+      f.write('{}')
+      return
+    f.write('{\n')
+    items = value.items()
+    items.sort()
+    for (i, (key, item)) in enumerate(items):
+      f.write(indent + '  ')
+      write_json(str(key), f)
+      f.write(': ')
+      write_json(item, f, indent + '  ')
+      if i + 1 < len(items):
+        f.write(',')
+      f.write('\n')
+    f.write(indent + '}')
+  elif isinstance(value, (list, tuple)):
+    if not value:
+      f.write('[]')
+      return
+    f.write('[\n')
+    for (i, item) in enumerate(value):
+      f.write(indent + '  ')
+      write_json(item, f, indent + '  ')
+      if i + 1 < len(value):
+        f.write(',')
+      f.write('\n')
+    f.write(indent + ']')
+  else:
+    raise TypeError('cannot write %r as JSON' % (value,))
+
+
+def write_telemetry_report(stats_keeper, filename):
+  """Write the telemetry recorded in STATS_KEEPER to FILENAME as JSON.
+
+  The report is a JSON object {'passes' : [...]} with one object per
+  pass, in pass order, containing the pass number and name and the
+  values described in PassTelemetry.stop()."""
+
+  f = open(filename, 'w')
+  write_json({'passes' : stats_keeper.get_pass_telemetry()}, f)
+  f.write('\n')
+  f.close()
+
+
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the DependencyChecker class.
+
+When executed, this program feeds DependencyChecker sets of items
+with consistent and inconsistent dependencies and checks which
+inconsistencies are reported."""
+
+import sys
+import os
+import shutil
+import pickle
+import unittest
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.common import FatalException
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.log import _Log
+from cvs2svn_lib.check_dependencies_pass import DependencyChecker
+
+TMPDIR = os.path.join(SRCPATH, 'cvs2svn-tmp', 'dependency-checker')
+
+
+class Item:
+  """A stand-in for a CVSItem, with just the dependency methods."""
+
+  def __init__(self, id, pred_ids=[], succ_ids=[]):
+    self.id = id
+    self.pred_ids = set(pred_ids)
+    self.succ_ids = set(succ_ids)
+
+  def get_pred_ids(self):
+    return self.pred_ids
+
+  def get_succ_ids(self):
+    return self.succ_ids
+
+
+class DependencyCheckerTestCase(unittest.TestCase):
+  def setUp(self):
+    if os.path.isdir(TMPDIR):
+      shutil.rmtree(TMPDIR)
+    os.makedirs(TMPDIR)
+    Ctx().tmpdir = TMPDIR
+    logger.log_level = _Log.ERROR
+
+  def tearDown(self):
+    shutil.rmtree(TMPDIR)
+
+  def check(self, items):
+    """Feed ITEMS to a DependencyChecker; return the error message.
+
+    Return None if no inconsistency was reported."""
+
+    checker = DependencyChecker('test items')
+    for item in items:
+      checker.add(item)
+    try:
+      checker.finish()
+    except FatalException, e:
+      return str(e)
+    else:
+      return None
+
+  def assertLeavesNoFiles(self):
+    self.assertEqual(os.listdir(TMPDIR), [])
+
+  def test_consistent(self):
+    self.assertEqual(
+        self.check([
+            Item(1, succ_ids=[2, 3]),
+            Item(2, pred_ids=[1], succ_ids=[4]),
+            Item(3, pred_ids=[1]),
+            Item(4, pred_ids=[2]),
+            ]),
+        None,
+        )
+    self.assertLeavesNoFiles()
+
+  def test_order_does_not_matter(self):
+    self.assertEqual(
+        self.check([
+            Item(4, pred_ids=[2]),
+            Item(3, pred_ids=[1]),
+            Item(2, pred_ids=[1], succ_ids=[4]),
+            Item(1, succ_ids=[2, 3]),
+            ]),
+        None,
+        )
+
+  def test_missing_pred(self):
+    message = self.check([
+        Item(1, succ_ids=[2]),
+        Item(2),
+        ])
+    self.assertNotEqual(message, None)
+    self.assert_('Item <1> lists succ=<2>, but not vice versa.' in message)
+    self.assertLeavesNoFiles()
+
+  def test_missing_succ(self):
+    message = self.check([
+        Item(0x1a),
+        Item(0x2b, pred_ids=[0x1a]),
+        ])
+    self.assertNotEqual(message, None)
+    self.assert_('Item <2b> lists pred=<1a>, but not vice versa.' in message)
+
+  def test_mismatched_ids(self):
+    # Item 2 names 3 as its successor, but item 3 names 1 as its
+    # predecessor; both dependencies are reported:
+    message = self.check([
+        Item(1),
+        Item(2, succ_ids=[3]),
+        Item(3, pred_ids=[1]),
+        ])
+    self.assertNotEqual(message, None)
+    self.assert_('Item <2> lists succ=<3>, but not vice versa.' in message)
+    self.assert_('Item <3> lists pred=<1>, but not vice versa.' in message)
+
+  def test_only_bad_dependencies_reported(self):
+    message = self.check([
+        Item(1, succ_ids=[2, 3]),
+        Item(2, pred_ids=[1]),
+        Item(3),
+        ])
+    self.assertNotEqual(message, None)
+    self.assert_('<1> lists succ=<3>' in message)
+    self.assert_('<2>' not in message)
+
+  def test_pickle_discards_later_records(self):
+    checker = DependencyChecker('test items')
+    checker.add(Item(1, succ_ids=[2]))
+    checker.add(Item(2, pred_ids=[1]))
+    state = pickle.dumps(checker)
+    # This record is lost when the checkpoint is restored:
+    checker.add(Item(3, pred_ids=[2]))
+    checker.f.close()
+    checker = pickle.loads(state)
+    checker.add(Item(4))
+    checker.finish()
+    self.assertLeavesNoFiles()
+
+
+if __name__ == '__main__':
+  suite = unittest.makeSuite(DependencyCheckerTestCase)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the DigestIndex class.
+
+When executed, this program checks lookups, collisions in the probe
+sequences, growth of the table, moving it to a temporary file, and
+pickling it for checkpoints."""
+
+import sys
+import os
+import shutil
+import struct
+import cPickle
+import unittest
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.log import _Log
+from cvs2svn_lib.digest_index import DigestIndex
+from cvs2svn_lib.digest_index import SLOT_LEN
+
+TMPDIR = os.path.join(SRCPATH, 'cvs2svn-tmp', 'digest-index')
+
+
+class SmallDigestIndex(DigestIndex):
+  INITIAL_CAPACITY = 16
+
+
+def digest(i):
+  return sha1(str(i)).digest()
+
+
+def key(home, suffix):
+  """Return a digest whose home slot is HOME (in a small table)."""
+
+  return struct.pack('=Q', home) + struct.pack('=Q', suffix) + 'xxxx'
+
+
+class DigestIndexTestCase(unittest.TestCase):
+  def setUp(self):
+    if os.path.isdir(TMPDIR):
+      shutil.rmtree(TMPDIR)
+    os.makedirs(TMPDIR)
+    logger.log_level = _Log.ERROR
+
+  def tearDown(self):
+    shutil.rmtree(TMPDIR)
+
+  def check_contents(self, index, ids):
+    """Check that INDEX maps exactly digest(i) to i for i in IDS."""
+
+    self.assertEqual(len(index), len(ids))
+    for i in ids:
+      self.assertEqual(index[digest(i)], i)
+    self.assert_(digest(0) not in index)
+
+  def test_lookup(self):
+    index = DigestIndex(tmpdir=TMPDIR)
+    index[digest(1)] = 1
+    index[digest(2)] = 7
+    self.assertEqual(index[digest(1)], 1)
+    self.assertEqual(index.get(digest(2)), 7)
+    self.assertEqual(index.get(digest(3)), None)
+    self.assertEqual(index.get(digest(3), 5), 5)
+    self.assert_(digest(1) in index)
+    self.assert_(digest(3) not in index)
+    self.assertRaises(KeyError, lambda: index[digest(3)])
+    self.assertEqual(len(index), 2)
+    # Only the first KEY_LEN bytes are significant:
+    self.assertEqual(index[digest(1)[:16] + 'other'], 1)
+    index.close()
+
+  def test_overwrite(self):
+    index = DigestIndex(tmpdir=TMPDIR)
+    index[digest(1)] = 1
+    index[digest(1)] = 2
+    self.assertEqual(index[digest(1)], 2)
+    self.assertEqual(len(index), 1)
+    index.close()
+
+  def test_invalid_id(self):
+    index = DigestIndex(tmpdir=TMPDIR)
+    self.assertRaises(ValueError, index.__setitem__, digest(1), 0)
+    self.assertEqual(len(index), 0)
+    index.close()
+
+  def test_probing(self):
+    index = SmallDigestIndex(tmpdir=TMPDIR)
+    # These all have the same home slot:
+    for suffix in range(1, 6):
+      index[key(3, suffix)] = suffix
+    # This one's home slot is taken by one of the above:
+    index[key(4, 0)] = 10
+    for suffix in range(1, 6):
+      self.assertEqual(index[key(3, suffix)], suffix)
+    self.assertEqual(index[key(4, 0)], 10)
+    self.assert_(key(3, 6) not in index)
+    index.close()
+
+  def test_probing_wraps_around(self):
+    index = SmallDigestIndex(tmpdir=TMPDIR)
+    last = SmallDigestIndex.INITIAL_CAPACITY - 1
+    for suffix in range(1, 4):
+      index[key(last, suffix)] = suffix
+    index[key(0, 0)] = 10
+    for suffix in range(1, 4):
+      self.assertEqual(index[key(last, suffix)], suffix)
+    self.assertEqual(index[key(0, 0)], 10)
+    index.close()
+
+  def test_growth(self):
+    index = SmallDigestIndex(tmpdir=TMPDIR)
+    for i in range(1, 1001):
+      index[digest(i)] = i
+    self.assert_(3 * len(index) <= 2 * index._capacity)
+    self.check_contents(index, range(1, 1001))
+    index.close()
+
+  def test_spill(self):
+    index = SmallDigestIndex(tmpdir=TMPDIR, memory=64 * SLOT_LEN)
+    for i in range(1, 43):
+      index[digest(i)] = i
+    # The table has 64 slots and still fits in memory:
+    self.assertEqual(os.listdir(TMPDIR), [])
+    index[digest(43)] = 43
+    # Now it has 128 slots and has been moved to a file:
+    self.assertEqual(len(os.listdir(TMPDIR)), 1)
+    for i in range(44, 301):
+      index[digest(i)] = i
+    self.assertEqual(len(os.listdir(TMPDIR)), 1)
+    self.check_contents(index, range(1, 301))
+    index.close()
+    self.assertEqual(os.listdir(TMPDIR), [])
+
+  def check_pickle(self, index, n, m):
+    """Pickle INDEX after adding ids 1..N, then add ids up to M.
+
+    Check that the unpickled index (which is unpickled twice, as if
+    the conversion were resumed twice from the same checkpoint) only
+    contains the ids up to N."""
+
+    for i in range(1, n + 1):
+      index[digest(i)] = i
+    state = cPickle.dumps(index, -1)
+    # The state doesn't contain the table itself:
+    self.assert_(len(state) < 1000)
+    for i in range(n + 1, m + 1):
+      index[digest(i)] = i
+    index._map.flush()
+    for attempt in range(2):
+      restored = cPickle.loads(state)
+      self.check_contents(restored, range(1, n + 1))
+      restored[digest(n + 1)] = n + 1
+      self.assertEqual(restored[digest(n + 1)], n + 1)
+      restored._map.flush()
+    restored.close()
+
+  def test_pickle(self):
+    self.check_pickle(DigestIndex(tmpdir=TMPDIR), 100, 200)
+
+  def test_pickle_before_growth(self):
+    self.check_pickle(SmallDigestIndex(tmpdir=TMPDIR), 10, 500)
+
+  def test_pickle_after_spill(self):
+    self.check_pickle(
+        SmallDigestIndex(tmpdir=TMPDIR, memory=64 * SLOT_LEN), 100, 500
+        )
+
+  def test_pickle_missing_file(self):
+    index = DigestIndex(tmpdir=TMPDIR)
+    index[digest(1)] = 1
+    state = cPickle.dumps(index, -1)
+    index.close()
+    self.assertRaises(FatalError, cPickle.loads, state)
+
+
+if __name__ == '__main__':
+  suite = unittest.makeSuite(DigestIndexTestCase)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the LRUCache class.
+
+When executed, this program checks the eviction order, the size
+accounting (including resizing, as done for --memory-limit), and the
+hit and miss counters of LRUCache."""
+
+import sys
+import os
+import unittest
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.lru_cache import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+  def fill(self, cache, keys, size=1):
+    for key in keys:
+      cache.set(key, key.upper(), size)
+
+  def assertKeys(self, cache, keys):
+    """Check that CACHE contains exactly KEYS (without touching them)."""
+
+    self.assertEqual(sorted(cache._map.keys()), sorted(keys))
+    self.assertEqual(len(cache), len(keys))
+
+  def test_lookup(self):
+    cache = LRUCache(10)
+    cache.set('a', 'A')
+    cache['b'] = 'B'
+    self.assertEqual(cache['a'], 'A')
+    self.assertEqual(cache.get('b'), 'B')
+    self.assertEqual(cache.get('c'), None)
+    self.assertEqual(cache.get('c', 'C'), 'C')
+    self.assertRaises(KeyError, lambda: cache['c'])
+    self.assert_('a' in cache)
+    self.assert_('c' not in cache)
+
+  def test_eviction_order(self):
+    cache = LRUCache(3)
+    self.fill(cache, 'abc')
+    self.fill(cache, 'd')
+    self.assertKeys(cache, 'bcd')
+    self.fill(cache, 'e')
+    self.assertKeys(cache, 'cde')
+    self.assertEqual(cache.evictions, 2)
+
+  def test_lookup_refreshes(self):
+    cache = LRUCache(3)
+    self.fill(cache, 'abc')
+    cache['a']
+    self.fill(cache, 'd')
+    self.assertKeys(cache, 'acd')
+    # Looking up a missing key, or checking membership, doesn't change
+    # the order:
+    cache.get('x')
+    'c' in cache
+    self.fill(cache, 'e')
+    self.assertKeys(cache, 'ade')
+
+  def test_overwrite_refreshes(self):
+    cache = LRUCache(3)
+    self.fill(cache, 'abc')
+    cache.set('a', 'new')
+    self.fill(cache, 'd')
+    self.assertKeys(cache, 'acd')
+    self.assertEqual(cache['a'], 'new')
+
+  def test_sizes(self):
+    cache = LRUCache(10)
+    cache.set('a', 'A', 4)
+    cache.set('b', 'B', 4)
+    self.assertEqual(cache.size, 8)
+    # Replacing an entry charges only its new size:
+    cache.set('a', 'A', 2)
+    self.assertEqual(cache.size, 6)
+    # This entry needs room for 5, so the least recently used one
+    # ('b') is evicted:
+    cache.set('c', 'C', 5)
+    self.assertKeys(cache, 'ac')
+    self.assertEqual(cache.size, 7)
+    del cache['a']
+    self.assertEqual(cache.size, 5)
+    self.assertKeys(cache, 'c')
+
+  def test_oversized_entry(self):
+    cache = LRUCache(10)
+    self.fill(cache, 'ab', 3)
+    # An entry that is larger than the whole cache evicts everything
+    # else but is kept itself:
+    cache.set('c', 'C', 20)
+    self.assertKeys(cache, 'c')
+    self.assertEqual(cache.size, 20)
+    # It is evicted by the next entry:
+    cache.set('d', 'D', 1)
+    self.assertKeys(cache, 'd')
+
+  def test_resize(self):
+    cache = LRUCache(10)
+    self.fill(cache, 'abcde', 2)
+    cache['a']
+    cache.resize(6)
+    self.assertEqual(cache.max_size, 6)
+    self.assertKeys(cache, 'ade')
+    self.assertEqual(cache.size, 6)
+    self.assertEqual(cache.evictions, 2)
+    cache.resize(100)
+    self.fill(cache, 'fghij', 2)
+    self.assertEqual(len(cache), 8)
+    cache.resize(0)
+    self.assertKeys(cache, [])
+    self.assertEqual(cache.size, 0)
+
+  def test_clear(self):
+    cache = LRUCache(10)
+    self.fill(cache, 'abc')
+    cache.clear()
+    self.assertKeys(cache, [])
+    self.assertEqual(cache.size, 0)
+    self.fill(cache, 'de')
+    self.assertKeys(cache, 'de')
+
+  def test_stats(self):
+    cache = LRUCache(2)
+    self.assertEqual(
+        cache.get_stats(), '0 lookups, 0 hits (0.0%), 0 misses, 0 evictions'
+        )
+    self.fill(cache, 'abc')
+    cache['c']
+    cache.get('b')
+    cache.get('a')
+    self.assertRaises(KeyError, lambda: cache['x'])
+    self.assertEqual(cache.hits, 2)
+    self.assertEqual(cache.misses, 2)
+    self.assertEqual(cache.evictions, 1)
+    self.assertEqual(
+        cache.get_stats(), '4 lookups, 2 hits (50.0%), 2 misses, 1 evictions'
+        )
+
+
+if __name__ == '__main__':
+  suite = unittest.makeSuite(LRUCacheTestCase)
+  unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the PersistentMap class.
+
+When executed, this program checks lookups, keys that collide in the
+lower levels of the trie, deletions (down to an empty map), and that
+old versions of a map are unchanged by modifications and share their
+unchanged subtrees with the new versions."""
+
+import sys
+import os
+import random
+import unittest
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.persistent_map import PersistentMap
+from cvs2svn_lib.persistent_map import EMPTY
+from cvs2svn_lib.persistent_map import BITS
+from cvs2svn_lib.persistent_map import _TrieNode
+
+
+# Keys that agree in their lowest 4 * BITS bits, and therefore share a
+# path through the top four levels of the trie:
+COLLIDING_KEYS = [7, 7 + (1 << (4 * BITS)), 7 + (3 << (4 * BITS)), 7 + (1 << 60)]
+
+
+def build(items):
+  m = EMPTY
+  for (key, value) in items:
+    m = m.set(key, value)
+  return m
+
+
+def iternodes(node):
+  """Generate NODE and all of the _TrieNodes below it."""
+
+  yield node
+  for child in node.children:
+    if isinstance(child, _TrieNode):
+      for n in iternodes(child):
+        yield n
+
+
+class PersistentMapTestCase(unittest.TestCase):
+  def check_contents(self, m, d):
+    """Check that PersistentMap M has the same contents as dict D."""
+
+    self.assertEqual(len(m), len(d))
+    self.assertEqual(sorted(m.iteritems()), sorted(d.items()))
+    self.assertEqual(sorted(m), sorted(d.keys()))
+    for (key, value) in d.items():
+      self.assertEqual(m[key], value)
+      self.assert_(key in m)
+    if m._root is not None:
+      # No node may be empty, and the bitmaps must match the children:
+      for node in iternodes(m._root):
+        self.assert_(node.children)
+        self.assertEqual(bin(node.bitmap).count('1'), len(node.children))
+
+  def test_empty(self):
+    self.check_contents(EMPTY, {})
+    self.assertEqual(EMPTY.get(1), None)
+    self.assertEqual(EMPTY.get(1, 'x'), 'x')
+    self.assertRaises(KeyError, lambda: EMPTY[1])
+    self.assertRaises(KeyError, EMPTY.delete, 1)
+    self.assertEqual(len(PersistentMap()), 0)
+
+  def test_lookup(self):
+    m = build([(1, 'a'), (2, 'b'), (100, None)])
+    self.check_contents(m, {1 : 'a', 2 : 'b', 100 : None})
+    self.assertEqual(m.get(3), None)
+    self.assert_(3 not in m)
+    self.assertRaises(KeyError, lambda: m[3])
+    self.assertRaises(KeyError, m.delete, 3)
+
+  def test_overwrite(self):
+    m1 = build([(1, 'a'), (2, 'b')])
+    m2 = m1.set(1, 'c')
+    self.check_contents(m2, {1 : 'c', 2 : 'b'})
+    # Setting a key to the value that it already has returns the same
+    # map:
+    self.assert_(m2.set(1, 'c') is m2)
+
+  def test_colliding_keys(self):
+    d = {}
+    m = EMPTY
+    for key in COLLIDING_KEYS:
+      d[key] = str(key)
+      m = m.set(key, str(key))
+      self.check_contents(m, d)
+    # A key that agrees with them in even more bits, but isn't present:
+    self.assert_(7 + (1 << 61) not in m)
+    self.assert_(7 + (1 << (4 * BITS)) + (1 << 60) not in m)
+    for key in COLLIDING_KEYS:
+      m = m.delete(key)
+      del d[key]
+      self.check_contents(m, d)
+    self.assert_(m._root is None)
+
+  def test_delete_to_empty(self):
+    keys = range(100) + COLLIDING_KEYS[1:]
+    d = dict([(key, -key) for key in keys])
+    m = build(d.items())
+    random.Random(1).shuffle(keys)
+    for key in keys:
+      m = m.delete(key)
+      del d[key]
+      self.check_contents(m, d)
+    self.assertEqual(len(m), 0)
+    self.assert_(m._root is None)
+    self.assertRaises(KeyError, m.delete, keys[0])
+    # The empty map can be reused:
+    m = m.set(5, 'x')
+    self.check_contents(m, {5 : 'x'})
+
+  def test_persistence(self):
+    r = random.Random(2)
+    versions = [(EMPTY, {})]
+    for i in range(500):
+      (m, d) = versions[r.randrange(len(versions))]
+      d = d.copy()
+      if d and r.random() < 0.3:
+        key = r.choice(d.keys())
+        m = m.delete(key)
+        del d[key]
+      else:
+        key = r.randrange(2000)
+        m = m.set(key, i)
+        d[key] = i
+      versions.append((m, d))
+    # No version was changed by the modifications derived from it:
+    for (m, d) in versions:
+      self.check_contents(m, d)
+
+  def test_structural_sharing(self):
+    m1 = build([(key, key) for key in range(32 * 32)])
+    m2 = m1.set(5, 'x')
+    self.assertEqual(m1[5], 5)
+    self.assertEqual(m2[5], 'x')
+    # Only the nodes on the path to key 5 are new; all other children
+    # of the root are shared:
+    for (i, child) in enumerate(m1._root.children):
+      if i == 5:
+        self.assert_(m2._root.children[i] is not child)
+      else:
+        self.assert_(m2._root.children[i] is child)
+    # The same holds for deletions:
+    m3 = m2.delete(6)
+    for (i, child) in enumerate(m2._root.children):
+      if i == 6:
+        self.assert_(m3._root.children[i] is not child)
+      else:
+        self.assert_(m3._root.children[i] is child)
+    self.assert_(6 in m2)
+    self.assert_(6 not in m3)
+
+
+if __name__ == '__main__':
+  suite = unittest.makeSuite(PersistentMapTestCase)
+  unittest.TextTestRunner(verbosity=2).run(suite)
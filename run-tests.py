@@ -4061,6 +4061,381 @@ def newphrases():
       )
 
 
+@Cvs2SvnTestFunction
+def check_dependencies():
+  "test --check-dependencies"
+
+  # The checks must pass and must not change the output:
+  conv = ensure_conversion(
+      'main', args=['--check-dependencies'],
+      dumpfile='check-dependencies.dump',
+      )
+  plain_conv = ensure_conversion(
+      'main', dumpfile='check-dependencies-plain.dump',
+      )
+  lines = list(open(conv.dumpfile, 'rb'))
+  plain_lines = list(open(plain_conv.dumpfile, 'rb'))
+  # Compare all lines following the repository UUID:
+  if lines[3:] != plain_lines[3:]:
+    raise Failure()
+
+
+class ParseCache(Cvs2SvnTestCase):
+  "test that --parse-cache does not change the output"
+
+  def __init__(self, variant=None, first_args=[], second_args=[], **kw):
+    """Convert twice, with FIRST_ARGS and then with SECOND_ARGS.
+
+    Both conversions use the same --parse-cache directory, which is
+    populated by the first conversion and used by the second.  The
+    outputs are compared to those of conversions without the cache."""
+
+    Cvs2SvnTestCase.__init__(self, 'main', variant=variant, **kw)
+    self.variant = variant
+    self.first_args = first_args
+    self.second_args = second_args
+
+  def convert(self, args, dumpfile):
+    # Don't use ensure_conversion(), because the same conversion is
+    # run more than once:
+    return Conversion(
+        dumpfile, self.name, None, None,
+        {'trunk' : 'trunk', 'branches' : 'branches', 'tags' : 'tags'},
+        args, dumpfile=dumpfile,
+        )
+
+  def get_entries(self, cache_dir):
+    """Return a map {path : inode} of the entries in CACHE_DIR."""
+
+    retval = {}
+    for (dirpath, dirnames, filenames) in os.walk(cache_dir):
+      for filename in filenames:
+        path = os.path.join(dirpath, filename)
+        retval[path] = os.stat(path).st_ino
+    return retval
+
+  def check_same_output(self, conv, args, dumpfile):
+    plain_conv = self.convert(args, dumpfile)
+    lines = list(open(conv.dumpfile, 'rb'))
+    plain_lines = list(open(plain_conv.dumpfile, 'rb'))
+    # Compare all lines following the repository UUID:
+    if lines[3:] != plain_lines[3:]:
+      raise Failure()
+
+  def run(self, sbox):
+    prefix = 'parse-cache-%s' % (self.variant or 0,)
+    cache_dir = os.path.join(tmp_dir, prefix)
+    erase(cache_dir)
+    cache_args = ['--parse-cache=%s' % (cache_dir,)]
+
+    conv = self.convert(self.first_args + cache_args, prefix + '-1.dump')
+    entries = self.get_entries(cache_dir)
+    if not entries:
+      raise Failure('The parse cache was not populated')
+    self.check_same_output(conv, self.first_args, prefix + '-1-plain.dump')
+
+    conv = self.convert(self.second_args + cache_args, prefix + '-2.dump')
+    # Entries are only rewritten for files that had to be parsed:
+    if self.get_entries(cache_dir) != entries:
+      raise Failure('The parse cache was not used')
+    self.check_same_output(conv, self.second_args, prefix + '-2-plain.dump')
+
+
+class ResumeAfterCrash(Cvs2SvnTestCase):
+  "test that --resume gives the same output"
+
+  def __init__(self, pass_name, count, variant=None, **kw):
+    """Crash after the COUNTth checkpoint of PASS_NAME, then resume."""
+
+    Cvs2SvnTestCase.__init__(self, 'main', variant=variant, **kw)
+    self.variant = variant
+    self.pass_name = pass_name
+    self.count = count
+
+  def run(self, sbox):
+    if not os.path.isdir(tmp_dir):
+      os.mkdir(tmp_dir)
+    cvsrepos = os.path.join(test_data_dir, '%s-cvsrepos' % self.name)
+    prefix = 'resume-%s' % (self.variant or 0,)
+    dumpfile = os.path.join(tmp_dir, prefix + '.dump')
+    plain_dumpfile = os.path.join(tmp_dir, prefix + '-plain.dump')
+    lock = os.path.join(tmp_dir, 'cvs2svn.lock')
+    erase(dumpfile)
+    erase(plain_dumpfile)
+
+    args = [
+        '--tmpdir=%s' % (tmp_dir,), '-qqqqqq', '--checkpoint-interval=0',
+        '--dumpfile=%s' % (dumpfile,), cvsrepos,
+        ]
+    try:
+      run_script(
+          cvs2svn, r'.*simulated crash after checkpoint',
+          '--crash-after-checkpoint=%s:%d' % (self.pass_name, self.count,),
+          *args
+          )
+      # The crash leaves the lock behind:
+      if not os.path.isdir(lock):
+        raise Failure('The conversion did not crash')
+    finally:
+      erase(lock)
+    run_script(cvs2svn, None, '--resume', *args)
+
+    run_script(
+        cvs2svn, None, '--tmpdir=%s' % (tmp_dir,), '-qqqqqq',
+        '--dumpfile=%s' % (plain_dumpfile,), cvsrepos,
+        )
+    lines = list(open(dumpfile, 'rb'))
+    plain_lines = list(open(plain_dumpfile, 'rb'))
+    # Compare all lines following the repository UUID:
+    if lines[3:] != plain_lines[3:]:
+      raise Failure()
+
+
+class ConcurrentPasses(Cvs2SvnTestCase):
+  "test that --jobs gives the same output"
+
+  def __init__(self, jobs, start_pass=None, variant=None, **kw):
+    """Convert with --jobs=JOBS.
+
+    If START_PASS is set, the passes before it are run serially first,
+    and the conversion with --jobs starts with pass START_PASS."""
+
+    Cvs2SvnTestCase.__init__(self, 'main', variant=variant, **kw)
+    self.variant = variant
+    self.jobs = jobs
+    self.start_pass = start_pass
+
+  def run(self, sbox):
+    if not os.path.isdir(tmp_dir):
+      os.mkdir(tmp_dir)
+    cvsrepos = os.path.join(test_data_dir, '%s-cvsrepos' % self.name)
+    prefix = 'jobs-%s' % (self.variant or 0,)
+    dumpfile = os.path.join(tmp_dir, prefix + '.dump')
+    plain_dumpfile = os.path.join(tmp_dir, prefix + '-plain.dump')
+    erase(dumpfile)
+    erase(plain_dumpfile)
+
+    args = [
+        '--tmpdir=%s' % (tmp_dir,), '-qqqqqq',
+        '--dumpfile=%s' % (dumpfile,), cvsrepos,
+        ]
+    if self.start_pass is None:
+      run_script(cvs2svn, None, '--jobs=%d' % (self.jobs,), *args)
+    else:
+      run_script(cvs2svn, None, '--passes=:%d' % (self.start_pass - 1,), *args)
+      run_script(
+          cvs2svn, None, '--jobs=%d' % (self.jobs,),
+          '--passes=%d:' % (self.start_pass,), *args
+          )
+
+    run_script(
+        cvs2svn, None, '--tmpdir=%s' % (tmp_dir,), '-qqqqqq',
+        '--dumpfile=%s' % (plain_dumpfile,), cvsrepos,
+        )
+    lines = list(open(dumpfile, 'rb'))
+    plain_lines = list(open(plain_dumpfile, 'rb'))
+    # Compare all lines following the repository UUID:
+    if lines[3:] != plain_lines[3:]:
+      raise Failure()
+
+
+class SameOutput(Cvs2SvnTestCase):
+  "test that an option doesn't change the output"
+
+  def __init__(self, options, doc=None, variant=None, **kw):
+    """Check that converting with OPTIONS gives the default output.
+
+    OPTIONS is a list of command-line options that should only affect
+    how the conversion is done, not its result."""
+
+    Cvs2SvnTestCase.__init__(self, 'main', doc=doc, variant=variant, **kw)
+    self.variant = variant
+    self.options = options
+
+  def run(self, sbox):
+    if not os.path.isdir(tmp_dir):
+      os.mkdir(tmp_dir)
+    cvsrepos = os.path.join(test_data_dir, '%s-cvsrepos' % self.name)
+    prefix = 'same-output-%s' % (self.variant or 0,)
+    dumpfile = os.path.join(tmp_dir, prefix + '.dump')
+    plain_dumpfile = os.path.join(tmp_dir, prefix + '-plain.dump')
+    erase(dumpfile)
+    erase(plain_dumpfile)
+
+    args = self.options + [
+        '--tmpdir=%s' % (tmp_dir,), '-qqqqqq',
+        '--dumpfile=%s' % (dumpfile,), cvsrepos,
+        ]
+    run_script(cvs2svn, None, *args)
+    run_script(
+        cvs2svn, None, '--tmpdir=%s' % (tmp_dir,), '-qqqqqq',
+        '--dumpfile=%s' % (plain_dumpfile,), cvsrepos,
+        )
+    lines = list(open(dumpfile, 'rb'))
+    plain_lines = list(open(plain_dumpfile, 'rb'))
+    # Compare all lines following the repository UUID:
+    if lines[3:] != plain_lines[3:]:
+      raise Failure()
+
+
+def write_incremental_cvsrepos(cvsrepos, younger_revisions):
+  """Write the CVS repository for the --incremental-state tests.
+
+  The repository contains a single file with revisions 1.1, 1.2, and
+  1.2.2.1 on branch B.  If YOUNGER_REVISIONS is True, the file also
+  contains revisions 1.3 and 1.2.2.2, which are younger than the
+  others, as if they had been committed after the first conversion."""
+
+  if younger_revisions:
+    head = '1.3'
+    trunk = [
+        ('1.3', '2010.01.03.00.00.00', 'a\nb\nc\n'),
+        ('1.2', '2010.01.02.00.00.00', 'd3 1\n'),
+        ]
+    branch = [
+        ('1.2.2.1', '2010.01.02.12.00.00', 'a2 1\nx\n'),
+        ('1.2.2.2', '2010.01.03.12.00.00', 'a3 1\ny\n'),
+        ]
+  else:
+    head = '1.2'
+    trunk = [
+        ('1.2', '2010.01.02.00.00.00', 'a\nb\n'),
+        ]
+    branch = [
+        ('1.2.2.1', '2010.01.02.12.00.00', 'a2 1\nx\n'),
+        ]
+  trunk.append(('1.1', '2010.01.01.00.00.00', 'd2 1\n'))
+
+  erase(cvsrepos)
+  os.makedirs(os.path.join(cvsrepos, 'CVSROOT'))
+  f = open(os.path.join(cvsrepos, 'file.txt,v'), 'wb')
+  f.write(
+      'head\t%s;\naccess;\nsymbols\n\tB:1.2.0.2;\nlocks; strict;\n'
+      'comment\t@# @;\n\n' % (head,)
+      )
+  for revs in [trunk, branch]:
+    for (i, (rev, date, text)) in enumerate(revs):
+      if rev == '1.2':
+        branches = '\n\t1.2.2.1'
+      else:
+        branches = ''
+      if i + 1 < len(revs):
+        next = revs[i + 1][0]
+      else:
+        next = ''
+      f.write(
+          '\n%s\ndate\t%s;\tauthor jrandom;\tstate Exp;\n'
+          'branches%s;\nnext\t%s;\n' % (rev, date, branches, next,)
+          )
+  f.write('\n\ndesc\n@@\n')
+  for (rev, date, text) in trunk + branch:
+    f.write('\n\n%s\nlog\n@Commit %s.\n@\ntext\n@%s@\n' % (rev, rev, text,))
+  f.close()
+
+
+@Cvs2SvnTestFunction
+def incremental_state():
+  "test that --incremental-state continues the output"
+
+  if not os.path.isdir(tmp_dir):
+    os.mkdir(tmp_dir)
+  cvsrepos = os.path.join(tmp_dir, 'incremental-cvsrepos')
+  state = os.path.join(tmp_dir, 'incremental-state.dat')
+  cache_dir = os.path.join(tmp_dir, 'incremental-parse-cache')
+  erase(state)
+  erase(cache_dir)
+
+  def convert(younger_revisions, dumpfile):
+    """Convert the repository; return the revision numbers output.
+
+    Warnings (e.g., about leftover revisions in the checkout cache)
+    are written to stderr and therefore make the conversion fail."""
+
+    write_incremental_cvsrepos(cvsrepos, younger_revisions)
+    dumpfile = os.path.join(tmp_dir, dumpfile)
+    erase(dumpfile)
+    run_script(
+        cvs2svn, None, '--tmpdir=%s' % (tmp_dir,), '-qq',
+        '--incremental-state=%s' % (state,), '--dumpfile=%s' % (dumpfile,),
+        '--parse-cache=%s' % (cache_dir,), cvsrepos,
+        )
+    return [
+        int(line.split(':')[1])
+        for line in open(dumpfile, 'rb')
+        if line.startswith('Revision-number:')
+        ]
+
+  revnums = convert(False, 'incremental-1.dump')
+  if revnums != range(1, len(revnums) + 1):
+    raise Failure()
+  # The second dumpfile only contains the new revisions (1.3 and
+  # 1.2.2.2), numbered after those of the first:
+  new_revnums = convert(True, 'incremental-2.dump')
+  if new_revnums != [revnums[-1] + 1, revnums[-1] + 2]:
+    raise Failure()
+  # A conversion without changes doesn't output any revisions:
+  if convert(True, 'incremental-3.dump'):
+    raise Failure()
+
+
+@Cvs2SvnTestFunction
+def incremental_state_git():
+  "test loading incremental cvs2git output into git"
+
+  if not os.path.isdir(tmp_dir):
+    os.mkdir(tmp_dir)
+  cvsrepos = os.path.join(tmp_dir, 'incremental-git-cvsrepos')
+  state = os.path.join(tmp_dir, 'incremental-git-state.dat')
+  marks = os.path.join(tmp_dir, 'incremental-git-marks.dat')
+  gitrepos = os.path.join(tmp_dir, 'incremental.git')
+  blobfile = os.path.join(tmp_dir, 'incremental-git-blob.dat')
+  dumpfile = os.path.join(tmp_dir, 'incremental-git-dump.dat')
+  erase(state)
+  erase(marks)
+  erase(gitrepos)
+
+  def git(*args):
+    return run_program('git', None, '--git-dir=%s' % (gitrepos,), *args)
+
+  try:
+    git('init', '--quiet', '--bare')
+  except OSError:
+    raise svntest.Skip()
+
+  for younger_revisions in [False, True]:
+    write_incremental_cvsrepos(cvsrepos, younger_revisions)
+    run_script(
+        cvs2git, None, '--tmpdir=%s' % (tmp_dir,), '-qq',
+        '--incremental-state=%s' % (state,),
+        '--use-external-blob-generator',
+        '--blobfile=%s' % (blobfile,), '--dumpfile=%s' % (dumpfile,),
+        '--username=cvs2git', cvsrepos,
+        )
+    # Load both outputs into the same repository, as described in
+    # www/cvs2git.html:
+    svntest.main.run_command_stdin(
+        'git', None, -1, 1,
+        open(blobfile, 'rb').readlines() + open(dumpfile, 'rb').readlines(),
+        '--git-dir=%s' % (gitrepos,), 'fast-import', '--quiet',
+        '--import-marks-if-exists=%s' % (marks,),
+        '--export-marks=%s' % (marks,),
+        )
+
+  # The new commits must follow the old ones on each branch:
+  if git('log', '--format=%s', 'master') != [
+        'Commit 1.3.\n', 'Commit 1.2.\n', 'Commit 1.1.\n',
+        ]:
+    raise Failure()
+  if git('log', '--format=%s', 'B')[:2] != [
+        'Commit 1.2.2.2.\n', 'Commit 1.2.2.1.\n',
+        ]:
+    raise Failure()
+  if git('show', 'master:file.txt') != ['a\n', 'b\n', 'c\n']:
+    raise Failure()
+  if git('show', 'B:file.txt') != ['a\n', 'b\n', 'x\n', 'y\n']:
+    raise Failure()
+
+
 ########################################################################
 # Run the tests
 
@@ -4279,6 +4654,32 @@ test_list = [
     log_message_eols,
     missing_vendor_branch,
     newphrases,
+    check_dependencies,
+    ParseCache(),
+    ParseCache(
+        variant=1, second_args=[r'--symbol-transform=^(.*)$:x-\1'],
+        ),
+    ResumeAfterCrash('CollectRevsPass', 10),
+    ResumeAfterCrash('FilterSymbolsPass', 10, variant=1),
+    ResumeAfterCrash('OutputPass', 10, variant=2),
+# 190:
+    incremental_state,
+    incremental_state_git,
+    ConcurrentPasses(3),
+    ConcurrentPasses(2, start_pass=5, variant=1),
+    SameOutput(
+        ['--in-memory-mirror'],
+        doc='test that --in-memory-mirror gives the same output',
+        ),
+    # The caches are set to their minimum sizes:
+    SameOutput(
+        ['--memory-limit=16M'],
+        doc='test that --memory-limit gives the same output', variant=1,
+        ),
+    SameOutput(
+        ['--memory-limit=256M'],
+        doc='test that --memory-limit gives the same output', variant=2,
+        ),
     ]
 
 if __name__ == '__main__':